@@ -31,6 +31,14 @@ ROOT_HELPER_OPTS = [
                help=_('Root helper application.')),
 ]
 
+ROOT_HELPER_DAEMON_OPTS = [
+    cfg.StrOpt('root_helper_daemon',
+               help=_('Command starting the rootwrap daemon, which runs the '
+                      'commands of the agent as root instead of the '
+                      'root_helper. For example "sudo neutron-rootwrap-daemon '
+                      '/etc/neutron/rootwrap.conf"')),
+]
+
 AGENT_STATE_OPTS = [
     cfg.IntOpt('report_interval', default=4,
                help=_('Seconds between nodes reporting state to server')),
@@ -68,6 +76,7 @@ def register_root_helper(conf):
     # The first call is to ensure backward compatibility
     conf.register_opts(ROOT_HELPER_OPTS)
     conf.register_opts(ROOT_HELPER_OPTS, 'AGENT')
+    conf.register_opts(ROOT_HELPER_DAEMON_OPTS, 'AGENT')
 
 
 def register_agent_state_opts_helper(conf):
@@ -25,6 +25,7 @@ from neutron.agent.common import config
 from neutron.agent.linux import dhcp
 from neutron.agent.linux import external_process
 from neutron.agent.linux import interface
+from neutron.agent.linux import ip_lib
 from neutron.agent import rpc as agent_rpc
 from neutron.common import constants
 from neutron.common import legacy
@@ -43,6 +44,11 @@ LOG = logging.getLogger(__name__)
 
 
 class DhcpAgent(manager.Manager):
+    # API version history:
+    #     1.0 - Initial version.
+    #     1.1 - Support ports_changed
+    RPC_API_VERSION = '1.1'
+
     OPTS = [
         cfg.IntOpt('resync_interval', default=5,
                    help=_("Interval to resync.")),
@@ -59,6 +65,11 @@ class DhcpAgent(manager.Manager):
                            "enable_isolated_metadata = True")),
         cfg.IntOpt('num_sync_threads', default=4,
                    help=_('Number of threads to use during sync process.')),
+        cfg.FloatOpt('reload_allocations_delay', default=0.5,
+                     help=_("Seconds to wait before reloading the "
+                            "allocations of a network after a port change, "
+                            "so that a burst of port changes is reloaded at "
+                            "once. 0 reloads them after each change.")),
         cfg.StrOpt('metadata_proxy_socket',
                    default='$state_path/metadata_proxy',
                    help=_('Location of Metadata Proxy UNIX domain '
@@ -70,6 +81,8 @@ class DhcpAgent(manager.Manager):
         self.needs_resync = False
         self.conf = cfg.CONF
         self.cache = NetworkCache()
+        # The networks whose allocations will be reloaded
+        self.pending_reloads = set()
         self.root_helper = config.get_root_helper(self.conf)
         self.dhcp_driver_cls = importutils.import_class(self.conf.dhcp_driver)
         ctx = context.get_admin_context_without_session()
@@ -243,6 +256,27 @@ class DhcpAgent(manager.Manager):
                                  mac_address=port.mac_address,
                                  removed_ips=removed_ips)
 
+    def reload_allocations(self, network):
+        """Reload the allocations of a network after a port change.
+
+        The reload is delayed, so that a burst of port changes of the
+        network is reloaded at once.
+        """
+        if self.conf.reload_allocations_delay <= 0:
+            self.call_driver('reload_allocations', network)
+        elif network.id not in self.pending_reloads:
+            self.pending_reloads.add(network.id)
+            eventlet.spawn_after(self.conf.reload_allocations_delay,
+                                 self._reload_pending_allocations,
+                                 network.id)
+
+    @utils.synchronized('dhcp-agent')
+    def _reload_pending_allocations(self, network_id):
+        self.pending_reloads.discard(network_id)
+        network = self.cache.get_network_by_id(network_id)
+        if network:
+            self.call_driver('reload_allocations', network)
+
     @utils.synchronized('dhcp-agent')
     def network_create_end(self, context, payload):
         """Handle the network.create.end notification event."""
@@ -280,23 +314,18 @@ class DhcpAgent(manager.Manager):
         if network:
             self.refresh_dhcp_helper(network.id)
 
-    @utils.synchronized('dhcp-agent')
-    def port_update_end(self, context, payload):
-        """Handle the port.update.end notification event."""
-        port = dhcp.DictModel(payload['port'])
+    def _port_updated(self, port):
+        """Update the cache with a port, return its network if cached."""
+        port = dhcp.DictModel(port)
         network = self.cache.get_network_by_id(port.network_id)
         if network:
             self.release_lease_for_removed_ips(port, network)
             self.cache.put_port(port)
-            self.call_driver('reload_allocations', network)
+        return network
 
-    # Use the update handler for the port create event.
-    port_create_end = port_update_end
-
-    @utils.synchronized('dhcp-agent')
-    def port_delete_end(self, context, payload):
-        """Handle the port.delete.end notification event."""
-        port = self.cache.get_port_by_id(payload['port_id'])
+    def _port_deleted(self, port_id):
+        """Remove a port from the cache, return its network if cached."""
+        port = self.cache.get_port_by_id(port_id)
         if port:
             network = self.cache.get_network_by_id(port.network_id)
             self.cache.remove_port(port)
@@ -306,7 +335,42 @@ class DhcpAgent(manager.Manager):
                              network,
                              mac_address=port.mac_address,
                              removed_ips=removed_ips)
-            self.call_driver('reload_allocations', network)
+            return network
+
+    @utils.synchronized('dhcp-agent')
+    def port_update_end(self, context, payload):
+        """Handle the port.update.end notification event."""
+        network = self._port_updated(payload['port'])
+        if network:
+            self.reload_allocations(network)
+
+    # Use the update handler for the port create event.
+    port_create_end = port_update_end
+
+    @utils.synchronized('dhcp-agent')
+    def port_delete_end(self, context, payload):
+        """Handle the port.delete.end notification event."""
+        network = self._port_deleted(payload['port_id'])
+        if network:
+            self.reload_allocations(network)
+
+    @utils.synchronized('dhcp-agent')
+    def ports_changed(self, context, payload):
+        """Handle a batch of port create, update and delete events.
+
+        The allocations of each network are reloaded once.
+        """
+        networks = {}
+        for port in payload.get('ports', []):
+            network = self._port_updated(port)
+            if network:
+                networks[network.id] = network
+        for port_id in payload.get('deleted_port_ids', []):
+            network = self._port_deleted(port_id)
+            if network:
+                networks[network.id] = network
+        for network in networks.values():
+            self.reload_allocations(network)
 
     def enable_isolated_metadata_proxy(self, network):
 
@@ -536,7 +600,8 @@ class DhcpAgentWithStateReport(DhcpAgent):
             'configurations': {
                 'dhcp_driver': cfg.CONF.dhcp_driver,
                 'use_namespaces': cfg.CONF.use_namespaces,
-                'dhcp_lease_duration': cfg.CONF.dhcp_lease_duration},
+                'dhcp_lease_duration': cfg.CONF.dhcp_lease_duration,
+                'batch_notifications': True},
             'start_flag': True,
             'agent_type': constants.AGENT_TYPE_DHCP}
         report_interval = cfg.CONF.AGENT.report_interval
@@ -581,6 +646,7 @@ def register_options():
     config.register_root_helper(cfg.CONF)
     cfg.CONF.register_opts(dhcp.OPTS)
     cfg.CONF.register_opts(interface.OPTS)
+    cfg.CONF.register_opts(ip_lib.OPTS)
 
 
 def main():
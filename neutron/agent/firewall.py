@@ -50,6 +50,9 @@ class FirewallDriver(object):
       if direction is egress:
         remote_group_id will be a list of dest_ip_prefix
       remote_group_id will also remaining membership update management
+      Note: drivers supporting remote group members receive the remote
+      group rules unconverted, and the member ips of the remote groups
+      through update_security_group_members
     """
 
     __metaclass__ = abc.ABCMeta
@@ -84,6 +87,27 @@ class FirewallDriver(object):
         """Stop filtering port."""
         raise NotImplementedError()
 
+    @property
+    def supports_remote_group_members(self):
+        """Whether remote group rules may be given unconverted."""
+        return False
+
+    def update_security_group_members(self, sg_members):
+        """Update the member ips of remote security groups.
+
+        :param sg_members: the ips of the members of each group, by
+                           ethertype.
+        """
+        raise NotImplementedError()
+
+    def update_security_group_member_ips(self, sg_member_ips):
+        """Add and remove member ips of remote security groups.
+
+        :param sg_member_ips: the ips added to each group as 'added', and
+                              the ips removed as 'removed', by group id.
+        """
+        raise NotImplementedError()
+
     def filter_defer_apply_on(self):
         """Defer application of filtering rule."""
         pass
@@ -17,7 +17,13 @@
 # @author: Dan Wendlandt, Nicira, Inc
 #
 
+import heapq
+import itertools
+import time
+
 import eventlet
+from eventlet import event
+from eventlet import semaphore
 import netaddr
 from oslo.config import cfg
 
@@ -35,13 +41,13 @@ from neutron.common import utils as common_utils
 from neutron import context
 from neutron import manager
 from neutron.openstack.common import importutils
-from neutron.openstack.common import lockutils
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import loopingcall
 from neutron.openstack.common import periodic_task
 from neutron.openstack.common.rpc import common as rpc_common
 from neutron.openstack.common.rpc import proxy
 from neutron.openstack.common import service
+from neutron.openstack.common import timeutils
 from neutron import service as neutron_service
 from neutron.services.firewall.agents.l3reference import firewall_l3_agent
 
@@ -49,7 +55,12 @@ LOG = logging.getLogger(__name__)
 NS_PREFIX = 'qrouter-'
 INTERNAL_DEV_PREFIX = 'qr-'
 EXTERNAL_DEV_PREFIX = 'qg-'
-RPC_LOOP_INTERVAL = 1
+
+# Router updates notified by the server are processed before the ones of
+# the periodic resync
+PRIORITY_RPC = 0
+PRIORITY_SYNC_ROUTERS_TASK = 1
+DELETE_ROUTER = 'delete'
 
 
 class L3PluginApi(proxy.RpcProxy):
@@ -67,11 +78,17 @@ class L3PluginApi(proxy.RpcProxy):
             topic=topic, default_version=self.BASE_RPC_API_VERSION)
         self.host = host
 
-    def get_routers(self, context, router_ids=None):
-        """Make a remote process call to retrieve the sync data for routers."""
+    def get_routers(self, context, router_ids=None, router_revisions=None):
+        """Make a remote process call to retrieve the sync data for routers.
+
+        The routers whose revision is given in router_revisions and did not
+        change are returned without their data by the servers which support
+        it.
+        """
         return self.call(context,
                          self.make_msg('sync_routers', host=self.host,
-                                       router_ids=router_ids),
+                                       router_ids=router_ids,
+                                       router_revisions=router_revisions),
                          topic=self.topic)
 
     def get_external_network_id(self, context):
@@ -138,6 +155,107 @@ class RouterInfo(object):
         self._snat_action = None
 
 
+class RouterUpdate(object):
+    """An update to process for a router.
+
+    The router is fetched from the server when processed, unless it is given
+    or the update deletes the router. The timestamp is the time at which the
+    router data was, or will be, fetched.
+    """
+
+    def __init__(self, router_id, priority, action=None, router=None,
+                 timestamp=None):
+        self.router_id = router_id
+        self.priority = priority
+        self.action = action
+        self.router = router
+        self.timestamp = timestamp or timeutils.utcnow()
+        self.done = event.Event()
+
+    def merge(self, update):
+        """Coalesce a later update of the same router into this one."""
+        self.priority = min(self.priority, update.priority)
+        if update.timestamp >= self.timestamp:
+            self.action = update.action
+            self.router = update.router
+            self.timestamp = update.timestamp
+
+    def wait(self):
+        self.done.wait()
+
+
+class RouterUpdateQueue(object):
+    """Priority queue of router updates.
+
+    There is at most one queued update per router: the updates of a router
+    which is already queued are merged into the queued one. A router is
+    processed by one worker at a time, the updates of a router which is
+    being processed are only returned once it is done.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        # Counts the heap entries, some of which may be stale
+        self._entries = semaphore.Semaphore(0)
+        # The queued update of each router
+        self._pending = {}
+        # The routers being processed, and their updates waiting for them
+        self._busy = set()
+        self._blocked = {}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, update):
+        """Queue an update.
+
+        :returns: the update in which it was merged, to wait for.
+        """
+        pending = self._pending.get(update.router_id)
+        if pending is None:
+            self._pending[update.router_id] = update
+            self._push(update)
+            return update
+        priority = pending.priority
+        pending.merge(update)
+        if (pending.priority < priority and
+                update.router_id not in self._blocked):
+            # The entry with the previous priority will be skipped
+            self._push(pending)
+        return pending
+
+    def get(self, block=True):
+        """Return the next update to process, or None if not blocking.
+
+        The caller must call task_done() once the update is processed.
+        """
+        while self._entries.acquire(blocking=block):
+            update = heapq.heappop(self._heap)[2]
+            router_id = update.router_id
+            if self._pending.get(router_id) is not update:
+                # Merged into an update with a higher priority
+                continue
+            if router_id in self._busy:
+                self._blocked[router_id] = update
+                continue
+            del self._pending[router_id]
+            self._busy.add(router_id)
+            return update
+
+    def task_done(self, update):
+        self._busy.discard(update.router_id)
+        blocked = self._blocked.pop(update.router_id, None)
+        if blocked is not None:
+            self._push(blocked)
+        update.done.send()
+
+    def _push(self, update):
+        heapq.heappush(self._heap,
+                       (update.priority, next(self._counter), update))
+        self._entries.release()
+
+
 class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
     """Manager for L3NatAgent
 
@@ -185,6 +303,8 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
                    default='$state_path/metadata_proxy',
                    help=_('Location of Metadata Proxy UNIX domain '
                           'socket')),
+        cfg.IntOpt('router_update_workers', default=8,
+                   help=_("Number of routers processed concurrently.")),
     ]
 
     def __init__(self, host, conf=None):
@@ -210,15 +330,19 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
         self.context = context.get_admin_context_without_session()
         self.plugin_rpc = L3PluginApi(topics.L3PLUGIN, host)
         self.fullsync = True
-        self.updated_routers = set()
-        self.removed_routers = set()
         self.sync_progress = False
+        self.target_ex_net_id = None
+        self._queue = RouterUpdateQueue()
+        # The timestamp of the data last processed for each router
+        self._router_timestamps = {}
+        # The time at which the routers of the resync in progress were
+        # fetched, None when no resync is in progress
+        self._sync_timestamp = None
+        # The revision of the routers processed successfully
+        self._router_revisions = {}
         if self.conf.use_namespaces:
             self._destroy_router_namespaces(self.conf.router_id)
 
-        self.rpc_loop = loopingcall.FixedIntervalLoopingCall(
-            self._rpc_loop)
-        self.rpc_loop.start(interval=RPC_LOOP_INTERVAL)
         super(L3NATAgent, self).__init__(conf=self.conf)
 
     def _destroy_router_namespaces(self, only_router_id=None):
@@ -617,7 +741,8 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
     def router_deleted(self, context, router_id):
         """Deal with router deletion RPC message."""
         LOG.debug(_('Got router deleted notification for %s'), router_id)
-        self.removed_routers.add(router_id)
+        self._queue.add(RouterUpdate(router_id, PRIORITY_RPC,
+                                     action=DELETE_ROUTER))
 
     def routers_updated(self, context, routers):
         """Deal with routers modification and creation RPC message."""
@@ -626,25 +751,56 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
             # This is needed for backward compatiblity
             if isinstance(routers[0], dict):
                 routers = [router['id'] for router in routers]
-            self.updated_routers.update(routers)
+            for router_id in routers:
+                self._queue.add(RouterUpdate(router_id, PRIORITY_RPC))
 
     def router_removed_from_agent(self, context, payload):
         LOG.debug(_('Got router removed from agent :%r'), payload)
-        self.removed_routers.add(payload['router_id'])
+        self._queue.add(RouterUpdate(payload['router_id'], PRIORITY_RPC,
+                                     action=DELETE_ROUTER))
 
     def router_added_to_agent(self, context, payload):
         LOG.debug(_('Got router added to agent :%r'), payload)
         self.routers_updated(context, payload)
 
-    def _process_routers(self, routers, all_routers=False):
-        pool = eventlet.GreenPool()
+    def _external_bridge_exists(self):
         if (self.conf.external_network_bridge and
             not ip_lib.device_exists(self.conf.external_network_bridge)):
             LOG.error(_("The external network bridge '%s' does not exist"),
                       self.conf.external_network_bridge)
+            return False
+        return True
+
+    def _is_router_handled(self, router):
+        if not router['admin_state_up']:
+            return False
+        # If namespaces are disabled, only process the router associated
+        # with the configured agent id.
+        if (not self.conf.use_namespaces and
+            router['id'] != self.conf.router_id):
+            return False
+        ex_net_id = (router['external_gateway_info'] or {}).get('network_id')
+        if not ex_net_id and not self.conf.handle_internal_only_routers:
+            return False
+        if ex_net_id and ex_net_id != self.target_ex_net_id:
+            # The external network may have been replaced since it was
+            # last fetched
+            self.target_ex_net_id = self._fetch_external_net_id()
+            return ex_net_id == self.target_ex_net_id
+        return True
+
+    def _process_routers(self, routers, all_routers=False, timestamp=None):
+        """Process routers and wait for them to be processed.
+
+        The routers are queued with the priority of the periodic resync and
+        processed by the workers, interleaved with the routers notified by
+        the server. The timestamp is the time at which the routers were
+        fetched, now by default.
+        """
+        if not self._external_bridge_exists():
             return
 
-        target_ex_net_id = self._fetch_external_net_id()
+        self.target_ex_net_id = self._fetch_external_net_id()
         # if routers are all the routers we have (They are from router sync on
         # starting or when error occurs during running), we seek the
         # routers which should be removed.
@@ -655,82 +811,129 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
         else:
             prev_router_ids = set(self.router_info) & set(
                 [router['id'] for router in routers])
+        timestamp = timestamp or timeutils.utcnow()
+        updates = []
         cur_router_ids = set()
         for r in routers:
-            if not r['admin_state_up']:
-                continue
-
-            # If namespaces are disabled, only process the router associated
-            # with the configured agent id.
-            if (not self.conf.use_namespaces and
-                r['id'] != self.conf.router_id):
-                continue
-            ex_net_id = (r['external_gateway_info'] or {}).get('network_id')
-            if not ex_net_id and not self.conf.handle_internal_only_routers:
-                continue
-            if ex_net_id and ex_net_id != target_ex_net_id:
-                continue
             cur_router_ids.add(r['id'])
-            if r['id'] not in self.router_info:
-                self._router_added(r['id'], r)
-            ri = self.router_info[r['id']]
-            ri.router = r
-            pool.spawn_n(self.process_router, ri)
-        # identify and remove routers that no longer exist
+            if (r.get('revision') and
+                    r['revision'] == self._router_revisions.get(r['id'])):
+                continue
+            updates.append(RouterUpdate(r['id'], PRIORITY_SYNC_ROUTERS_TASK,
+                                        router=r, timestamp=timestamp))
         for router_id in prev_router_ids - cur_router_ids:
-            pool.spawn_n(self._router_removed, router_id)
-        pool.waitall()
-
-    @lockutils.synchronized('l3-agent', 'neutron-')
-    def _rpc_loop(self):
-        # _rpc_loop and _sync_routers_task will not be
-        # executed in the same time because of lock.
-        # so we can clear the value of updated_routers
-        # and removed_routers
+            updates.append(RouterUpdate(router_id, PRIORITY_SYNC_ROUTERS_TASK,
+                                        action=DELETE_ROUTER,
+                                        timestamp=timestamp))
+        updates = [self._queue.add(update) for update in updates]
+        # Work on the queue too, the workers are not running before the
+        # agent is started
+        while self._process_router_update(block=False):
+            pass
+        for update in updates:
+            update.wait()
+
+    def _process_router_update(self, block=True):
+        """Process the next router update of the queue.
+
+        :returns: False if not blocking and the queue is empty.
+        """
+        update = self._queue.get(block=block)
+        if update is None:
+            return False
+        start = time.time()
         try:
-            if self.updated_routers:
-                router_ids = list(self.updated_routers)
-                self.updated_routers.clear()
-                routers = self.plugin_rpc.get_routers(
-                    self.context, router_ids)
-                self._process_routers(routers)
-            self._process_router_delete()
+            self._apply_router_update(update)
         except Exception:
-            LOG.exception(_("Failed synchronizing routers"))
+            LOG.exception(_("Failed processing router %s"), update.router_id)
+            # The router is processed again by the next resync
+            self._router_revisions.pop(update.router_id, None)
             self.fullsync = True
-
-    def _process_router_delete(self):
-        current_removed_routers = list(self.removed_routers)
-        for router_id in current_removed_routers:
-            self._router_removed(router_id)
-            self.removed_routers.remove(router_id)
+        finally:
+            self._queue.task_done(update)
+        LOG.debug(_("Processed router %(router_id)s in %(time).3f seconds, "
+                    "%(queued)d router updates queued"),
+                  {'router_id': update.router_id,
+                   'time': time.time() - start,
+                   'queued': len(self._queue)})
+        return True
+
+    def _apply_router_update(self, update):
+        router_id = update.router_id
+        if update.timestamp < self._router_timestamps.get(router_id,
+                                                          update.timestamp):
+            LOG.debug(_("Skipping outdated update of router %s"), router_id)
+            return
+        router = None
+        if update.action != DELETE_ROUTER:
+            router = update.router
+            if router is None:
+                if not self._external_bridge_exists():
+                    return
+                update.timestamp = timeutils.utcnow()
+                routers = self.plugin_rpc.get_routers(self.context,
+                                                      [router_id])
+                router = routers[0] if routers else None
+        self._router_revisions.pop(router_id, None)
+        if router is None or not self._is_router_handled(router):
+            if router_id in self.router_info:
+                self._router_removed(router_id)
+            if self._sync_timestamp is None:
+                # Only the updates of a resync hold router data fetched
+                # before they are processed, there is none to skip
+                self._router_timestamps.pop(router_id, None)
+                return
+        else:
+            if router_id not in self.router_info:
+                self._router_added(router_id, router)
+            ri = self.router_info[router_id]
+            ri.router = router
+            self.process_router(ri)
+            if router.get('revision'):
+                self._router_revisions[router_id] = router['revision']
+        self._router_timestamps[router_id] = update.timestamp
+
+    def _process_router_updates_loop(self):
+        while True:
+            self._process_router_update()
 
     def _router_ids(self):
         if not self.conf.use_namespaces:
             return [self.conf.router_id]
 
     @periodic_task.periodic_task
-    @lockutils.synchronized('l3-agent', 'neutron-')
     def _sync_routers_task(self, context):
         if self.services_sync:
             super(L3NATAgent, self).process_services_sync(context)
         if not self.fullsync:
             return
+        # Taken before the routers are fetched, so that the updates notified
+        # while they are fetched are not skipped as outdated
+        self._sync_timestamp = timeutils.utcnow()
         try:
             router_ids = self._router_ids()
-            self.updated_routers.clear()
-            self.removed_routers.clear()
             routers = self.plugin_rpc.get_routers(
-                context, router_ids)
+                context, router_ids,
+                router_revisions=dict(self._router_revisions))
 
             LOG.debug(_('Processing :%r'), routers)
-            self._process_routers(routers, all_routers=True)
             self.fullsync = False
+            self._process_routers(routers, all_routers=True,
+                                  timestamp=self._sync_timestamp)
         except Exception:
             LOG.exception(_("Failed synchronizing routers"))
             self.fullsync = True
+        finally:
+            self._sync_timestamp = None
+            # Forget the routers removed during the resync, its updates
+            # are all processed
+            for router_id in set(self._router_timestamps) - set(
+                    self.router_info):
+                del self._router_timestamps[router_id]
 
     def after_start(self):
+        for i in range(self.conf.router_update_workers):
+            eventlet.spawn_n(self._process_router_updates_loop)
         LOG.info(_("L3 agent started"))
 
     def _update_routing_table(self, ri, operation, route):
@@ -836,6 +1039,7 @@ def main(manager='neutron.agent.l3_agent.L3NATAgentWithStateReport'):
     config.register_agent_state_opts_helper(conf)
     config.register_root_helper(conf)
     conf.register_opts(interface.OPTS)
+    conf.register_opts(ip_lib.OPTS)
     conf.register_opts(external_process.OPTS)
     conf(project='neutron')
     config.setup_logging(conf)
@@ -386,9 +386,14 @@ class Dnsmasq(DhcpLocalProcess):
                         'turned off DHCP: %s'), self.network.id)
             return
 
+        self.config_changed = False
         self._output_hosts_file()
         self._output_opts_file()
         if self.active:
+            if not self.config_changed:
+                LOG.debug(_('Allocations of network %s did not change'),
+                          self.network.id)
+                return
             cmd = ['kill', '-HUP', self.pid]
             utils.execute(cmd, self.root_helper)
         else:
@@ -418,7 +423,7 @@ class Dnsmasq(DhcpLocalProcess):
                               (port.mac_address, name, alloc.ip_address))
 
         name = self.get_conf_file_name('host')
-        utils.replace_file(name, buf.getvalue())
+        self._replace_config_file(name, buf.getvalue())
         return name
 
     def _output_opts_file(self):
@@ -477,9 +482,20 @@ class Dnsmasq(DhcpLocalProcess):
                     for opt in port.extra_dhcp_opts)
 
         name = self.get_conf_file_name('opts')
-        utils.replace_file(name, '\n'.join(options))
+        self._replace_config_file(name, '\n'.join(options))
         return name
 
+    def _replace_config_file(self, name, data):
+        """Replace a configuration file, unless it is up to date."""
+        try:
+            with open(name) as f:
+                if f.read() == data:
+                    return
+        except IOError:
+            pass
+        utils.replace_file(name, data)
+        self.config_changed = True
+
     def _make_subnet_interface_ip_map(self):
         ip_dev = ip_lib.IPDevice(
             self.interface_name,
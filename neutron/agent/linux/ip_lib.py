@@ -14,9 +14,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import socket
+
 import netaddr
 from oslo.config import cfg
 
+from neutron.agent.linux import netlink
 from neutron.agent.linux import utils
 from neutron.common import exceptions
 
@@ -25,10 +28,17 @@ OPTS = [
     cfg.BoolOpt('ip_lib_force_root',
                 default=False,
                 help=_('Force ip_lib calls to use the root helper')),
+    cfg.BoolOpt('ip_lib_use_netlink',
+                default=False,
+                help=_('Query the devices, addresses and routes over '
+                       'netlink instead of running the ip command. The '
+                       'queries of namespaces still run the ip command if '
+                       'the agent does not run as root.')),
 ]
 
 
 LOOPBACK_DEVNAME = 'lo'
+MAIN_TABLE = 254
 
 
 class SubProcessBase(object):
@@ -41,6 +51,16 @@ class SubProcessBase(object):
             # Only callers that need to force use of the root helper
             # need to register the option.
             self.force_root = False
+        try:
+            self.use_netlink = cfg.CONF.ip_lib_use_netlink
+        except cfg.NoSuchOptError:
+            self.use_netlink = False
+
+    def _use_netlink(self):
+        """Whether the read-only queries can be made over netlink."""
+        if not self.use_netlink or self.force_root:
+            return False
+        return not self.namespace or netlink.can_enter_namespaces()
 
     def _run(self, options, command, args):
         if self.namespace:
@@ -86,6 +106,11 @@ class IPWrapper(SubProcessBase):
         return IPDevice(name, self.root_helper, self.namespace)
 
     def get_devices(self, exclude_loopback=False):
+        if self._use_netlink():
+            return [IPDevice(link['name'], self.root_helper, self.namespace)
+                    for link in netlink.get_links(self.namespace)
+                    if not (exclude_loopback and
+                            link['name'] == LOOPBACK_DEVNAME)]
         retval = []
         output = self._execute('o', 'link', ('list',),
                                self.root_helper, self.namespace)
@@ -267,8 +292,21 @@ class IpLinkCommand(IpDeviceCommandBase):
 
     @property
     def attributes(self):
+        if self._parent._use_netlink():
+            return self._get_netlink_attributes()
         return self._parse_line(self._run('show', self.name, options='o'))
 
+    def _get_netlink_attributes(self):
+        link = netlink.get_link(self.name, self._parent.namespace)
+        if link is None:
+            raise RuntimeError(_('Device "%s" does not exist.') % self.name)
+        retval = dict((key, link[key])
+                      for key in ('mtu', 'qdisc', 'state', 'qlen', 'alias')
+                      if key in link)
+        if link['type'] == netlink.ARPHRD_ETHER and 'address' in link:
+            retval['link/ether'] = link['address']
+        return retval
+
     def _parse_line(self, value):
         if not value:
             return {}
@@ -307,6 +345,8 @@ class IpAddrCommand(IpDeviceCommandBase):
         self._as_root('flush', self.name)
 
     def list(self, scope=None, to=None, filters=None):
+        if not filters and self._parent._use_netlink():
+            return self._netlink_list(scope, to)
         if filters is None:
             filters = []
 
@@ -345,6 +385,37 @@ class IpAddrCommand(IpDeviceCommandBase):
                                dynamic=('dynamic' == parts[-1])))
         return retval
 
+    def _netlink_list(self, scope=None, to=None):
+        namespace = self._parent.namespace
+        link = netlink.get_link(self.name, namespace)
+        if link is None:
+            raise RuntimeError(_('Device "%s" does not exist.') % self.name)
+        retval = []
+        for addr in netlink.get_addresses(link['index'], namespace):
+            if scope and addr['scope'] != scope:
+                continue
+            if addr['family'] == socket.AF_INET6:
+                version = 6
+                broadcast = '::'
+            else:
+                version = 4
+                broadcast = addr.get('broadcast')
+            cidr = '%s/%d' % (addr['address'], addr['prefixlen'])
+            if to:
+                to_net = netaddr.IPNetwork(to)
+                if (to_net.version != version or
+                        netaddr.IPAddress(addr['address']) not in to_net):
+                    continue
+            if broadcast is None:
+                broadcast = str(netaddr.IPNetwork(cidr).broadcast)
+            retval.append(dict(cidr=cidr,
+                               broadcast=broadcast,
+                               scope=addr['scope'],
+                               ip_version=version,
+                               dynamic=not (addr['flags'] &
+                                            netlink.IFA_F_PERMANENT)))
+        return retval
+
 
 class IpRouteCommand(IpDeviceCommandBase):
     COMMAND = 'route'
@@ -365,6 +436,8 @@ class IpRouteCommand(IpDeviceCommandBase):
                       self.name)
 
     def get_gateway(self, scope=None, filters=None):
+        if not filters and self._parent._use_netlink():
+            return self._netlink_get_gateway(scope)
         if filters is None:
             filters = []
 
@@ -389,6 +462,23 @@ class IpRouteCommand(IpDeviceCommandBase):
 
         return retval
 
+    def _netlink_get_gateway(self, scope=None):
+        namespace = self._parent.namespace
+        link = netlink.get_link(self.name, namespace)
+        if link is None:
+            raise RuntimeError(_('Device "%s" does not exist.') % self.name)
+        for route in netlink.get_routes(socket.AF_INET, namespace):
+            if (route['table'] != MAIN_TABLE or route['dst_len'] or
+                    route.get('oif') != link['index'] or
+                    (scope and route['scope'] != scope)):
+                continue
+            if 'gateway' not in route:
+                return
+            retval = dict(gateway=route['gateway'])
+            if 'priority' in route:
+                retval.update(metric=route['priority'])
+            return retval
+
     def pullup_route(self, interface_name):
         """Ensures that the route entry for the interface is before all
         others on the same subnet.
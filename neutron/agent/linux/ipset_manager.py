@@ -0,0 +1,93 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Implements ipsets of addresses using the ipset utility."""
+
+from neutron.agent.linux import utils as linux_utils
+from neutron.common import constants
+from neutron.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# The ipset names are limited to 31 characters
+MAX_NAME_LENGTH = 31
+IPSET_FAMILY = {constants.IPv4: 'inet',
+                constants.IPv6: 'inet6'}
+
+
+def get_name(security_group_id, ethertype):
+    """Return the name of the ipset of a security group members."""
+    return ('%s%s' % (ethertype, security_group_id))[:MAX_NAME_LENGTH]
+
+
+class IpsetManager(object):
+    """Wrapper for ipset.
+
+    Keeps the members of the sets it manages, so that their updates only
+    add and delete the members which changed, in one ipset restore.
+    """
+
+    def __init__(self, execute=None, root_helper=None, namespace=None):
+        if execute:
+            self.execute = execute
+        else:
+            self.execute = linux_utils.execute
+        self.root_helper = root_helper
+        self.namespace = namespace
+        # The members of each set, by set name
+        self.ipsets = {}
+
+    def set_members(self, name, ethertype, members):
+        """Create the set if needed, and set its members.
+
+        :param members: the addresses or CIDRs of the members.
+        """
+        members = set(members)
+        lines = []
+        old_members = self.ipsets.get(name)
+        if old_members is None:
+            # The set could remain from a previous run of the agent
+            lines.append('create %s hash:net family %s' %
+                         (name, IPSET_FAMILY[ethertype]))
+            lines.append('flush %s' % name)
+            old_members = set()
+        lines += ['add %s %s' % (name, member)
+                  for member in sorted(members - old_members)]
+        lines += ['del %s %s' % (name, member)
+                  for member in sorted(old_members - members)]
+        if lines:
+            self._restore(lines)
+        self.ipsets[name] = members
+
+    def destroy(self, name):
+        """Destroy a set, which must not be used by iptables rules."""
+        if self.ipsets.pop(name, None) is None:
+            return
+        self._execute(['ipset', 'destroy', name])
+
+    def _restore(self, lines):
+        LOG.debug(_('Restoring ipset lines: %s'), lines)
+        self._execute(['ipset', 'restore', '-exist'],
+                      process_input='\n'.join(lines) + '\n')
+
+    def _execute(self, args, process_input=None):
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        if process_input is None:
+            return self.execute(args, root_helper=self.root_helper)
+        return self.execute(args, process_input=process_input,
+                            root_helper=self.root_helper)
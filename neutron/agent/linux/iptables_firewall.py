@@ -19,6 +19,7 @@ import netaddr
 from oslo.config import cfg
 
 from neutron.agent import firewall
+from neutron.agent.linux import ipset_manager
 from neutron.agent.linux import iptables_manager
 from neutron.common import constants
 from neutron.openstack.common import log as logging
@@ -33,6 +34,15 @@ CHAIN_NAME_PREFIX = {INGRESS_DIRECTION: 'i',
                      EGRESS_DIRECTION: 'o',
                      SPOOF_FILTER: 's'}
 LINUX_DEV_LEN = 14
+IPSET_DIRECTION = {INGRESS_DIRECTION: 'src',
+                   EGRESS_DIRECTION: 'dst'}
+
+
+def _split_by_ethertype(ips):
+    ips_by_ethertype = {constants.IPv4: set(), constants.IPv6: set()}
+    for ip in ips:
+        ips_by_ethertype['IPv%s' % netaddr.IPNetwork(ip).version].add(ip)
+    return ips_by_ethertype
 
 
 class IptablesFirewallDriver(firewall.FirewallDriver):
@@ -44,8 +54,16 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self.iptables = iptables_manager.IptablesManager(
             root_helper=cfg.CONF.AGENT.root_helper,
             use_ipv6=True)
+        self.ipset = None
+        if cfg.CONF.SECURITYGROUP.enable_ipset:
+            self.ipset = ipset_manager.IpsetManager(
+                root_helper=cfg.CONF.AGENT.root_helper)
         # list of port which has security group
         self.filtered_ports = {}
+        # the member ips of the remote security groups, by ethertype
+        self.sg_members = {}
+        # the names of the ipsets used by the rules being set up
+        self._ipsets_in_use = set()
         self._add_fallback_chain_v4v6()
         self._defer_apply = False
         self._pre_defer_filtered_ports = None
@@ -54,13 +72,69 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
     def ports(self):
         return self.filtered_ports
 
+    @property
+    def supports_remote_group_members(self):
+        return self.ipset is not None
+
+    def update_security_group_members(self, sg_members):
+        """Update the member ips of remote security groups.
+
+        The ipsets of the groups are updated at once, the rules using them
+        do not change.
+
+        :param sg_members: the ips of the members of each group, by
+                           ethertype.
+        """
+        self.sg_members.update(sg_members)
+        for sg_id, ips_by_ethertype in sg_members.iteritems():
+            for ethertype, ips in ips_by_ethertype.iteritems():
+                name = ipset_manager.get_name(sg_id, ethertype)
+                if name in self.ipset.ipsets:
+                    self.ipset.set_members(name, ethertype, ips)
+
+    def update_security_group_member_ips(self, sg_member_ips):
+        """Add and remove member ips of remote security groups.
+
+        Only the groups used by the rules are kept, the updates of the
+        other groups are ignored.
+
+        :param sg_member_ips: the ips added to each group as 'added', and
+                              the ips removed as 'removed', by group id.
+        """
+        for sg_id, ips in sg_member_ips.iteritems():
+            members = self.sg_members.get(sg_id)
+            if members is None:
+                continue
+            added = _split_by_ethertype(ips.get('added', []))
+            removed = _split_by_ethertype(ips.get('removed', []))
+            for ethertype in (constants.IPv4, constants.IPv6):
+                old_ips = set(members.get(ethertype, []))
+                new_ips = ((old_ips - removed[ethertype]) |
+                           added[ethertype])
+                if new_ips == old_ips:
+                    continue
+                members[ethertype] = sorted(new_ips)
+                name = ipset_manager.get_name(sg_id, ethertype)
+                if name in self.ipset.ipsets:
+                    self.ipset.set_members(name, ethertype, new_ips)
+
+    def _apply(self):
+        self.iptables.apply()
+        self._remove_unused_ipsets()
+
+    def _remove_unused_ipsets(self):
+        # The ipsets can only be destroyed once no rule references them
+        if self.ipset and not self._defer_apply:
+            for name in set(self.ipset.ipsets) - self._ipsets_in_use:
+                self.ipset.destroy(name)
+
     def prepare_port_filter(self, port):
         LOG.debug(_("Preparing device (%s) filter"), port['device'])
         self._remove_chains()
         self.filtered_ports[port['device']] = port
         # each security group has it own chains
         self._setup_chains()
-        self.iptables.apply()
+        self._apply()
 
     def update_port_filter(self, port):
         LOG.debug(_("Updating device (%s) filter"), port['device'])
@@ -71,7 +145,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self._remove_chains()
         self.filtered_ports[port['device']] = port
         self._setup_chains()
-        self.iptables.apply()
+        self._apply()
 
     def remove_port_filter(self, port):
         LOG.debug(_("Removing device (%s) filter"), port['device'])
@@ -82,7 +156,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self._remove_chains()
         self.filtered_ports.pop(port['device'], None)
         self._setup_chains()
-        self.iptables.apply()
+        self._apply()
 
     def _setup_chains(self):
         """Setup ingress and egress chain for a port."""
@@ -90,6 +164,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             self._setup_chains_apply(self.filtered_ports)
 
     def _setup_chains_apply(self, ports):
+        self._ipsets_in_use = set()
         self._add_chain_by_name_v4v6(SG_CHAIN)
         for port in ports.values():
             self._setup_chain(port, INGRESS_DIRECTION)
@@ -289,6 +364,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                                    rule.get('protocol'),
                                    rule.get('port_range_min'),
                                    rule.get('port_range_max'))
+            args += self._remote_group_arg(rule)
             args += ['-j RETURN']
             iptables_rules += [' '.join(args)]
 
@@ -334,6 +410,22 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             return ['-%s' % direction, ip_prefix]
         return []
 
+    def _remote_group_arg(self, rule):
+        # Without ipsets, or with an old server, the remote group rules are
+        # converted to ip prefix rules in server side
+        remote_group_id = rule.get('remote_group_id')
+        if (not self.ipset or not remote_group_id or
+                rule.get('source_ip_prefix') or rule.get('dest_ip_prefix')):
+            return []
+        ethertype = rule['ethertype']
+        name = ipset_manager.get_name(remote_group_id, ethertype)
+        if name not in self.ipset.ipsets:
+            ips = self.sg_members.get(remote_group_id, {}).get(ethertype, [])
+            self.ipset.set_members(name, ethertype, ips)
+        self._ipsets_in_use.add(name)
+        return ['-m set --match-set %s %s' % (
+            name, IPSET_DIRECTION[rule['direction']])]
+
     def _port_chain_name(self, port, direction):
         return iptables_manager.get_chain_name(
             '%s%s' % (CHAIN_NAME_PREFIX[direction], port['device'][3:]))
@@ -351,6 +443,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             self._pre_defer_filtered_ports = None
             self._setup_chains_apply(self.filtered_ports)
             self.iptables.defer_apply_off()
+            self._remove_unused_ipsets()
 
 
 class OVSHybridIptablesFirewallDriver(IptablesFirewallDriver):
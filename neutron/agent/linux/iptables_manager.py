@@ -54,6 +54,30 @@ def get_chain_name(chain_name, wrap=True):
         return chain_name[:MAX_CHAIN_LEN_NOWRAP]
 
 
+def _strip_packets_bytes(line):
+    # strip any [packet:byte] counts at start or end of lines
+    if line.startswith(':'):
+        # it's a chain, for example, ":neutron-billing - [0:0]"
+        line = line.split(':')[1]
+        line = line.split(' - [', 1)[0]
+    elif line.startswith('['):
+        # it's a rule, for example, "[0:0] -A neutron-billing..."
+        line = line.split('] ', 1)[1]
+    line = line.strip()
+    return line
+
+
+def _unique(items):
+    """Return the items without duplicates, in their first occurrence order."""
+    seen = set()
+    result = []
+    for item in items:
+        if item not in seen:
+            seen.add(item)
+            result.append(item)
+    return result
+
+
 class IptablesRule(object):
     """An iptables rule.
 
@@ -97,6 +121,8 @@ class IptablesTable(object):
         self.unwrapped_chains = set()
         self.remove_chains = set()
         self.wrap_name = binary_name[:16]
+        # The (name, wrap) of the chains changed since the last apply
+        self.dirty_chains = set()
 
     def add_chain(self, name, wrap=True):
         """Adds a named chain to the table.
@@ -115,6 +141,7 @@ class IptablesTable(object):
             self.chains.add(name)
         else:
             self.unwrapped_chains.add(name)
+        self.dirty_chains.add((name, wrap))
 
     def _select_chain_set(self, wrap):
         if wrap:
@@ -153,6 +180,7 @@ class IptablesTable(object):
             return
 
         chain_set.remove(name)
+        self.dirty_chains.add((name, wrap))
 
         if not wrap:
             # non-wrapped chains and rules need to be dealt with specially,
@@ -174,6 +202,8 @@ class IptablesTable(object):
             jump_snippet = '-j %s-%s' % (self.wrap_name, name)
 
         # finally, remove rules from list that have a matching jump chain
+        self.dirty_chains.update((r.chain, r.wrap) for r in self.rules
+                                 if jump_snippet in r.rule)
         self.rules = [r for r in self.rules
                       if jump_snippet not in r.rule]
 
@@ -196,6 +226,7 @@ class IptablesTable(object):
             rule = ' '.join(map(self._wrap_target_chain, rule.split(' ')))
 
         self.rules.append(IptablesRule(chain, rule, wrap, top, self.wrap_name))
+        self.dirty_chains.add((chain, wrap))
 
     def _wrap_target_chain(self, s):
         if s.startswith('$'):
@@ -214,6 +245,7 @@ class IptablesTable(object):
         try:
             self.rules.remove(IptablesRule(chain, rule, wrap, top,
                                            self.wrap_name))
+            self.dirty_chains.add((chain, wrap))
             if not wrap:
                 self.remove_rules.append(IptablesRule(chain, rule, wrap, top,
                                                       self.wrap_name))
@@ -230,6 +262,23 @@ class IptablesTable(object):
                          if rule.chain == chain and rule.wrap == wrap]
         for rule in chained_rules:
             self.rules.remove(rule)
+        if chained_rules:
+            self.dirty_chains.add((chain, wrap))
+
+    def get_wrapped_rules(self, names):
+        """Return the rules of wrapped chains, in their applied order.
+
+        :param names: the names of the wrapped chains.
+        :returns: a dict of the rule specifications of each chain, without
+                  the '-A <chain name>' bit.
+        """
+        top = dict((name, []) for name in names)
+        bottom = dict((name, []) for name in names)
+        for rule in self.rules:
+            if rule.wrap and rule.chain in top:
+                (top if rule.top else bottom)[rule.chain].append(rule.rule)
+        return dict((name, _unique(top[name] + bottom[name]))
+                    for name in names)
 
 
 class IptablesManager(object):
@@ -253,8 +302,16 @@ class IptablesManager(object):
     wrapped in the same was as the built-in filter chains. Additionally,
     there's a snat chain that is applied after the POSTROUTING chain.
 
+    The first apply replaces the whole state of the tables. The next ones
+    only restore the rules added to or removed from the wrapped chains, which
+    belong to this manager, as long as no unwrapped chain changed. Every
+    full_apply_interval applies, the whole state is read and replaced again,
+    which repairs the rules changed behind the back of the manager.
+
     """
 
+    full_apply_interval = 100
+
     def __init__(self, _execute=None, state_less=False,
                  root_helper=None, use_ipv6=False, namespace=None,
                  binary_name=binary_name):
@@ -268,6 +325,11 @@ class IptablesManager(object):
         self.namespace = namespace
         self.iptables_apply_deferred = False
         self.wrap_name = binary_name[:16]
+        # The rules of the wrapped chains, per table, as last applied by
+        # each command. None when they must be read with <command>-save.
+        self._applied = {'iptables': None, 'ip6tables': None}
+        # The number of incremental applies since the last full one
+        self._incremental_applies = {'iptables': 0, 'ip6tables': 0}
 
         self.ipv4 = {'filter': IptablesTable(binary_name=self.wrap_name)}
         self.ipv6 = {'filter': IptablesTable(binary_name=self.wrap_name)}
@@ -356,23 +418,127 @@ class IptablesManager(object):
             s += [('ip6tables', self.ipv6)]
 
         for cmd, tables in s:
-            args = ['%s-save' % (cmd,), '-c']
-            if self.namespace:
-                args = ['ip', 'netns', 'exec', self.namespace] + args
-            all_tables = self.execute(args, root_helper=self.root_helper)
-            all_lines = all_tables.split('\n')
-            for table_name, table in tables.iteritems():
-                start, end = self._find_table(all_lines, table_name)
-                all_lines[start:end] = self._modify_rules(
-                    all_lines[start:end], table, table_name)
-
-            args = ['%s-restore' % (cmd,), '-c']
-            if self.namespace:
-                args = ['ip', 'netns', 'exec', self.namespace] + args
-            self.execute(args, process_input='\n'.join(all_lines),
-                         root_helper=self.root_helper)
+            if not self._apply_incremental(cmd, tables):
+                self._apply_full(cmd, tables)
         LOG.debug(_("IPTablesManager.apply completed with success"))
 
+    def _execute_in_namespace(self, args, process_input=None):
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        if process_input is None:
+            return self.execute(args, root_helper=self.root_helper)
+        return self.execute(args, process_input=process_input,
+                            root_helper=self.root_helper)
+
+    def _apply_full(self, cmd, tables):
+        # The state is unknown until restored, in case of failure
+        self._applied[cmd] = None
+        all_tables = self._execute_in_namespace(['%s-save' % (cmd,), '-c'])
+        all_lines = all_tables.split('\n')
+        for table_name, table in tables.iteritems():
+            start, end = self._find_table(all_lines, table_name)
+            all_lines[start:end] = self._modify_rules(
+                all_lines[start:end], table, table_name)
+
+        self._execute_in_namespace(['%s-restore' % (cmd,), '-c'],
+                                   process_input='\n'.join(all_lines))
+        self._applied[cmd] = dict(
+            (table_name, table.get_wrapped_rules(table.chains))
+            for table_name, table in tables.iteritems())
+        self._incremental_applies[cmd] = 0
+        for table in tables.itervalues():
+            table.dirty_chains.clear()
+
+    def _apply_incremental(self, cmd, tables):
+        """Restore the changes of the wrapped chains without flushing.
+
+        Nothing is read from iptables, the changes are computed against the
+        rules last applied.
+
+        :returns: False if the whole state of the tables must be applied
+                  instead, that is on the first apply, every
+                  full_apply_interval applies, when unwrapped chains
+                  changed, or when the changes could not be restored.
+        """
+        applied = self._applied[cmd]
+        if (applied is None or self._incremental_applies[cmd] >=
+                self.full_apply_interval):
+            return False
+        for table in tables.itervalues():
+            if any(not wrap for name, wrap in table.dirty_chains):
+                return False
+
+        lines = []
+        changed = {}
+        for table_name, table in tables.iteritems():
+            names = set(name for name, wrap in table.dirty_chains)
+            table_lines, changed[table_name] = self._get_chain_changes(
+                applied[table_name], table, names)
+            if table_lines:
+                lines += ['*%s' % table_name] + table_lines + ['COMMIT']
+
+        if lines:
+            try:
+                self._execute_in_namespace(
+                    ['%s-restore' % (cmd,), '--noflush'],
+                    process_input='\n'.join(lines) + '\n')
+            except RuntimeError:
+                LOG.warn(_('Unable to apply the changes of the %s rules, '
+                           'applying all of them'), cmd)
+                return False
+
+        for table_name, table in tables.iteritems():
+            for name, rules in changed[table_name].iteritems():
+                if rules is None:
+                    applied[table_name].pop(name, None)
+                else:
+                    applied[table_name][name] = rules
+            table.dirty_chains.clear()
+        self._incremental_applies[cmd] += 1
+        return True
+
+    def _get_chain_changes(self, applied, table, names):
+        """Return the restore lines turning the applied chains into names.
+
+        Rules are deleted and inserted at their position, so the counters
+        of the unchanged rules are kept. Chains whose remaining rules were
+        reordered are flushed and filled again.
+        """
+        current = table.get_wrapped_rules(
+            [name for name in names if name in table.chains])
+        new_chains, changes, removed_chains = [], [], []
+        changed = {}
+        for name in sorted(names):
+            chain = '%s-%s' % (self.wrap_name, name)
+            if name not in current:
+                if name in applied:
+                    removed_chains += ['-F %s' % chain, '-X %s' % chain]
+                    changed[name] = None
+                continue
+
+            rules = current[name]
+            old_rules = applied.get(name)
+            if old_rules is None:
+                new_chains.append(':%s - [0:0]' % chain)
+                old_rules = []
+            if rules == old_rules:
+                continue
+            changed[name] = rules
+
+            new_set = set(rules)
+            old_set = set(old_rules)
+            kept = [rule for rule in old_rules if rule in new_set]
+            if kept != [rule for rule in rules if rule in old_set]:
+                changes.append('-F %s' % chain)
+                old_set = set()
+            else:
+                changes += ['-D %s %s' % (chain, rule)
+                            for rule in old_rules if rule not in new_set]
+            changes += ['-I %s %d %s' % (chain, index, rule)
+                        for index, rule in enumerate(rules, 1)
+                        if rule not in old_set]
+        return new_chains + changes + removed_chains, changed
+
     def _find_table(self, lines, table_name):
         if len(lines) < 3:
             # length only <2 when fake iptables
@@ -428,28 +594,31 @@ class IptablesManager(object):
         all_chains = [':%s' % name for name in unwrapped_chains]
         all_chains += [':%s-%s' % (self.wrap_name, name) for name in chains]
 
+        # Index the current lines by their text without [packet:byte]
+        # counts. The last occurrence wins, since it could have a non-zero
+        # count we want to preserve.
+        old_lines = dict((_strip_packets_bytes(line), line)
+                         for line in old_filter)
+        new_lines = dict((_strip_packets_bytes(line), line)
+                         for line in new_filter
+                         if line.startswith((':', '[')))
+
         # Iterate through all the chains, trying to find an existing
         # match.
+        our_keys = set()
         our_chains = []
         for chain in all_chains:
-            chain_str = str(chain).strip()
-
-            orig_filter = [s for s in old_filter if chain_str in s.strip()]
-            dup_filter = [s for s in new_filter if chain_str in s.strip()]
-            new_filter = [s for s in new_filter if chain_str not in s.strip()]
+            key = _strip_packets_bytes(chain)
+            our_keys.add(key)
 
             # if no old or duplicates, use original chain
-            if orig_filter:
-                # grab the last entry, if there is one
-                old = orig_filter[-1]
-                chain_str = str(old).strip()
-            elif dup_filter:
-                # grab the last entry, if there is one
-                dup = dup_filter[-1]
-                chain_str = str(dup).strip()
+            if key in old_lines:
+                chain_str = old_lines[key]
+            elif key in new_lines:
+                chain_str = new_lines[key]
             else:
                 # add-on the [packet:bytes]
-                chain_str += ' - [0:0]'
+                chain_str = chain + ' - [0:0]'
 
             our_chains += [chain_str]
 
@@ -458,28 +627,20 @@ class IptablesManager(object):
         our_rules = []
         bot_rules = []
         for rule in rules:
-            rule_str = str(rule).strip()
-            # Further down, we weed out duplicates from the bottom of the
-            # list, so here we remove the dupes ahead of time.
-
-            orig_filter = [s for s in old_filter if rule_str in s.strip()]
-            dup_filter = [s for s in new_filter if rule_str in s.strip()]
-            new_filter = [s for s in new_filter if rule_str not in s.strip()]
+            key = str(rule).strip()
 
             # if no old or duplicates, use original rule
-            if orig_filter:
-                # grab the last entry, if there is one
-                old = orig_filter[-1]
-                rule_str = str(old).strip()
-            elif dup_filter:
-                # grab the last entry, if there is one
-                dup = dup_filter[-1]
-                rule_str = str(dup).strip()
-                # backup one index so we write the array correctly
-                rules_index -= 1
+            if key in old_lines:
+                rule_str = old_lines[key]
+            elif key in new_lines:
+                rule_str = new_lines[key]
+                if key not in our_keys:
+                    # backup one index so we write the array correctly
+                    rules_index -= 1
             else:
                 # add-on the [packet:bytes]
-                rule_str = '[0:0] ' + rule_str
+                rule_str = '[0:0] ' + key
+            our_keys.add(key)
 
             if rule.top:
                 # rule.top == True means we want this rule to be at the top.
@@ -489,65 +650,34 @@ class IptablesManager(object):
 
         our_rules += bot_rules
 
+        # Our chains and rules replace their duplicates
+        new_filter = [line for line in new_filter
+                      if not (line.startswith((':', '[')) and
+                              _strip_packets_bytes(line) in our_keys)]
+
         new_filter[rules_index:rules_index] = our_rules
         new_filter[rules_index:rules_index] = our_chains
 
-        def _strip_packets_bytes(line):
-            # strip any [packet:byte] counts at start or end of lines
-            if line.startswith(':'):
-                # it's a chain, for example, ":neutron-billing - [0:0]"
-                line = line.split(':')[1]
-                line = line.split(' - [', 1)[0]
-            elif line.startswith('['):
-                # it's a rule, for example, "[0:0] -A neutron-billing..."
-                line = line.split('] ', 1)[1]
-            line = line.strip()
-            return line
-
-        seen_chains = set()
-
-        def _weed_out_duplicate_chains(line):
-            # ignore [packet:byte] counts at end of lines
-            if line.startswith(':'):
-                line = _strip_packets_bytes(line)
-                if line in seen_chains:
-                    return False
-                else:
-                    seen_chains.add(line)
-
-            # Leave it alone
-            return True
-
-        seen_rules = set()
-
-        def _weed_out_duplicate_rules(line):
-            if line.startswith('['):
-                line = _strip_packets_bytes(line)
-                if line in seen_rules:
-                    return False
-                else:
-                    seen_rules.add(line)
-
-            # Leave it alone
-            return True
+        seen_lines = set()
+        remove_chains = set(remove_chains)
+        remove_rules = set(_strip_packets_bytes(str(rule))
+                           for rule in remove_rules)
 
-        def _weed_out_removes(line):
-            # We need to find exact matches here
-            if line.startswith(':'):
-                line = _strip_packets_bytes(line)
-                for chain in remove_chains:
-                    if chain == line:
-                        remove_chains.remove(chain)
-                        return False
-            elif line.startswith('['):
-                line = _strip_packets_bytes(line)
-                for rule in remove_rules:
-                    rule_str = _strip_packets_bytes(str(rule))
-                    if rule_str == line:
-                        remove_rules.remove(rule)
-                        return False
-
-            # Leave it alone
+        def _weed_out_duplicates_and_removes(line):
+            # ignore [packet:byte] counts at end of lines
+            if not line.startswith((':', '[')):
+                # Leave it alone
+                return True
+            line = _strip_packets_bytes(line)
+            if line in seen_lines:
+                return False
+            seen_lines.add(line)
+            # We need to find exact matches here, each of them is removed
+            # once
+            removes = remove_chains if line[0] != '-' else remove_rules
+            if line in removes:
+                removes.remove(line)
+                return False
             return True
 
         # We filter duplicates.  Go throught the chains and rules, letting
@@ -556,15 +686,12 @@ class IptablesManager(object):
         # out anything in the "remove" list.
         new_filter.reverse()
         new_filter = [line for line in new_filter
-                      if _weed_out_duplicate_chains(line) and
-                      _weed_out_duplicate_rules(line) and
-                      _weed_out_removes(line)]
+                      if _weed_out_duplicates_and_removes(line)]
         new_filter.reverse()
 
         # flush lists, just in case we didn't find something
-        remove_chains.clear()
-        for rule in remove_rules:
-            remove_rules.remove(rule)
+        table.remove_chains.clear()
+        del table.remove_rules[:]
 
         return new_filter
 
@@ -0,0 +1,280 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Queries of the links, addresses and routes of the kernel over rtnetlink.
+
+Unlike the ip command, these queries run no process. Querying a network
+namespace other than the one of the agent requires entering it, which is
+only allowed to root.
+"""
+
+import ctypes
+import ctypes.util
+import itertools
+import os
+import socket
+import struct
+
+NETLINK_ROUTE = 0
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+
+RTM_GETLINK = 18
+RTM_GETADDR = 22
+RTM_GETROUTE = 26
+
+IFLA_ADDRESS = 1
+IFLA_IFNAME = 3
+IFLA_MTU = 4
+IFLA_QDISC = 6
+IFLA_TXQLEN = 13
+IFLA_OPERSTATE = 16
+IFLA_IFALIAS = 20
+
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_BROADCAST = 4
+IFA_FLAGS = 8
+IFA_F_PERMANENT = 0x80
+
+RTA_DST = 1
+RTA_OIF = 4
+RTA_GATEWAY = 5
+RTA_PRIORITY = 6
+RTA_TABLE = 15
+
+ARPHRD_ETHER = 1
+CLONE_NEWNET = 0x40000000
+NETNS_RUN_DIR = '/var/run/netns'
+
+OPER_STATES = ('UNKNOWN', 'NOTPRESENT', 'DOWN', 'LOWERLAYERDOWN', 'TESTING',
+               'DORMANT', 'UP')
+SCOPES = {0: 'global', 200: 'site', 253: 'link', 254: 'host', 255: 'nowhere'}
+
+# struct nlmsghdr: length, type, flags, sequence number, port id
+_NLMSGHDR = struct.Struct('=IHHII')
+# struct rtattr: length, type
+_RTATTR = struct.Struct('=HH')
+# struct ifinfomsg: family, type, index, flags, change
+_IFINFOMSG = struct.Struct('=BxHiII')
+# struct ifaddrmsg: family, prefix length, flags, scope, index
+_IFADDRMSG = struct.Struct('=BBBBI')
+# struct rtmsg: family, dst_len, src_len, tos, table, protocol, scope, type,
+# flags
+_RTMSG = struct.Struct('=BBBBBBBBI')
+_U32 = struct.Struct('=I')
+_ERRNO = struct.Struct('=i')
+
+_RECV_SIZE = 65536
+_sequence = itertools.count(1)
+_libc = None
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+def _setns(fd):
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    if _libc.setns(fd, CLONE_NEWNET) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+
+def can_enter_namespaces():
+    return os.geteuid() == 0
+
+
+def _open_socket(namespace=None):
+    """Open a netlink socket in a network namespace.
+
+    A socket stays in the namespace in which it was created, so the
+    namespace is only entered while the socket is created.
+    """
+    if not namespace:
+        return socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                             NETLINK_ROUTE)
+    with open('/proc/self/ns/net') as own_namespace:
+        with open(os.path.join(NETNS_RUN_DIR, namespace)) as target:
+            _setns(target.fileno())
+        try:
+            return socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                                 NETLINK_ROUTE)
+        finally:
+            _setns(own_namespace.fileno())
+
+
+def _parse_attributes(data, offset):
+    attributes = {}
+    while offset + _RTATTR.size <= len(data):
+        length, attr_type = _RTATTR.unpack_from(data, offset)
+        if length < _RTATTR.size:
+            break
+        # Ignore the nested and byte order flags
+        attributes[attr_type & 0x3fff] = data[offset + _RTATTR.size:
+                                              offset + length]
+        offset += _align(length)
+    return attributes
+
+
+def _string(value):
+    return value.split('\0', 1)[0]
+
+
+def _u32(value):
+    return _U32.unpack_from(value)[0]
+
+
+def _dump(msg_type, payload, namespace=None):
+    """Send a dump request and return the (header, attributes) of replies.
+
+    :param payload: the packed message header of the request.
+    """
+    try:
+        sock = _open_socket(namespace)
+    except (IOError, OSError, socket.error) as e:
+        raise RuntimeError(_("Unable to open a netlink socket in namespace "
+                             "%(namespace)s: %(error)s") %
+                           {'namespace': namespace, 'error': e})
+    try:
+        sequence = next(_sequence)
+        sock.bind((0, 0))
+        sock.sendto(_NLMSGHDR.pack(_NLMSGHDR.size + len(payload), msg_type,
+                                   NLM_F_REQUEST | NLM_F_DUMP, sequence, 0) +
+                    payload, (0, 0))
+        replies = []
+        while True:
+            data = sock.recv(_RECV_SIZE)
+            offset = 0
+            while offset + _NLMSGHDR.size <= len(data):
+                length, reply_type, flags, reply_sequence, port = (
+                    _NLMSGHDR.unpack_from(data, offset))
+                body = data[offset + _NLMSGHDR.size:offset + length]
+                offset += _align(length)
+                if reply_sequence != sequence:
+                    continue
+                if reply_type == NLMSG_DONE:
+                    return replies
+                if reply_type == NLMSG_ERROR:
+                    errno = -_ERRNO.unpack_from(body)[0]
+                    if errno:
+                        raise RuntimeError(_("Netlink dump failed: %s") %
+                                           os.strerror(errno))
+                    return replies
+                replies.append(body)
+    except socket.error as e:
+        raise RuntimeError(_("Netlink dump failed: %s") % e)
+    finally:
+        sock.close()
+
+
+def get_links(namespace=None):
+    """Return the links of a namespace, ordered by index."""
+    links = []
+    for body in _dump(RTM_GETLINK, _IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0,
+                                                   0), namespace):
+        family, link_type, index, flags, change = _IFINFOMSG.unpack_from(
+            body)
+        attrs = _parse_attributes(body, _IFINFOMSG.size)
+        link = {'index': index,
+                'type': link_type,
+                'name': _string(attrs.get(IFLA_IFNAME, ''))}
+        if IFLA_ADDRESS in attrs:
+            link['address'] = ':'.join('%02x' % ord(c)
+                                       for c in attrs[IFLA_ADDRESS])
+        if IFLA_MTU in attrs:
+            link['mtu'] = _u32(attrs[IFLA_MTU])
+        if IFLA_QDISC in attrs:
+            link['qdisc'] = _string(attrs[IFLA_QDISC])
+        if IFLA_TXQLEN in attrs:
+            link['qlen'] = _u32(attrs[IFLA_TXQLEN])
+        if IFLA_OPERSTATE in attrs:
+            state = ord(attrs[IFLA_OPERSTATE][0])
+            if state < len(OPER_STATES):
+                link['state'] = OPER_STATES[state]
+        if IFLA_IFALIAS in attrs:
+            link['alias'] = _string(attrs[IFLA_IFALIAS])
+        links.append(link)
+    return links
+
+
+def get_link(name, namespace=None):
+    """Return a link of a namespace by name, None if it does not exist."""
+    for link in get_links(namespace):
+        if link['name'] == name:
+            return link
+
+
+def get_addresses(index=None, namespace=None):
+    """Return the addresses of a namespace, or of one of its links."""
+    addresses = []
+    for body in _dump(RTM_GETADDR, _IFADDRMSG.pack(socket.AF_UNSPEC, 0, 0, 0,
+                                                   0), namespace):
+        family, prefixlen, flags, scope, link_index = (
+            _IFADDRMSG.unpack_from(body))
+        if index is not None and link_index != index:
+            continue
+        attrs = _parse_attributes(body, _IFADDRMSG.size)
+        if IFA_FLAGS in attrs:
+            flags = _u32(attrs[IFA_FLAGS])
+        address = {'family': family,
+                   'prefixlen': prefixlen,
+                   'flags': flags,
+                   'scope': SCOPES.get(scope, str(scope)),
+                   'index': link_index}
+        # The local address is the address of the link, the address is the
+        # one of the peer on point to point links
+        local = attrs.get(IFA_LOCAL, attrs.get(IFA_ADDRESS))
+        if local is None:
+            continue
+        address['address'] = socket.inet_ntop(family, local)
+        if IFA_BROADCAST in attrs:
+            address['broadcast'] = socket.inet_ntop(family,
+                                                    attrs[IFA_BROADCAST])
+        addresses.append(address)
+    return addresses
+
+
+def get_routes(family=socket.AF_INET, namespace=None):
+    """Return the routes of a namespace."""
+    routes = []
+    for body in _dump(RTM_GETROUTE, _RTMSG.pack(family, 0, 0, 0, 0, 0, 0, 0,
+                                                0), namespace):
+        (route_family, dst_len, src_len, tos, table, protocol, scope,
+         route_type, flags) = _RTMSG.unpack_from(body)
+        if route_family != family:
+            continue
+        attrs = _parse_attributes(body, _RTMSG.size)
+        route = {'dst_len': dst_len,
+                 'table': _u32(attrs[RTA_TABLE]) if RTA_TABLE in attrs
+                 else table,
+                 'scope': SCOPES.get(scope, str(scope)),
+                 'type': route_type}
+        if RTA_DST in attrs:
+            route['dst'] = socket.inet_ntop(family, attrs[RTA_DST])
+        if RTA_OIF in attrs:
+            route['oif'] = _u32(attrs[RTA_OIF])
+        if RTA_GATEWAY in attrs:
+            route['gateway'] = socket.inet_ntop(family, attrs[RTA_GATEWAY])
+        if RTA_PRIORITY in attrs:
+            route['priority'] = _u32(attrs[RTA_PRIORITY])
+        routes.append(route)
+    return routes
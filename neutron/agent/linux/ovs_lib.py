@@ -50,7 +50,7 @@ class OVSBridge:
         self.root_helper = root_helper
         self.re_id = self.re_compile_id()
         self.defer_apply_flows = False
-        self.deferred_flows = {'add': '', 'mod': '', 'del': ''}
+        self.deferred_flows = []
 
     def re_compile_id(self):
         external = 'external_ids\s*'
@@ -165,14 +165,14 @@ class OVSBridge:
     def add_flow(self, **kwargs):
         flow_str = self.add_or_mod_flow_str(**kwargs)
         if self.defer_apply_flows:
-            self.deferred_flows['add'] += flow_str + '\n'
+            self._defer_flow('add', flow_str, kwargs.get('table', 0))
         else:
             self.run_ofctl("add-flow", [flow_str])
 
     def mod_flow(self, **kwargs):
         flow_str = self.add_or_mod_flow_str(**kwargs)
         if self.defer_apply_flows:
-            self.deferred_flows['mod'] += flow_str + '\n'
+            self._defer_flow('mod', flow_str, kwargs.get('table'))
         else:
             self.run_ofctl("mod-flows", [flow_str])
 
@@ -183,7 +183,7 @@ class OVSBridge:
             flow_expr_arr.append("actions=%s" % (kwargs["actions"]))
         flow_str = ",".join(flow_expr_arr)
         if self.defer_apply_flows:
-            self.deferred_flows['del'] += flow_str + '\n'
+            self._defer_flow('del', flow_str, kwargs.get('table'))
         else:
             self.run_ofctl("del-flows", [flow_str])
 
@@ -191,45 +191,71 @@ class OVSBridge:
         LOG.debug(_('defer_apply_on'))
         self.defer_apply_flows = True
 
+    def _defer_flow(self, action, flow_str, table):
+        """Add a flow change to the batches applied by defer_apply_off.
+
+        Each batch is applied by one ovs-ofctl call. A change joins the last
+        batch of the same action unless a later batch touches its table:
+        the changes of distinct tables commute, those of a same table are
+        applied in order.
+
+        :param table: the table changed, None if the change matches the
+               flows of all the tables.
+        """
+        table = None if table is None else str(table)
+        for batch in reversed(self.deferred_flows):
+            batch_action, flows, tables = batch
+            if batch_action == action:
+                flows.append(flow_str)
+                if tables is not None:
+                    if table is None:
+                        batch[2] = None
+                    else:
+                        tables.add(table)
+                return
+            if table is None or tables is None or table in tables:
+                break
+        self.deferred_flows.append(
+            [action, [flow_str], None if table is None else set([table])])
+
     def defer_apply_off(self):
         LOG.debug(_('defer_apply_off'))
-        for action, flows in self.deferred_flows.items():
-            if flows:
-                LOG.debug(_('Applying following deferred flows '
-                            'to bridge %s'), self.br_name)
-                for line in flows.splitlines():
-                    LOG.debug(_('%(action)s: %(flow)s'),
-                              {'action': action, 'flow': line})
-                self.run_ofctl('%s-flows' % action, ['-'], flows)
+        deferred_flows = self.deferred_flows
         self.defer_apply_flows = False
-        self.deferred_flows = {'add': '', 'mod': '', 'del': ''}
+        self.deferred_flows = []
+        if deferred_flows:
+            LOG.debug(_('Applying following deferred flows '
+                        'to bridge %s'), self.br_name)
+        for action, flows, tables in deferred_flows:
+            for line in flows:
+                LOG.debug(_('%(action)s: %(flow)s'),
+                          {'action': action, 'flow': line})
+            self.run_ofctl('%s-flows' % action, ['-'],
+                           ''.join(flow + '\n' for flow in flows))
 
     def add_tunnel_port(self, port_name, remote_ip, local_ip,
                         tunnel_type=constants.TYPE_GRE,
                         vxlan_udp_port=constants.VXLAN_UDP_PORT):
-        self.run_vsctl(["--", "--may-exist", "add-port", self.br_name,
-                       port_name])
-        self.set_db_attribute("Interface", port_name, "type", tunnel_type)
+        # The port is created and configured in a single transaction
+        attrs = [('type', tunnel_type)]
         if tunnel_type == constants.TYPE_VXLAN:
             # Only set the VXLAN UDP port if it's not the default
             if vxlan_udp_port != constants.VXLAN_UDP_PORT:
-                self.set_db_attribute("Interface", port_name,
-                                      "options:dst_port",
-                                      vxlan_udp_port)
-        self.set_db_attribute("Interface", port_name, "options:remote_ip",
-                              remote_ip)
-        self.set_db_attribute("Interface", port_name, "options:local_ip",
-                              local_ip)
-        self.set_db_attribute("Interface", port_name, "options:in_key", "flow")
-        self.set_db_attribute("Interface", port_name, "options:out_key",
-                              "flow")
+                attrs.append(('options:dst_port', vxlan_udp_port))
+        attrs.extend([('options:remote_ip', remote_ip),
+                      ('options:local_ip', local_ip),
+                      ('options:in_key', 'flow'),
+                      ('options:out_key', 'flow')])
+        args = ["--", "--may-exist", "add-port", self.br_name, port_name,
+                "--", "set", "Interface", port_name]
+        args.extend("%s=%s" % attr for attr in attrs)
+        self.run_vsctl(args)
         return self.get_port_ofport(port_name)
 
     def add_patch_port(self, local_name, remote_name):
-        self.run_vsctl(["add-port", self.br_name, local_name])
-        self.set_db_attribute("Interface", local_name, "type", "patch")
-        self.set_db_attribute("Interface", local_name, "options:peer",
-                              remote_name)
+        self.run_vsctl(["add-port", self.br_name, local_name,
+                        "--", "set", "Interface", local_name, "type=patch",
+                        "options:peer=%s" % remote_name])
         return self.get_port_ofport(local_name)
 
     def db_get_map(self, table, record, column):
@@ -335,6 +361,30 @@ class OVSBridge:
             LOG.info(_("Unable to parse regex results. Exception: %s"), e)
             return
 
+    def get_vif_ports_by_ids(self, port_ids):
+        """Return the VifPorts of several port ids with one ovs-vsctl call.
+
+        :returns: a dict mapping the port ids found to their VifPort.
+        """
+        port_ids = set(port_ids)
+        vif_ports = {}
+        args = ['--format=json', '--', '--columns=name,external_ids,ofport',
+                'list', 'Interface']
+        result = self.run_vsctl(args)
+        if not result:
+            return vif_ports
+        for name, external_ids, ofport in jsonutils.loads(result)['data']:
+            external_ids = dict(external_ids[1])
+            vif_id = external_ids.get('iface-id')
+            if vif_id not in port_ids or 'attached-mac' not in external_ids:
+                continue
+            # ofport is an empty set until the interface is attached
+            if not isinstance(ofport, int):
+                continue
+            vif_ports[vif_id] = VifPort(name, ofport, vif_id,
+                                        external_ids['attached-mac'], self)
+        return vif_ports
+
     def delete_ports(self, all_ports=False):
         if all_ports:
             port_names = self.get_port_name_list()
@@ -0,0 +1,348 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Long lived root wrapper, running the commands of an agent as root.
+
+Starting neutron-rootwrap costs a sudo and a Python interpreter start per
+command. The daemon is started once by the agent, through sudo, with the
+rootwrap configuration file as argument:
+
+   neutron-rootwrap-daemon /etc/neutron/rootwrap.conf
+
+The agent user must be allowed to run it as root in sudoers:
+   neutron ALL = (root) NOPASSWD: /usr/bin/neutron-rootwrap-daemon
+                                   /etc/neutron/rootwrap.conf
+
+It listens on a UNIX socket created in a private directory, and writes the
+path of the socket and a random key on its standard output. Clients must
+send the key before any command. Commands are checked against the filters
+of the configuration, as neutron-rootwrap does. The daemon exits when its
+standard input is closed, that is when the agent which started it exits.
+
+Messages are lists of byte strings, each prefixed by its length. A request
+is [stdin flag, stdin, arg0, arg1...], the response is [exit code, stdout,
+stderr].
+"""
+
+import ConfigParser
+import logging
+import os
+import shlex
+import shutil
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+
+from eventlet import semaphore
+from eventlet.green import socket as green_socket
+from eventlet.green import subprocess as green_subprocess
+
+from neutron.openstack.common.rootwrap import cmd as rootwrap_cmd
+from neutron.openstack.common.rootwrap import wrapper
+
+
+_HEADER = struct.Struct('!I')
+# Bounds the number of arguments of a command
+MAX_FRAMES = 4096
+AUTH_OK = 'ok'
+
+LOG = logging.getLogger(__name__)
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 65536))
+        if not chunk:
+            raise EOFError()
+        chunks.append(chunk)
+        size -= len(chunk)
+    return ''.join(chunks)
+
+
+def send_frames(sock, frames):
+    data = [_HEADER.pack(len(frames))]
+    for frame in frames:
+        data.append(_HEADER.pack(len(frame)))
+        data.append(frame)
+    sock.sendall(''.join(data))
+
+
+def recv_frames(sock, max_frames=MAX_FRAMES, max_size=None):
+    count = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))[0]
+    if count > max_frames:
+        raise ValueError('Too many frames: %d' % count)
+    frames = []
+    for i in range(count):
+        size = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))[0]
+        if max_size is not None and size > max_size:
+            raise ValueError('Frame too large: %d' % size)
+        frames.append(_recv_exactly(sock, size))
+    return frames
+
+
+def _constant_time_compare(first, second):
+    if len(first) != len(second):
+        return False
+    result = 0
+    for x, y in zip(first, second):
+        result |= ord(x) ^ ord(y)
+    return result == 0
+
+
+def _to_bytes(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return str(value)
+
+
+class RootwrapServer(object):
+    """Runs the commands received on a UNIX socket, once filtered."""
+
+    def __init__(self, config, filters):
+        self.config = config
+        self.filters = filters
+        self.authkey = os.urandom(32).encode('hex')
+        self.directory = None
+        self.address = None
+        self._socket = None
+
+    def start(self):
+        self.directory = tempfile.mkdtemp(prefix='neutron-rootwrap-')
+        os.chmod(self.directory, 0o700)
+        # Let the user who ran sudo reach the socket
+        if 'SUDO_UID' in os.environ:
+            os.chown(self.directory, int(os.environ['SUDO_UID']),
+                     int(os.environ.get('SUDO_GID', -1)))
+        self.address = os.path.join(self.directory, 'rootwrap.sock')
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.bind(self.address)
+        self._socket.listen(64)
+        thread = threading.Thread(target=self._accept)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self._socket.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _accept(self):
+        while True:
+            try:
+                conn = self._socket.accept()[0]
+            except socket.error:
+                # The socket was closed by stop()
+                return
+            thread = threading.Thread(target=self._serve, args=(conn,))
+            thread.daemon = True
+            thread.start()
+
+    def _serve(self, conn):
+        try:
+            # Nothing is read from unauthenticated clients but the key
+            frames = recv_frames(conn, max_frames=1,
+                                 max_size=len(self.authkey))
+            if len(frames) != 1 or not _constant_time_compare(
+                    frames[0], self.authkey):
+                return
+            send_frames(conn, [AUTH_OK])
+            while True:
+                frames = recv_frames(conn)
+                if len(frames) < 3:
+                    return
+                process_input = frames[1] if frames[0] == '1' else None
+                returncode, stdout, stderr = self.run(frames[2:],
+                                                      process_input)
+                send_frames(conn, [str(returncode), stdout, stderr])
+        except (EOFError, ValueError, socket.error):
+            pass
+        finally:
+            conn.close()
+
+    def run(self, userargs, process_input=None):
+        """Run a command if it matches a filter.
+
+        :returns: the exit code, standard output and standard error of the
+                  command, the exit codes of neutron-rootwrap are returned
+                  when the command is not run.
+        """
+        try:
+            filtermatch = wrapper.match_filter(
+                self.filters, userargs, exec_dirs=self.config.exec_dirs)
+            command = filtermatch.get_command(
+                userargs, exec_dirs=self.config.exec_dirs)
+        except wrapper.FilterMatchNotExecutable as exc:
+            msg = ("Executable not found: %s (filter match = %s)"
+                   % (exc.match.exec_path, exc.match.name))
+            self._log_error(msg)
+            return rootwrap_cmd.RC_NOEXECFOUND, '', msg
+        except wrapper.NoFilterMatched:
+            msg = ("Unauthorized command: %s (no filter matched)"
+                   % ' '.join(userargs))
+            self._log_error(msg)
+            return rootwrap_cmd.RC_UNAUTHORIZED, '', msg
+
+        if self.config.use_syslog:
+            LOG.info("Executing %s (filter match = %s)" % (
+                command, filtermatch.name))
+        obj = subprocess.Popen(command,
+                               stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE,
+                               close_fds=True,
+                               preexec_fn=rootwrap_cmd._subprocess_setup,
+                               env=filtermatch.get_environment(userargs))
+        stdout, stderr = obj.communicate(process_input)
+        return obj.returncode, stdout, stderr
+
+    def _log_error(self, msg):
+        if self.config.use_syslog:
+            LOG.error(msg)
+
+
+class RootwrapDaemonClient(object):
+    """Runs commands through a rootwrap daemon, started on first use.
+
+    The daemon is restarted if it exits. Idle connections are kept for the
+    next commands, a connection is opened per concurrent command.
+    """
+
+    def __init__(self, daemon_cmd):
+        self.daemon_cmd = daemon_cmd
+        self._process = None
+        self._address = None
+        self._authkey = None
+        self._connections = []
+        self._lock = semaphore.Semaphore()
+
+    def _ensure_daemon(self):
+        with self._lock:
+            if self._process and self._process.poll() is None:
+                return
+            self._connections = []
+            process = green_subprocess.Popen(shlex.split(self.daemon_cmd),
+                                             stdin=green_subprocess.PIPE,
+                                             stdout=green_subprocess.PIPE,
+                                             close_fds=True)
+            line = process.stdout.readline()
+            try:
+                self._address, self._authkey = line.split()
+            except ValueError:
+                process.stdin.close()
+                raise RuntimeError(
+                    _("Unable to start the rootwrap daemon %(cmd)s: "
+                      "%(output)r") % {'cmd': self.daemon_cmd,
+                                       'output': line})
+            self._process = process
+
+    def _connect(self):
+        sock = green_socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self._address)
+            send_frames(sock, [self._authkey])
+            if recv_frames(sock) != [AUTH_OK]:
+                raise RuntimeError(_("Rootwrap daemon authentication "
+                                     "failed"))
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def _call(self, frames):
+        self._ensure_daemon()
+        if self._connections:
+            sock = self._connections.pop()
+        else:
+            sock = self._connect()
+        try:
+            send_frames(sock, frames)
+            response = recv_frames(sock)
+        except Exception:
+            sock.close()
+            raise
+        self._connections.append(sock)
+        return response
+
+    def execute(self, cmd, process_input=None):
+        """Run a command as root.
+
+        :returns: the exit code, standard output and standard error of the
+                  command.
+        """
+        frames = ['1' if process_input is not None else '0',
+                  _to_bytes(process_input or '')]
+        frames.extend(_to_bytes(arg) for arg in cmd)
+        try:
+            response = self._call(frames)
+        except (EOFError, socket.error):
+            # The daemon exited or an idle connection was closed, retry
+            # once with a new connection
+            self._connections = []
+            response = self._call(frames)
+        return int(response[0]), response[1], response[2]
+
+    def stop(self):
+        for sock in self._connections:
+            sock.close()
+        self._connections = []
+        if self._process and self._process.poll() is None:
+            self._process.stdin.close()
+            self._process.wait()
+        self._process = None
+
+
+def main():
+    execname = sys.argv.pop(0)
+    if len(sys.argv) != 1:
+        rootwrap_cmd._exit_error(execname, "No configuration file specified",
+                                 rootwrap_cmd.RC_BADCONFIG, log=False)
+    configfile = sys.argv[0]
+
+    try:
+        rawconfig = ConfigParser.RawConfigParser()
+        rawconfig.read(configfile)
+        config = wrapper.RootwrapConfig(rawconfig)
+    except ValueError as exc:
+        msg = "Incorrect value in %s: %s" % (configfile, exc.message)
+        rootwrap_cmd._exit_error(execname, msg, rootwrap_cmd.RC_BADCONFIG,
+                                 log=False)
+    except ConfigParser.Error:
+        rootwrap_cmd._exit_error(execname, "Incorrect configuration file: "
+                                 "%s" % configfile, rootwrap_cmd.RC_BADCONFIG,
+                                 log=False)
+
+    if config.use_syslog:
+        wrapper.setup_syslog(execname,
+                             config.syslog_log_facility,
+                             config.syslog_log_level)
+
+    server = RootwrapServer(config, wrapper.load_filters(config.filters_path))
+    server.start()
+    try:
+        sys.stdout.write('%s %s\n' % (server.address, server.authkey))
+        sys.stdout.flush()
+        # Serve until the client closes our standard input
+        while sys.stdin.read(4096):
+            pass
+    finally:
+        server.stop()
+    # Exit without waiting for the threads of the remaining connections
+    logging.shutdown()
+    os._exit(0)
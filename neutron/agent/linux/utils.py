@@ -25,7 +25,9 @@ import struct
 import tempfile
 
 from eventlet.green import subprocess
+from oslo.config import cfg
 
+from neutron.agent.linux import rootwrap_daemon
 from neutron.common import utils
 from neutron.openstack.common import log as logging
 
@@ -33,8 +35,12 @@ from neutron.openstack.common import log as logging
 LOG = logging.getLogger(__name__)
 
 
-def execute(cmd, root_helper=None, process_input=None, addl_env=None,
-            check_exit_code=True, return_stderr=False):
+def create_process(cmd, root_helper=None, addl_env=None):
+    """Create a process object for the given command.
+
+    The return value will be a tuple of the process object and the
+    list of command arguments used to create it.
+    """
     if root_helper:
         cmd = shlex.split(root_helper) + cmd
     cmd = map(str, cmd)
@@ -48,16 +54,51 @@ def execute(cmd, root_helper=None, process_input=None, addl_env=None,
                                  stdout=subprocess.PIPE,
                                  stderr=subprocess.PIPE,
                                  env=env)
+    return obj, cmd
+
+
+# Clients of the rootwrap daemons, by daemon command
+_rootwrap_clients = {}
+
 
-    _stdout, _stderr = (process_input and
-                        obj.communicate(process_input) or
-                        obj.communicate())
-    obj.stdin.close()
+def get_rootwrap_client():
+    """Return the client of the configured rootwrap daemon, if any."""
+    try:
+        daemon_cmd = cfg.CONF.AGENT.root_helper_daemon
+    except (cfg.NoSuchOptError, cfg.NoSuchGroupError):
+        return None
+    if not daemon_cmd:
+        return None
+    client = _rootwrap_clients.get(daemon_cmd)
+    if client is None:
+        client = _rootwrap_clients[daemon_cmd] = (
+            rootwrap_daemon.RootwrapDaemonClient(daemon_cmd))
+    return client
+
+
+def execute(cmd, root_helper=None, process_input=None, addl_env=None,
+            check_exit_code=True, return_stderr=False):
+    # The rootwrap daemon runs the commands as root in place of the root
+    # helper; it does not pass environment variables
+    client = root_helper and not addl_env and get_rootwrap_client()
+    if client:
+        cmd = map(str, cmd)
+        LOG.debug(_("Running command through the rootwrap daemon: %s"), cmd)
+        returncode, _stdout, _stderr = client.execute(cmd, process_input)
+    else:
+        obj, cmd = create_process(cmd, root_helper=root_helper,
+                                  addl_env=addl_env)
+
+        _stdout, _stderr = (process_input and
+                            obj.communicate(process_input) or
+                            obj.communicate())
+        obj.stdin.close()
+        returncode = obj.returncode
     m = _("\nCommand: %(cmd)s\nExit code: %(code)s\nStdout: %(stdout)r\n"
-          "Stderr: %(stderr)r") % {'cmd': cmd, 'code': obj.returncode,
+          "Stderr: %(stderr)r") % {'cmd': cmd, 'code': returncode,
                                    'stdout': _stdout, 'stderr': _stderr}
     LOG.debug(m)
-    if obj.returncode and check_exit_code:
+    if returncode and check_exit_code:
         raise RuntimeError(m)
 
     return return_stderr and (_stdout, _stderr) or _stdout
@@ -89,3 +130,17 @@ def replace_file(file_name, data):
     tmp_file.close()
     os.chmod(tmp_file.name, 0o644)
     os.rename(tmp_file.name, file_name)
+
+
+def find_child_pids(pid):
+    """Retrieve a list of the pids of child processes of the given pid."""
+
+    try:
+        raw_pids = execute(['ps', '--ppid', pid, '-o', 'pid='])
+    except RuntimeError as e:
+        # Exception is raised when no child processes exist
+        no_children_found = 'Exit code: 1' in str(e)
+        if no_children_found:
+            return []
+        raise
+    return [x.strip() for x in raw_pids.split('\n') if x.strip()]
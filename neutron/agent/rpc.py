@@ -21,6 +21,7 @@ from neutron.common import topics
 
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import rpc
+from neutron.openstack.common.rpc import common as rpc_common
 from neutron.openstack.common.rpc import proxy
 from neutron.openstack.common import timeutils
 
@@ -56,6 +57,18 @@ def create_consumers(dispatcher, prefix, topic_details):
     return connection
 
 
+def _is_unsupported_version(exc):
+    """Whether exc reports a call to a version the plugin does not support.
+
+    The exception is received as a RemoteError when its type is not among
+    the allowed RPC exception modules.
+    """
+    if isinstance(exc, rpc_common.UnsupportedRpcVersion):
+        return True
+    return (isinstance(exc, rpc_common.RemoteError) and
+            exc.exc_type == 'UnsupportedRpcVersion')
+
+
 class PluginReportStateAPI(proxy.RpcProxy):
     BASE_RPC_API_VERSION = '1.0'
 
@@ -79,6 +92,7 @@ class PluginApi(proxy.RpcProxy):
 
     API version history:
         1.0 - Initial version.
+        1.2 - get_devices_details_list and update_devices_up.
 
     '''
 
@@ -94,6 +108,24 @@ class PluginApi(proxy.RpcProxy):
                                        agent_id=agent_id),
                          topic=self.topic)
 
+    def get_devices_details_list(self, context, devices, agent_id):
+        """Return the details of several devices, in one call if supported.
+
+        Plugins which do not support version 1.2 of the API are sent one
+        get_device_details call per device.
+        """
+        try:
+            return self.call(context,
+                             self.make_msg('get_devices_details_list',
+                                           devices=devices,
+                                           agent_id=agent_id),
+                             topic=self.topic, version='1.2')
+        except Exception as e:
+            if not _is_unsupported_version(e):
+                raise
+        return [self.get_device_details(context, device, agent_id)
+                for device in devices]
+
     def update_device_down(self, context, device, agent_id):
         return self.call(context,
                          self.make_msg('update_device_down', device=device,
@@ -106,6 +138,20 @@ class PluginApi(proxy.RpcProxy):
                                        agent_id=agent_id),
                          topic=self.topic)
 
+    def update_devices_up(self, context, devices, agent_id):
+        """Mark several devices up, in one call if supported."""
+        try:
+            return self.call(context,
+                             self.make_msg('update_devices_up',
+                                           devices=devices,
+                                           agent_id=agent_id),
+                             topic=self.topic, version='1.2')
+        except Exception as e:
+            if not _is_unsupported_version(e):
+                raise
+        for device in devices:
+            self.update_device_up(context, device, agent_id)
+
     def tunnel_sync(self, context, tunnel_ip, tunnel_type=None):
         return self.call(context,
                          self.make_msg('tunnel_sync', tunnel_ip=tunnel_ip,
@@ -16,8 +16,12 @@
 #    under the License.
 #
 
+import time
+
+from eventlet import semaphore
 from oslo.config import cfg
 
+from neutron.agent import rpc as agent_rpc
 from neutron.common import topics
 from neutron.openstack.common import importutils
 from neutron.openstack.common import log as logging
@@ -29,7 +33,19 @@ security_group_opts = [
     cfg.StrOpt(
         'firewall_driver',
         default='neutron.agent.firewall.NoopFirewallDriver',
-        help=_('Driver for Security Groups Firewall'))
+        help=_('Driver for Security Groups Firewall')),
+    cfg.BoolOpt(
+        'enable_ipset',
+        default=False,
+        help=_('Use ipset to match the members of remote security groups '
+               'instead of one iptables rule per member')),
+    cfg.IntOpt(
+        'remote_members_resync_interval',
+        default=60,
+        help=_('Seconds after which the agents using ipset fetch the '
+               'members of the remote security groups of their devices '
+               'again, repairing the member updates lost or received out '
+               'of order, 0 to disable'))
 ]
 cfg.CONF.register_opts(security_group_opts, 'SECURITYGROUP')
 
@@ -57,6 +73,23 @@ class SecurityGroupServerRpcApiMixin(object):
                          version=SG_RPC_VERSION,
                          topic=self.topic)
 
+    def security_group_info_for_devices(self, context, devices):
+        """Get the security group rules and the members of remote groups.
+
+        :returns: None if the plugin does not support it.
+        """
+        LOG.debug(_("Get security group information "
+                    "for devices via rpc %r"), devices)
+        try:
+            return self.call(context,
+                             self.make_msg('security_group_info_for_devices',
+                                           devices=devices),
+                             version='1.3',
+                             topic=self.topic)
+        except Exception as e:
+            if not agent_rpc._is_unsupported_version(e):
+                raise
+
 
 class SecurityGroupAgentRpcCallbackMixin(object):
     """A mix-in that enable SecurityGroup agent
@@ -79,11 +112,18 @@ class SecurityGroupAgentRpcCallbackMixin(object):
         """Callback for security group member update.
 
         :param security_groups: list of updated security_groups
+        :param member_ips: the ips added to and removed from each group,
+                           only sent by newer servers
         """
         security_groups = kwargs.get('security_groups', [])
         LOG.debug(
             _("Security group member updated on remote: %s"), security_groups)
-        self.sg_agent.security_groups_member_updated(security_groups)
+        member_ips = kwargs.get('member_ips')
+        if member_ips is None:
+            self.sg_agent.security_groups_member_updated(security_groups)
+        else:
+            self.sg_agent.security_group_member_ips_updated(security_groups,
+                                                            member_ips)
 
     def security_groups_provider_updated(self, context, **kwargs):
         """Callback for security group provider update."""
@@ -96,17 +136,64 @@ class SecurityGroupAgentRpcMixin(object):
     support in agent implementations.
     """
 
-    def init_firewall(self):
+    def init_firewall(self, defer_refresh_firewall=False):
+        """Load the firewall driver.
+
+        :param defer_refresh_firewall: record the refreshes requested by
+            the notifications of the server, for the loop of the agent to
+            do them at once with refresh_pending_firewall.
+        """
         firewall_driver = cfg.CONF.SECURITYGROUP.firewall_driver
         LOG.debug(_("Init firewall settings (driver=%s)"), firewall_driver)
         self.firewall = importutils.import_object(firewall_driver)
+        self.use_remote_group_members = (
+            self.firewall.supports_remote_group_members)
+        self.defer_refresh_firewall = defer_refresh_firewall
+        self.devices_to_refilter = set()
+        self.global_refresh_firewall = False
+        # The ips added to and removed from remote groups, not applied yet
+        self.sg_member_ips_updates = {}
+        # The updates of members received while the members are fetched
+        # are applied after them
+        self._sg_members_lock = semaphore.Semaphore()
+        # When the members of the remote groups were all fetched last
+        self._sg_members_resynced_at = time.time()
+
+    def _get_devices_info(self, device_ids):
+        if getattr(self, 'use_remote_group_members', False):
+            with self._sg_members_lock:
+                info = self.plugin_rpc.security_group_info_for_devices(
+                    self.context, device_ids)
+                if info is not None:
+                    self.firewall.update_security_group_members(
+                        info['sg_member_ips'])
+                    return self._add_security_group_rules(info)
+            LOG.info(_("The plugin does not give the members of remote "
+                       "security groups, using one rule per member"))
+            self.use_remote_group_members = False
+        return self.plugin_rpc.security_group_rules_for_devices(
+            self.context, device_ids)
+
+    def _add_security_group_rules(self, info):
+        """Give each device the rules of its security groups.
+
+        The rules of each security group are sent once for all the
+        devices, before the provider rules of the devices.
+        """
+        devices = info['devices']
+        for device in devices.values():
+            rules = []
+            for sg_id in device.get('security_groups', []):
+                rules.extend(info['security_groups'].get(sg_id, []))
+            device['security_group_rules'] = (
+                rules + device['security_group_rules'])
+        return devices
 
     def prepare_devices_filter(self, device_ids):
         if not device_ids:
             return
         LOG.info(_("Preparing filters for devices %s"), device_ids)
-        devices = self.plugin_rpc.security_group_rules_for_devices(
-            self.context, list(device_ids))
+        devices = self._get_devices_info(list(device_ids))
         with self.firewall.defer_apply():
             for device in devices.values():
                 self.firewall.prepare_port_filter(device)
@@ -125,6 +212,37 @@ class SecurityGroupAgentRpcMixin(object):
             security_groups,
             'security_group_source_groups')
 
+    def security_group_member_ips_updated(self, security_groups,
+                                          member_ips):
+        """Add and remove the members of remote groups.
+
+        The rules of the devices do not change, only the sets of members
+        of the groups do.
+
+        :param member_ips: the ips added to and removed from each group.
+        """
+        LOG.info(_("Security group member ips updated %r"), member_ips)
+        if not getattr(self, 'use_remote_group_members', False):
+            # The rules of the devices have one rule per member
+            self.security_groups_member_updated(security_groups)
+            return
+        for sg_id, ips in member_ips.iteritems():
+            added = set(ips.get('added', []))
+            removed = set(ips.get('removed', []))
+            pending = self.sg_member_ips_updates.setdefault(
+                sg_id, {'added': set(), 'removed': set()})
+            pending['added'] = (pending['added'] - removed) | added
+            pending['removed'] = (pending['removed'] - added) | removed
+        if not self.defer_refresh_firewall:
+            self._update_security_group_member_ips()
+
+    def _update_security_group_member_ips(self):
+        with self._sg_members_lock:
+            updates = self.sg_member_ips_updates
+            self.sg_member_ips_updates = {}
+            if updates:
+                self.firewall.update_security_group_member_ips(updates)
+
     def _security_group_updated(self, security_groups, attribute):
         devices = []
         sec_grp_set = set(security_groups)
@@ -132,12 +250,20 @@ class SecurityGroupAgentRpcMixin(object):
             if sec_grp_set & set(device.get(attribute, [])):
                 devices.append(device)
 
-        if devices:
+        if not devices:
+            return
+        if getattr(self, 'defer_refresh_firewall', False):
+            self.devices_to_refilter |= set(
+                device['device'] for device in devices)
+        else:
             self.refresh_firewall(devices)
 
     def security_groups_provider_updated(self):
         LOG.info(_("Provider rule updated"))
-        self.refresh_firewall()
+        if getattr(self, 'defer_refresh_firewall', False):
+            self.global_refresh_firewall = True
+        else:
+            self.refresh_firewall()
 
     def remove_devices_filter(self, device_ids):
         if not device_ids:
@@ -160,13 +286,71 @@ class SecurityGroupAgentRpcMixin(object):
         if not device_ids:
             LOG.info(_("No ports here to refresh firewall"))
             return
-        devices = self.plugin_rpc.security_group_rules_for_devices(
-            self.context, device_ids)
+        devices = self._get_devices_info(device_ids)
         with self.firewall.defer_apply():
             for device in devices.values():
                 LOG.debug(_("Update port filter for %s"), device['device'])
                 self.firewall.update_port_filter(device)
 
+    def _sg_members_resync_needed(self):
+        interval = cfg.CONF.SECURITYGROUP.remote_members_resync_interval
+        return (getattr(self, 'use_remote_group_members', False) and
+                interval > 0 and
+                time.time() - self._sg_members_resynced_at >= interval)
+
+    def _resync_security_group_members(self):
+        """Fetch the members of the remote groups of all the devices.
+
+        The member updates are sent with the ips added to and removed from
+        the groups, an update lost or received out of order leaves the
+        members wrong until they are fetched again.
+        """
+        self._sg_members_resynced_at = time.time()
+        device_ids = self.firewall.ports.keys()
+        if not device_ids:
+            return
+        LOG.debug(_("Fetching the members of the remote security groups"))
+        with self._sg_members_lock:
+            # The updates received so far are part of the fetched members
+            self.sg_member_ips_updates = {}
+            info = self.plugin_rpc.security_group_info_for_devices(
+                self.context, device_ids)
+            if info is not None:
+                self.firewall.update_security_group_members(
+                    info['sg_member_ips'])
+
+    def firewall_refresh_needed(self):
+        return bool(self.global_refresh_firewall or
+                    self.devices_to_refilter or
+                    self.sg_member_ips_updates or
+                    self._sg_members_resync_needed())
+
+    def refresh_pending_firewall(self):
+        """Do the refreshes recorded since the last call, at once.
+
+        The members of the remote groups are also fetched again every
+        remote_members_resync_interval seconds.
+        """
+        self._update_security_group_member_ips()
+        if self.global_refresh_firewall:
+            self.global_refresh_firewall = False
+            self.devices_to_refilter = set()
+            # The members of the groups of all the devices are fetched too
+            self._sg_members_resynced_at = time.time()
+            self.refresh_firewall()
+            return
+        if self._sg_members_resync_needed():
+            self._resync_security_group_members()
+        if self.devices_to_refilter:
+            device_ids = self.devices_to_refilter
+            self.devices_to_refilter = set()
+            # The devices removed meanwhile are not refreshed
+            devices = [self.firewall.ports[device_id]
+                       for device_id in device_ids
+                       if device_id in self.firewall.ports]
+            if devices:
+                self.refresh_firewall(devices)
+
 
 class SecurityGroupAgentRpcApiMixin(object):
 
@@ -185,13 +369,21 @@ class SecurityGroupAgentRpcApiMixin(object):
                          version=SG_RPC_VERSION,
                          topic=self._get_security_group_topic())
 
-    def security_groups_member_updated(self, context, security_groups):
-        """Notify member updated security groups."""
+    def security_groups_member_updated(self, context, security_groups,
+                                       member_ips=None):
+        """Notify member updated security groups.
+
+        :param member_ips: the ips which were added to and removed from
+                           each group, older agents ignore them.
+        """
         if not security_groups:
             return
+        kwargs = {'security_groups': security_groups}
+        if member_ips is not None:
+            kwargs['member_ips'] = member_ips
         self.fanout_cast(context,
                          self.make_msg('security_groups_member_updated',
-                                       security_groups=security_groups),
+                                       **kwargs),
                          version=SG_RPC_VERSION,
                          topic=self._get_security_group_topic())
 
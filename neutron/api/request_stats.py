@@ -0,0 +1,160 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Instrumentation of the cost of the API requests.
+
+The RequestStatsMiddleware records, for each request it wraps, the number
+of SQL statements executed and the time spent in the database, in policy
+checks and in (de)serialization. The figures are returned in response
+headers, logged, and aggregated per kind of request in this process.
+"""
+
+import re
+import time
+
+from oslo.config import cfg
+import webob.dec
+import webob.exc
+
+from neutron.common import timing
+from neutron.openstack.common import jsonutils
+from neutron.openstack.common import log as logging
+from neutron import wsgi
+
+
+LOG = logging.getLogger(__name__)
+
+request_stats_opts = [
+    cfg.FloatOpt('slow_statement_threshold',
+                 default=1.0,
+                 help=_('Log the SQL statements of the instrumented API '
+                        'requests which take more than this number of '
+                        'seconds, 0 to disable')),
+    cfg.IntOpt('request_stats_max_keys',
+               default=500,
+               help=_('Maximum number of kinds of request aggregated by '
+                      'the request stats, the requests of further kinds '
+                      'are aggregated together')),
+]
+cfg.CONF.register_opts(request_stats_opts)
+
+TIMINGS = (timing.POLICY, timing.SERIALIZATION)
+
+STATS_PATH = '/request-stats'
+
+# Dashed UUIDs, and the undashed ones used e.g. for the keystone tenant ids
+_ID_SEGMENT = re.compile(r'/(?:[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-'
+                         r'[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|[0-9a-fA-F]{32})'
+                         r'(?=/|\.|$)')
+_FORMAT_SUFFIX = re.compile(r'\.(json|xml)$')
+
+OTHER_REQUESTS = 'other'
+
+
+def request_key(method, path):
+    """Return the key aggregating the requests of method on path."""
+    path = _FORMAT_SUFFIX.sub('', path)
+    return '%s %s' % (method, _ID_SEGMENT.sub('/{id}', path))
+
+
+class RequestStatsMiddleware(wsgi.Middleware):
+    """Record the database, policy and serialization costs of requests.
+
+    The aggregated stats of this process are shown by a GET on
+    /request-stats, and reset by a DELETE; both are restricted to admins.
+    """
+
+    def __init__(self, application):
+        super(RequestStatsMiddleware, self).__init__(application)
+        self.aggregates = {}
+
+    def _aggregate(self, key, statements, timings, duration):
+        if (key not in self.aggregates and
+                len(self.aggregates) >= cfg.CONF.request_stats_max_keys):
+            # Bound the memory used by requests on paths which are not
+            # collapsed into a single kind, e.g. with names instead of ids
+            key = OTHER_REQUESTS
+        aggregate = self.aggregates.get(key)
+        if aggregate is None:
+            aggregate = self.aggregates[key] = {
+                'request': key, 'count': 0, 'statements': 0,
+                'max_statements': 0, 'db_time': 0.0, 'duration': 0.0}
+            for name in TIMINGS:
+                aggregate['%s_time' % name] = 0.0
+        aggregate['count'] += 1
+        aggregate['statements'] += statements.count
+        aggregate['max_statements'] = max(aggregate['max_statements'],
+                                          statements.count)
+        aggregate['db_time'] += statements.duration
+        aggregate['duration'] += duration
+        for name in TIMINGS:
+            aggregate['%s_time' % name] += timings[name]
+
+    def _stats_request(self, req):
+        if not req.context.is_admin:
+            return webob.exc.HTTPForbidden()
+        if req.method == 'DELETE':
+            self.aggregates = {}
+            return webob.exc.HTTPNoContent()
+        if req.method != 'GET':
+            return webob.exc.HTTPMethodNotAllowed()
+        aggregates = sorted(self.aggregates.values(),
+                            key=lambda a: a['request'])
+        return webob.Response(
+            content_type='application/json',
+            body=jsonutils.dumps({'request_stats': aggregates}))
+
+    @webob.dec.wsgify(RequestClass=wsgi.Request)
+    def __call__(self, req):
+        if _FORMAT_SUFFIX.sub('', req.path_info) == STATS_PATH:
+            return self._stats_request(req)
+
+        timings = timing.start()
+        statements = timing.start_statement_stats()
+        start = time.time()
+        try:
+            response = req.get_response(self.application)
+        finally:
+            timing.stop()
+            timing.stop_statement_stats()
+        duration = time.time() - start
+
+        response.headers['X-DB-Statements'] = str(statements.count)
+        response.headers['X-DB-Time'] = '%.6f' % statements.duration
+        for name in TIMINGS:
+            response.headers['X-%s-Time' % name.capitalize()] = (
+                '%.6f' % timings[name])
+
+        key = request_key(req.method, req.path_info)
+        self._aggregate(key, statements, timings, duration)
+        LOG.info(_("%(request)s: %(statements)d statements, "
+                   "%(db_time).3fs in database, %(policy_time).3fs in "
+                   "policy, %(serialization_time).3fs in serialization, "
+                   "%(duration).3fs total"),
+                 {'request': key, 'statements': statements.count,
+                  'db_time': statements.duration,
+                  'policy_time': timings[timing.POLICY],
+                  'serialization_time': timings[timing.SERIALIZATION],
+                  'duration': duration})
+        threshold = cfg.CONF.slow_statement_threshold
+        if threshold > 0 and statements.slowest_duration > threshold:
+            LOG.warn(_("%(request)s: slow statement took %(duration).3fs: "
+                       "%(statement)s"),
+                     {'request': key,
+                      'duration': statements.slowest_duration,
+                      'statement': statements.slowest_statement})
+        return response
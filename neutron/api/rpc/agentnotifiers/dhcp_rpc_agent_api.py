@@ -13,9 +13,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
+import time
+
+import eventlet
+from oslo.config import cfg
+
 from neutron.common import constants
 from neutron.common import topics
 from neutron.common import utils
+from neutron import context as neutron_context
 from neutron import manager
 from neutron.openstack.common import log as logging
 from neutron.openstack.common.rpc import proxy
@@ -23,12 +30,26 @@ from neutron.openstack.common.rpc import proxy
 
 LOG = logging.getLogger(__name__)
 
+# Seconds during which the agents hosting a network are cached. Each server
+# process has its own cache: the agents scheduled by another process, or
+# which went down, are only noticed by this one once its entry expires.
+AGENTS_CACHE_TTL = 5
+
 
 class DhcpAgentNotifyAPI(proxy.RpcProxy):
-    """API for plugin to notify DHCP agent."""
+    """API for plugin to notify DHCP agent.
+
+    The port events are buffered for dhcp_agent_notification_delay
+    seconds. The events of a port are coalesced to the last one, and the
+    agents which advertise batch_notifications receive the events of a
+    network in one ports_changed message.
+    """
     BASE_RPC_API_VERSION = '1.0'
-    # It seems dhcp agent does not support bulk operation
     VALID_RESOURCES = ['network', 'subnet', 'port']
+    # The resources of bulk operations
+    BULK_RESOURCES = {'networks': 'network',
+                      'subnets': 'subnet',
+                      'ports': 'port'}
     VALID_METHOD_NAMES = ['network.create.end',
                           'network.update.end',
                           'network.delete.end',
@@ -38,17 +59,73 @@ class DhcpAgentNotifyAPI(proxy.RpcProxy):
                           'port.create.end',
                           'port.update.end',
                           'port.delete.end']
+    PORT_METHOD_NAMES = ['port_create_end',
+                         'port_update_end',
+                         'port_delete_end']
+
+    # The (time, agents) of the networks, shared by the notifiers of the
+    # process so that scheduling invalidates it for all of them
+    _agents_cache = {}
 
     def __init__(self, topic=topics.DHCP_AGENT):
         super(DhcpAgentNotifyAPI, self).__init__(
             topic=topic, default_version=self.BASE_RPC_API_VERSION)
+        # The buffered port events of each network, by port id
+        self._pending_ports = collections.OrderedDict()
+        self._flush_scheduled = False
+
+    @classmethod
+    def _invalidate_agents_cache(cls, network_id=None):
+        if network_id:
+            cls._agents_cache.pop(network_id, None)
+        else:
+            cls._agents_cache.clear()
+
+    @classmethod
+    def _evict_expired_agents(cls, now):
+        for network_id, (cached_at, agents) in cls._agents_cache.items():
+            if now - cached_at >= AGENTS_CACHE_TTL:
+                del cls._agents_cache[network_id]
 
     def _get_dhcp_agents(self, context, network_id):
+        """Return the (host, topic, batch) of the agents of a network."""
+        now = time.time()
+        cached = self._agents_cache.get(network_id)
+        if cached and now - cached[0] < AGENTS_CACHE_TTL:
+            return cached[1]
+        # The entries of the networks no longer notified would never be
+        # replaced, they are dropped when one misses the cache
+        self._evict_expired_agents(now)
         plugin = manager.NeutronManager.get_plugin()
         dhcp_agents = plugin.get_dhcp_agents_hosting_networks(
             context, [network_id], active=True)
-        return [(dhcp_agent.host, dhcp_agent.topic) for
-                dhcp_agent in dhcp_agents]
+        agents = [(dhcp_agent.host, dhcp_agent.topic,
+                   bool(plugin.get_configuration_dict(dhcp_agent).get(
+                       'batch_notifications')))
+                  for dhcp_agent in dhcp_agents]
+        self._agents_cache[network_id] = (time.time(), agents)
+        return agents
+
+    def _schedule_network(self, context, network_id):
+        """Schedule a network which is not hosted by enough agents."""
+        if (len(self._get_dhcp_agents(context, network_id)) >=
+                cfg.CONF.dhcp_agents_per_network):
+            return
+        plugin = manager.NeutronManager.get_plugin()
+        # we don't schedule when we create network
+        # because we want to give admin a chance to
+        # schedule network manually by API
+        adminContext = (context if context.is_admin else
+                        context.elevated())
+        network = plugin.get_network(adminContext, network_id)
+        chosen_agents = plugin.schedule_network(adminContext, network)
+        self._invalidate_agents_cache(network_id)
+        if chosen_agents:
+            for agent in chosen_agents:
+                self._notification_host(
+                    context, 'network_create_end',
+                    {'network': {'id': network_id}},
+                    agent['host'])
 
     def _notification_host(self, context, method, payload, host):
         """Notify the agent on host."""
@@ -59,33 +136,56 @@ class DhcpAgentNotifyAPI(proxy.RpcProxy):
 
     def _notification(self, context, method, payload, network_id):
         """Notify all the agents that are hosting the network."""
+        self._notify_events(context, network_id, [(method, payload)])
+
+    def _notify_events(self, context, network_id, events):
+        """Notify the agents hosting a network of a list of events.
+
+        :param events: the (method, payload) of the events, the events of
+                       ports only are sent in one message to the agents
+                       supporting it.
+        """
         plugin = manager.NeutronManager.get_plugin()
-        if (method != 'network_delete_end' and utils.is_extension_supported(
-                plugin, constants.DHCP_AGENT_SCHEDULER_EXT_ALIAS)):
-            if method == 'port_create_end':
-                # we don't schedule when we create network
-                # because we want to give admin a chance to
-                # schedule network manually by API
-                adminContext = (context if context.is_admin else
-                                context.elevated())
-                network = plugin.get_network(adminContext, network_id)
-                chosen_agents = plugin.schedule_network(adminContext, network)
-                if chosen_agents:
-                    for agent in chosen_agents:
-                        self._notification_host(
-                            context, 'network_create_end',
-                            {'network': {'id': network_id}},
-                            agent['host'])
-            for (host, topic) in self._get_dhcp_agents(context, network_id):
-                self.cast(
-                    context, self.make_msg(method,
-                                           payload=payload),
-                    topic='%s.%s' % (topic, host))
+        methods = [method for method, payload in events]
+        if ('network_delete_end' not in methods and
+                utils.is_extension_supported(
+                    plugin, constants.DHCP_AGENT_SCHEDULER_EXT_ALIAS)):
+            if 'port_create_end' in methods:
+                self._schedule_network(context, network_id)
+            batch = all(method in self.PORT_METHOD_NAMES
+                        for method in methods)
+            for (host, topic, batch_notifications) in self._get_dhcp_agents(
+                    context, network_id):
+                if batch and batch_notifications:
+                    self._notification_ports_changed(context, events,
+                                                     '%s.%s' % (topic, host))
+                    continue
+                for method, payload in events:
+                    self.cast(
+                        context, self.make_msg(method,
+                                               payload=payload),
+                        topic='%s.%s' % (topic, host))
         else:
             # besides the non-agentscheduler plugin,
             # There is no way to query who is hosting the network
             # when the network is deleted, so we need to fanout
-            self._notification_fanout(context, method, payload)
+            for method, payload in events:
+                self._notification_fanout(context, method, payload)
+
+    def _notification_ports_changed(self, context, events, topic):
+        ports = []
+        deleted_port_ids = []
+        for method, payload in events:
+            if method == 'port_delete_end':
+                deleted_port_ids.append(payload['port_id'])
+            else:
+                ports.append(payload['port'])
+        self.cast(
+            context, self.make_msg('ports_changed',
+                                   payload={'ports': ports,
+                                            'deleted_port_ids':
+                                            deleted_port_ids}),
+            topic=topic, version='1.1')
 
     def _notification_fanout(self, context, method, payload):
         """Fanout the payload to all dhcp agents."""
@@ -94,15 +194,59 @@ class DhcpAgentNotifyAPI(proxy.RpcProxy):
                                    payload=payload),
             topic=topics.DHCP_AGENT)
 
+    def _buffer_port_event(self, method, payload, network_id):
+        if method == 'port_delete_end':
+            port_id = payload['port_id']
+        else:
+            port_id = payload['port']['id']
+        events = self._pending_ports.setdefault(network_id,
+                                                collections.OrderedDict())
+        # Only the last event of a port is sent, a port created and
+        # updated is sent once with its last state
+        previous = events.pop(port_id, None)
+        if (previous and previous[0] == 'port_create_end' and
+                method == 'port_update_end'):
+            method = 'port_create_end'
+        events[port_id] = (method, payload)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            eventlet.spawn_after(cfg.CONF.dhcp_agent_notification_delay,
+                                 self._flush_port_events)
+
+    def _flush_port_events(self, network_id=None):
+        """Send the buffered port events of a network, or of all networks."""
+        if network_id:
+            pending = {}
+            if network_id in self._pending_ports:
+                pending[network_id] = self._pending_ports.pop(network_id)
+        else:
+            self._flush_scheduled = False
+            pending, self._pending_ports = (self._pending_ports,
+                                            collections.OrderedDict())
+        if not pending:
+            return
+        # The events may be sent once the requests which caused them
+        # completed, use a context of our own
+        context = neutron_context.get_admin_context()
+        for network_id, events in pending.iteritems():
+            try:
+                self._notify_events(context, network_id, events.values())
+            except Exception:
+                LOG.exception(_("Failed notifying DHCP agents of the port "
+                                "events of network %s"), network_id)
+
     def network_removed_from_agent(self, context, network_id, host):
+        self._invalidate_agents_cache(network_id)
         self._notification_host(context, 'network_delete_end',
                                 {'network_id': network_id}, host)
 
     def network_added_to_agent(self, context, network_id, host):
+        self._invalidate_agents_cache(network_id)
         self._notification_host(context, 'network_create_end',
                                 {'network': {'id': network_id}}, host)
 
     def agent_updated(self, context, admin_state_up, host):
+        self._invalidate_agents_cache()
         self._notification_host(context, 'agent_updated',
                                 {'admin_state_up': admin_state_up},
                                 host)
@@ -112,6 +256,12 @@ class DhcpAgentNotifyAPI(proxy.RpcProxy):
         if methodname not in self.VALID_METHOD_NAMES:
             return
         obj_type = data.keys()[0]
+        if obj_type in self.BULK_RESOURCES:
+            # Notify the resources of bulk operations one by one
+            resource = self.BULK_RESOURCES[obj_type]
+            for obj_value in data[obj_type]:
+                self.notify(context, {resource: obj_value}, methodname)
+            return
         if obj_type not in self.VALID_RESOURCES:
             return
         obj_value = data[obj_type]
@@ -124,9 +274,19 @@ class DhcpAgentNotifyAPI(proxy.RpcProxy):
             return
         methodname = methodname.replace(".", "_")
         if methodname.endswith("_delete_end"):
-            if 'id' in obj_value:
-                self._notification(context, methodname,
-                                   {obj_type + '_id': obj_value['id']},
-                                   network_id)
+            if 'id' not in obj_value:
+                return
+            method, payload = (methodname,
+                               {obj_type + '_id': obj_value['id']})
+        else:
+            method, payload = methodname, data
+        if method == 'network_delete_end':
+            self._invalidate_agents_cache(network_id)
+        if method not in self.PORT_METHOD_NAMES:
+            # Keep the order of the events of the network
+            self._flush_port_events(network_id)
+            self._notification(context, method, payload, network_id)
+        elif cfg.CONF.dhcp_agent_notification_delay > 0:
+            self._buffer_port_event(method, payload, network_id)
         else:
-            self._notification(context, methodname, data, network_id)
+            self._notification(context, method, payload, network_id)
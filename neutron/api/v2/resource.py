@@ -17,12 +17,15 @@
 Utility methods for working with WSGI servers redux
 """
 
+import time
+
 import netaddr
 import webob.dec
 import webob.exc
 
 from neutron.api.v2 import attributes
 from neutron.common import exceptions
+from neutron.common import timing
 from neutron.openstack.common import gettextutils
 from neutron.openstack.common import log as logging
 from neutron import wsgi
@@ -77,11 +80,20 @@ def Resource(controller, faults=None, deserializers=None, serializers=None):
 
         try:
             if request.body:
-                args['body'] = deserializer.deserialize(request.body)['body']
+                with timing.measure(timing.SERIALIZATION):
+                    body = deserializer.deserialize(request.body)['body']
+                args['body'] = body
 
             method = getattr(controller, action)
 
             result = method(request=request, **args)
+            if action == 'index':
+                # NOTE: collections are streamed, but their first chunk is
+                # serialized here so that failures to serialize them still
+                # get reported with an error status
+                chunks = serializer.serialize_iter(result)
+                with timing.measure(timing.SERIALIZATION):
+                    first_chunk = next(chunks, '')
         except (exceptions.NeutronException,
                 netaddr.AddrFormatError) as e:
             LOG.exception(_('%s failed'), action)
@@ -122,7 +134,12 @@ def Resource(controller, faults=None, deserializers=None, serializers=None):
             raise webob.exc.HTTPInternalServerError(**kwargs)
 
         status = action_status.get(action, 200)
-        body = serializer.serialize(result)
+        if action == 'index':
+            return webob.Response(
+                request=request, status=status, content_type=content_type,
+                app_iter=_stream_chunks(request, first_chunk, chunks))
+        with timing.measure(timing.SERIALIZATION):
+            body = serializer.serialize(result)
         # NOTE(jkoelker) Comply with RFC2616 section 9.7
         if status == 204:
             content_type = ''
@@ -134,6 +151,32 @@ def Resource(controller, faults=None, deserializers=None, serializers=None):
     return resource
 
 
+def _stream_chunks(request, first_chunk, chunks):
+    """Yield the chunks of a streamed response body.
+
+    The chunks following the first one, and the views of the items they
+    hold, are built after the response headers are sent. The time spent
+    building them is logged once they are all written.
+    """
+    yield first_chunk
+    duration = 0.0
+    while True:
+        begin = time.time()
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            break
+        except Exception:
+            LOG.exception(_('Failed to stream the response of %s'),
+                          request.path_info)
+            raise
+        finally:
+            duration += time.time() - begin
+        yield chunk
+    LOG.debug(_('%(path)s: %(duration).3fs in streamed serialization'),
+              {'path': request.path_info, 'duration': duration})
+
+
 def translate(translatable, locale):
     """Translates the object to the given locale.
 
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Cron script to resynchronize the quota usages with the resources owned
+by the tenants, and purge the expired quota reservations.
+
+"""
+
+from oslo.config import cfg
+
+from neutron.common import config
+from neutron import context
+from neutron.db import quota_db
+from neutron import manager
+from neutron.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+def main():
+    cfg.CONF(project='neutron')
+    config.setup_logging(cfg.CONF)
+
+    # Loading the plugin sets up the usage tracking of its resources
+    manager.NeutronManager.get_plugin()
+    out_of_sync = quota_db.DbQuotaDriver.sync_usages(
+        context.get_admin_context())
+    LOG.info(_("Quota usages synchronized, %d were out of sync"),
+             out_of_sync)
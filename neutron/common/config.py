@@ -77,6 +77,11 @@ core_opts = [
     cfg.BoolOpt('dhcp_agent_notification', default=True,
                 help=_("Allow sending resource operation"
                        " notification to DHCP agent")),
+    cfg.FloatOpt('dhcp_agent_notification_delay', default=0.01,
+                 help=_("Seconds during which the port notifications to the "
+                        "DHCP agents are buffered, so that a burst of port "
+                        "changes is sent together. 0 sends each of them "
+                        "immediately.")),
     cfg.BoolOpt('allow_overlapping_ips', default=False,
                 help=_("Allow overlapping IP support in Neutron")),
     cfg.StrOpt('host', default=utils.get_hostname(),
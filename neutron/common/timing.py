@@ -0,0 +1,149 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Greenthread local timings of the phases of a request.
+
+Nothing is measured unless start() was called by the current greenthread,
+so the instrumented code paths only pay for a lookup otherwise. The SQL
+statements executed by a greenthread are recorded likewise once
+start_statement_stats() was called, on the engines passed to
+instrument_engine().
+"""
+
+import collections
+import contextlib
+import functools
+import time
+import weakref
+
+from eventlet import corolocal
+import sqlalchemy
+
+POLICY = 'policy'
+SERIALIZATION = 'serialization'
+
+_local = corolocal.local()
+
+
+def start():
+    """Start timing the current greenthread.
+
+    :returns: the dict of the timings, in seconds, updated until stop()
+              gets called.
+    """
+    timings = collections.defaultdict(float)
+    _local.timings = timings
+    return timings
+
+
+def stop():
+    """Stop timing the current greenthread."""
+    _local.timings = None
+
+
+@contextlib.contextmanager
+def measure(name):
+    """Add the time spent in the block to the timing name."""
+    timings = getattr(_local, 'timings', None)
+    if timings is None:
+        yield
+        return
+    begin = time.time()
+    try:
+        yield
+    finally:
+        timings[name] += time.time() - begin
+
+
+def timed(name):
+    """Decorator adding the time spent in the calls to the timing name."""
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            timings = getattr(_local, 'timings', None)
+            if timings is None:
+                return f(*args, **kwargs)
+            begin = time.time()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                timings[name] += time.time() - begin
+        return wrapper
+    return decorator
+
+
+class StatementStats(object):
+    """Statements executed by a greenthread, see start_statement_stats()."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest_duration = 0.0
+        self.slowest_statement = None
+
+    def add(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        if duration > self.slowest_duration:
+            self.slowest_duration = duration
+            self.slowest_statement = statement
+
+
+def start_statement_stats():
+    """Record the statements executed by the current greenthread.
+
+    :returns: the StatementStats updated with the statements executed until
+              stop_statement_stats() gets called.
+    """
+    stats = StatementStats()
+    _local.statement_stats = stats
+    return stats
+
+
+def stop_statement_stats():
+    """Stop recording the statements executed by the current greenthread."""
+    stats = getattr(_local, 'statement_stats', None)
+    _local.statement_stats = None
+    return stats
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    if getattr(_local, 'statement_stats', None) is not None:
+        conn.info['statement_start'] = time.time()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    stats = getattr(_local, 'statement_stats', None)
+    start = conn.info.pop('statement_start', None)
+    if stats is not None and start is not None:
+        stats.add(statement, time.time() - start)
+
+
+_instrumented_engines = weakref.WeakKeyDictionary()
+
+
+def instrument_engine(engine):
+    """Record the statements executed on engine, once per engine."""
+    if engine in _instrumented_engines:
+        return
+    sqlalchemy.event.listen(engine, 'before_cursor_execute',
+                            _before_cursor_execute)
+    sqlalchemy.event.listen(engine, 'after_cursor_execute',
+                            _after_cursor_execute)
+    _instrumented_engines[engine] = True
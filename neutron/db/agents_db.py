@@ -15,22 +15,33 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import hashlib
+
 from oslo.config import cfg
 import sqlalchemy as sa
 from sqlalchemy.orm import exc
 
+from neutron.db import api as db_api
 from neutron.db import model_base
 from neutron.db import models_v2
 from neutron.extensions import agent as ext_agent
 from neutron import manager
 from neutron.openstack.common import jsonutils
 from neutron.openstack.common import log as logging
+from neutron.openstack.common import loopingcall
 from neutron.openstack.common import timeutils
+from neutron.openstack.common import uuidutils
 
 LOG = logging.getLogger(__name__)
 cfg.CONF.register_opt(
     cfg.IntOpt('agent_down_time', default=5,
                help=_("Seconds to regard the agent is down.")))
+cfg.CONF.register_opt(
+    cfg.FloatOpt('agent_heartbeat_flush_interval', default=1,
+                 help=_("Seconds during which the heartbeats of the agents "
+                        "whose state did not change are kept in memory, "
+                        "before being written together. 0 writes each "
+                        "heartbeat.")))
 
 
 class Agent(model_base.BASEV2, models_v2.HasId):
@@ -57,9 +68,131 @@ class Agent(model_base.BASEV2, models_v2.HasId):
     configurations = sa.Column(sa.String(4095), nullable=False)
 
 
+def _state_hash(binary, topic, configurations):
+    """Return the hash of the state of an agent which is not a heartbeat."""
+    return hashlib.sha1(
+        '\0'.join([binary, topic, configurations])).hexdigest()
+
+
+class AgentHeartbeats(object):
+    """The heartbeats of the agents reported to this process.
+
+    The heartbeat of an agent whose state did not change since it was last
+    written is only recorded in memory. The recorded heartbeats are written
+    every agent_heartbeat_flush_interval seconds, in one batch updating only
+    the heartbeat_timestamp of the agents. The state of an agent written
+    since by another process is noticed then, and the next report of the
+    agent is written in full.
+    """
+
+    def __init__(self):
+        # The (id, state hash) of the agents written, by (type, host)
+        self.agents = {}
+        # The last heartbeat of the agents, by agent id
+        self.heartbeats = {}
+        # The heartbeats not written yet, by agent id
+        self.pending = {}
+        self._flusher = None
+
+    def clear(self):
+        self.agents.clear()
+        self.heartbeats.clear()
+        self.pending.clear()
+
+    def get_heartbeat(self, agent_id, heartbeat_timestamp):
+        """Return the last heartbeat of an agent.
+
+        :param heartbeat_timestamp: the heartbeat of the agent in the
+                                    database, which another process may
+                                    have written last.
+        """
+        heartbeat = self.heartbeats.get(agent_id)
+        if heartbeat and heartbeat > heartbeat_timestamp:
+            return heartbeat
+        return heartbeat_timestamp
+
+    def absorb(self, agent_key, state_hash, heartbeat):
+        """Record the heartbeat of an agent whose state did not change.
+
+        :returns: False if the agent state has to be written instead.
+        """
+        agent = self.agents.get(agent_key)
+        if not agent or agent[1] != state_hash:
+            return False
+        self.heartbeats[agent[0]] = heartbeat
+        self.pending[agent[0]] = heartbeat
+        if not self._flusher:
+            self._flusher = loopingcall.FixedIntervalLoopingCall(
+                self._periodic_flush)
+            self._flusher.start(
+                interval=cfg.CONF.agent_heartbeat_flush_interval)
+        return True
+
+    def written(self, agent_key, agent_id, state_hash, heartbeat):
+        """Record the state of an agent written to the database."""
+        self.agents[agent_key] = (agent_id, state_hash)
+        self.heartbeats[agent_id] = heartbeat
+        self.pending.pop(agent_id, None)
+
+    def forget(self, agent_id):
+        for agent_key, agent in self.agents.items():
+            if agent[0] == agent_id:
+                del self.agents[agent_key]
+        self.heartbeats.pop(agent_id, None)
+        self.pending.pop(agent_id, None)
+
+    def _periodic_flush(self):
+        try:
+            self.flush()
+        except Exception:
+            LOG.exception(_("Failed writing the heartbeats of the agents"))
+
+    def flush(self):
+        """Write the pending heartbeats."""
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, {}
+        table = Agent.__table__
+        # A heartbeat written by another process may be newer
+        update = table.update().where(sa.and_(
+            table.c.id == sa.bindparam('agent_id'),
+            table.c.heartbeat_timestamp < sa.bindparam('heartbeat'))).values(
+                heartbeat_timestamp=sa.bindparam('heartbeat'))
+        try:
+            session = db_api.get_session()
+            with session.begin():
+                session.execute(update, [
+                    {'agent_id': agent_id, 'heartbeat': heartbeat}
+                    for agent_id, heartbeat in pending.iteritems()])
+                states = dict(
+                    (agent_id, _state_hash(binary, topic, configurations))
+                    for agent_id, binary, topic, configurations in
+                    session.query(Agent.id, Agent.binary, Agent.topic,
+                                  Agent.configurations).filter(
+                                      Agent.id.in_(pending.keys())))
+        except Exception:
+            for agent_id, heartbeat in pending.iteritems():
+                self.pending.setdefault(agent_id, heartbeat)
+            raise
+        written_states = dict(self.agents.values())
+        for agent_id in pending:
+            # The next report of a deleted agent creates it again, and the
+            # next report of an agent whose state another process wrote
+            # since this one did is written in full
+            if states.get(agent_id) != written_states.get(agent_id):
+                self.forget(agent_id)
+        LOG.debug(_("Wrote the heartbeats of %d agents"), len(pending))
+
+
 class AgentDbMixin(ext_agent.AgentPluginBase):
     """Mixin class to add agent extension to db_plugin_base_v2."""
 
+    # The (configurations, parsed configurations) of the agents, by agent
+    # id, the configurations are parsed again once an agent reports others
+    _configurations_cache = {}
+    # Shared by the plugins of the process, as is the liveness of agents
+    heartbeats = AgentHeartbeats()
+
     def _get_agent(self, context, id):
         try:
             agent = self._get_by_id(context, Agent, id)
@@ -68,11 +201,27 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
         return agent
 
     @classmethod
-    def is_agent_down(cls, heart_beat_time):
-        return timeutils.is_older_than(heart_beat_time,
-                                       cfg.CONF.agent_down_time)
+    def is_agent_down(cls, heart_beat_time, agent_id=None):
+        """Return whether an agent is down.
+
+        :param heart_beat_time: the heartbeat of the agent in the database.
+        :param agent_id: the id of the agent, whose heartbeats reported to
+                         this process are considered.
+        """
+        down_time = cfg.CONF.agent_down_time
+        heartbeat = cls.heartbeats.heartbeats.get(agent_id)
+        if heartbeat and heartbeat >= heart_beat_time:
+            heart_beat_time = heartbeat
+        else:
+            # The newest heartbeat was written by another process, which
+            # writes the heartbeats it absorbs late
+            down_time += cfg.CONF.agent_heartbeat_flush_interval
+        return timeutils.is_older_than(heart_beat_time, down_time)
 
     def get_configuration_dict(self, agent_db):
+        cached = self._configurations_cache.get(agent_db.id)
+        if cached and cached[0] == agent_db.configurations:
+            return dict(cached[1])
         try:
             conf = jsonutils.loads(agent_db.configurations)
         except Exception:
@@ -81,15 +230,19 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
             LOG.warn(msg, {'agent_type': agent_db.agent_type,
                            'host': agent_db.host})
             conf = {}
-        return conf
+        self._configurations_cache[agent_db.id] = (agent_db.configurations,
+                                                   conf)
+        return dict(conf)
 
     def _make_agent_dict(self, agent, fields=None):
         attr = ext_agent.RESOURCE_ATTRIBUTE_MAP.get(
             ext_agent.RESOURCE_NAME + 's')
         res = dict((k, agent[k]) for k in attr
                    if k not in ['alive', 'configurations'])
+        res['heartbeat_timestamp'] = self.heartbeats.get_heartbeat(
+            agent['id'], agent['heartbeat_timestamp'])
         res['alive'] = not AgentDbMixin.is_agent_down(
-            res['heartbeat_timestamp'])
+            res['heartbeat_timestamp'], agent['id'])
         res['configurations'] = self.get_configuration_dict(agent)
         return self._fields(res, fields)
 
@@ -97,6 +250,8 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
         with context.session.begin(subtransactions=True):
             agent = self._get_agent(context, id)
             context.session.delete(agent)
+        self._configurations_cache.pop(id, None)
+        self.heartbeats.forget(id)
 
     def update_agent(self, context, id, agent):
         agent_data = agent['agent']
@@ -132,14 +287,25 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
         return self._make_agent_dict(agent, fields)
 
     def create_or_update_agent(self, context, agent):
-        """Create or update agent according to report."""
-        with context.session.begin(subtransactions=True):
-            res_keys = ['agent_type', 'binary', 'host', 'topic']
-            res = dict((k, agent[k]) for k in res_keys)
+        """Create or update agent according to report.
 
-            configurations_dict = agent.get('configurations', {})
-            res['configurations'] = jsonutils.dumps(configurations_dict)
-            current_time = timeutils.utcnow()
+        The report of an agent whose state did not change is only a
+        heartbeat, written later with the heartbeats of other agents.
+        """
+        res_keys = ['agent_type', 'binary', 'host', 'topic']
+        res = dict((k, agent[k]) for k in res_keys)
+        configurations_dict = agent.get('configurations', {})
+        res['configurations'] = jsonutils.dumps(configurations_dict,
+                                                sort_keys=True)
+        current_time = timeutils.utcnow()
+        agent_key = (agent['agent_type'], agent['host'])
+        state_hash = _state_hash(res['binary'], res['topic'],
+                                 res['configurations'])
+        if (cfg.CONF.agent_heartbeat_flush_interval > 0 and
+                not agent.get('start_flag') and
+                self.heartbeats.absorb(agent_key, state_hash, current_time)):
+            return
+        with context.session.begin(subtransactions=True):
             try:
                 agent_db = self._get_agent_by_type_and_host(
                     context, agent['agent_type'], agent['host'])
@@ -152,8 +318,11 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
                 res['started_at'] = current_time
                 res['heartbeat_timestamp'] = current_time
                 res['admin_state_up'] = True
+                res['id'] = uuidutils.generate_uuid()
                 agent_db = Agent(**res)
                 context.session.add(agent_db)
+        self.heartbeats.written(agent_key, agent_db.id, state_hash,
+                                current_time)
 
 
 class AgentExtRpcCallback(object):
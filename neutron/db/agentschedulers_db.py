@@ -38,7 +38,11 @@ AGENTS_SCHEDULER_OPTS = [
     cfg.BoolOpt('network_auto_schedule', default=True,
                 help=_('Allow auto scheduling networks to DHCP agent.')),
     cfg.IntOpt('dhcp_agents_per_network', default=1,
-               help=_('Number of DHCP agents scheduled to host a network.')),
+               help=_('Number of DHCP agents scheduled to host a network. '
+                      'Each server process caches the agents hosting a '
+                      'network for up to 5 seconds, so the agents '
+                      'scheduled by other processes may be notified '
+                      'late.')),
 ]
 
 cfg.CONF.register_opts(AGENTS_SCHEDULER_OPTS)
@@ -79,7 +83,7 @@ class AgentSchedulerDbMixin(agents_db.AgentDbMixin):
             #                   (i.e. have a recent heartbeat timestamp)
             #                   are eligible, even if active is False
             return not agents_db.AgentDbMixin.is_agent_down(
-                agent['heartbeat_timestamp'])
+                agent['heartbeat_timestamp'], agent['id'])
 
     def update_agent(self, context, id, agent):
         original_agent = self.get_agent(context, id)
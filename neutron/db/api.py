@@ -19,6 +19,7 @@
 
 import sqlalchemy as sql
 
+from neutron.common import timing
 from neutron.db import model_base
 from neutron.openstack.common.db.sqlalchemy import session
 from neutron.openstack.common import log as logging
@@ -34,7 +35,8 @@ def configure_db():
     Establish the database, create an engine if needed, and register
     the models.
     """
-    session.get_engine(sqlite_fk=True)
+    engine = session.get_engine(sqlite_fk=True)
+    timing.instrument_engine(engine)
     register_models()
 
 
@@ -43,6 +45,11 @@ def clear_db(base=BASE):
     session.cleanup()
 
 
+def dispose_engine():
+    """Drop the pooled connections, e.g. those inherited across a fork."""
+    session.get_engine(sqlite_fk=True).pool.dispose()
+
+
 def get_session(autocommit=True, expire_on_commit=False):
     """Helper method to grab session."""
     return session.get_session(autocommit=autocommit,
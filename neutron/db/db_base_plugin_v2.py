@@ -27,6 +27,8 @@ from neutron.api.v2 import attributes
 from neutron.common import constants
 from neutron.common import exceptions as q_exc
 from neutron.db import api as db
+from neutron.db import ipam
+from neutron.db import metadata_cache
 from neutron.db import models_v2
 from neutron.db import sqlalchemyutils
 from neutron import neutron_plugin_base_v2
@@ -64,6 +66,11 @@ class CommonDbMixin(object):
     # TODO(salvatore-orlando): Avoid using class-level variables
     _dict_extend_functions = {}
 
+    # This dictionary maps model classes to the names of the relationships
+    # the dict functions and their extend functions access, in order to
+    # load them eagerly together with the models
+    _model_load_profiles = {}
+
     @classmethod
     def register_model_query_hook(cls, model, name, query_hook, filter_hook,
                                   result_filters=None):
@@ -89,6 +96,37 @@ class CommonDbMixin(object):
         model_hooks[name] = {'query': query_hook, 'filter': filter_hook,
                              'result_filters': result_filters}
 
+    @classmethod
+    def register_model_load_profile(cls, model, relationships):
+        """Register relationships of model to load along with the model.
+
+        Mixins registering extend functions for a resource should register
+        the relationships of the model the functions access here, so that
+        they do not get lazily loaded one row at a time.
+        """
+        profile = cls._model_load_profiles.setdefault(model, [])
+        profile.extend(r for r in relationships if r not in profile)
+
+    def _apply_load_profile(self, query, model, collection=True):
+        """Eagerly load the relationships registered for model.
+
+        To-many relationships are loaded with one more query each rather
+        than joined, so that the number of rows returned does not grow with
+        their product. When retrieving a single object, the first of them is
+        joined nonetheless, as its rows alone do not multiply anything.
+        """
+        mapper = orm.class_mapper(model)
+        join_collection = not collection
+        for relationship in self._model_load_profiles.get(model, ()):
+            if not mapper.get_property(relationship).uselist:
+                query = query.options(orm.joinedload(relationship))
+            elif join_collection:
+                query = query.options(orm.joinedload(relationship))
+                join_collection = False
+            else:
+                query = query.options(orm.subqueryload(relationship))
+        return query
+
     def _model_query(self, context, model):
         query = context.session.query(model)
         # define basic filter condition for model query
@@ -141,6 +179,7 @@ class CommonDbMixin(object):
 
     def _get_by_id(self, context, model, id):
         query = self._model_query(context, model)
+        query = self._apply_load_profile(query, model, collection=False)
         return query.filter(model.id == id).one()
 
     def _apply_filters_to_query(self, query, model, filters):
@@ -192,6 +231,7 @@ class CommonDbMixin(object):
                                            limit=limit,
                                            marker_obj=marker_obj,
                                            page_reverse=page_reverse)
+        query = self._apply_load_profile(query, model)
         items = [dict_func(c, fields) for c in query]
         if limit and page_reverse:
             items.reverse()
@@ -206,6 +246,23 @@ class CommonDbMixin(object):
         return None
 
 
+class PortBulkAllocations(object):
+    """MAC and IP addresses allocated up front for a port bulk request.
+
+    create_port consumes these rather than generating addresses one port
+    at a time, and looks the networks up here too, so that no query is
+    issued per port and the rows of all the ports get flushed together.
+    """
+
+    def __init__(self):
+        # network_id -> Network
+        self.networks = {}
+        # network_id -> list of MAC addresses
+        self.macs = {}
+        # network_id -> list of fixed IP lists, one per IP version
+        self.ips = {}
+
+
 class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                         CommonDbMixin):
     """V2 Neutron plugin interface implementation using SQLAlchemy models.
@@ -245,17 +302,32 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                     data.iteritems() if k in columns)
 
     def _get_network(self, context, id):
+        bulk = self._get_port_bulk_allocations(context)
+        if bulk and id in bulk.networks:
+            return bulk.networks[id]
+        network = metadata_cache.get_request_model(context,
+                                                   models_v2.Network, id)
+        if network is not None:
+            return network
         try:
             network = self._get_by_id(context, models_v2.Network, id)
         except exc.NoResultFound:
             raise q_exc.NetworkNotFound(net_id=id)
+        metadata_cache.set_request_model(context, models_v2.Network, id,
+                                         network)
         return network
 
     def _get_subnet(self, context, id):
+        subnet = metadata_cache.get_request_model(context,
+                                                  models_v2.Subnet, id)
+        if subnet is not None:
+            return subnet
         try:
             subnet = self._get_by_id(context, models_v2.Subnet, id)
         except exc.NoResultFound:
             raise q_exc.SubnetNotFound(subnet_id=id)
+        metadata_cache.set_request_model(context, models_v2.Subnet, id,
+                                         subnet)
         return subnet
 
     def _get_port(self, context, id):
@@ -279,20 +351,29 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
 
     def _get_all_subnets(self, context):
         # NOTE(salvatore-orlando): This query might end up putting
-        # a lot of stress on the db. Consider adding a cache layer
-        return context.session.query(models_v2.Subnet).all()
+        # a lot of stress on the db. Only the columns needed to check
+        # overlaps are loaded, rather than the models and their relationships
+        return context.session.query(models_v2.Subnet.id,
+                                     models_v2.Subnet.cidr).all()
 
     @staticmethod
-    def _generate_mac(context, network_id):
+    def _random_mac():
         base_mac = cfg.CONF.base_mac.split(':')
+        mac = [int(base_mac[0], 16), int(base_mac[1], 16),
+               int(base_mac[2], 16), random.randint(0x00, 0xff),
+               random.randint(0x00, 0xff), random.randint(0x00, 0xff)]
+        if base_mac[3] != '00':
+            mac[3] = int(base_mac[3], 16)
+        return ':'.join(map(lambda x: "%02x" % x, mac))
+
+    @staticmethod
+    def _generate_mac(context, network_id):
+        bulk = NeutronDbPluginV2._get_port_bulk_allocations(context)
+        if bulk and bulk.macs.get(network_id):
+            return bulk.macs[network_id].pop()
         max_retries = cfg.CONF.mac_generation_retries
         for i in range(max_retries):
-            mac = [int(base_mac[0], 16), int(base_mac[1], 16),
-                   int(base_mac[2], 16), random.randint(0x00, 0xff),
-                   random.randint(0x00, 0xff), random.randint(0x00, 0xff)]
-            if base_mac[3] != '00':
-                mac[3] = int(base_mac[3], 16)
-            mac_address = ':'.join(map(lambda x: "%02x" % x, mac))
+            mac_address = NeutronDbPluginV2._random_mac()
             if NeutronDbPluginV2._check_unique_mac(context, network_id,
                                                    mac_address):
                 LOG.debug(_("Generated mac for network %(network_id)s "
@@ -309,6 +390,32 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                   max_retries)
         raise q_exc.MacAddressGenerationFailure(net_id=network_id)
 
+    @staticmethod
+    def _generate_macs(context, network_id, count, exclude=()):
+        """Generate count MAC addresses unique on the network.
+
+        The uniqueness of each batch of candidates is checked with a single
+        query. The MAC addresses in exclude are not generated.
+        """
+        max_retries = cfg.CONF.mac_generation_retries
+        macs = set()
+        for i in range(max_retries):
+            candidates = set(NeutronDbPluginV2._random_mac()
+                             for j in range(count - len(macs)))
+            candidates -= macs
+            candidates.difference_update(exclude)
+            mac_qry = context.session.query(models_v2.Port.mac_address)
+            in_use = mac_qry.filter(
+                models_v2.Port.network_id == network_id,
+                models_v2.Port.mac_address.in_(candidates))
+            macs |= candidates - set(mac for (mac,) in in_use)
+            if len(macs) == count:
+                return list(macs)
+        LOG.error(_("Unable to generate %(count)s mac addresses after "
+                    "%(max_retries)s attempts"),
+                  {'count': count, 'max_retries': max_retries})
+        raise q_exc.MacAddressGenerationFailure(net_id=network_id)
+
     @staticmethod
     def _check_unique_mac(context, network_id, mac_address):
         mac_qry = context.session.query(models_v2.Port)
@@ -324,83 +431,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         """Return an IP address to the pool of free IP's on the network
         subnet.
         """
-        # Grab all allocation pools for the subnet
-        allocation_pools = (context.session.query(
-            models_v2.IPAllocationPool).filter_by(subnet_id=subnet_id).
-            options(orm.joinedload('available_ranges', innerjoin=True)).
-            with_lockmode('update'))
-
-        # Find the allocation pool for the IP to recycle
-        pool_id = None
-        for allocation_pool in allocation_pools:
-            allocation_pool_range = netaddr.IPRange(
-                allocation_pool['first_ip'],
-                allocation_pool['last_ip'])
-            if netaddr.IPAddress(ip_address) in allocation_pool_range:
-                pool_id = allocation_pool['id']
-                break
-        if not pool_id:
-            NeutronDbPluginV2._delete_ip_allocation(
-                context, network_id, subnet_id, ip_address)
-            return
-        # Two requests will be done on the database. The first will be to
-        # search if an entry starts with ip_address + 1 (r1). The second
-        # will be to see if an entry ends with ip_address -1 (r2).
-        # If 1 of the above holds true then the specific entry will be
-        # modified. If both hold true then the two ranges will be merged.
-        # If there are no entries then a single entry will be added.
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange).with_lockmode('update')
-        ip_first = str(netaddr.IPAddress(ip_address) + 1)
-        ip_last = str(netaddr.IPAddress(ip_address) - 1)
-        LOG.debug(_("Recycle %s"), ip_address)
-        try:
-            r1 = range_qry.filter_by(allocation_pool_id=pool_id,
-                                     first_ip=ip_first).one()
-            LOG.debug(_("Recycle: first match for %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
-        except exc.NoResultFound:
-            r1 = []
-        try:
-            r2 = range_qry.filter_by(allocation_pool_id=pool_id,
-                                     last_ip=ip_last).one()
-            LOG.debug(_("Recycle: last match for %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
-        except exc.NoResultFound:
-            r2 = []
-
-        if r1 and r2:
-            # Merge the two ranges
-            ip_range = models_v2.IPAvailabilityRange(
-                allocation_pool_id=pool_id,
-                first_ip=r2['first_ip'],
-                last_ip=r1['last_ip'])
-            context.session.add(ip_range)
-            LOG.debug(_("Recycle: merged %(first_ip1)s-%(last_ip1)s and "
-                        "%(first_ip2)s-%(last_ip2)s"),
-                      {'first_ip1': r2['first_ip'], 'last_ip1': r2['last_ip'],
-                       'first_ip2': r1['first_ip'], 'last_ip2': r1['last_ip']})
-            context.session.delete(r1)
-            context.session.delete(r2)
-        elif r1:
-            # Update the range with matched first IP
-            r1['first_ip'] = ip_address
-            LOG.debug(_("Recycle: updated first %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
-        elif r2:
-            # Update the range with matched last IP
-            r2['last_ip'] = ip_address
-            LOG.debug(_("Recycle: updated last %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
-        else:
-            # Create a new range
-            ip_range = models_v2.IPAvailabilityRange(
-                allocation_pool_id=pool_id,
-                first_ip=ip_address,
-                last_ip=ip_address)
-            context.session.add(ip_range)
-            LOG.debug(_("Recycle: created new %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': ip_address, 'last_ip': ip_address})
+        ipam.get_driver().release(context, subnet_id, ip_address)
         NeutronDbPluginV2._delete_ip_allocation(context, network_id, subnet_id,
                                                 ip_address)
 
@@ -445,65 +476,27 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         The IP address will be generated from one of the subnets defined on
         the network.
         """
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange).join(
-                models_v2.IPAllocationPool).with_lockmode('update')
+        driver = ipam.get_driver()
         for subnet in subnets:
-            range = range_qry.filter_by(subnet_id=subnet['id']).first()
-            if not range:
+            ip_address = driver.allocate(context, subnet)
+            if not ip_address:
                 LOG.debug(_("All IP's from subnet %(subnet_id)s (%(cidr)s) "
                             "allocated"),
                           {'subnet_id': subnet['id'], 'cidr': subnet['cidr']})
                 continue
-            ip_address = range['first_ip']
-            LOG.debug(_("Allocated IP - %(ip_address)s from %(first_ip)s "
-                        "to %(last_ip)s"),
-                      {'ip_address': ip_address,
-                       'first_ip': range['first_ip'],
-                       'last_ip': range['last_ip']})
-            if range['first_ip'] == range['last_ip']:
-                # No more free indices on subnet => delete
-                LOG.debug(_("No more free IP's in slice. Deleting allocation "
-                            "pool."))
-                context.session.delete(range)
-            else:
-                # increment the first free
-                range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
+            LOG.debug(_("Allocated IP - %(ip_address)s from subnet "
+                        "%(subnet_id)s"),
+                      {'ip_address': ip_address, 'subnet_id': subnet['id']})
             return {'ip_address': ip_address, 'subnet_id': subnet['id']}
         raise q_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
 
     @staticmethod
-    def _allocate_specific_ip(context, subnet_id, ip_address):
+    def _allocate_specific_ip(context, network_id, subnet_id, ip_address):
         """Allocate a specific IP address on the subnet."""
-        ip = int(netaddr.IPAddress(ip_address))
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange).join(
-                models_v2.IPAllocationPool).with_lockmode('update')
-        results = range_qry.filter_by(subnet_id=subnet_id)
-        for range in results:
-            first = int(netaddr.IPAddress(range['first_ip']))
-            last = int(netaddr.IPAddress(range['last_ip']))
-            if first <= ip <= last:
-                if first == last:
-                    context.session.delete(range)
-                    return
-                elif first == ip:
-                    range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
-                    return
-                elif last == ip:
-                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
-                    return
-                else:
-                    # Split into two ranges
-                    new_first = str(netaddr.IPAddress(ip_address) + 1)
-                    new_last = range['last_ip']
-                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
-                    ip_range = models_v2.IPAvailabilityRange(
-                        allocation_pool_id=range['allocation_pool_id'],
-                        first_ip=new_first,
-                        last_ip=new_last)
-                    context.session.add(ip_range)
-                    return
+        if not ipam.get_driver().allocate_specific(context, subnet_id,
+                                                   ip_address):
+            raise q_exc.IpAddressInUse(net_id=network_id,
+                                       ip_address=ip_address)
 
     @staticmethod
     def _check_unique_ip(context, network_id, subnet_id, ip_address):
@@ -544,14 +537,12 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             return False
 
         # Check if the requested IP is in a defined allocation pool
-        pool_qry = context.session.query(models_v2.IPAllocationPool)
-        allocation_pools = pool_qry.filter_by(subnet_id=subnet_id)
+        subnet = metadata_cache.get_subnet(context, subnet_id)
+        if not subnet:
+            return False
         ip = netaddr.IPAddress(ip_address)
-        for allocation_pool in allocation_pools:
-            allocation_pool_range = netaddr.IPRange(
-                allocation_pool['first_ip'],
-                allocation_pool['last_ip'])
-            if ip in allocation_pool_range:
+        for first_ip, last_ip in subnet['allocation_pools']:
+            if ip in netaddr.IPRange(first_ip, last_ip):
                 return True
         return False
 
@@ -627,7 +618,8 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             if 'ip_address' in fixed:
                 # Remove the IP address from the allocation pool
                 NeutronDbPluginV2._allocate_specific_ip(
-                    context, fixed['subnet_id'], fixed['ip_address'])
+                    context, network['id'], fixed['subnet_id'],
+                    fixed['ip_address'])
                 ips.append({'ip_address': fixed['ip_address'],
                             'subnet_id': fixed['subnet_id']})
             # Only subnet ID is specified => need to generate IP
@@ -693,24 +685,31 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                                            p['fixed_ips'])
             ips = self._allocate_fixed_ips(context, network, configured_ips)
         else:
+            bulk = self._get_port_bulk_allocations(context)
+            allocated = bulk and bulk.ips.get(p['network_id'])
+            if allocated and all(allocated):
+                return [ips_by_version.pop() for ips_by_version in allocated]
             filter = {'network_id': [p['network_id']]}
             subnets = self.get_subnets(context, filters=filter)
-            # Split into v4 and v6 subnets
-            v4 = []
-            v6 = []
-            for subnet in subnets:
-                if subnet['ip_version'] == 4:
-                    v4.append(subnet)
-                else:
-                    v6.append(subnet)
-            version_subnets = [v4, v6]
-            for subnets in version_subnets:
+            for subnets in self._split_subnets_by_version(subnets):
                 if subnets:
                     result = NeutronDbPluginV2._generate_ip(context, subnets)
                     ips.append({'ip_address': result['ip_address'],
                                 'subnet_id': result['subnet_id']})
         return ips
 
+    @staticmethod
+    def _split_subnets_by_version(subnets):
+        """Split subnets into v4 and v6 subnets."""
+        v4 = []
+        v6 = []
+        for subnet in subnets:
+            if subnet['ip_version'] == 4:
+                v4.append(subnet)
+            else:
+                v6.append(subnet)
+        return [v4, v6]
+
     def _validate_subnet_cidr(self, context, network, new_subnet_cidr):
         """Validate the CIDR for a subnet.
 
@@ -994,9 +993,11 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             for port in ports:
                 self._delete_port(context, port['id'])
 
-            # clean up subnets
+            # clean up subnets, through the session so that the quota
+            # usages of the subnets get updated
             subnets_qry = context.session.query(models_v2.Subnet)
-            subnets_qry.filter_by(network_id=id).delete()
+            for subnet in subnets_qry.filter_by(network_id=id):
+                context.session.delete(subnet)
             context.session.delete(network)
 
     def get_network(self, context, id, fields=None):
@@ -1158,11 +1159,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                                      first_ip=pool['start'],
                                                      last_ip=pool['end'])
                 context.session.add(ip_pool)
-                ip_range = models_v2.IPAvailabilityRange(
-                    ipallocationpool=ip_pool,
-                    first_ip=pool['start'],
-                    last_ip=pool['end'])
-                context.session.add(ip_range)
+                ipam.get_driver().initialize_pool(context, ip_pool)
 
         return self._make_subnet_dict(subnet)
 
@@ -1290,8 +1287,79 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         return self._get_collection_count(context, models_v2.Subnet,
                                           filters=filters)
 
+    @staticmethod
+    def _get_port_bulk_allocations(context):
+        return getattr(context, '_port_bulk_allocations', None)
+
+    def _allocate_for_port_bulk(self, context, ports):
+        """Allocate the MAC and IP addresses of ports in batches.
+
+        Only the addresses create_port would generate for the ports are
+        allocated, that is MAC addresses when unspecified and one IP
+        address per IP version when fixed_ips are unspecified.
+        """
+        bulk = PortBulkAllocations()
+        mac_counts = {}
+        requested_macs = {}
+        ip_counts = {}
+        for item in ports:
+            p = item['port']
+            network_id = p['network_id']
+            mac_address = p.get('mac_address')
+            if mac_address is attributes.ATTR_NOT_SPECIFIED:
+                mac_counts[network_id] = mac_counts.get(network_id, 0) + 1
+            elif mac_address:
+                # Not in use yet, but taken by another port of the request
+                requested_macs.setdefault(network_id, set()).add(mac_address)
+            if p.get('fixed_ips') is attributes.ATTR_NOT_SPECIFIED:
+                ip_counts[network_id] = ip_counts.get(network_id, 0) + 1
+
+        network_qry = self._model_query(context, models_v2.Network)
+        network_qry = network_qry.filter(models_v2.Network.id.in_(
+            set(item['port']['network_id'] for item in ports)))
+        bulk.networks = dict((network.id, network) for network in network_qry)
+
+        for network_id, count in mac_counts.iteritems():
+            bulk.macs[network_id] = self._generate_macs(
+                context, network_id, count,
+                exclude=requested_macs.get(network_id, ()))
+        driver = ipam.get_driver()
+        for network_id, count in ip_counts.iteritems():
+            bulk.ips[network_id] = []
+            subnets = self._get_subnets_by_network(context, network_id)
+            for subnets in self._split_subnets_by_version(subnets):
+                if not subnets:
+                    continue
+                ips = []
+                for subnet in subnets:
+                    ips.extend({'ip_address': ip, 'subnet_id': subnet['id']}
+                               for ip in driver.allocate_many(
+                                   context, subnet, count - len(ips)))
+                    if len(ips) == count:
+                        break
+                else:
+                    raise q_exc.IpAddressGenerationFailure(net_id=network_id)
+                # Hand out addresses in ascending order
+                ips.reverse()
+                bulk.ips[network_id].append(ips)
+        return bulk
+
     def create_port_bulk(self, context, ports):
-        return self._create_bulk('port', context, ports)
+        with context.session.begin(subtransactions=True):
+            bulk = self._allocate_for_port_bulk(context, ports['ports'])
+            context._port_bulk_allocations = bulk
+            try:
+                objects = self._create_bulk('port', context, ports)
+            finally:
+                del context._port_bulk_allocations
+            # Return what create_port did not consume to the pools
+            driver = ipam.get_driver()
+            for ips_by_version in bulk.ips.itervalues():
+                for ips in ips_by_version:
+                    for ip in ips:
+                        driver.release(context, ip['subnet_id'],
+                                       ip['ip_address'])
+        return objects
 
     def create_port(self, context, port):
         p = port['port']
@@ -1400,9 +1468,9 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         # recycle all of the IP's
         allocated = allocated_qry.filter_by(port_id=id)
         for a in allocated:
-            subnet = self._get_subnet(context, a['subnet_id'])
+            subnet = metadata_cache.get_subnet(context, a['subnet_id'])
             # Check if IP was allocated from allocation pool
-            if NeutronDbPluginV2._check_ip_in_allocation_pool(
+            if subnet and NeutronDbPluginV2._check_ip_in_allocation_pool(
                 context, a['subnet_id'], subnet['gateway_ip'],
                 a['ip_address']):
                 NeutronDbPluginV2._recycle_ip(context,
@@ -1462,6 +1530,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                       sorts=sorts, limit=limit,
                                       marker_obj=marker_obj,
                                       page_reverse=page_reverse)
+        query = self._apply_load_profile(query, models_v2.Port)
         items = [self._make_port_dict(c, fields) for c in query]
         if limit and page_reverse:
             items.reverse()
@@ -1469,3 +1538,9 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
 
     def get_ports_count(self, context, filters=None):
         return self._get_ports_query(context, filters).count()
+
+
+NeutronDbPluginV2.register_model_load_profile(models_v2.Network, ['subnets'])
+NeutronDbPluginV2.register_model_load_profile(
+    models_v2.Subnet, ['allocation_pools', 'dns_nameservers', 'routes'])
+NeutronDbPluginV2.register_model_load_profile(models_v2.Port, ['fixed_ips'])
@@ -64,6 +64,8 @@ class ExtraRoute_db_mixin(l3_db.L3_NAT_db_mixin):
 
     db_base_plugin_v2.NeutronDbPluginV2.register_dict_extend_funcs(
         l3.ROUTERS, ['_extend_router_dict_extraroute'])
+    db_base_plugin_v2.NeutronDbPluginV2.register_model_load_profile(
+        l3_db.Router, ['route_list'])
 
     def update_router(self, context, id, router):
         r = router['router']
@@ -0,0 +1,378 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""IP address management backends for the v2 database plugin."""
+
+import abc
+
+import netaddr
+from oslo.config import cfg
+from sqlalchemy import orm
+
+from neutron.db import models_v2
+from neutron.openstack.common import importutils
+from neutron.openstack.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+ipam_opts = [
+    cfg.StrOpt('ipam_driver',
+               default='neutron.db.ipam.AvailabilityRangeIpamDriver',
+               help=_('Driver managing the free addresses of the subnet '
+                      'allocation pools')),
+]
+cfg.CONF.register_opts(ipam_opts)
+
+_DRIVERS = {}
+
+
+def get_driver():
+    """Return the configured IPAM driver, loading it on first use."""
+    driver_class = cfg.CONF.ipam_driver
+    if driver_class not in _DRIVERS:
+        _DRIVERS[driver_class] = importutils.import_object(driver_class)
+    return _DRIVERS[driver_class]
+
+
+class IpamDriver(object):
+    """Manages the free addresses of the allocation pools of subnets.
+
+    Drivers are only responsible for the availability of addresses; the
+    IPAllocation rows binding addresses to ports are handled by the plugin.
+    All the methods are called within the transaction of the plugin.
+    """
+
+    __metaclass__ = abc.ABCMeta
+
+    @abc.abstractmethod
+    def initialize_pool(self, context, allocation_pool):
+        """Mark all the addresses of a new allocation pool as free."""
+        pass
+
+    @abc.abstractmethod
+    def allocate(self, context, subnet):
+        """Allocate any free address of the subnet.
+
+        :returns: the allocated address, or None if the subnet is exhausted.
+        """
+        pass
+
+    def allocate_many(self, context, subnet, count):
+        """Allocate up to count free addresses of the subnet.
+
+        Drivers are encouraged to override this with a batched allocation.
+
+        :returns: the list of allocated addresses, shorter than count if the
+                  subnet got exhausted.
+        """
+        ips = []
+        while len(ips) < count:
+            ip_address = self.allocate(context, subnet)
+            if not ip_address:
+                break
+            ips.append(ip_address)
+        return ips
+
+    @abc.abstractmethod
+    def allocate_specific(self, context, subnet_id, ip_address):
+        """Remove ip_address from the free addresses of the subnet.
+
+        :returns: False if the address belongs to an allocation pool of the
+                  subnet but could not be allocated from it.
+        """
+        pass
+
+    @abc.abstractmethod
+    def release(self, context, subnet_id, ip_address):
+        """Return ip_address to the free addresses of the subnet.
+
+        :returns: False if the address does not belong to any allocation
+                  pool of the subnet.
+        """
+        pass
+
+
+def ip_key(ip):
+    """Return the key of the integer address ip, ordering like addresses."""
+    return '%032x' % ip
+
+
+class PoolRanges(object):
+    """Free ranges of an allocation pool.
+
+    Addresses are handled as integers. The IPAvailabilityRange rows are
+    looked up by their first_ip_key, so that an operation only reads and
+    rewrites the ranges next to the addresses it handles.
+    """
+
+    def __init__(self, session, pool, lock=False):
+        self.session = session
+        self.pool = pool
+        self.lock = lock
+        self.version = netaddr.IPAddress(pool['first_ip']).version
+        self.first = int(netaddr.IPAddress(pool['first_ip']))
+        self.last = int(netaddr.IPAddress(pool['last_ip']))
+        # The ranges read by this operation, by first address
+        self._ranges = {}
+
+    def __contains__(self, ip):
+        return self.first <= ip <= self.last
+
+    def format(self, ip):
+        return str(netaddr.IPAddress(ip, self.version))
+
+    def _query(self):
+        query = self.session.query(models_v2.IPAvailabilityRange)
+        query = query.filter_by(allocation_pool_id=self.pool['id'])
+        if self.lock:
+            query = query.with_lockmode('update').populate_existing()
+        return query
+
+    def _add(self, row):
+        first = int(netaddr.IPAddress(row['first_ip']))
+        last = int(netaddr.IPAddress(row['last_ip']))
+        self._ranges[first] = (last, row)
+        return first, last, row
+
+    def _lowest(self, count):
+        """Return the count lowest free ranges as (first, last, row)."""
+        key = models_v2.IPAvailabilityRange.first_ip_key
+        return [self._add(row) for row in
+                self._query().order_by(key).limit(count)]
+
+    def _at_or_before(self, ip):
+        """Return the free range starting the closest at or before ip."""
+        for first, (last, row) in self._ranges.iteritems():
+            if first <= ip <= last:
+                return first, last, row
+        key = models_v2.IPAvailabilityRange.first_ip_key
+        row = self._query().filter(key <= ip_key(ip)).order_by(
+            key.desc()).first()
+        return self._add(row) if row else None
+
+    def _starting_at(self, ip):
+        row = self._query().filter_by(first_ip_key=ip_key(ip)).first()
+        return self._add(row) if row else None
+
+    def _ranges_loaded(self):
+        # The relationship is kept in sync once loaded, the pool may be
+        # used again from the session within the transaction
+        return 'available_ranges' in self.pool.__dict__
+
+    def _delete(self, first, row):
+        if self._ranges_loaded():
+            self.pool.available_ranges.remove(row)
+        self.session.delete(row)
+        del self._ranges[first]
+
+    def _insert(self, first, last):
+        row = models_v2.IPAvailabilityRange(
+            allocation_pool_id=self.pool['id'],
+            first_ip=self.format(first),
+            last_ip=self.format(last),
+            first_ip_key=ip_key(first))
+        if self._ranges_loaded():
+            self.pool.available_ranges.append(row)
+        self.session.add(row)
+        self._ranges[first] = (last, row)
+
+    def _set_first(self, first, new_first):
+        last, row = self._ranges.pop(first)
+        row['first_ip'] = self.format(new_first)
+        row['first_ip_key'] = ip_key(new_first)
+        self._ranges[new_first] = (last, row)
+
+    def _set_last(self, first, new_last):
+        last, row = self._ranges[first]
+        row['last_ip'] = self.format(new_last)
+        self._ranges[first] = (new_last, row)
+
+    def is_free(self, ip):
+        found = self._at_or_before(ip)
+        return found is not None and found[1] >= ip
+
+    def first_free(self):
+        """Return the lowest free address of the pool, or None."""
+        ranges = self._lowest(1)
+        return ranges[0][0] if ranges else None
+
+    def take_first(self, count):
+        """Remove up to count of the lowest free addresses.
+
+        :returns: the list of the removed addresses.
+        """
+        ips = []
+        # Each range holds at least one address
+        for first, last, row in self._lowest(count):
+            taken = min(count - len(ips), last - first + 1)
+            ips.extend(xrange(first, first + taken))
+            if first + taken > last:
+                self._delete(first, row)
+            else:
+                self._set_first(first, first + taken)
+            if len(ips) == count:
+                break
+        return ips
+
+    def take(self, ip):
+        """Remove ip from the free ranges, returning False if not free."""
+        found = self._at_or_before(ip)
+        if found is None or found[1] < ip:
+            return False
+        first, last, row = found
+        if first == last:
+            self._delete(first, row)
+        elif first == ip:
+            self._set_first(first, ip + 1)
+        elif last == ip:
+            self._set_last(first, ip - 1)
+        else:
+            # Split into two ranges
+            self._set_last(first, ip - 1)
+            self._insert(ip + 1, last)
+        return True
+
+    def give(self, ip):
+        """Add ip to the free ranges, merging it with adjacent ranges."""
+        previous = self._at_or_before(ip)
+        if previous is not None and previous[1] >= ip:
+            # Already free
+            return
+        merge_prev = previous is not None and previous[1] == ip - 1
+        following = self._starting_at(ip + 1) if ip < self.last else None
+        if merge_prev and following:
+            self._set_last(previous[0], following[1])
+            self._delete(following[0], following[2])
+        elif merge_prev:
+            self._set_last(previous[0], ip)
+        elif following:
+            self._set_first(following[0], ip)
+        else:
+            self._insert(ip, ip)
+
+
+class AvailabilityRangeIpamDriver(IpamDriver):
+    """IPAM driver keeping the free ranges in IPAvailabilityRange rows.
+
+    Concurrent writers of the same allocation pool are detected through a
+    compare-and-swap on the pool version, rather than by locking the ranges
+    up front; a writer losing the race retries once with locking reads.
+    """
+
+    def _get_pools(self, context, subnet_id, lock):
+        query = context.session.query(models_v2.IPAllocationPool)
+        query = query.filter_by(subnet_id=subnet_id)
+        # The ranges are read as needed by PoolRanges
+        query = query.options(orm.lazyload('available_ranges'))
+        if lock:
+            # Locking reads see the latest committed ranges regardless of
+            # the isolation level, and the refreshed data is used in place
+            # of the one possibly cached in the session
+            query = query.with_lockmode('update').populate_existing()
+        return sorted((PoolRanges(context.session, pool, lock)
+                       for pool in query),
+                      key=lambda ranges: ranges.first)
+
+    def _bump_version(self, context, pool):
+        """Compare-and-swap the version of the allocation pool."""
+        query = context.session.query(models_v2.IPAllocationPool)
+        count = query.filter_by(id=pool['id'],
+                                version=pool['version']).update(
+                                    {'version': pool['version'] + 1},
+                                    synchronize_session='evaluate')
+        return count == 1
+
+    def _update_pools(self, context, subnet_id, select, update):
+        """Apply update to the pool chosen by select, retrying on conflicts.
+
+        select is called with the ranges of each pool of the subnet in turn
+        and returns the address to operate on, or None to skip the pool.
+
+        :returns: the address that was updated, or None.
+        """
+        for lock in (False, True):
+            for ranges in self._get_pools(context, subnet_id, lock):
+                ip = select(ranges)
+                if ip is None:
+                    continue
+                if not self._bump_version(context, ranges.pool):
+                    LOG.debug(_("Allocation pool %s was concurrently "
+                                "updated, retrying"), ranges.pool['id'])
+                    break
+                update(ranges, ip)
+                return ranges.format(ip)
+            else:
+                return None
+        return None
+
+    def initialize_pool(self, context, allocation_pool):
+        ip_range = models_v2.IPAvailabilityRange(
+            ipallocationpool=allocation_pool,
+            first_ip=allocation_pool['first_ip'],
+            last_ip=allocation_pool['last_ip'],
+            first_ip_key=ip_key(int(netaddr.IPAddress(
+                allocation_pool['first_ip']))))
+        context.session.add(ip_range)
+
+    def allocate(self, context, subnet):
+        return self._update_pools(context, subnet['id'],
+                                  lambda ranges: ranges.first_free(),
+                                  lambda ranges, ip: ranges.take(ip))
+
+    def allocate_many(self, context, subnet, count):
+        ips = []
+        for lock in (False, True):
+            for ranges in self._get_pools(context, subnet['id'], lock):
+                if len(ips) == count:
+                    return ips
+                if ranges.first_free() is None:
+                    continue
+                if not self._bump_version(context, ranges.pool):
+                    LOG.debug(_("Allocation pool %s was concurrently "
+                                "updated, retrying"), ranges.pool['id'])
+                    break
+                ips.extend(ranges.format(ip) for ip in
+                           ranges.take_first(count - len(ips)))
+            else:
+                return ips
+        return ips
+
+    def allocate_specific(self, context, subnet_id, ip_address):
+        ip = int(netaddr.IPAddress(ip_address))
+        in_pool = []
+
+        def select(ranges):
+            if ip not in ranges:
+                return None
+            in_pool.append(ranges)
+            return ip if ranges.is_free(ip) else None
+
+        if self._update_pools(context, subnet_id, select,
+                              lambda ranges, ip: ranges.take(ip)):
+            return True
+        # Addresses outside of the allocation pools are not tracked
+        return not in_pool
+
+    def release(self, context, subnet_id, ip_address):
+        ip = int(netaddr.IPAddress(ip_address))
+        LOG.debug(_("Recycle %s"), ip_address)
+        released = self._update_pools(context, subnet_id,
+                                      lambda ranges: ip if ip in ranges
+                                      else None,
+                                      lambda ranges, ip: ranges.give(ip))
+        return released is not None
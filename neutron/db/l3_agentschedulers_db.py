@@ -167,7 +167,8 @@ class L3AgentSchedulerDbMixin(l3agentscheduler.L3AgentSchedulerPluginBase,
             l3_agents = [l3_agent for l3_agent in
                          l3_agents if not
                          agents_db.AgentDbMixin.is_agent_down(
-                             l3_agent['heartbeat_timestamp'])]
+                             l3_agent['heartbeat_timestamp'],
+                             l3_agent['id'])]
         return l3_agents
 
     def _get_l3_bindings_hosting_routers(self, context, router_ids):
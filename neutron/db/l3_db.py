@@ -26,8 +26,10 @@ from neutron.api.rpc.agentnotifiers import l3_rpc_agent_api
 from neutron.api.v2 import attributes
 from neutron.common import constants as l3_constants
 from neutron.common import exceptions as q_exc
+from neutron.db import db_base_plugin_v2
 from neutron.db import model_base
 from neutron.db import models_v2
+from neutron.db import quota_db
 from neutron.extensions import l3
 from neutron import manager
 from neutron.openstack.common import log as logging
@@ -75,6 +77,10 @@ class FloatingIP(model_base.BASEV2, models_v2.HasId, models_v2.HasTenant):
     router_id = sa.Column(sa.String(36), sa.ForeignKey('routers.id'))
 
 
+quota_db.track_resource_usage('router', Router)
+quota_db.track_resource_usage('floatingip', FloatingIP)
+
+
 class L3_NAT_db_mixin(l3.RouterPluginBase):
     """Mixin class to add L3/NAT router methods to db_plugin_base_v2."""
 
@@ -111,6 +117,9 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
                 l3.ROUTERS, res, router)
         return self._fields(res, fields)
 
+    db_base_plugin_v2.NeutronDbPluginV2.register_model_load_profile(
+        Router, ['gw_port'])
+
     def create_router(self, context, router):
         r = router['router']
         has_gw_info = False
@@ -13,6 +13,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
+
 from oslo.config import cfg
 
 from neutron.common import constants
@@ -34,12 +36,17 @@ class L3RpcCallbackMixin(object):
     def sync_routers(self, context, **kwargs):
         """Sync routers according to filters to a specific agent.
 
+        Each router carries a revision, which changes with its data.
+        The routers whose revision is given in router_revisions and did not
+        change are returned without their data, as {'id', 'revision'}.
+
         @param context: contain user information
-        @param kwargs: host, router_ids
+        @param kwargs: host, router_ids, router_revisions
         @return: a list of routers
                  with their interfaces and floating_ips
         """
         router_ids = kwargs.get('router_ids')
+        router_revisions = kwargs.get('router_revisions') or {}
         host = kwargs.get('host')
         context = neutron_context.get_admin_context()
         l3plugin = manager.NeutronManager.get_service_plugins()[
@@ -60,9 +67,25 @@ class L3RpcCallbackMixin(object):
         if utils.is_extension_supported(
             plugin, constants.PORT_BINDING_EXT_ALIAS):
             self._ensure_host_set_on_ports(context, plugin, host, routers)
-        LOG.debug(_("Routers returned to l3 agent:\n %s"),
-                  jsonutils.dumps(routers, indent=5))
-        return routers
+        result = []
+        changed_ids = []
+        for router in routers:
+            revision = self._get_router_revision(router)
+            if router_revisions.get(router['id']) == revision:
+                router = {'id': router['id']}
+            else:
+                changed_ids.append(router['id'])
+            router['revision'] = revision
+            result.append(router)
+        LOG.debug(_("Routers returned to l3 agent: %(changed)s, "
+                    "%(unchanged)d unchanged"),
+                  {'changed': changed_ids,
+                   'unchanged': len(result) - len(changed_ids)})
+        return result
+
+    def _get_router_revision(self, router):
+        return hashlib.sha1(jsonutils.dumps(router,
+                                            sort_keys=True)).hexdigest()
 
     def _ensure_host_set_on_ports(self, context, plugin, host, routers):
         for router in routers:
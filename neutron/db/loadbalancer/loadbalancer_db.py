@@ -212,6 +212,11 @@ class LoadBalancerPluginDb(LoadBalancerPluginBase,
                 raise
         return r
 
+    def _get_resource_marker_obj(self, context, model, limit, marker):
+        if limit and marker:
+            return self._get_resource(context, model, marker)
+        return None
+
     def assert_modification_allowed(self, obj):
         status = getattr(obj, 'status', None)
 
@@ -448,10 +453,18 @@ class LoadBalancerPluginDb(LoadBalancerPluginBase,
         vip = self._get_resource(context, Vip, id)
         return self._make_vip_dict(vip, fields)
 
-    def get_vips(self, context, filters=None, fields=None):
+    def get_vips(self, context, filters=None, fields=None,
+                 sorts=None, limit=None, marker=None,
+                 page_reverse=False):
+        marker_obj = self._get_resource_marker_obj(
+            context, Vip, limit, marker)
         return self._get_collection(context, Vip,
                                     self._make_vip_dict,
-                                    filters=filters, fields=fields)
+                                    filters=filters, fields=fields,
+                                    sorts=sorts,
+                                    limit=limit,
+                                    marker_obj=marker_obj,
+                                    page_reverse=page_reverse)
 
     ########################################################
     # Pool DB access
@@ -568,11 +581,18 @@ class LoadBalancerPluginDb(LoadBalancerPluginBase,
         pool = self._get_resource(context, Pool, id)
         return self._make_pool_dict(pool, fields)
 
-    def get_pools(self, context, filters=None, fields=None):
-        collection = self._model_query(context, Pool)
-        collection = self._apply_filters_to_query(collection, Pool, filters)
-        return [self._make_pool_dict(c, fields)
-                for c in collection]
+    def get_pools(self, context, filters=None, fields=None,
+                  sorts=None, limit=None, marker=None,
+                  page_reverse=False):
+        marker_obj = self._get_resource_marker_obj(
+            context, Pool, limit, marker)
+        return self._get_collection(context, Pool,
+                                    self._make_pool_dict,
+                                    filters=filters, fields=fields,
+                                    sorts=sorts,
+                                    limit=limit,
+                                    marker_obj=marker_obj,
+                                    page_reverse=page_reverse)
 
     def stats(self, context, pool_id):
         with context.session.begin(subtransactions=True):
@@ -693,10 +713,18 @@ class LoadBalancerPluginDb(LoadBalancerPluginBase,
         member = self._get_resource(context, Member, id)
         return self._make_member_dict(member, fields)
 
-    def get_members(self, context, filters=None, fields=None):
+    def get_members(self, context, filters=None, fields=None,
+                    sorts=None, limit=None, marker=None,
+                    page_reverse=False):
+        marker_obj = self._get_resource_marker_obj(
+            context, Member, limit, marker)
         return self._get_collection(context, Member,
                                     self._make_member_dict,
-                                    filters=filters, fields=fields)
+                                    filters=filters, fields=fields,
+                                    sorts=sorts,
+                                    limit=limit,
+                                    marker_obj=marker_obj,
+                                    page_reverse=page_reverse)
 
     ########################################################
     # HealthMonitor DB access
@@ -755,7 +783,15 @@ class LoadBalancerPluginDb(LoadBalancerPluginBase,
         healthmonitor = self._get_resource(context, HealthMonitor, id)
         return self._make_health_monitor_dict(healthmonitor, fields)
 
-    def get_health_monitors(self, context, filters=None, fields=None):
+    def get_health_monitors(self, context, filters=None, fields=None,
+                            sorts=None, limit=None, marker=None,
+                            page_reverse=False):
+        marker_obj = self._get_resource_marker_obj(
+            context, HealthMonitor, limit, marker)
         return self._get_collection(context, HealthMonitor,
                                     self._make_health_monitor_dict,
-                                    filters=filters, fields=fields)
+                                    filters=filters, fields=fields,
+                                    sorts=sorts,
+                                    limit=limit,
+                                    marker_obj=marker_obj,
+                                    page_reverse=page_reverse)
@@ -0,0 +1,195 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Caches of the network and subnet data read by the port operations.
+
+Two layers are provided:
+
+* a per request cache, keyed by the request context, memoizing the models
+  the plugin looks up by id, so that a port operation reads each network
+  and subnet row once;
+* a process wide cache of the subnet metadata (CIDR, gateway, allocation
+  pools), whose entries expire after subnet_cache_ttl seconds and are
+  invalidated when a transaction of this process updating or deleting the
+  subnet ends.
+"""
+
+import collections
+import time
+import weakref
+
+from oslo.config import cfg
+from sqlalchemy import event
+from sqlalchemy import orm
+
+from neutron.db import models_v2
+
+
+metadata_cache_opts = [
+    cfg.IntOpt('subnet_cache_ttl',
+               default=60,
+               help=_('Number of seconds the metadata of a subnet is cached '
+                      'by the API server, 0 to disable the cache')),
+    cfg.IntOpt('subnet_cache_size',
+               default=1000,
+               help=_('Maximum number of subnets whose metadata is cached by '
+                      'the API server')),
+]
+cfg.CONF.register_opts(metadata_cache_opts)
+
+
+class ExpiringLRUCache(object):
+    """A mapping bounded in size whose entries expire after a delay.
+
+    The least recently used entries are evicted first when the cache is
+    full. The size and the delay are callables so that they are read from
+    the configuration on use.
+    """
+
+    def __init__(self, size, ttl):
+        self._size = size
+        self._ttl = ttl
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        expiration, value = entry
+        if expiration < time.time():
+            return None
+        # Move the entry to the most recently used end
+        self._entries[key] = entry
+        return value
+
+    def set(self, key, value):
+        ttl = self._ttl()
+        self._entries.pop(key, None)
+        if ttl <= 0:
+            return
+        self._entries[key] = (time.time() + ttl, value)
+        while len(self._entries) > max(self._size(), 0):
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+_subnets = ExpiringLRUCache(lambda: cfg.CONF.subnet_cache_size,
+                            lambda: cfg.CONF.subnet_cache_ttl)
+
+# Models memoized for each request context, dropped along with the context
+_request_caches = weakref.WeakKeyDictionary()
+
+
+def get_request_model(context, model, id):
+    """Return the instance of model memoized for this request, or None.
+
+    Instances which were deleted or expunged from the session of the
+    request since they were memoized are not returned.
+    """
+    instance = _request_caches.get(context, {}).get((model, id))
+    if (instance is None or instance not in context.session or
+            instance in context.session.deleted):
+        return None
+    return instance
+
+
+def set_request_model(context, model, id, instance):
+    """Memoize instance as the row of model with this id for the request."""
+    _request_caches.setdefault(context, {})[(model, id)] = instance
+
+
+def _load_subnet(context, subnet_id):
+    query = context.session.query(models_v2.Subnet)
+    query = query.options(orm.joinedload('allocation_pools'))
+    subnet = query.filter_by(id=subnet_id).first()
+    if not subnet:
+        return None
+    return {'id': subnet['id'],
+            'network_id': subnet['network_id'],
+            'ip_version': subnet['ip_version'],
+            'cidr': subnet['cidr'],
+            'gateway_ip': subnet['gateway_ip'],
+            'allocation_pools': [(pool['first_ip'], pool['last_ip'])
+                                 for pool in subnet.allocation_pools]}
+
+
+def get_subnet(context, subnet_id):
+    """Return the metadata of a subnet, or None if it does not exist.
+
+    The metadata is read regardless of the tenant of the context; it is
+    meant for the checks made on behalf of already authorized operations.
+    """
+    metadata = _subnets.get(subnet_id)
+    if metadata is None:
+        metadata = _load_subnet(context, subnet_id)
+        if metadata is not None:
+            _subnets.set(subnet_id, metadata)
+    return metadata
+
+
+def invalidate_subnet(subnet_id):
+    _subnets.invalidate(subnet_id)
+
+
+def clear():
+    """Drop the metadata cached by this process."""
+    _subnets.clear()
+
+
+# Subnets changed by the transaction of each session, invalidated again
+# when it ends
+_session_changes = weakref.WeakKeyDictionary()
+
+
+def _record_change(target, subnet_id):
+    # NOTE: invalidating at flush time alone is not enough: another request
+    # could cache the subnet as it was before the transaction commits
+    invalidate_subnet(subnet_id)
+    session = orm.object_session(target)
+    if session is not None:
+        _session_changes.setdefault(session, set()).add(subnet_id)
+
+
+def _invalidate_subnet(mapper, connection, target):
+    _record_change(target, target.id)
+
+
+def _invalidate_pool_subnet(mapper, connection, target):
+    _record_change(target, target.subnet_id)
+
+
+def _invalidate_session_changes(session):
+    for subnet_id in _session_changes.pop(session, ()):
+        invalidate_subnet(subnet_id)
+
+
+event.listen(models_v2.Subnet, 'after_update', _invalidate_subnet)
+event.listen(models_v2.Subnet, 'after_delete', _invalidate_subnet)
+event.listen(models_v2.IPAllocationPool, 'after_insert',
+             _invalidate_pool_subnet)
+event.listen(models_v2.IPAllocationPool, 'after_delete',
+             _invalidate_pool_subnet)
+event.listen(orm.Session, 'after_commit', _invalidate_session_changes)
+event.listen(orm.Session, 'after_rollback', _invalidate_session_changes)
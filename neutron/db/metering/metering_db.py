@@ -63,6 +63,18 @@ class MeteringDbMixin(metering.MeteringPluginBase,
 
         self.meter_rpc = metering_rpc_agent_api.MeteringAgentNotifyAPI()
 
+    def _get_metering_label(self, context, label_id):
+        try:
+            return self._get_by_id(context, MeteringLabel, label_id)
+        except orm.exc.NoResultFound:
+            raise metering.MeteringLabelNotFound(label_id=label_id)
+
+    def _get_metering_label_rule(self, context, rule_id):
+        try:
+            return self._get_by_id(context, MeteringLabelRule, rule_id)
+        except orm.exc.NoResultFound:
+            raise metering.MeteringLabelRuleNotFound(rule_id=rule_id)
+
     def _make_metering_label_dict(self, metering_label, fields=None):
         res = {'id': metering_label['id'],
                'name': metering_label['name'],
@@ -85,25 +97,17 @@ class MeteringDbMixin(metering.MeteringPluginBase,
 
     def delete_metering_label(self, context, label_id):
         with context.session.begin(subtransactions=True):
-            try:
-                label = self._get_by_id(context, MeteringLabel, label_id)
-            except orm.exc.NoResultFound:
-                raise metering.MeteringLabelNotFound(label_id=label_id)
-
+            label = self._get_metering_label(context, label_id)
             context.session.delete(label)
 
     def get_metering_label(self, context, label_id, fields=None):
-        try:
-            metering_label = self._get_by_id(context, MeteringLabel, label_id)
-        except orm.exc.NoResultFound:
-            raise metering.MeteringLabelNotFound(label_id=label_id)
-
+        metering_label = self._get_metering_label(context, label_id)
         return self._make_metering_label_dict(metering_label, fields)
 
     def get_metering_labels(self, context, filters=None, fields=None,
                             sorts=None, limit=None, marker=None,
                             page_reverse=False):
-        marker_obj = self._get_marker_obj(context, 'metering_labels', limit,
+        marker_obj = self._get_marker_obj(context, 'metering_label', limit,
                                           marker)
         return self._get_collection(context, MeteringLabel,
                                     self._make_metering_label_dict,
@@ -124,7 +128,7 @@ class MeteringDbMixin(metering.MeteringPluginBase,
     def get_metering_label_rules(self, context, filters=None, fields=None,
                                  sorts=None, limit=None, marker=None,
                                  page_reverse=False):
-        marker_obj = self._get_marker_obj(context, 'metering_label_rules',
+        marker_obj = self._get_marker_obj(context, 'metering_label_rule',
                                           limit, marker)
 
         return self._get_collection(context, MeteringLabelRule,
@@ -136,12 +140,7 @@ class MeteringDbMixin(metering.MeteringPluginBase,
                                     page_reverse=page_reverse)
 
     def get_metering_label_rule(self, context, rule_id, fields=None):
-        try:
-            metering_label_rule = self._get_by_id(context,
-                                                  MeteringLabelRule, rule_id)
-        except orm.exc.NoResultFound:
-            raise metering.MeteringLabelRuleNotFound(rule_id=rule_id)
-
+        metering_label_rule = self._get_metering_label_rule(context, rule_id)
         return self._make_metering_label_rule_dict(metering_label_rule, fields)
 
     def _validate_cidr(self, context, remote_ip_prefix, direction, excluded):
@@ -178,11 +177,7 @@ class MeteringDbMixin(metering.MeteringPluginBase,
 
     def delete_metering_label_rule(self, context, rule_id):
         with context.session.begin(subtransactions=True):
-            try:
-                rule = self._get_by_id(context, MeteringLabelRule, rule_id)
-            except orm.exc.NoResultFound:
-                raise metering.MeteringLabelRuleNotFound(rule_id=rule_id)
-
+            rule = self._get_metering_label_rule(context, rule_id)
             context.session.delete(rule)
 
     def _get_metering_rules_dict(self, metering_label):
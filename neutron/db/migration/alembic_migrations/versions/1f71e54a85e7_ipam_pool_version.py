@@ -0,0 +1,47 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""ipam pool version
+
+Revision ID: 1f71e54a85e7
+Revises: 3d6fae8b70b0
+Create Date: 2013-10-02 10:12:19.582165
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '1f71e54a85e7'
+down_revision = '3d6fae8b70b0'
+
+# Change to ['*'] if this migration applies to all plugins
+
+migration_for_plugins = [
+    '*'
+]
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade(active_plugins=None, options=None):
+    op.add_column('ipallocationpools',
+                  sa.Column('version', sa.Integer(), nullable=False,
+                            server_default='0'))
+
+
+def downgrade(active_plugins=None, options=None):
+    op.drop_column('ipallocationpools', 'version')
@@ -0,0 +1,59 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""core resources indexes
+
+Revision ID: 9b894dbece67
+Revises: 1f71e54a85e7
+Create Date: 2013-10-04 15:21:42.318420
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '9b894dbece67'
+down_revision = '1f71e54a85e7'
+
+# Change to ['*'] if this migration applies to all plugins
+
+migration_for_plugins = [
+    '*'
+]
+
+from alembic import op
+
+
+INDEXES = [
+    ('ix_ports_tenant_id', 'ports', ['tenant_id']),
+    ('ix_ports_network_id_device_owner', 'ports',
+     ['network_id', 'device_owner']),
+    ('ix_ports_network_id_mac_address', 'ports',
+     ['network_id', 'mac_address']),
+    ('ix_ports_device_id', 'ports', ['device_id']),
+    ('ix_subnets_tenant_id', 'subnets', ['tenant_id']),
+    ('ix_subnets_network_id', 'subnets', ['network_id']),
+    ('ix_networks_tenant_id', 'networks', ['tenant_id']),
+]
+
+
+def upgrade(active_plugins=None, options=None):
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade(active_plugins=None, options=None):
+    for name, table, columns in INDEXES:
+        op.drop_index(name, table)
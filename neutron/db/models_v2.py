@@ -63,6 +63,12 @@ class IPAvailabilityRange(model_base.BASEV2):
                                    primary_key=True)
     first_ip = sa.Column(sa.String(64), nullable=False, primary_key=True)
     last_ip = sa.Column(sa.String(64), nullable=False, primary_key=True)
+    # first_ip as a fixed width hexadecimal string, which orders like the
+    # addresses, so that the range holding an address can be looked up
+    first_ip_key = sa.Column(sa.String(32), nullable=False)
+    __table_args__ = (
+        sa.Index('ix_ipavailabilityranges_allocation_pool_id_first_ip_key',
+                 'allocation_pool_id', 'first_ip_key'),)
 
     def __repr__(self):
         return "%s - %s" % (self.first_ip, self.last_ip)
@@ -76,6 +82,10 @@ class IPAllocationPool(model_base.BASEV2, HasId):
                           nullable=True)
     first_ip = sa.Column(sa.String(64), nullable=False)
     last_ip = sa.Column(sa.String(64), nullable=False)
+    # Bumped on every change of the available ranges, for the optimistic
+    # concurrency control of the IPAM driver
+    version = sa.Column(sa.Integer, nullable=False, default=0,
+                        server_default='0')
     available_ranges = orm.relationship(IPAvailabilityRange,
                                         backref='ipallocationpool',
                                         lazy="joined",
@@ -128,6 +138,13 @@ class Port(model_base.BASEV2, HasId, HasTenant):
     status = sa.Column(sa.String(16), nullable=False)
     device_id = sa.Column(sa.String(255), nullable=False)
     device_owner = sa.Column(sa.String(255), nullable=False)
+    __table_args__ = (
+        sa.Index('ix_ports_tenant_id', 'tenant_id'),
+        sa.Index('ix_ports_network_id_device_owner',
+                 'network_id', 'device_owner'),
+        sa.Index('ix_ports_network_id_mac_address',
+                 'network_id', 'mac_address'),
+        sa.Index('ix_ports_device_id', 'device_id'))
 
 
 class DNSNameServer(model_base.BASEV2):
@@ -164,6 +181,9 @@ class Subnet(model_base.BASEV2, HasId, HasTenant):
                               backref='subnet',
                               cascade='all, delete, delete-orphan')
     shared = sa.Column(sa.Boolean)
+    __table_args__ = (
+        sa.Index('ix_subnets_tenant_id', 'tenant_id'),
+        sa.Index('ix_subnets_network_id', 'network_id'))
 
 
 class Network(model_base.BASEV2, HasId, HasTenant):
@@ -175,3 +195,4 @@ class Network(model_base.BASEV2, HasId, HasTenant):
     status = sa.Column(sa.String(16))
     admin_state_up = sa.Column(sa.Boolean)
     shared = sa.Column(sa.Boolean)
+    __table_args__ = (sa.Index('ix_networks_tenant_id', 'tenant_id'),)
@@ -15,11 +15,23 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+import weakref
+
+from oslo.config import cfg
 import sqlalchemy as sa
+from sqlalchemy import event
+from sqlalchemy import func
+from sqlalchemy import orm
 
 from neutron.common import exceptions
 from neutron.db import model_base
 from neutron.db import models_v2
+from neutron.openstack.common.db import exception as db_exc
+from neutron.openstack.common import log as logging
+from neutron.openstack.common import timeutils
+
+LOG = logging.getLogger(__name__)
 
 
 class Quota(model_base.BASEV2, models_v2.HasId):
@@ -33,6 +45,102 @@ class Quota(model_base.BASEV2, models_v2.HasId):
     limit = sa.Column(sa.Integer)
 
 
+class QuotaUsage(model_base.BASEV2):
+    """Represent the number of resources a tenant currently has.
+
+    The rows are created on the first reservation of a resource by a tenant
+    and then kept up to date as the tracked resources get created and
+    deleted. A dirty row is recounted on its next reservation.
+    """
+    tenant_id = sa.Column(sa.String(255), primary_key=True)
+    resource = sa.Column(sa.String(255), primary_key=True)
+    in_use = sa.Column(sa.Integer, nullable=False, default=0)
+    dirty = sa.Column(sa.Boolean, nullable=False, default=False)
+
+
+class Reservation(model_base.BASEV2, models_v2.HasId):
+    """Represent resources reserved by a tenant while they get created."""
+    tenant_id = sa.Column(sa.String(255), index=True)
+    resource = sa.Column(sa.String(255))
+    delta = sa.Column(sa.Integer, nullable=False)
+    expiration = sa.Column(sa.DateTime, nullable=False)
+
+
+_TRACKED_RESOURCES = {}
+_tracking_enabled = False
+# The live reservations made through each session, as lists of ids by
+# tenant and resource, for the resources created in the session to consume
+_session_reservations = weakref.WeakKeyDictionary()
+
+
+def _consume_reservation(connection, session, tenant_id, resource):
+    reservations = Reservation.__table__
+    pending = _session_reservations.get(session, {})
+    for reservation_id in pending.get((tenant_id, resource), ()):
+        result = connection.execute(
+            reservations.update().
+            where(reservations.c.id == reservation_id).
+            where(reservations.c.delta > 0).
+            values(delta=reservations.c.delta - 1))
+        if result.rowcount:
+            return
+
+
+def _usage_updater(resource, delta):
+    usages = QuotaUsage.__table__
+
+    def update_usage(mapper, connection, target):
+        # Run within the flush, so that the usage commits or rolls back
+        # along with the resource
+        connection.execute(usages.update().
+                           where(usages.c.tenant_id == target['tenant_id']).
+                           where(usages.c.resource == resource).
+                           values(in_use=usages.c.in_use + delta))
+        if delta > 0:
+            # The resource is now in use, it must not be counted by its
+            # reservation too until that gets committed
+            _consume_reservation(connection, orm.object_session(target),
+                                 target['tenant_id'], resource)
+    return update_usage
+
+
+def _listen(resource, model):
+    event.listen(model, 'after_insert', _usage_updater(resource, 1))
+    event.listen(model, 'after_delete', _usage_updater(resource, -1))
+
+
+def track_resource_usage(resource, model):
+    """Maintain the usages of resource on the inserts and deletes of model.
+
+    The rows of model must have a tenant_id and must only be deleted
+    through the session, bulk deletes are not seen by the tracking. The
+    usages are only maintained once enable_usage_tracking() was called.
+    """
+    if resource in _TRACKED_RESOURCES:
+        return
+    _TRACKED_RESOURCES[resource] = model
+    if _tracking_enabled:
+        _listen(resource, model)
+
+
+def enable_usage_tracking():
+    """Start maintaining the usages of the tracked resources.
+
+    Only the drivers reading the usages enable it, so that the writes of
+    the resources do not update usages nobody reads.
+    """
+    global _tracking_enabled
+    if _tracking_enabled:
+        return
+    _tracking_enabled = True
+    for resource, model in _TRACKED_RESOURCES.iteritems():
+        _listen(resource, model)
+
+
+def is_tracked(resource):
+    return resource in _TRACKED_RESOURCES
+
+
 class DbQuotaDriver(object):
     """Driver to perform necessary checks to enforce quotas and obtain quota
     information.
@@ -40,6 +148,9 @@ class DbQuotaDriver(object):
     The default driver utilizes the local database.
     """
 
+    def __init__(self):
+        enable_usage_tracking()
+
     @staticmethod
     def get_tenant_quotas(context, resources, tenant_id):
         """Given a list of resources, retrieve the quotas for the given
@@ -179,3 +290,156 @@ class DbQuotaDriver(object):
                  if quotas[key] >= 0 and quotas[key] < val]
         if overs:
             raise exceptions.OverQuota(overs=sorted(overs))
+
+    @staticmethod
+    def _count_tracked(context, tenant_id, resource):
+        model = _TRACKED_RESOURCES[resource]
+        query = context.session.query(func.count(model.id))
+        return query.filter_by(tenant_id=tenant_id).scalar()
+
+    def _get_usage(self, context, tenant_id, resource, count):
+        """Return the locked usage of resource, recounting it if needed."""
+        query = context.session.query(QuotaUsage).with_lockmode('update')
+        usage = query.filter_by(tenant_id=tenant_id,
+                                resource=resource).first()
+        if usage is None:
+            usage = QuotaUsage(tenant_id=tenant_id, resource=resource)
+            context.session.add(usage)
+        elif is_tracked(resource) and not usage['dirty']:
+            return usage
+        if is_tracked(resource):
+            usage['in_use'] = self._count_tracked(context, tenant_id,
+                                                  resource)
+        else:
+            usage['in_use'] = count()
+        usage['dirty'] = False
+        return usage
+
+    @staticmethod
+    def _get_reserved(context, tenant_id, resource):
+        query = context.session.query(func.sum(Reservation.delta))
+        query = query.filter(Reservation.tenant_id == tenant_id,
+                             Reservation.resource == resource,
+                             Reservation.expiration > timeutils.utcnow())
+        return query.scalar() or 0
+
+    def make_reservation(self, context, tenant_id, resources, resource,
+                         delta, count):
+        """Reserve delta more of resource for the tenant.
+
+        The usage of the resource is read from its quota usage row, which is
+        locked so that concurrent reservations for the tenant serialize, and
+        the live reservations are accounted as if already in use. Resources
+        whose usage is not tracked are recounted through the count callable.
+
+        :param context: The request context, for access checks.
+        :param tenant_id: The tenant_id to check the quota.
+        :param resources: A dictionary of the registered resources.
+        :param resource: The name of the resource to reserve.
+        :param delta: The number of resources to reserve.
+        :param count: A callable returning the current count of the resource.
+        :returns: the id of the reservation, or None if there was no need
+                  for one.
+        """
+        if delta < 0:
+            raise exceptions.InvalidQuotaValue(unders=[resource])
+
+        limit = self._get_quotas(context, tenant_id, resources,
+                                 [resource])[resource]
+        if limit < 0:
+            # Unlimited, nothing to reserve
+            return
+
+        expiration = timeutils.utcnow() + datetime.timedelta(
+            seconds=cfg.CONF.QUOTAS.reservation_expiration)
+        try:
+            with context.session.begin(subtransactions=True):
+                usage = self._get_usage(context, tenant_id, resource, count)
+                reserved = self._get_reserved(context, tenant_id, resource)
+                if usage['in_use'] + reserved + delta > limit:
+                    raise exceptions.OverQuota(overs=[resource])
+                reservation = Reservation(tenant_id=tenant_id,
+                                          resource=resource,
+                                          delta=delta,
+                                          expiration=expiration)
+                context.session.add(reservation)
+        except db_exc.DBDuplicateEntry:
+            # The usage got concurrently created, it is locked this time
+            LOG.debug(_("Usage of %(resource)s for tenant %(tenant_id)s was "
+                        "concurrently created, retrying"),
+                      {'resource': resource, 'tenant_id': tenant_id})
+            return self.make_reservation(context, tenant_id, resources,
+                                         resource, delta, count)
+        pending = _session_reservations.setdefault(context.session, {})
+        pending.setdefault((tenant_id, resource), []).append(
+            reservation['id'])
+        return reservation['id']
+
+    @staticmethod
+    def _delete_reservation(context, reservation_id):
+        with context.session.begin(subtransactions=True):
+            query = context.session.query(Reservation)
+            query.filter_by(id=reservation_id).delete()
+        for ids in _session_reservations.get(context.session, {}).values():
+            if reservation_id in ids:
+                ids.remove(reservation_id)
+
+    @staticmethod
+    def commit_reservation(context, reservation_id):
+        """Release a reservation once its resources got created.
+
+        The usages were already updated along with the creation of tracked
+        resources, which consumed the reservation in the same transaction
+        when created through the session of the reservation, so this only
+        drops the reservation.
+        """
+        DbQuotaDriver._delete_reservation(context, reservation_id)
+
+    @staticmethod
+    def cancel_reservation(context, reservation_id):
+        """Release a reservation whose resources failed to be created."""
+        DbQuotaDriver._delete_reservation(context, reservation_id)
+
+    @staticmethod
+    def sync_usages(context):
+        """Recount the usages of all the tenants and purge the expired
+        reservations.
+
+        Tracked usages are recounted in place, the usages of the other
+        resources are marked dirty so that they get recounted on their next
+        reservation.
+
+        :param context: The request context, for access checks.
+        :returns: the number of usages which were out of sync.
+        """
+        out_of_sync = 0
+        with context.session.begin(subtransactions=True):
+            usages = context.session.query(QuotaUsage).with_lockmode('update')
+            for usage in usages:
+                resource = usage['resource']
+                if is_tracked(resource):
+                    in_use = DbQuotaDriver._count_tracked(
+                        context, usage['tenant_id'], resource)
+                    if in_use == usage['in_use']:
+                        continue
+                    LOG.info(_("Usage of %(resource)s for tenant "
+                               "%(tenant_id)s out of sync: %(in_use)s "
+                               "recorded, %(count)s counted"),
+                             {'resource': resource,
+                              'tenant_id': usage['tenant_id'],
+                              'in_use': usage['in_use'],
+                              'count': in_use})
+                    usage['in_use'] = in_use
+                    out_of_sync += 1
+                else:
+                    usage['dirty'] = True
+
+            expired = context.session.query(Reservation).filter(
+                Reservation.expiration <= timeutils.utcnow())
+            expired.delete(synchronize_session=False)
+        return out_of_sync
+
+
+track_resource_usage('network', models_v2.Network)
+track_resource_usage('subnet', models_v2.Subnet)
+track_resource_usage('port', models_v2.Port)
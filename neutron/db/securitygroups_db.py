@@ -445,6 +445,10 @@ class SecurityGroupDbMixin(ext_sg.SecurityGroupPluginBase):
     # Register dict extend functions for ports
     db_base_plugin_v2.NeutronDbPluginV2.register_dict_extend_funcs(
         attr.PORTS, ['_extend_port_dict_security_group'])
+    db_base_plugin_v2.NeutronDbPluginV2.register_model_load_profile(
+        models_v2.Port, ['security_groups'])
+    db_base_plugin_v2.NeutronDbPluginV2.register_model_load_profile(
+        SecurityGroup, ['rules'])
 
     def _process_port_create_security_group(self, context, port,
                                             security_group_ids):
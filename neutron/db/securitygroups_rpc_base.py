@@ -21,6 +21,7 @@ from neutron.common import constants as q_const
 from neutron.common import utils
 from neutron.db import models_v2
 from neutron.db import securitygroups_db as sg_db
+from neutron.extensions import allowedaddresspairs as addr_pair
 from neutron.extensions import securitygroup as ext_sg
 from neutron.openstack.common import log as logging
 
@@ -99,11 +100,12 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
                 original_port.get(ext_sg.SECURITYGROUPS),
                 updated_port.get(ext_sg.SECURITYGROUPS))):
             self.notify_security_groups_member_updated(
-                context, updated_port)
+                context, updated_port, original_port)
             need_notify = True
         return need_notify
 
-    def notify_security_groups_member_updated(self, context, port):
+    def notify_security_groups_member_updated(self, context, port,
+                                              original_port=None):
         """Notify update event of security group members.
 
         The agent setups the iptables rule to allow
@@ -113,12 +115,68 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         security_groups_provider_updated() just notifies that an event
         occurs and the plugin agent fetches the update provider
         rule in the other RPC call (security_group_rules_for_devices).
+
+        The member ips of the groups of the port, and of its original
+        groups when it is updated, are notified with the event, so that
+        the agents using ipsets update them without fetching the rules.
         """
         if port['device_owner'] == q_const.DEVICE_OWNER_DHCP:
             self.notifier.security_groups_provider_updated(context)
+            return
+        security_groups = port.get(ext_sg.SECURITYGROUPS)
+        ports = [port]
+        if original_port:
+            security_groups = list(
+                original_port.get(ext_sg.SECURITYGROUPS) or [])
+            security_groups += [
+                sg_id for sg_id in port.get(ext_sg.SECURITYGROUPS) or []
+                if sg_id not in security_groups]
+            ports.append(original_port)
+        if any(port.get(addr_pair.ADDRESS_PAIRS) for port in ports):
+            # The agents fetch the members, with the allowed address pairs
+            self.notifier.security_groups_member_updated(
+                context, security_groups)
         else:
             self.notifier.security_groups_member_updated(
-                context, port.get(ext_sg.SECURITYGROUPS))
+                context, security_groups,
+                member_ips=self._get_member_ips_updates(
+                    context, security_groups, ports))
+
+    def _get_member_ips_updates(self, context, security_group_ids, ports):
+        """Return whether the fixed ips of ports are members of groups.
+
+        The ips are checked against all the ports of the groups, as
+        several ports may have the same ip.
+
+        :returns: the ips, as CIDRs, which are members of each group as
+                  'added' and the other ones as 'removed', by group id.
+        """
+        if not security_group_ids:
+            return {}
+        ips = set()
+        for port in ports:
+            ips.update(ip['ip_address'] for ip in port['fixed_ips'])
+        members = set()
+        if ips:
+            ip_port = models_v2.IPAllocation.port_id
+            ip_address = models_v2.IPAllocation.ip_address
+            sg_binding_port = sg_db.SecurityGroupPortBinding.port_id
+            sg_binding_sgid = sg_db.SecurityGroupPortBinding.security_group_id
+            query = context.session.query(sg_binding_sgid, ip_address)
+            query = query.join(models_v2.IPAllocation,
+                               ip_port == sg_binding_port)
+            query = query.filter(sg_binding_sgid.in_(security_group_ids))
+            query = query.filter(ip_address.in_(ips))
+            members.update((sg_id, ip) for sg_id, ip in query)
+        updates = {}
+        for sg_id in security_group_ids:
+            added = set(str(netaddr.IPNetwork(ip).cidr) for ip in ips
+                        if (sg_id, ip) in members)
+            removed = set(str(netaddr.IPNetwork(ip).cidr)
+                          for ip in ips) - added
+            updates[sg_id] = {'added': sorted(added),
+                              'removed': sorted(removed)}
+        return updates
 
 
 class SecurityGroupServerRpcCallbackMixin(object):
@@ -126,6 +184,9 @@ class SecurityGroupServerRpcCallbackMixin(object):
     implementations.
     """
 
+    # The version and compiled rules of security groups, by group id
+    _rule_sets = {}
+
     def security_group_rules_for_devices(self, context, **kwargs):
         """Return security group rules for each port.
 
@@ -136,31 +197,137 @@ class SecurityGroupServerRpcCallbackMixin(object):
         :returns: port correspond to the devices with security group rules
         """
         devices = kwargs.get('devices')
+        ports = self._get_ports_for_devices(devices)
+        return self._security_group_rules_for_ports(context, ports)
 
+    def security_group_info_for_devices(self, context, **kwargs):
+        """Return security group rules and remote group members.
+
+        Unlike security_group_rules_for_devices, the rules of each
+        security group are returned once for all ports, and
+        remote_group_id rules are not converted to one rule per member,
+        the ips of the members of the remote groups are returned once too.
+
+        :params devices: list of devices
+        :returns: dict with the ports corresponding to the devices, with
+                  their provider rules only, as 'devices', the rules of
+                  their security groups, by group id, as 'security_groups'
+                  and the member ips of each remote group, by ethertype,
+                  as 'sg_member_ips'
+        """
+        devices = kwargs.get('devices')
+        ports = self._get_ports_for_devices(devices)
+        rules = self._get_security_group_rules(
+            context, self._select_security_group_ids(ports))
+        remote_groups = dict(
+            (sg_id, set(rule['remote_group_id'] for rule in sg_rules
+                        if rule.get('remote_group_id')))
+            for sg_id, sg_rules in rules.iteritems())
+        for port in ports.values():
+            source_groups = set()
+            for sg_id in port['security_groups']:
+                source_groups |= remote_groups[sg_id]
+            port['security_group_source_groups'] = sorted(source_groups)
+        self._apply_provider_rule(context, ports)
+        remote_group_ids = set()
+        for group_ids in remote_groups.values():
+            remote_group_ids |= group_ids
+        ips = self._select_ips_for_remote_group(context, remote_group_ids)
+        sg_member_ips = {}
+        for remote_group_id, group_ips in ips.iteritems():
+            members = {q_const.IPv4: set(), q_const.IPv6: set()}
+            for ip in group_ips:
+                net = netaddr.IPNetwork(ip)
+                members['IPv%s' % net.version].add(str(net.cidr))
+            sg_member_ips[remote_group_id] = dict(
+                (ethertype, sorted(member_ips))
+                for ethertype, member_ips in members.iteritems())
+        return {'devices': ports,
+                'security_groups': dict(
+                    (sg_id, [rule.copy() for rule in sg_rules])
+                    for sg_id, sg_rules in rules.iteritems()),
+                'sg_member_ips': sg_member_ips}
+
+    def _get_ports_for_devices(self, devices):
+        if hasattr(self, 'get_ports_from_devices'):
+            # The plugin reads all the ports at once
+            found = self.get_ports_from_devices(devices)
+        else:
+            found = [self.get_port_from_device(device) for device in devices]
         ports = {}
-        for device in devices:
-            port = self.get_port_from_device(device)
+        for port in found:
             if not port:
                 continue
             if port['device_owner'].startswith('network:'):
                 continue
             ports[port['id']] = port
-        return self._security_group_rules_for_ports(context, ports)
+        return ports
 
-    def _select_rules_for_ports(self, context, ports):
-        if not ports:
-            return []
-        sg_binding_port = sg_db.SecurityGroupPortBinding.port_id
-        sg_binding_sgid = sg_db.SecurityGroupPortBinding.security_group_id
+    def _select_security_group_ids(self, ports):
+        security_group_ids = set()
+        for port in ports.values():
+            security_group_ids.update(port['security_groups'])
+        return security_group_ids
 
-        sgr_sgid = sg_db.SecurityGroupRule.security_group_id
+    def _get_security_group_rules(self, context, security_group_ids):
+        """Return the rules of security groups, by group id.
+
+        The compiled rules of each group are cached with the ids of its
+        rules as version. Security group rules are created and deleted but
+        never updated, so that reading the ids of the rules is enough to
+        check that a cached rule set is current, whichever server process
+        changed the rules.
+        """
+        if not security_group_ids:
+            return {}
+        sgr = sg_db.SecurityGroupRule
+        versions = dict((sg_id, set()) for sg_id in security_group_ids)
+        query = context.session.query(sgr.security_group_id, sgr.id)
+        query = query.filter(sgr.security_group_id.in_(security_group_ids))
+        for sg_id, rule_id in query:
+            versions[sg_id].add(rule_id)
+        cache = SecurityGroupServerRpcCallbackMixin._rule_sets
+        rules = {}
+        stale_ids = []
+        for sg_id, version in versions.iteritems():
+            cached = cache.get(sg_id)
+            if cached and cached[0] == version:
+                rules[sg_id] = cached[1]
+            else:
+                stale_ids.append(sg_id)
+        if stale_ids:
+            rule_ids = dict((sg_id, set()) for sg_id in stale_ids)
+            for sg_id in stale_ids:
+                rules[sg_id] = []
+            query = context.session.query(sgr)
+            query = query.filter(sgr.security_group_id.in_(stale_ids))
+            for rule_in_db in query:
+                sg_id = rule_in_db['security_group_id']
+                rule_ids[sg_id].add(rule_in_db['id'])
+                rules[sg_id].append(self._make_rule_dict(rule_in_db))
+            for sg_id in stale_ids:
+                if rule_ids[sg_id]:
+                    cache[sg_id] = (rule_ids[sg_id], rules[sg_id])
+                else:
+                    cache.pop(sg_id, None)
+        return rules
 
-        query = context.session.query(sg_db.SecurityGroupPortBinding,
-                                      sg_db.SecurityGroupRule)
-        query = query.join(sg_db.SecurityGroupRule,
-                           sgr_sgid == sg_binding_sgid)
-        query = query.filter(sg_binding_port.in_(ports.keys()))
-        return query.all()
+    def _make_rule_dict(self, rule_in_db):
+        direction = rule_in_db['direction']
+        rule_dict = {
+            'security_group_id': rule_in_db['security_group_id'],
+            'direction': direction,
+            'ethertype': rule_in_db['ethertype'],
+        }
+        for key in ('protocol', 'port_range_min', 'port_range_max',
+                    'remote_ip_prefix', 'remote_group_id'):
+            if rule_in_db.get(key):
+                if key == 'remote_ip_prefix':
+                    direction_ip_prefix = DIRECTION_IP_PREFIX[direction]
+                    rule_dict[direction_ip_prefix] = rule_in_db[key]
+                    continue
+                rule_dict[key] = rule_in_db[key]
+        return rule_dict
 
     def _select_ips_for_remote_group(self, context, remote_group_ids):
         ips_by_group = {}
@@ -287,24 +454,14 @@ class SecurityGroupServerRpcCallbackMixin(object):
             self._add_ingress_dhcp_rule(port, ips)
 
     def _security_group_rules_for_ports(self, context, ports):
-        rules_in_db = self._select_rules_for_ports(context, ports)
-        for (binding, rule_in_db) in rules_in_db:
-            port_id = binding['port_id']
-            port = ports[port_id]
-            direction = rule_in_db['direction']
-            rule_dict = {
-                'security_group_id': rule_in_db['security_group_id'],
-                'direction': direction,
-                'ethertype': rule_in_db['ethertype'],
-            }
-            for key in ('protocol', 'port_range_min', 'port_range_max',
-                        'remote_ip_prefix', 'remote_group_id'):
-                if rule_in_db.get(key):
-                    if key == 'remote_ip_prefix':
-                        direction_ip_prefix = DIRECTION_IP_PREFIX[direction]
-                        rule_dict[direction_ip_prefix] = rule_in_db[key]
-                        continue
-                    rule_dict[key] = rule_in_db[key]
-            port['security_group_rules'].append(rule_dict)
-        self._apply_provider_rule(context, ports)
+        self._add_security_group_rules(context, ports)
         return self._convert_remote_group_id_to_ip_prefix(context, ports)
+
+    def _add_security_group_rules(self, context, ports):
+        rules = self._get_security_group_rules(
+            context, self._select_security_group_ids(ports))
+        for port in ports.values():
+            for sg_id in port['security_groups']:
+                port['security_group_rules'].extend(
+                    rule.copy() for rule in rules[sg_id])
+        self._apply_provider_rule(context, ports)
@@ -389,7 +389,9 @@ class LoadBalancerPluginBase(ServicePluginBase):
         return 'LoadBalancer service plugin'
 
     @abc.abstractmethod
-    def get_vips(self, context, filters=None, fields=None):
+    def get_vips(self, context, filters=None, fields=None,
+                 sorts=None, limit=None, marker=None,
+                 page_reverse=False):
         pass
 
     @abc.abstractmethod
@@ -409,7 +411,9 @@ class LoadBalancerPluginBase(ServicePluginBase):
         pass
 
     @abc.abstractmethod
-    def get_pools(self, context, filters=None, fields=None):
+    def get_pools(self, context, filters=None, fields=None,
+                  sorts=None, limit=None, marker=None,
+                  page_reverse=False):
         pass
 
     @abc.abstractmethod
@@ -445,7 +449,9 @@ class LoadBalancerPluginBase(ServicePluginBase):
         pass
 
     @abc.abstractmethod
-    def get_members(self, context, filters=None, fields=None):
+    def get_members(self, context, filters=None, fields=None,
+                    sorts=None, limit=None, marker=None,
+                    page_reverse=False):
         pass
 
     @abc.abstractmethod
@@ -465,7 +471,9 @@ class LoadBalancerPluginBase(ServicePluginBase):
         pass
 
     @abc.abstractmethod
-    def get_health_monitors(self, context, filters=None, fields=None):
+    def get_health_monitors(self, context, filters=None, fields=None,
+                            sorts=None, limit=None, marker=None,
+                            page_reverse=False):
         pass
 
     @abc.abstractmethod
@@ -418,7 +418,9 @@ class VPNPluginBase(ServicePluginBase):
         return 'VPN service plugin'
 
     @abc.abstractmethod
-    def get_vpnservices(self, context, filters=None, fields=None):
+    def get_vpnservices(self, context, filters=None, fields=None,
+                        sorts=None, limit=None, marker=None,
+                        page_reverse=False):
         pass
 
     @abc.abstractmethod
@@ -438,7 +440,9 @@ class VPNPluginBase(ServicePluginBase):
         pass
 
     @abc.abstractmethod
-    def get_ipsec_site_connections(self, context, filters=None, fields=None):
+    def get_ipsec_site_connections(self, context, filters=None, fields=None,
+                                   sorts=None, limit=None, marker=None,
+                                   page_reverse=False):
         pass
 
     @abc.abstractmethod
@@ -464,7 +468,9 @@ class VPNPluginBase(ServicePluginBase):
         pass
 
     @abc.abstractmethod
-    def get_ikepolicies(self, context, filters=None, fields=None):
+    def get_ikepolicies(self, context, filters=None, fields=None,
+                        sorts=None, limit=None, marker=None,
+                        page_reverse=False):
         pass
 
     @abc.abstractmethod
@@ -480,7 +486,9 @@ class VPNPluginBase(ServicePluginBase):
         pass
 
     @abc.abstractmethod
-    def get_ipsecpolicies(self, context, filters=None, fields=None):
+    def get_ipsecpolicies(self, context, filters=None, fields=None,
+                          sorts=None, limit=None, marker=None,
+                          page_reverse=False):
         pass
 
     @abc.abstractmethod
@@ -749,7 +749,7 @@ class LinuxBridgeNeutronAgentRPC(sg_rpc.SecurityGroupAgentRpcMixin):
             'start_flag': True}
 
         self.setup_rpc(interface_mappings.values())
-        self.init_firewall()
+        self.init_firewall(defer_refresh_firewall=True)
 
     def _report_state(self):
         try:
@@ -821,18 +821,18 @@ class LinuxBridgeNeutronAgentRPC(sg_rpc.SecurityGroupAgentRpcMixin):
     def treat_devices_added(self, devices):
         resync = False
         self.prepare_devices_filter(devices)
-        for device in devices:
-            LOG.debug(_("Port %s added"), device)
-            try:
-                details = self.plugin_rpc.get_device_details(self.context,
-                                                             device,
-                                                             self.agent_id)
-            except Exception as e:
-                LOG.debug(_("Unable to get port details for "
-                            "%(device)s: %(e)s"),
-                          {'device': device, 'e': e})
-                resync = True
-                continue
+        LOG.debug(_("Ports %s added"), devices)
+        try:
+            devices_details = self.plugin_rpc.get_devices_details_list(
+                self.context, list(devices), self.agent_id)
+        except Exception as e:
+            LOG.debug(_("Unable to get port details for "
+                        "%(devices)s: %(e)s"),
+                      {'devices': devices, 'e': e})
+            return True
+        devices_up = []
+        for details in devices_details:
+            device = details['device']
             if 'port_id' in details:
                 LOG.info(_("Port %(device)s updated. Details: %(details)s"),
                          {'device': device, 'details': details})
@@ -851,11 +851,7 @@ class LinuxBridgeNeutronAgentRPC(sg_rpc.SecurityGroupAgentRpcMixin):
                                                  details['physical_network'],
                                                  segmentation_id,
                                                  details['port_id']):
-
-                        # update plugin about port status
-                        self.plugin_rpc.update_device_up(self.context,
-                                                         device,
-                                                         self.agent_id)
+                        devices_up.append(device)
                     else:
                         self.plugin_rpc.update_device_down(self.context,
                                                            device,
@@ -865,6 +861,15 @@ class LinuxBridgeNeutronAgentRPC(sg_rpc.SecurityGroupAgentRpcMixin):
                                              details['port_id'])
             else:
                 LOG.info(_("Device %s not defined on plugin"), device)
+        if devices_up:
+            # update plugin about port status
+            try:
+                self.plugin_rpc.update_devices_up(self.context, devices_up,
+                                                  self.agent_id)
+            except Exception as e:
+                LOG.debug(_("Unable to update the status of %(devices)s: "
+                            "%(e)s"), {'devices': devices_up, 'e': e})
+                resync = True
         return resync
 
     def treat_devices_removed(self, devices):
@@ -913,6 +918,10 @@ class LinuxBridgeNeutronAgentRPC(sg_rpc.SecurityGroupAgentRpcMixin):
                     # plugin
                     sync = self.process_network_devices(device_info)
                     devices = device_info['current']
+                # Refresh the filters once for all the security group
+                # updates received during the iteration
+                if self.firewall_refresh_needed():
+                    self.refresh_pending_firewall()
             except Exception:
                 LOG.exception(_("Error in agent loop. Devices info: %s"),
                               device_info)
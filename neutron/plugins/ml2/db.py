@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from sqlalchemy import sql
 from sqlalchemy.orm import exc
 
 from neutron.db import api as db_api
@@ -27,6 +28,9 @@ from neutron.plugins.ml2 import models
 
 LOG = log.getLogger(__name__)
 
+# Length of the string representation of a UUID
+PORT_ID_LENGTH = 36
+
 
 def initialize():
     db_api.configure_db()
@@ -60,6 +64,23 @@ def get_network_segments(session, network_id):
                 for record in records]
 
 
+def get_networks_segments(session, network_ids):
+    """Return the segments of several networks, by network id."""
+    segments = dict((network_id, []) for network_id in network_ids)
+    if not network_ids:
+        return segments
+    with session.begin(subtransactions=True):
+        records = (session.query(models.NetworkSegment).
+                   filter(models.NetworkSegment.network_id.in_(network_ids)))
+        for record in records:
+            segments[record.network_id].append(
+                {api.ID: record.id,
+                 api.NETWORK_TYPE: record.network_type,
+                 api.PHYSICAL_NETWORK: record.physical_network,
+                 api.SEGMENTATION_ID: record.segmentation_id})
+    return segments
+
+
 def ensure_port_binding(session, port_id):
     with session.begin(subtransactions=True):
         try:
@@ -76,6 +97,27 @@ def ensure_port_binding(session, port_id):
         return record
 
 
+def ensure_port_bindings(session, port_ids):
+    """Return the bindings of several ports, by port id.
+
+    Bindings are created for the ports which have none.
+    """
+    with session.begin(subtransactions=True):
+        bindings = {}
+        if port_ids:
+            query = session.query(models.PortBinding)
+            query = query.filter(models.PortBinding.port_id.in_(port_ids))
+            bindings = dict((record.port_id, record) for record in query)
+        for port_id in set(port_ids) - set(bindings):
+            bindings[port_id] = models.PortBinding(
+                port_id=port_id,
+                host='',
+                vif_type=portbindings.VIF_TYPE_UNBOUND,
+                cap_port_filter=False)
+            session.add(bindings[port_id])
+        return bindings
+
+
 def get_port(session, port_id):
     """Get port record for update within transcation."""
 
@@ -93,6 +135,41 @@ def get_port(session, port_id):
             return
 
 
+def get_ports(session, port_ids):
+    """Get port records for update within transaction.
+
+    The port ids may be truncated, as in the names of the devices of the
+    ports, the records are then matched on the prefix.
+
+    :returns: a dict mapping each of the given ids to its port, ids
+              matching no port or several ports are left out.
+    """
+    full_ids = set(port_id for port_id in port_ids
+                   if len(port_id) == PORT_ID_LENGTH)
+    prefixes = set(port_ids) - full_ids
+    ports = {}
+    with session.begin(subtransactions=True):
+        query = session.query(models_v2.Port)
+        if full_ids:
+            for record in query.filter(models_v2.Port.id.in_(full_ids)):
+                ports[record.id] = record
+        if prefixes:
+            matched = {}
+            records = query.filter(sql.or_(*[
+                models_v2.Port.id.startswith(prefix) for prefix in prefixes]))
+            for record in records:
+                for prefix in prefixes:
+                    if record.id.startswith(prefix):
+                        matched.setdefault(prefix, []).append(record)
+            for prefix, records in matched.iteritems():
+                if len(records) > 1:
+                    LOG.error(_("Multiple ports have port_id starting with "
+                                "%s"), prefix)
+                else:
+                    ports[prefix] = records[0]
+    return ports
+
+
 def get_port_and_sgs(port_id):
     """Get port from database with security group info."""
 
@@ -119,3 +196,40 @@ def get_port_and_sgs(port_id):
         port_dict['fixed_ips'] = [ip['ip_address']
                                   for ip in port['fixed_ips']]
         return port_dict
+
+
+def get_ports_and_sgs(port_ids):
+    """Get ports from database with security group info.
+
+    The ports and their security group bindings are read with one query
+    each.
+
+    :returns: a dict mapping each of the given, possibly truncated, port
+              ids to its port.
+    """
+
+    LOG.debug(_("get_ports_and_sgs() called for port_ids %s"), port_ids)
+    session = db_api.get_session()
+    sg_binding_port = sg_db.SecurityGroupPortBinding.port_id
+
+    with session.begin(subtransactions=True):
+        records = get_ports(session, port_ids)
+        if not records:
+            return {}
+        sg_ids = dict((port.id, []) for port in records.values())
+        query = session.query(sg_binding_port,
+                              sg_db.SecurityGroupPortBinding.security_group_id)
+        query = query.filter(sg_binding_port.in_(sg_ids.keys()))
+        for port_id, sg_id in query:
+            sg_ids[port_id].append(sg_id)
+        plugin = manager.NeutronManager.get_plugin()
+        ports = {}
+        for port_id, port in records.iteritems():
+            port_dict = plugin._make_port_dict(port)
+            port_dict['security_groups'] = sg_ids[port.id]
+            port_dict['security_group_rules'] = []
+            port_dict['security_group_source_groups'] = []
+            port_dict['fixed_ips'] = [ip['ip_address']
+                                      for ip in port['fixed_ips']]
+            ports[port_id] = port_dict
+        return ports
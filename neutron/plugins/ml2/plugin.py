@@ -118,11 +118,14 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
         )
         self.callbacks = rpc.RpcCallbacks(self.notifier, self.type_manager)
         self.topic = topics.PLUGIN
+
+    def start_rpc_listener(self):
         self.conn = c_rpc.create_connection(new=True)
         self.dispatcher = self.callbacks.create_rpc_dispatcher()
         self.conn.create_consumer(self.topic, self.dispatcher,
                                   fanout=False)
         self.conn.consume_in_thread()
+        return [self.conn]
 
     def _process_provider_segment(self, segment):
         network_type = self._get_attribute(segment, provider.NETWORK_TYPE)
@@ -40,10 +40,12 @@ class RpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
                    sg_db_rpc.SecurityGroupServerRpcCallbackMixin,
                    type_tunnel.TunnelRpcCallbackMixin):
 
-    RPC_API_VERSION = '1.1'
+    RPC_API_VERSION = '1.3'
     # history
     #   1.0 Initial version (from openvswitch/linuxbridge)
     #   1.1 Support Security Group RPC
+    #   1.2 Support get_devices_details_list and update_devices_up
+    #   1.3 Support security_group_info_for_devices
 
     def __init__(self, notifier, type_manager):
         # REVISIT(kmestery): This depends on the first three super classes
@@ -79,6 +81,19 @@ class RpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
             port['device'] = device
         return port
 
+    @classmethod
+    def get_ports_from_devices(cls, devices):
+        port_ids = dict((device, cls._device_to_port_id(device))
+                        for device in devices)
+        ports = db.get_ports_and_sgs(port_ids.values())
+        result = []
+        for device, port_id in port_ids.iteritems():
+            port = ports.get(port_id)
+            if port:
+                port['device'] = device
+                result.append(port)
+        return result
+
     def get_device_details(self, rpc_context, **kwargs):
         """Agent requests device details."""
         agent_id = kwargs.get('agent_id')
@@ -92,56 +107,105 @@ class RpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
         with session.begin(subtransactions=True):
             port = db.get_port(session, port_id)
             if not port:
-                LOG.warning(_("Device %(device)s requested by agent "
-                              "%(agent_id)s not found in database"),
-                            {'device': device, 'agent_id': agent_id})
-                return {'device': device}
-
+                return self._get_device_details(device, agent_id, None,
+                                                None, None)
             segments = db.get_network_segments(session, port.network_id)
-            if not segments:
-                LOG.warning(_("Device %(device)s requested by agent "
-                              "%(agent_id)s has network %(network_id)s with "
-                              "no segments"),
-                            {'device': device,
-                             'agent_id': agent_id,
-                             'network_id': port.network_id})
-                return {'device': device}
-
-            binding = db.ensure_port_binding(session, port.id)
-            if not binding.segment:
-                LOG.warning(_("Device %(device)s requested by agent "
-                              "%(agent_id)s on network %(network_id)s not "
-                              "bound, vif_type: %(vif_type)s"),
-                            {'device': device,
-                             'agent_id': agent_id,
-                             'network_id': port.network_id,
-                             'vif_type': binding.vif_type})
-                return {'device': device}
-
-            segment = self._find_segment(segments, binding.segment)
-            if not segment:
-                LOG.warning(_("Device %(device)s requested by agent "
-                              "%(agent_id)s on network %(network_id)s "
-                              "invalid segment, vif_type: %(vif_type)s"),
-                            {'device': device,
-                             'agent_id': agent_id,
-                             'network_id': port.network_id,
-                             'vif_type': binding.vif_type})
-                return {'device': device}
-
-            new_status = (q_const.PORT_STATUS_BUILD if port.admin_state_up
-                          else q_const.PORT_STATUS_DOWN)
-            if port.status != new_status:
-                port.status = new_status
-            entry = {'device': device,
-                     'network_id': port.network_id,
-                     'port_id': port.id,
-                     'admin_state_up': port.admin_state_up,
-                     'network_type': segment[api.NETWORK_TYPE],
-                     'segmentation_id': segment[api.SEGMENTATION_ID],
-                     'physical_network': segment[api.PHYSICAL_NETWORK]}
-            LOG.debug(_("Returning: %s"), entry)
-            return entry
+            binding = None
+            if segments:
+                binding = db.ensure_port_binding(session, port.id)
+            return self._get_device_details(device, agent_id, port,
+                                            segments, binding)
+
+    def get_devices_details_list(self, rpc_context, **kwargs):
+        """Agent requests the details of several devices.
+
+        The ports, segments and bindings of all the devices are read with
+        one query each.
+        """
+        agent_id = kwargs.get('agent_id')
+        devices = kwargs.get('devices', [])
+        LOG.debug(_("Details of %(count)d devices requested by agent "
+                    "%(agent_id)s"),
+                  {'count': len(devices), 'agent_id': agent_id})
+        port_ids = dict((device, self._device_to_port_id(device))
+                        for device in devices)
+
+        session = db_api.get_session()
+        with session.begin(subtransactions=True):
+            ports = db.get_ports(session, port_ids.values())
+            segments = db.get_networks_segments(
+                session, set(port.network_id for port in ports.values()))
+            bindings = db.ensure_port_bindings(
+                session, [port.id for port in ports.values()
+                          if segments[port.network_id]])
+            details = []
+            for device in devices:
+                port = ports.get(port_ids[device])
+                if port:
+                    details.append(self._get_device_details(
+                        device, agent_id, port, segments[port.network_id],
+                        bindings.get(port.id)))
+                else:
+                    details.append(self._get_device_details(
+                        device, agent_id, None, None, None))
+            return details
+
+    def _get_device_details(self, device, agent_id, port, segments,
+                            binding):
+        """Return the details of a device, from its port records.
+
+        Must be called within the transaction which read the records, the
+        status of the port is updated.
+        """
+        if not port:
+            LOG.warning(_("Device %(device)s requested by agent "
+                          "%(agent_id)s not found in database"),
+                        {'device': device, 'agent_id': agent_id})
+            return {'device': device}
+
+        if not segments:
+            LOG.warning(_("Device %(device)s requested by agent "
+                          "%(agent_id)s has network %(network_id)s with "
+                          "no segments"),
+                        {'device': device,
+                         'agent_id': agent_id,
+                         'network_id': port.network_id})
+            return {'device': device}
+
+        if not binding.segment:
+            LOG.warning(_("Device %(device)s requested by agent "
+                          "%(agent_id)s on network %(network_id)s not "
+                          "bound, vif_type: %(vif_type)s"),
+                        {'device': device,
+                         'agent_id': agent_id,
+                         'network_id': port.network_id,
+                         'vif_type': binding.vif_type})
+            return {'device': device}
+
+        segment = self._find_segment(segments, binding.segment)
+        if not segment:
+            LOG.warning(_("Device %(device)s requested by agent "
+                          "%(agent_id)s on network %(network_id)s "
+                          "invalid segment, vif_type: %(vif_type)s"),
+                        {'device': device,
+                         'agent_id': agent_id,
+                         'network_id': port.network_id,
+                         'vif_type': binding.vif_type})
+            return {'device': device}
+
+        new_status = (q_const.PORT_STATUS_BUILD if port.admin_state_up
+                      else q_const.PORT_STATUS_DOWN)
+        if port.status != new_status:
+            port.status = new_status
+        entry = {'device': device,
+                 'network_id': port.network_id,
+                 'port_id': port.id,
+                 'admin_state_up': port.admin_state_up,
+                 'network_type': segment[api.NETWORK_TYPE],
+                 'segmentation_id': segment[api.SEGMENTATION_ID],
+                 'physical_network': segment[api.PHYSICAL_NETWORK]}
+        LOG.debug(_("Returning: %s"), entry)
+        return entry
 
     def _find_segment(self, segments, segment_id):
         for segment in segments:
@@ -177,6 +241,18 @@ class RpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
         plugin.update_port_status(rpc_context, port_id,
                                   q_const.PORT_STATUS_ACTIVE)
 
+    def update_devices_up(self, rpc_context, **kwargs):
+        """Several devices are up on agent."""
+        agent_id = kwargs.get('agent_id')
+        devices = kwargs.get('devices', [])
+        LOG.debug(_("Devices %(devices)s up at agent %(agent_id)s"),
+                  {'devices': devices, 'agent_id': agent_id})
+        plugin = manager.NeutronManager.get_plugin()
+        for device in devices:
+            plugin.update_port_status(rpc_context,
+                                      self._device_to_port_id(device),
+                                      q_const.PORT_STATUS_ACTIVE)
+
 
 class AgentNotifierApi(proxy.RpcProxy,
                        sg_rpc.SecurityGroupAgentRpcApiMixin,
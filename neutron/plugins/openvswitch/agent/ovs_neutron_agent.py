@@ -22,6 +22,7 @@
 # @author: Seetharama Ayyadevara, Freescale Semiconductor, Inc.
 # @author: Kyle Mestery, Cisco Systems, Inc.
 
+import contextlib
 import distutils.version as dist_version
 import sys
 import time
@@ -32,6 +33,7 @@ from oslo.config import cfg
 from neutron.agent import l2population_rpc
 from neutron.agent.linux import ip_lib
 from neutron.agent.linux import ovs_lib
+from neutron.agent.linux import polling
 from neutron.agent import rpc as agent_rpc
 from neutron.agent import securitygroups_rpc as sg_rpc
 from neutron.common import config as logging_config
@@ -116,7 +118,7 @@ class OVSSecurityGroupAgent(sg_rpc.SecurityGroupAgentRpcMixin):
         self.context = context
         self.plugin_rpc = plugin_rpc
         self.root_helper = root_helper
-        self.init_firewall()
+        self.init_firewall(defer_refresh_firewall=True)
 
 
 class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
@@ -155,7 +157,10 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
     def __init__(self, integ_br, tun_br, local_ip,
                  bridge_mappings, root_helper,
                  polling_interval, tunnel_types=None,
-                 veth_mtu=None, l2_population=False):
+                 veth_mtu=None, l2_population=False,
+                 minimize_polling=False,
+                 ovsdb_monitor_respawn_interval=(
+                     constants.DEFAULT_OVSDBMON_RESPAWN)):
         '''Constructor.
 
         :param integ_br: name of the integration bridge.
@@ -168,6 +173,11 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                the agent. If set, will automatically set enable_tunneling to
                True.
         :param veth_mtu: MTU size for veth interfaces.
+        :param minimize_polling: Optional, whether to minimize polling by
+               monitoring ovsdb for interface changes.
+        :param ovsdb_monitor_respawn_interval: Optional, when using polling
+               minimization, the number of seconds to wait before respawning
+               the ovsdb monitor.
         '''
         self.veth_mtu = veth_mtu
         self.root_helper = root_helper
@@ -198,6 +208,8 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                                constants.TYPE_VXLAN: {}}
 
         self.polling_interval = polling_interval
+        self.minimize_polling = minimize_polling
+        self.ovsdb_monitor_respawn_interval = ovsdb_monitor_respawn_interval
 
         if tunnel_types:
             self.enable_tunneling = True
@@ -687,6 +699,7 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                         "Agent terminated!"))
             exit(1)
         self.tun_br.remove_all_flows()
+        self.tun_br.defer_apply_on()
 
         # Table 0 (default) will sort incoming traffic depending on in_port
         self.tun_br.add_flow(priority=1,
@@ -740,6 +753,7 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
         self.tun_br.add_flow(table=constants.FLOOD_TO_TUN,
                              priority=0,
                              actions="drop")
+        self.tun_br.defer_apply_off()
 
     def setup_physical_bridges(self, bridge_mappings):
         '''Setup the physical network bridges.
@@ -881,82 +895,105 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                     self.tun_br.delete_port(port_name)
                     self.tun_br_ofports[tunnel_type].pop(remote_ip, None)
 
+    @contextlib.contextmanager
+    def _defer_apply_flows(self):
+        """Apply the flows changed within the block in batches.
+
+        The flow changes of each bridge are applied by one ovs-ofctl call
+        per run of changes of the same kind, rather than one per flow.
+        """
+        bridges = [self.int_br] + self.phys_brs.values()
+        if self.enable_tunneling:
+            bridges.append(self.tun_br)
+        for bridge in bridges:
+            bridge.defer_apply_on()
+        try:
+            yield
+        finally:
+            for bridge in bridges:
+                bridge.defer_apply_off()
+
     def treat_devices_added(self, devices):
         resync = False
         self.sg_agent.prepare_devices_filter(devices)
-        for device in devices:
-            LOG.info(_("Port %s added"), device)
+        LOG.info(_("Ports %s added"), devices)
+        try:
+            devices_details = self.plugin_rpc.get_devices_details_list(
+                self.context, list(devices), self.agent_id)
+        except Exception as e:
+            LOG.debug(_("Unable to get port details for "
+                        "%(devices)s: %(e)s"),
+                      {'devices': devices, 'e': e})
+            return True
+        vif_ports = self.int_br.get_vif_ports_by_ids(
+            [details['device'] for details in devices_details])
+        devices_up = []
+        with self._defer_apply_flows():
+            for details in devices_details:
+                device = details['device']
+                port = vif_ports.get(device)
+                if 'port_id' in details:
+                    LOG.info(_("Port %(device)s updated. Details: "
+                               "%(details)s"),
+                             {'device': device, 'details': details})
+                    self.treat_vif_port(port, details['port_id'],
+                                        details['network_id'],
+                                        details['network_type'],
+                                        details['physical_network'],
+                                        details['segmentation_id'],
+                                        details['admin_state_up'])
+                    devices_up.append(device)
+                else:
+                    LOG.debug(_("Device %s not defined on plugin"), device)
+                    if (port and int(port.ofport) != -1):
+                        self.port_dead(port)
+        if devices_up:
+            # update plugin about port status
             try:
-                details = self.plugin_rpc.get_device_details(self.context,
-                                                             device,
-                                                             self.agent_id)
+                self.plugin_rpc.update_devices_up(self.context, devices_up,
+                                                  self.agent_id)
             except Exception as e:
-                LOG.debug(_("Unable to get port details for "
-                            "%(device)s: %(e)s"),
-                          {'device': device, 'e': e})
+                LOG.debug(_("Unable to update the status of %(devices)s: "
+                            "%(e)s"), {'devices': devices_up, 'e': e})
                 resync = True
-                continue
-            port = self.int_br.get_vif_port_by_id(details['device'])
-            if 'port_id' in details:
-                LOG.info(_("Port %(device)s updated. Details: %(details)s"),
-                         {'device': device, 'details': details})
-                self.treat_vif_port(port, details['port_id'],
-                                    details['network_id'],
-                                    details['network_type'],
-                                    details['physical_network'],
-                                    details['segmentation_id'],
-                                    details['admin_state_up'])
-
-                # update plugin about port status
-                self.plugin_rpc.update_device_up(self.context,
-                                                 device,
-                                                 self.agent_id)
-            else:
-                LOG.debug(_("Device %s not defined on plugin"), device)
-                if (port and int(port.ofport) != -1):
-                    self.port_dead(port)
         return resync
 
     def treat_ancillary_devices_added(self, devices):
-        resync = False
-        for device in devices:
-            LOG.info(_("Ancillary Port %s added"), device)
-            try:
-                self.plugin_rpc.get_device_details(self.context, device,
-                                                   self.agent_id)
-            except Exception as e:
-                LOG.debug(_("Unable to get port details for "
-                            "%(device)s: %(e)s"),
-                          {'device': device, 'e': e})
-                resync = True
-                continue
-
+        LOG.info(_("Ancillary Ports %s added"), devices)
+        try:
+            self.plugin_rpc.get_devices_details_list(self.context,
+                                                     list(devices),
+                                                     self.agent_id)
             # update plugin about port status
-            self.plugin_rpc.update_device_up(self.context,
-                                             device,
-                                             self.agent_id)
-        return resync
+            self.plugin_rpc.update_devices_up(self.context, list(devices),
+                                              self.agent_id)
+        except Exception as e:
+            LOG.debug(_("Unable to get port details for "
+                        "%(devices)s: %(e)s"),
+                      {'devices': devices, 'e': e})
+            return True
+        return False
 
     def treat_devices_removed(self, devices):
         resync = False
         self.sg_agent.remove_devices_filter(devices)
-        for device in devices:
-            LOG.info(_("Attachment %s removed"), device)
-            try:
-                details = self.plugin_rpc.update_device_down(self.context,
-                                                             device,
-                                                             self.agent_id)
-            except Exception as e:
-                LOG.debug(_("port_removed failed for %(device)s: %(e)s"),
-                          {'device': device, 'e': e})
-                resync = True
-                continue
-            if details['exists']:
-                LOG.info(_("Port %s updated."), device)
-                # Nothing to do regarding local networking
-            else:
-                LOG.debug(_("Device %s not defined on plugin"), device)
-                self.port_unbound(device)
+        with self._defer_apply_flows():
+            for device in devices:
+                LOG.info(_("Attachment %s removed"), device)
+                try:
+                    details = self.plugin_rpc.update_device_down(
+                        self.context, device, self.agent_id)
+                except Exception as e:
+                    LOG.debug(_("port_removed failed for %(device)s: %(e)s"),
+                              {'device': device, 'e': e})
+                    resync = True
+                    continue
+                if details['exists']:
+                    LOG.info(_("Port %s updated."), device)
+                    # Nothing to do regarding local networking
+                else:
+                    LOG.debug(_("Device %s not defined on plugin"), device)
+                    self.port_unbound(device)
         return resync
 
     def treat_ancillary_devices_removed(self, devices):
@@ -1022,7 +1059,10 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
             resync = True
         return resync
 
-    def rpc_loop(self):
+    def rpc_loop(self, polling_manager=None):
+        if not polling_manager:
+            polling_manager = polling.AlwaysPoll()
+
         sync = True
         ports = set()
         ancillary_ports = set()
@@ -1036,38 +1076,50 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                     ports.clear()
                     ancillary_ports.clear()
                     sync = False
+                    polling_manager.force_polling()
 
                 # Notify the plugin of tunnel IP
                 if self.enable_tunneling and tunnel_sync:
                     LOG.info(_("Agent tunnel out of sync with plugin!"))
                     tunnel_sync = self.tunnel_sync()
 
-                port_info = self.update_ports(ports)
-
-                # notify plugin about port deltas
-                if port_info:
-                    LOG.debug(_("Agent loop has new devices!"))
-                    # If treat devices fails - must resync with plugin
-                    sync = self.process_network_ports(port_info)
-                    ports = port_info['current']
+                if polling_manager.is_polling_required:
+                    port_info = self.update_ports(ports)
 
-                # Treat ancillary devices if they exist
-                if self.ancillary_brs:
-                    port_info = self.update_ancillary_ports(ancillary_ports)
+                    # notify plugin about port deltas
                     if port_info:
-                        rc = self.process_ancillary_network_ports(port_info)
-                        ancillary_ports = port_info['current']
-                        sync = sync | rc
+                        LOG.debug(_("Agent loop has new devices!"))
+                        # If treat devices fails - must resync with plugin
+                        sync = self.process_network_ports(port_info)
+                        ports = port_info['current']
+
+                    # Treat ancillary devices if they exist
+                    if self.ancillary_brs:
+                        port_info = self.update_ancillary_ports(
+                            ancillary_ports)
+                        if port_info:
+                            rc = self.process_ancillary_network_ports(
+                                port_info)
+                            ancillary_ports = port_info['current']
+                            sync = sync | rc
+
+                    polling_manager.polling_completed()
+
+                # Refresh the filters once for all the security group
+                # updates received during the iteration
+                if self.sg_agent.firewall_refresh_needed():
+                    self.sg_agent.refresh_pending_firewall()
 
             except Exception:
                 LOG.exception(_("Error in agent event loop"))
                 sync = True
                 tunnel_sync = True
 
-            # sleep till end of polling interval
+            # sleep till end of polling interval, the polling manager
+            # returning earlier if it detects device changes
             elapsed = (time.time() - start)
             if (elapsed < self.polling_interval):
-                time.sleep(self.polling_interval - elapsed)
+                polling_manager.wait(self.polling_interval - elapsed)
             else:
                 LOG.debug(_("Loop iteration exceeded interval "
                             "(%(polling_interval)s vs. %(elapsed)s)!"),
@@ -1075,7 +1127,12 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                            'elapsed': elapsed})
 
     def daemon_loop(self):
-        self.rpc_loop()
+        with polling.get_polling_manager(
+                self.minimize_polling,
+                self.root_helper,
+                self.ovsdb_monitor_respawn_interval) as pm:
+
+            self.rpc_loop(polling_manager=pm)
 
 
 def check_ovs_version(min_required_version, root_helper):
@@ -1137,6 +1194,9 @@ def create_agent_config_map(config):
         tunnel_types=config.AGENT.tunnel_types,
         veth_mtu=config.AGENT.veth_mtu,
         l2_population=config.AGENT.l2_population,
+        minimize_polling=config.AGENT.minimize_polling,
+        ovsdb_monitor_respawn_interval=(
+            config.AGENT.ovsdb_monitor_respawn_interval),
     )
 
     # If enable_tunneling is TRUE, set tunnel_type to default to GRE
@@ -343,6 +343,36 @@ def get_port_from_device(port_id):
     return port_dict
 
 
+def get_ports_from_devices(port_ids):
+    """Get ports from database, with one query for all of them."""
+    LOG.debug(_("get_ports_from_devices() called:port_ids=%s"), port_ids)
+    if not port_ids:
+        return []
+    session = db.get_session()
+    sg_binding_port = sg_db.SecurityGroupPortBinding.port_id
+
+    query = session.query(models_v2.Port,
+                          sg_db.SecurityGroupPortBinding.security_group_id)
+    query = query.outerjoin(sg_db.SecurityGroupPortBinding,
+                            models_v2.Port.id == sg_binding_port)
+    query = query.filter(models_v2.Port.id.in_(port_ids))
+    plugin = manager.NeutronManager.get_plugin()
+    ports = {}
+    for port, sg_id in query:
+        port_dict = ports.get(port.id)
+        if port_dict is None:
+            port_dict = plugin._make_port_dict(port)
+            port_dict[ext_sg.SECURITYGROUPS] = []
+            port_dict['security_group_rules'] = []
+            port_dict['security_group_source_groups'] = []
+            port_dict['fixed_ips'] = [ip['ip_address']
+                                      for ip in port['fixed_ips']]
+            ports[port.id] = port_dict
+        if sg_id:
+            port_dict[ext_sg.SECURITYGROUPS].append(sg_id)
+    return ports.values()
+
+
 def set_port_status(port_id, status):
     session = db.get_session()
     try:
@@ -96,6 +96,13 @@ class OVSRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
             port['device'] = device
         return port
 
+    @classmethod
+    def get_ports_from_devices(cls, devices):
+        ports = ovs_db_v2.get_ports_from_devices(devices)
+        for port in ports:
+            port['device'] = port['id']
+        return ports
+
     def get_device_details(self, rpc_context, **kwargs):
         """Agent requests device details."""
         agent_id = kwargs.get('agent_id')
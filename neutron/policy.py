@@ -25,6 +25,7 @@ from oslo.config import cfg
 
 from neutron.api.v2 import attributes
 from neutron.common import exceptions
+from neutron.common import timing
 import neutron.common.utils as utils
 from neutron import manager
 from neutron.openstack.common import importutils
@@ -314,15 +315,97 @@ class FieldCheck(policy.Check):
         return target_value == self.value
 
 
-def _prepare_check(context, action, target):
-    """Prepare rule, target, and credentials for the policy engine."""
+def _compile_rule(rule, credentials, rules_seen=()):
+    """Partially evaluate a rule for the given credentials.
+
+    The checks which do not depend on the target are evaluated right away,
+    so that the result is either a boolean, when the rule has the same
+    outcome whatever the target, or a function of the target evaluating
+    the remaining checks only.
+    """
+    if isinstance(rule, policy.TrueCheck):
+        return True
+    if isinstance(rule, policy.FalseCheck):
+        return False
+    if isinstance(rule, policy.RoleCheck):
+        return bool(rule({}, credentials))
+    if isinstance(rule, policy.RuleCheck) and rule.match not in rules_seen:
+        try:
+            rule_ref = policy._rules[rule.match]
+        except (KeyError, TypeError):
+            # We don't have any matching rule; fail closed
+            return False
+        return _compile_rule(rule_ref, credentials,
+                             rules_seen + (rule.match,))
+    if isinstance(rule, policy.NotCheck):
+        compiled = _compile_rule(rule.rule, credentials, rules_seen)
+        if isinstance(compiled, bool):
+            return not compiled
+        return lambda target: not compiled(target)
+    if isinstance(rule, (policy.AndCheck, policy.OrCheck)):
+        # Outcome of the whole rule when any of its checks has it
+        decisive = isinstance(rule, policy.OrCheck)
+        remaining = []
+        for sub_rule in rule.rules:
+            compiled = _compile_rule(sub_rule, credentials, rules_seen)
+            if isinstance(compiled, bool):
+                if compiled == decisive:
+                    return decisive
+            else:
+                remaining.append(compiled)
+        if not remaining:
+            return not decisive
+        combine = any if decisive else all
+        return lambda target: combine(f(target) for f in remaining)
+    if type(rule) is policy.GenericCheck and '%(' not in rule.match:
+        return bool(rule({}, credentials))
+    return lambda target: bool(rule(target, credentials))
+
+
+def _get_context_cache(context):
+    """Return the policy data cached on the context.
+
+    The cache holds the credentials of the context and the rules compiled
+    for them, and is rebuilt when either the policy rules or the
+    credentials of the context change.
+    """
+    state = (context.user_id, context.tenant_id, context.is_admin,
+             tuple(context.roles), context.read_deleted)
+    cache = getattr(context, '_policy_cache', None)
+    if (cache is None or cache['rules'] is not policy._rules or
+            cache['state'] != state):
+        cache = {'rules': policy._rules,
+                 'state': state,
+                 'credentials': context.to_dict(),
+                 'checkers': {}}
+        context._policy_cache = cache
+    return cache
+
+
+@timing.timed(timing.POLICY)
+def _check(context, action, target):
+    """Evaluate the match rule for action on target within this context."""
     init()
     # Compare with None to distinguish case in which target is {}
     if target is None:
         target = {}
-    match_rule = _build_match_rule(action, target)
-    credentials = context.to_dict()
-    return match_rule, target, credentials
+    cache = _get_context_cache(context)
+    checkers = cache['checkers']
+    resource, is_write = get_resource_and_action(action)
+    if is_write:
+        # The match rule depends on the attributes set in the target
+        match_rule = _build_match_rule(action, target)
+        key = str(match_rule)
+    else:
+        match_rule = None
+        key = action
+    if key not in checkers:
+        match_rule = match_rule or _build_match_rule(action, target)
+        checkers[key] = _compile_rule(match_rule, cache['credentials'])
+    checker = checkers[key]
+    if isinstance(checker, bool):
+        return checker
+    return checker(target)
 
 
 def check(context, action, target, plugin=None):
@@ -339,7 +422,7 @@ def check(context, action, target, plugin=None):
 
     :return: Returns True if access is permitted else False.
     """
-    return policy.check(*(_prepare_check(context, action, target)))
+    return _check(context, action, target)
 
 
 def check_if_exists(context, action, target):
@@ -355,7 +438,7 @@ def check_if_exists(context, action, target):
     # Raise if there's no match for requested action in the policy engine
     if not policy._rules or action not in policy._rules:
         raise exceptions.PolicyRuleNotFound(rule=action)
-    return policy.check(*(_prepare_check(context, action, target)))
+    return _check(context, action, target)
 
 
 def enforce(context, action, target, plugin=None):
@@ -373,10 +456,10 @@ def enforce(context, action, target, plugin=None):
     :raises neutron.exceptions.PolicyNotAllowed: if verification fails.
     """
 
-    init()
-    rule, target, credentials = _prepare_check(context, action, target)
-    return policy.check(rule, target, credentials,
-                        exc=exceptions.PolicyNotAuthorized, action=action)
+    result = _check(context, action, target)
+    if not result:
+        raise exceptions.PolicyNotAuthorized(action=action)
+    return result
 
 
 def check_is_admin(context):
@@ -49,6 +49,10 @@ quota_opts = [
     cfg.StrOpt('quota_driver',
                default='neutron.quota.ConfDriver',
                help=_('Default driver to use for quota checks')),
+    cfg.IntOpt('reservation_expiration',
+               default=120,
+               help=_('Number of seconds a quota reservation is held for '
+                      'resources being created')),
 ]
 # Register the configuration options
 cfg.CONF.register_opts(quota_opts, 'QUOTAS')
@@ -284,6 +288,55 @@ class QuotaEngine(object):
         return self._driver.limit_check(context, tenant_id,
                                         self._resources, values)
 
+    def make_reservation(self, context, tenant_id, resource, delta,
+                         *args, **kwargs):
+        """Reserve resources about to be created by a tenant.
+
+        The reservation holds delta more of the resource against the quota
+        of the tenant until it gets committed or cancelled, so concurrent
+        creations can not overshoot the quota together. Drivers which do not
+        support reservations check the limit against a fresh count instead.
+
+        This method will raise a QuotaResourceUnknown exception if the
+        resource is unknown, and an OverQuota exception if the reservation
+        would put the tenant over its quota.
+
+        :param context: The request context, for access checks.
+        :param tenant_id: The tenant_id to reserve the resources for.
+        :param resource: The name of the resource, as a string.
+        :param delta: The number of resources to reserve.
+        :returns: the reservation, to pass to commit_reservation() or
+                  cancel_reservation(); None if nothing was reserved.
+
+        The remaining arguments are passed to the count function of the
+        resource, whenever it needs to be counted.
+        """
+
+        res = self._resources.get(resource)
+        if not res or not hasattr(res, 'count'):
+            raise exceptions.QuotaResourceUnknown(unknown=[resource])
+
+        def count():
+            return res.count(context, *args, **kwargs)
+
+        if not hasattr(self._driver, 'make_reservation'):
+            self._driver.limit_check(context, tenant_id, self._resources,
+                                     {resource: count() + delta})
+            return
+        return self._driver.make_reservation(context, tenant_id,
+                                             self._resources, resource,
+                                             delta, count)
+
+    def commit_reservation(self, context, reservation):
+        """Release a reservation once its resources got created."""
+        if reservation:
+            self._driver.commit_reservation(context, reservation)
+
+    def cancel_reservation(self, context, reservation):
+        """Release a reservation whose resources failed to be created."""
+        if reservation:
+            self._driver.cancel_reservation(context, reservation)
+
     @property
     def resources(self):
         return self._resources
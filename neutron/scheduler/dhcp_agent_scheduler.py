@@ -15,13 +15,17 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import random
 
 from oslo.config import cfg
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 
 from neutron.common import constants
 from neutron.db import agents_db
 from neutron.db import agentschedulers_db
+from neutron.db import models_v2
 from neutron.openstack.common import log as logging
 
 
@@ -71,14 +75,15 @@ class ChanceScheduler(object):
             active_dhcp_agents = [
                 agent for agent in set(enabled_dhcp_agents)
                 if not agents_db.AgentDbMixin.is_agent_down(
-                    agent['heartbeat_timestamp'])
+                    agent['heartbeat_timestamp'], agent['id'])
                 and agent not in dhcp_agents
             ]
             if not active_dhcp_agents:
                 LOG.warn(_('No more DHCP agents'))
                 return
             n_agents = min(len(active_dhcp_agents), n_agents)
-            chosen_agents = random.sample(active_dhcp_agents, n_agents)
+            chosen_agents = self._choose_network_agents(
+                plugin, context, active_dhcp_agents, n_agents)
             for agent in chosen_agents:
                 self._schedule_bind_network(context, agent, network['id'])
         return chosen_agents
@@ -97,7 +102,7 @@ class ChanceScheduler(object):
             dhcp_agents = query.all()
             for dhcp_agent in dhcp_agents:
                 if agents_db.AgentDbMixin.is_agent_down(
-                    dhcp_agent.heartbeat_timestamp):
+                    dhcp_agent.heartbeat_timestamp, dhcp_agent.id):
                     LOG.warn(_('DHCP agent %s is not active'), dhcp_agent.id)
                     continue
                 fields = ['network_id', 'enable_dhcp']
@@ -107,15 +112,59 @@ class ChanceScheduler(object):
                 if not net_ids:
                     LOG.debug(_('No non-hosted networks'))
                     return False
+                # the active agents hosting the networks, in one query
+                binding_model = agentschedulers_db.NetworkDhcpAgentBinding
+                query = context.session.query(binding_model)
+                query = query.options(joinedload('dhcp_agent')).filter(
+                    binding_model.network_id.in_(net_ids))
+                hosting_agents = collections.defaultdict(list)
+                for binding in query:
+                    if not agents_db.AgentDbMixin.is_agent_down(
+                            binding.dhcp_agent.heartbeat_timestamp,
+                            binding.dhcp_agent_id):
+                        hosting_agents[binding.network_id].append(
+                            binding.dhcp_agent_id)
                 for net_id in net_ids:
-                    agents = plugin.get_dhcp_agents_hosting_networks(
-                        context, [net_id], active=True)
+                    agents = hosting_agents[net_id]
                     if len(agents) >= agents_per_network:
                         continue
-                    if any(dhcp_agent.id == agent.id for agent in agents):
+                    if dhcp_agent.id in agents:
                         continue
                     binding = agentschedulers_db.NetworkDhcpAgentBinding()
                     binding.dhcp_agent = dhcp_agent
                     binding.network_id = net_id
                     context.session.add(binding)
         return True
+
+    def _choose_network_agents(self, plugin, context, candidates, n_agents):
+        """Choose n_agents agents from the candidates to host a network."""
+        return random.sample(candidates, n_agents)
+
+
+class LeastNetworksScheduler(ChanceScheduler):
+    """Allocate to a network the DHCP agents hosting the fewest networks.
+
+    The agents hosting as many networks are compared by the number of
+    ports of their networks, remaining ties are broken randomly.
+    """
+
+    def _choose_network_agents(self, plugin, context, candidates, n_agents):
+        agent_ids = [agent['id'] for agent in candidates]
+        binding_model = agentschedulers_db.NetworkDhcpAgentBinding
+        query = context.session.query(binding_model.dhcp_agent_id,
+                                      func.count(binding_model.network_id))
+        networks = dict(query.filter(
+            binding_model.dhcp_agent_id.in_(agent_ids)).group_by(
+                binding_model.dhcp_agent_id))
+        query = context.session.query(binding_model.dhcp_agent_id,
+                                      func.count(models_v2.Port.id))
+        ports = dict(query.join(
+            models_v2.Port,
+            models_v2.Port.network_id == binding_model.network_id).filter(
+                binding_model.dhcp_agent_id.in_(agent_ids)).group_by(
+                    binding_model.dhcp_agent_id))
+        candidates = list(candidates)
+        random.shuffle(candidates)
+        candidates.sort(key=lambda agent: (networks.get(agent['id'], 0),
+                                           ports.get(agent['id'], 0)))
+        return candidates[:n_agents]
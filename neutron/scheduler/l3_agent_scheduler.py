@@ -17,6 +17,7 @@
 
 import random
 
+from sqlalchemy import func
 from sqlalchemy.orm import exc
 from sqlalchemy.sql import exists
 
@@ -58,19 +59,22 @@ class ChanceScheduler(object):
                           host)
                 return False
             if agents_db.AgentDbMixin.is_agent_down(
-                l3_agent.heartbeat_timestamp):
+                l3_agent.heartbeat_timestamp, l3_agent.id):
                 LOG.warn(_('L3 agent %s is not active'), l3_agent.id)
             # check if each of the specified routers is hosted
             if router_ids:
+                binding_model = l3_agentschedulers_db.RouterL3AgentBinding
+                query = context.session.query(binding_model.router_id,
+                                              binding_model.l3_agent_id)
+                hosting_agents = dict(query.filter(
+                    binding_model.router_id.in_(router_ids)))
                 unscheduled_router_ids = []
                 for router_id in router_ids:
-                    l3_agents = plugin.get_l3_agents_hosting_routers(
-                        context, [router_id], admin_state_up=True)
-                    if l3_agents:
+                    if router_id in hosting_agents:
                         LOG.debug(_('Router %(router_id)s has already been'
                                     ' hosted by L3 agent %(agent_id)s'),
                                   {'router_id': router_id,
-                                   'agent_id': l3_agents[0]['id']})
+                                   'agent_id': hosting_agents[router_id]})
                     else:
                         unscheduled_router_ids.append(router_id)
                 if not unscheduled_router_ids:
@@ -143,7 +147,8 @@ class ChanceScheduler(object):
                          sync_router['id'])
                 return
 
-            chosen_agent = random.choice(candidates)
+            chosen_agent = self._choose_router_agent(plugin, context,
+                                                     candidates)
             binding = l3_agentschedulers_db.RouterL3AgentBinding()
             binding.l3_agent = chosen_agent
             binding.router_id = sync_router['id']
@@ -153,3 +158,36 @@ class ChanceScheduler(object):
                       {'router_id': sync_router['id'],
                        'agent_id': chosen_agent['id']})
             return chosen_agent
+
+    def _choose_router_agent(self, plugin, context, candidates):
+        """Choose an agent from the candidates to host a router."""
+        return random.choice(candidates)
+
+
+class LeastRoutersScheduler(ChanceScheduler):
+    """Allocate to a router the L3 agent hosting the fewest routers.
+
+    The agents hosting as many routers are compared by the number of
+    floating IPs of their routers, remaining ties are broken randomly.
+    """
+
+    def _choose_router_agent(self, plugin, context, candidates):
+        agent_ids = [agent['id'] for agent in candidates]
+        binding_model = l3_agentschedulers_db.RouterL3AgentBinding
+        query = context.session.query(binding_model.l3_agent_id,
+                                      func.count(binding_model.router_id))
+        routers = dict(query.filter(
+            binding_model.l3_agent_id.in_(agent_ids)).group_by(
+                binding_model.l3_agent_id))
+        query = context.session.query(binding_model.l3_agent_id,
+                                      func.count(l3_db.FloatingIP.id))
+        floatingips = dict(query.join(
+            l3_db.FloatingIP,
+            l3_db.FloatingIP.router_id == binding_model.router_id).filter(
+                binding_model.l3_agent_id.in_(agent_ids)).group_by(
+                    binding_model.l3_agent_id))
+        candidates = list(candidates)
+        random.shuffle(candidates)
+        return min(candidates,
+                   key=lambda agent: (routers.get(agent['id'], 0),
+                                      floatingips.get(agent['id'], 0)))
@@ -15,20 +15,26 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import errno
 import inspect
 import logging as std_logging
 import os
 import random
 
+import eventlet.event
 from oslo.config import cfg
 
 from neutron.common import config
 from neutron.common import legacy
 from neutron import context
+from neutron.db import api as db_api
+from neutron import manager
+from neutron.openstack.common import excutils
 from neutron.openstack.common import importutils
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import loopingcall
 from neutron.openstack.common.rpc import service
+from neutron.openstack.common import service as common_service
 from neutron import wsgi
 
 
@@ -41,6 +47,14 @@ service_opts = [
                help=_('Range of seconds to randomly delay when starting the '
                       'periodic task scheduler to reduce stampeding. '
                       '(Disable by setting to 0)')),
+    cfg.IntOpt('api_workers',
+               default=0,
+               help=_('Number of separate API worker processes for service. '
+                      '0 runs the API in the main process.')),
+    cfg.IntOpt('rpc_workers',
+               default=0,
+               help=_('Number of separate RPC worker processes for service. '
+                      '0 runs the RPC consumers in the main process.')),
 ]
 CONF = cfg.CONF
 CONF.register_opts(service_opts)
@@ -64,6 +78,9 @@ class WsgiService(object):
     def start(self):
         self.wsgi_app = _run_wsgi(self.app_name)
 
+    def stop(self):
+        self.wsgi_app.stop()
+
     def wait(self):
         self.wsgi_app.wait()
 
@@ -105,13 +122,113 @@ def serve_wsgi(cls):
     return service
 
 
+class ProcessLauncher(common_service.ProcessLauncher):
+    """ProcessLauncher which only reaps its own children.
+
+    The API and RPC workers are started by separate launchers of the same
+    parent process, so a launcher must not reap the children of another.
+    """
+
+    def _wait_child(self):
+        for pid in list(self.children):
+            try:
+                # Don't block if the child has not exited
+                child_pid, status = os.waitpid(pid, os.WNOHANG)
+            except OSError as exc:
+                if exc.errno not in (errno.EINTR, errno.ECHILD):
+                    raise
+                continue
+            if child_pid:
+                break
+        else:
+            return None
+
+        if os.WIFSIGNALED(status):
+            sig = os.WTERMSIG(status)
+            LOG.info(_('Child %(pid)d killed by signal %(sig)d'),
+                     dict(pid=pid, sig=sig))
+        else:
+            code = os.WEXITSTATUS(status)
+            LOG.info(_('Child %(pid)s exited with status %(code)d'),
+                     dict(pid=pid, code=code))
+
+        wrap = self.children.pop(pid)
+        wrap.children.remove(pid)
+        return wrap
+
+    def stop(self):
+        """Stop respawning the children, wait() then terminates them."""
+        self.running = False
+
+
+class RpcWorker(object):
+    """Wraps a plugin's RPC listener to be handled by ProcessLauncher."""
+
+    def __init__(self, plugin):
+        self._plugin = plugin
+        self._servers = []
+        self._stopped = eventlet.event.Event()
+
+    def start(self):
+        # We may have just forked from the parent process. Dispose of the
+        # inherited sql connections so that they are not shared between
+        # processes and discovered to be broken later on.
+        db_api.dispose_engine()
+        self._servers = self._plugin.start_rpc_listener()
+
+    def wait(self):
+        self._stopped.wait()
+
+    def stop(self):
+        for server in self._servers:
+            server.close()
+        self._servers = []
+        if not self._stopped.ready():
+            self._stopped.send()
+
+
+def serve_rpc():
+    """Start the RPC consumers of the core plugin.
+
+    Raises NotImplementedError when the plugin consumes its RPC topics on
+    its own, in which case they are already running in this process.
+    """
+    plugin = manager.NeutronManager.get_plugin()
+
+    # When rpc_workers > 0 start_rpc_listener is called in a child process,
+    # where a NotImplementedError could not be caught by the caller, so check
+    # up front whether the plugin supports separate RPC workers.
+    if not plugin.rpc_workers_supported():
+        LOG.debug(_("Active plugin doesn't implement start_rpc_listener"))
+        if cfg.CONF.rpc_workers > 0:
+            LOG.error(_("'rpc_workers = %d' ignored because "
+                        "start_rpc_listener is not implemented."),
+                      cfg.CONF.rpc_workers)
+        raise NotImplementedError()
+
+    try:
+        rpc = RpcWorker(plugin)
+        if cfg.CONF.rpc_workers < 1:
+            rpc.start()
+            return rpc
+        launcher = ProcessLauncher()
+        launcher.launch_service(rpc, workers=cfg.CONF.rpc_workers)
+        return launcher
+    except Exception:
+        with excutils.save_and_reraise_exception():
+            LOG.exception(_('Unrecoverable error: please check log '
+                            'for details.'))
+
+
 def _run_wsgi(app_name):
     app = config.load_paste_app(app_name)
     if not app:
         LOG.error(_('No known API applications configured.'))
         return
     server = wsgi.Server("Neutron")
-    server.start(app, cfg.CONF.bind_port, cfg.CONF.bind_host)
+    launcher = ProcessLauncher() if cfg.CONF.api_workers > 0 else None
+    server.start(app, cfg.CONF.bind_port, cfg.CONF.bind_host,
+                 workers=cfg.CONF.api_workers, launcher=launcher)
     # Dump all option values here after all options are parsed
     cfg.CONF.log_opt_values(LOG, std_logging.DEBUG)
     LOG.info(_("Neutron service started, listening on %(host)s:%(port)s"),
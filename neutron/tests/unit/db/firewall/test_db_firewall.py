@@ -612,6 +612,41 @@ class TestFirewallDBPlugin(FirewallPluginDbTestCase):
             self._test_list_resources('firewall_rule', fr,
                                       query_params=query_params)
 
+    def test_list_firewall_rules_with_sort(self):
+        with contextlib.nested(self.firewall_rule(name='fwr1',
+                                                  no_delete=True),
+                               self.firewall_rule(name='fwr2',
+                                                  no_delete=True),
+                               self.firewall_rule(name='fwr3',
+                                                  no_delete=True)
+                               ) as (fwr1, fwr2, fwr3):
+            self._test_list_with_sort('firewall_rule', (fwr3, fwr2, fwr1),
+                                      [('name', 'desc')])
+
+    def test_list_firewall_rules_with_pagination(self):
+        with contextlib.nested(self.firewall_rule(name='fwr1',
+                                                  no_delete=True),
+                               self.firewall_rule(name='fwr2',
+                                                  no_delete=True),
+                               self.firewall_rule(name='fwr3',
+                                                  no_delete=True)
+                               ) as (fwr1, fwr2, fwr3):
+            self._test_list_with_pagination('firewall_rule',
+                                            (fwr1, fwr2, fwr3),
+                                            ('name', 'asc'), 2, 2)
+
+    def test_list_firewall_rules_with_pagination_reverse(self):
+        with contextlib.nested(self.firewall_rule(name='fwr1',
+                                                  no_delete=True),
+                               self.firewall_rule(name='fwr2',
+                                                  no_delete=True),
+                               self.firewall_rule(name='fwr3',
+                                                  no_delete=True)
+                               ) as (fwr1, fwr2, fwr3):
+            self._test_list_with_pagination_reverse('firewall_rule',
+                                                    (fwr1, fwr2, fwr3),
+                                                    ('name', 'asc'), 2, 2)
+
     def test_update_firewall_rule(self):
         name = "new_firewall_rule1"
         attrs = self._get_test_firewall_rule_attrs(name)
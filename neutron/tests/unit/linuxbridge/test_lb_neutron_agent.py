@@ -157,6 +157,41 @@ class TestLinuxBridgeAgent(base.BaseTestCase):
                 agent.daemon_loop()
             self.assertEqual(3, log.call_count)
 
+    def test_treat_devices_added_batches_rpc_calls(self):
+        agent = linuxbridge_neutron_agent.LinuxBridgeNeutronAgentRPC({},
+                                                                     0,
+                                                                     None)
+        details = [{'device': device, 'port_id': device, 'network_id': 'net1',
+                    'network_type': 'vlan', 'physical_network': 'physnet1',
+                    'segmentation_id': 1, 'admin_state_up': True}
+                   for device in ('tap1', 'tap2')]
+        details.append({'device': 'tap3'})
+        with contextlib.nested(
+            mock.patch.object(agent, 'prepare_devices_filter'),
+            mock.patch.object(agent.plugin_rpc, 'get_devices_details_list',
+                              return_value=details),
+            mock.patch.object(agent.plugin_rpc, 'update_devices_up')
+        ) as (prepare, get_details, devices_up):
+            agent.br_mgr.add_interface.return_value = True
+            self.assertFalse(agent.treat_devices_added(
+                ['tap1', 'tap2', 'tap3']))
+        get_details.assert_called_once_with(
+            agent.context, ['tap1', 'tap2', 'tap3'], agent.agent_id)
+        devices_up.assert_called_once_with(
+            agent.context, ['tap1', 'tap2'], agent.agent_id)
+        self.assertEqual(2, agent.br_mgr.add_interface.call_count)
+
+    def test_treat_devices_added_returns_true_on_rpc_failure(self):
+        agent = linuxbridge_neutron_agent.LinuxBridgeNeutronAgentRPC({},
+                                                                     0,
+                                                                     None)
+        with contextlib.nested(
+            mock.patch.object(agent, 'prepare_devices_filter'),
+            mock.patch.object(agent.plugin_rpc, 'get_devices_details_list',
+                              side_effect=Exception())
+        ):
+            self.assertTrue(agent.treat_devices_added(['tap1']))
+
 
 class TestLinuxBridgeManager(base.BaseTestCase):
     def setUp(self):
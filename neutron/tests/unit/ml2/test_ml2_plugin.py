@@ -13,9 +13,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import mock
+
 from neutron.extensions import multiprovidernet as mpnet
 from neutron.extensions import portbindings
 from neutron.extensions import providernet as pnet
+from neutron import manager
 from neutron.plugins.ml2 import config
 from neutron.tests.unit import _test_extension_portbindings as test_bindings
 from neutron.tests.unit import test_db_plugin as test_plugin
@@ -57,6 +60,24 @@ class TestMl2BasicGet(test_plugin.TestBasicGet,
     pass
 
 
+class TestMl2RpcListener(Ml2PluginV2TestCase):
+
+    def test_rpc_workers_supported(self):
+        plugin = manager.NeutronManager.get_plugin()
+        self.assertTrue(plugin.rpc_workers_supported())
+
+    def test_start_rpc_listener(self):
+        plugin = manager.NeutronManager.get_plugin()
+        with mock.patch('neutron.openstack.common.rpc.'
+                        'create_connection') as create_conn:
+            conns = plugin.start_rpc_listener()
+            conn = create_conn.return_value
+            self.assertEqual([conn], conns)
+            conn.create_consumer.assert_called_once_with(
+                plugin.topic, mock.ANY, fanout=False)
+            conn.consume_in_thread.assert_called_once_with()
+
+
 class TestMl2V2HTTPResponse(test_plugin.TestV2HTTPResponse,
                             Ml2PluginV2TestCase):
     pass
@@ -13,6 +13,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+
+from neutron import context
 from neutron.extensions import portbindings
 from neutron import manager
 from neutron.plugins.ml2 import config as config
@@ -76,3 +79,38 @@ class PortBindingTestCase(test_plugin.NeutronDbPluginV2TestCase):
         self._test_port_binding("host-bridge-filter",
                                 portbindings.VIF_TYPE_BRIDGE,
                                 True, True)
+
+    def test_devices_details_list(self):
+        with self.subnet() as subnet:
+            with contextlib.nested(
+                self.port(subnet=subnet, arg_list=(portbindings.HOST_ID,),
+                          **{portbindings.HOST_ID: 'host-ovs-no_filter'}),
+                self.port(subnet=subnet, arg_list=(portbindings.HOST_ID,),
+                          **{portbindings.HOST_ID: ''})
+            ) as (bound, unbound):
+                bound_id = bound['port']['id']
+                # Devices are named after a truncated port id
+                device = 'tap' + unbound['port']['id'][:11]
+                details = self.plugin.callbacks.get_devices_details_list(
+                    None, agent_id="theAgentId",
+                    devices=[bound_id, device, 'tapunknown'])
+                self.assertEqual([bound_id, device, 'tapunknown'],
+                                 [entry['device'] for entry in details])
+                self.assertEqual('local', details[0]['network_type'])
+                self.assertEqual(bound_id, details[0]['port_id'])
+                self.assertNotIn('network_type', details[1])
+                self.assertNotIn('network_type', details[2])
+
+    def test_update_devices_up(self):
+        with self.subnet() as subnet:
+            with contextlib.nested(
+                self.port(subnet=subnet),
+                self.port(subnet=subnet)
+            ) as (port1, port2):
+                port_ids = [port1['port']['id'], port2['port']['id']]
+                self.plugin.callbacks.update_devices_up(
+                    context.get_admin_context(), agent_id="theAgentId",
+                    devices=port_ids)
+                for port_id in port_ids:
+                    port = self._show('ports', port_id)
+                    self.assertEqual('ACTIVE', port['port']['status'])
@@ -84,6 +84,30 @@ class TestMl2SecurityGroups(Ml2SecurityGroupsTestCase,
         port_dict = plugin.callbacks.get_port_from_device('bad_device_id')
         self.assertEqual(None, port_dict)
 
+    def test_security_group_get_ports_from_devices(self):
+        with self.network() as n:
+            with self.subnet(n):
+                with self.security_group() as sg:
+                    security_group_id = sg['security_group']['id']
+                    res = self._create_port(
+                        self.fmt, n['network']['id'],
+                        security_groups=[security_group_id])
+                    port = self.deserialize(self.fmt, res)
+                    port_id = port['port']['id']
+                    device = 'tap' + port_id[:11]
+                    plugin = manager.NeutronManager.get_plugin()
+                    ports = plugin.callbacks.get_ports_from_devices(
+                        [device, 'bad_device_id'])
+                    self.assertEqual(1, len(ports))
+                    self.assertEqual(port_id, ports[0]['id'])
+                    self.assertEqual(device, ports[0]['device'])
+                    self.assertEqual([security_group_id],
+                                     ports[0][ext_sg.SECURITYGROUPS])
+                    self.assertEqual(
+                        [port['port']['fixed_ips'][0]['ip_address']],
+                        ports[0]['fixed_ips'])
+                    self._delete('ports', port_id)
+
 
 class TestMl2SecurityGroupsXML(TestMl2SecurityGroups):
     fmt = 'xml'
@@ -35,6 +35,8 @@ from neutron import manager
 from neutron.openstack.common import timeutils
 from neutron.openstack.common import uuidutils
 from neutron.plugins.common import constants as service_constants
+from neutron.scheduler import dhcp_agent_scheduler
+from neutron.scheduler import l3_agent_scheduler
 from neutron.tests.unit import test_agent_ext_plugin
 from neutron.tests.unit import test_db_plugin as test_plugin
 from neutron.tests.unit import test_extensions
@@ -210,6 +212,10 @@ class OvsAgentSchedulerTestCaseBase(test_l3_plugin.L3NatTestCaseMixin,
             service_plugins = None
         super(OvsAgentSchedulerTestCaseBase, self).setUp(
             self.plugin_str, service_plugins=service_plugins)
+        # Notify and schedule synchronously, without cached agents
+        cfg.CONF.set_override('dhcp_agent_notification_delay', 0)
+        self.addCleanup(
+            dhcp_rpc_agent_api.DhcpAgentNotifyAPI._agents_cache.clear)
         ext_mgr = extensions.PluginAwareExtensionManager.get_instance()
         self.ext_api = test_extensions.setup_extensions_middleware(ext_mgr)
         self.adminContext = context.get_admin_context()
@@ -590,6 +596,23 @@ class OvsAgentSchedulerTestCase(OvsAgentSchedulerTestCaseBase):
         self.assertEqual(1, len(l3_agents['agents']))
         self.assertEqual(L3_HOSTA, l3_agents['agents'][0]['host'])
 
+    def test_sync_routers_returns_changed_routers_data(self):
+        with self.router() as router:
+            router_id = router['router']['id']
+            l3_rpc = l3_rpc_base.L3RpcCallbackMixin()
+            self._register_agent_states()
+            ret = l3_rpc.sync_routers(self.adminContext, host=L3_HOSTA)
+            revision = ret[0]['revision']
+            ret = l3_rpc.sync_routers(self.adminContext, host=L3_HOSTA,
+                                      router_revisions={router_id: revision})
+            self.assertEqual([{'id': router_id, 'revision': revision}], ret)
+            self._update('routers', router_id,
+                         {'router': {'name': 'new-name'}})
+            ret = l3_rpc.sync_routers(self.adminContext, host=L3_HOSTA,
+                                      router_revisions={router_id: revision})
+            self.assertEqual('new-name', ret[0]['name'])
+            self.assertNotEqual(revision, ret[0]['revision'])
+
     def test_router_auto_schedule_restart_l3_agent(self):
         with self.router():
             l3_rpc = l3_rpc_base.L3RpcCallbackMixin()
@@ -969,6 +992,64 @@ class OvsAgentSchedulerTestCase(OvsAgentSchedulerTestCaseBase):
                 admin_context=False)
 
 
+class OvsLeastLoadedSchedulerTestCase(OvsAgentSchedulerTestCaseBase):
+
+    def test_least_routers_scheduler(self):
+        plugin = self.l3agentscheduler_dbMinxin
+        scheduler = l3_agent_scheduler.LeastRoutersScheduler()
+        with contextlib.nested(self.router(),
+                               self.router()) as (router1, router2):
+            self._register_agent_states()
+            hosta_id = self._get_agent_id(constants.AGENT_TYPE_L3,
+                                          L3_HOSTA)
+            hostb_id = self._get_agent_id(constants.AGENT_TYPE_L3,
+                                          L3_HOSTB)
+            self._add_router_to_l3_agent(hosta_id,
+                                         router1['router']['id'])
+            agent = scheduler.schedule(plugin, self.adminContext,
+                                       router2['router']['id'])
+        self.assertEqual(hostb_id, agent['id'])
+
+    def test_least_networks_scheduler(self):
+        plugin = manager.NeutronManager.get_plugin()
+        scheduler = dhcp_agent_scheduler.LeastNetworksScheduler()
+        with contextlib.nested(self.network(),
+                               self.network()) as (net1, net2):
+            self._register_agent_states()
+            hosta_id = self._get_agent_id(constants.AGENT_TYPE_DHCP,
+                                          DHCP_HOSTA)
+            hostc_id = self._get_agent_id(constants.AGENT_TYPE_DHCP,
+                                          DHCP_HOSTC)
+            self._add_network_to_dhcp_agent(hosta_id,
+                                            net1['network']['id'])
+            agents = scheduler.schedule(plugin, self.adminContext,
+                                        net2['network'])
+        self.assertEqual([hostc_id], [agent['id'] for agent in agents])
+
+    def test_least_networks_scheduler_compares_ports(self):
+        cfg.CONF.set_override('allow_overlapping_ips', True)
+        plugin = manager.NeutronManager.get_plugin()
+        scheduler = dhcp_agent_scheduler.LeastNetworksScheduler()
+        with contextlib.nested(self.port(), self.port(),
+                               self.network()) as (port1, port2, net3):
+            self._register_agent_states()
+            hosta_id = self._get_agent_id(constants.AGENT_TYPE_DHCP,
+                                          DHCP_HOSTA)
+            hostc_id = self._get_agent_id(constants.AGENT_TYPE_DHCP,
+                                          DHCP_HOSTC)
+            self._add_network_to_dhcp_agent(hosta_id,
+                                            port1['port']['network_id'])
+            self._add_network_to_dhcp_agent(hostc_id,
+                                            port2['port']['network_id'])
+            port3 = self.deserialize(
+                self.fmt,
+                self._create_port(self.fmt, port1['port']['network_id']))
+            agents = scheduler.schedule(plugin, self.adminContext,
+                                        net3['network'])
+            self._delete('ports', port3['port']['id'])
+        self.assertEqual([hostc_id], [agent['id'] for agent in agents])
+
+
 class OvsDhcpAgentNotifierTestCase(test_l3_plugin.L3NatTestCaseMixin,
                                    test_agent_ext_plugin.AgentDBTestMixIn,
                                    AgentSchedulerTestMixIn,
@@ -988,6 +1069,8 @@ class OvsDhcpAgentNotifierTestCase(test_l3_plugin.L3NatTestCaseMixin,
         for resource, attrs in attributes.RESOURCE_ATTRIBUTE_MAP.iteritems():
             self.saved_attr_map[resource] = attrs.copy()
         super(OvsDhcpAgentNotifierTestCase, self).setUp(self.plugin_str)
+        cfg.CONF.set_override('dhcp_agent_notification_delay', 0)
+        self.addCleanup(self.dhcp_notifier._agents_cache.clear)
         ext_mgr = extensions.PluginAwareExtensionManager.get_instance()
         self.ext_api = test_extensions.setup_extensions_middleware(ext_mgr)
         self.adminContext = context.get_admin_context()
@@ -23,6 +23,7 @@ from neutron.agent.linux import ovs_lib
 from neutron.agent.linux import utils
 from neutron.openstack.common import jsonutils
 from neutron.openstack.common import uuidutils
+from neutron.plugins.openvswitch.common import constants
 from neutron.tests import base
 
 
@@ -213,6 +214,49 @@ class OVS_Lib_Test(base.BaseTestCase):
         self.br.defer_apply_off()
         self.mox.VerifyAll()
 
+    def test_defer_apply_flows_keeps_order(self):
+        self.mox.StubOutWithMock(self.br, 'run_ofctl')
+        self.br.run_ofctl('add-flows', ['-'],
+                          'hard_timeout=0,idle_timeout=0,priority=1,'
+                          'in_port=1,actions=drop\n'
+                          'hard_timeout=0,idle_timeout=0,priority=1,'
+                          'in_port=2,actions=drop\n')
+        self.br.run_ofctl('del-flows', ['-'], 'in_port=1\n')
+        self.br.run_ofctl('add-flows', ['-'],
+                          'hard_timeout=0,idle_timeout=0,priority=1,'
+                          'in_port=1,actions=normal\n')
+        self.mox.ReplayAll()
+
+        self.br.defer_apply_on()
+        self.br.add_flow(priority=1, in_port=1, actions='drop')
+        self.br.add_flow(priority=1, in_port=2, actions='drop')
+        self.br.delete_flows(in_port=1)
+        self.br.add_flow(priority=1, in_port=1, actions='normal')
+        self.br.defer_apply_off()
+        self.assertEqual([], self.br.deferred_flows)
+        self.mox.VerifyAll()
+
+    def test_defer_apply_flows_batches_distinct_tables(self):
+        self.mox.StubOutWithMock(self.br, 'run_ofctl')
+        self.br.run_ofctl('mod-flows', ['-'],
+                          'hard_timeout=0,idle_timeout=0,priority=1,'
+                          'table=1,dl_vlan=1,actions=drop\n'
+                          'hard_timeout=0,idle_timeout=0,priority=1,'
+                          'table=1,dl_vlan=2,actions=drop\n')
+        self.br.run_ofctl('add-flows', ['-'],
+                          'hard_timeout=0,idle_timeout=0,priority=1,'
+                          'table=2,tun_id=1,actions=normal\n'
+                          'hard_timeout=0,idle_timeout=0,priority=1,'
+                          'table=2,tun_id=2,actions=normal\n')
+        self.mox.ReplayAll()
+
+        self.br.defer_apply_on()
+        for i in (1, 2):
+            self.br.mod_flow(table=1, priority=1, dl_vlan=i, actions='drop')
+            self.br.add_flow(table=2, priority=1, tun_id=i, actions='normal')
+        self.br.defer_apply_off()
+        self.mox.VerifyAll()
+
     def test_add_tunnel_port(self):
         pname = "tap99"
         local_ip = "1.1.1.1"
@@ -220,20 +264,10 @@ class OVS_Lib_Test(base.BaseTestCase):
         ofport = "6"
 
         utils.execute(["ovs-vsctl", self.TO, '--', "--may-exist", "add-port",
-                       self.BR_NAME, pname], root_helper=self.root_helper)
-        utils.execute(["ovs-vsctl", self.TO, "set", "Interface",
-                       pname, "type=gre"], root_helper=self.root_helper)
-        utils.execute(["ovs-vsctl", self.TO, "set", "Interface",
-                       pname, "options:remote_ip=" + remote_ip],
-                      root_helper=self.root_helper)
-        utils.execute(["ovs-vsctl", self.TO, "set", "Interface",
-                       pname, "options:local_ip=" + local_ip],
-                      root_helper=self.root_helper)
-        utils.execute(["ovs-vsctl", self.TO, "set", "Interface",
-                       pname, "options:in_key=flow"],
-                      root_helper=self.root_helper)
-        utils.execute(["ovs-vsctl", self.TO, "set", "Interface",
-                       pname, "options:out_key=flow"],
+                       self.BR_NAME, pname, "--", "set", "Interface", pname,
+                       "type=gre", "options:remote_ip=" + remote_ip,
+                       "options:local_ip=" + local_ip,
+                       "options:in_key=flow", "options:out_key=flow"],
                       root_helper=self.root_helper)
         utils.execute(["ovs-vsctl", self.TO, "get",
                        "Interface", pname, "ofport"],
@@ -245,17 +279,37 @@ class OVS_Lib_Test(base.BaseTestCase):
             ofport)
         self.mox.VerifyAll()
 
+    def test_add_tunnel_port_vxlan(self):
+        pname = "vxlan-9.9.9.9"
+        ofport = "6"
+
+        utils.execute(["ovs-vsctl", self.TO, '--', "--may-exist", "add-port",
+                       self.BR_NAME, pname, "--", "set", "Interface", pname,
+                       "type=vxlan", "options:dst_port=4790",
+                       "options:remote_ip=9.9.9.9",
+                       "options:local_ip=1.1.1.1",
+                       "options:in_key=flow", "options:out_key=flow"],
+                      root_helper=self.root_helper)
+        utils.execute(["ovs-vsctl", self.TO, "get",
+                       "Interface", pname, "ofport"],
+                      root_helper=self.root_helper).AndReturn(ofport)
+        self.mox.ReplayAll()
+
+        self.assertEqual(
+            self.br.add_tunnel_port(pname, "9.9.9.9", "1.1.1.1",
+                                    tunnel_type=constants.TYPE_VXLAN,
+                                    vxlan_udp_port=4790),
+            ofport)
+        self.mox.VerifyAll()
+
     def test_add_patch_port(self):
         pname = "tap99"
         peer = "bar10"
         ofport = "6"
 
         utils.execute(["ovs-vsctl", self.TO, "add-port",
-                       self.BR_NAME, pname], root_helper=self.root_helper)
-        utils.execute(["ovs-vsctl", self.TO, "set", "Interface",
-                       pname, "type=patch"], root_helper=self.root_helper)
-        utils.execute(["ovs-vsctl", self.TO, "set",
-                       "Interface", pname, "options:peer=" + peer],
+                       self.BR_NAME, pname, "--", "set", "Interface", pname,
+                       "type=patch", "options:peer=" + peer],
                       root_helper=self.root_helper)
         utils.execute(["ovs-vsctl", self.TO, "get",
                        "Interface", pname, "ofport"],
@@ -314,8 +368,12 @@ class OVS_Lib_Test(base.BaseTestCase):
                     ovs_row.append(cell)
                 elif isinstance(cell, dict):
                     ovs_row.append(["map", cell.items()])
+                elif isinstance(cell, (int, list)):
+                    # integers and already encoded sets
+                    ovs_row.append(cell)
                 else:
-                    raise TypeError('%r not str or dict' % type(cell))
+                    raise TypeError('%r not str, dict, int or list' %
+                                    type(cell))
         return jsonutils.dumps(r)
 
     def _test_get_vif_port_set(self, is_xen):
@@ -365,6 +423,33 @@ class OVS_Lib_Test(base.BaseTestCase):
     def test_get_vif_port_set_xen(self):
         self._test_get_vif_port_set(True)
 
+    def test_get_vif_ports_by_ids(self):
+        headings = ['name', 'external_ids', 'ofport']
+        data = [
+            ['tap99', {'iface-id': 'tap99id', 'attached-mac': 'tap99mac'}, 1],
+            # A port not requested
+            ['tap88', {'iface-id': 'tap88id', 'attached-mac': 'tap88mac'}, 2],
+            # A port not attached yet
+            ['tap77', {'iface-id': 'tap77id', 'attached-mac': 'tap77mac'},
+             ['set', []]],
+            ['tun22', {}, 3],
+        ]
+        utils.execute(["ovs-vsctl", self.TO, "--format=json",
+                       "--", "--columns=name,external_ids,ofport",
+                       "list", "Interface"],
+                      root_helper=self.root_helper).AndReturn(
+                          self._encode_ovs_json(headings, data))
+        self.mox.ReplayAll()
+
+        vif_ports = self.br.get_vif_ports_by_ids(['tap99id', 'tap77id'])
+        self.assertEqual(['tap99id'], vif_ports.keys())
+        vif_port = vif_ports['tap99id']
+        self.assertEqual('tap99', vif_port.port_name)
+        self.assertEqual(1, vif_port.ofport)
+        self.assertEqual('tap99mac', vif_port.vif_mac)
+        self.assertEqual(self.br, vif_port.switch)
+        self.mox.VerifyAll()
+
     def test_get_vif_port_set_list_ports_error(self):
         utils.execute(["ovs-vsctl", self.TO, "list-ports", self.BR_NAME],
                       root_helper=self.root_helper).AndRaise(RuntimeError())
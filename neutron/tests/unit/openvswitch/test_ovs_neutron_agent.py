@@ -23,6 +23,7 @@ import testtools
 
 from neutron.agent.linux import ip_lib
 from neutron.agent.linux import ovs_lib
+from neutron.agent.linux import utils
 from neutron.common import constants as n_const
 from neutron.openstack.common.rpc import common as rpc_common
 from neutron.plugins.openvswitch.agent import ovs_neutron_agent
@@ -167,49 +168,127 @@ class TestOvsNeutronAgent(base.BaseTestCase):
         actual = self.mock_update_ports(vif_port_set, registered_ports)
         self.assertEqual(expected, actual)
 
+    def _run_rpc_loop_once(self, polling_required):
+        polling_manager = mock.Mock()
+        polling_manager.is_polling_required = polling_required
+        polling_manager.wait.side_effect = RuntimeError('stop the loop')
+        with contextlib.nested(
+            mock.patch.object(self.agent, 'update_ports', return_value=None),
+            mock.patch.object(self.agent, 'tunnel_sync', return_value=False)
+        ) as (update_ports, tunnel_sync):
+            self.assertRaises(RuntimeError, self.agent.rpc_loop,
+                              polling_manager=polling_manager)
+        return polling_manager, update_ports
+
+    def test_rpc_loop_polls_when_required(self):
+        polling_manager, update_ports = self._run_rpc_loop_once(True)
+        polling_manager.force_polling.assert_called_once_with()
+        update_ports.assert_called_once_with(set())
+        polling_manager.polling_completed.assert_called_once_with()
+        self.assertTrue(polling_manager.wait.called)
+
+    def test_rpc_loop_does_not_poll_without_changes(self):
+        polling_manager, update_ports = self._run_rpc_loop_once(False)
+        self.assertFalse(update_ports.called)
+        self.assertFalse(polling_manager.polling_completed.called)
+
+    def test_daemon_loop_uses_polling_manager(self):
+        with contextlib.nested(
+            mock.patch('neutron.agent.linux.polling.get_polling_manager'),
+            mock.patch.object(self.agent, 'rpc_loop')
+        ) as (get_pm, rpc_loop):
+            self.agent.daemon_loop()
+        get_pm.assert_called_once_with(
+            True, 'sudo', constants.DEFAULT_OVSDBMON_RESPAWN)
+        rpc_loop.assert_called_once_with(
+            polling_manager=get_pm.return_value.__enter__.return_value)
+
     def test_treat_devices_added_returns_true_for_missing_device(self):
-        with mock.patch.object(self.agent.plugin_rpc, 'get_device_details',
+        with mock.patch.object(self.agent.plugin_rpc,
+                               'get_devices_details_list',
                                side_effect=Exception()):
-            self.assertTrue(self.agent.treat_devices_added([{}]))
+            self.assertTrue(self.agent.treat_devices_added(['tap1']))
 
     def _mock_treat_devices_added(self, details, port, func_name):
         """Mock treat devices added.
 
         :param details: the details to return for the device
-        :param port: the port that get_vif_port_by_id should return
+        :param port: the port that get_vif_ports_by_ids should return
         :param func_name: the function that should be called
         :returns: whether the named function was called
         """
         with contextlib.nested(
-            mock.patch.object(self.agent.plugin_rpc, 'get_device_details',
-                              return_value=details),
-            mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
-                              return_value=port),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_up'),
+            mock.patch.object(self.agent.plugin_rpc,
+                              'get_devices_details_list',
+                              return_value=[details]),
+            mock.patch.object(self.agent.int_br, 'get_vif_ports_by_ids',
+                              return_value={details['device']: port}),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_up'),
             mock.patch.object(self.agent, func_name)
         ) as (get_dev_fn, get_vif_func, upd_dev_up, func):
-            self.assertFalse(self.agent.treat_devices_added([{}]))
+            self.assertFalse(self.agent.treat_devices_added(['tap1']))
+        get_vif_func.assert_called_once_with([details['device']])
         return func.called
 
     def test_treat_devices_added_ignores_invalid_ofport(self):
         port = mock.Mock()
         port.ofport = -1
-        self.assertFalse(self._mock_treat_devices_added(mock.MagicMock(), port,
-                                                        'port_dead'))
+        self.assertFalse(self._mock_treat_devices_added({'device': 'tap1'},
+                                                        port, 'port_dead'))
 
     def test_treat_devices_added_marks_unknown_port_as_dead(self):
         port = mock.Mock()
         port.ofport = 1
-        self.assertTrue(self._mock_treat_devices_added(mock.MagicMock(), port,
-                                                       'port_dead'))
+        self.assertTrue(self._mock_treat_devices_added({'device': 'tap1'},
+                                                       port, 'port_dead'))
 
     def test_treat_devices_added_updates_known_port(self):
-        details = mock.MagicMock()
-        details.__contains__.side_effect = lambda x: True
+        details = {'device': 'tap1', 'port_id': 'port1', 'network_id': 'net1',
+                   'network_type': 'vlan', 'physical_network': 'physnet1',
+                   'segmentation_id': 1, 'admin_state_up': True}
         self.assertTrue(self._mock_treat_devices_added(details,
                                                        mock.Mock(),
                                                        'treat_vif_port'))
 
+    def test_treat_devices_added_batches_rpc_calls(self):
+        details = [{'device': device, 'port_id': device, 'network_id': 'net1',
+                    'network_type': 'vlan', 'physical_network': 'physnet1',
+                    'segmentation_id': 1, 'admin_state_up': True}
+                   for device in ('tap1', 'tap2')]
+        details.append({'device': 'tap3'})
+        with contextlib.nested(
+            mock.patch.object(self.agent.plugin_rpc,
+                              'get_devices_details_list',
+                              return_value=details),
+            mock.patch.object(self.agent.int_br, 'get_vif_ports_by_ids',
+                              return_value={}),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_up'),
+            mock.patch.object(self.agent, 'treat_vif_port')
+        ) as (get_dev_fn, get_vif_func, upd_dev_up, treat_vif_port):
+            self.assertFalse(self.agent.treat_devices_added(
+                ['tap1', 'tap2', 'tap3']))
+        get_dev_fn.assert_called_once_with(
+            self.agent.context, ['tap1', 'tap2', 'tap3'], self.agent.agent_id)
+        get_vif_func.assert_called_once_with(['tap1', 'tap2', 'tap3'])
+        upd_dev_up.assert_called_once_with(
+            self.agent.context, ['tap1', 'tap2'], self.agent.agent_id)
+        self.assertEqual(2, treat_vif_port.call_count)
+
+    def test_provision_local_vlans_batches_tunnel_flows(self):
+        self.agent.enable_tunneling = True
+        self.agent.tun_br = ovs_lib.OVSBridge('br-tun', 'sudo')
+        self.agent.tun_br_ofports['gre'] = {'1.1.1.1': '1', '2.2.2.2': '2'}
+        with mock.patch.object(utils, 'execute') as execute:
+            with self.agent._defer_apply_flows():
+                for i in range(1000):
+                    self.agent.provision_local_vlan('net%d' % i, 'gre', None,
+                                                    i + 1)
+        # One mod-flows call for the flooding flows and one add-flows call
+        # for the flows setting the local vlans
+        self.assertEqual(2, execute.call_count)
+        self.assertEqual(1000, len(
+            execute.call_args_list[1][1]['process_input'].splitlines()))
+
     def test_treat_devices_removed_returns_true_for_missing_device(self):
         with mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
                                side_effect=Exception()):
@@ -115,6 +115,7 @@ class TunnelTest(base.BaseTestCase):
             'patch-int', 'patch-tun').AndReturn(self.INT_OFPORT)
 
         self.mock_tun_bridge.remove_all_flows()
+        self.mock_tun_bridge.defer_apply_on()
         self.mock_tun_bridge.add_flow(priority=1,
                                       in_port=self.INT_OFPORT,
                                       actions="resubmit(,%s)" %
@@ -153,6 +154,7 @@ class TunnelTest(base.BaseTestCase):
         self.mock_tun_bridge.add_flow(table=constants.FLOOD_TO_TUN,
                                       priority=0,
                                       actions="drop")
+        self.mock_tun_bridge.defer_apply_off()
 
         self.mox.StubOutWithMock(ip_lib, 'device_exists')
         ip_lib.device_exists('tunnel_bridge_mapping', 'sudo').AndReturn(True)
@@ -18,6 +18,7 @@
 import copy
 import time
 
+import mock
 from oslo.config import cfg
 from webob import exc
 
@@ -29,7 +30,9 @@ from neutron import context
 from neutron.db import agents_db
 from neutron.db import db_base_plugin_v2
 from neutron.extensions import agent
+from neutron import manager
 from neutron.openstack.common import log as logging
+from neutron.openstack.common import loopingcall
 from neutron.openstack.common import timeutils
 from neutron.openstack.common import uuidutils
 from neutron.tests.unit import test_api_v2
@@ -241,6 +244,163 @@ class AgentDBTestCase(AgentDBTestMixIn,
             query_string='binary=neutron-l3-agent&host=' + L3_HOSTB)
         self.assertFalse(agents['agents'][0]['alive'])
 
+    def _override_time(self):
+        looping_call_p = mock.patch.object(loopingcall,
+                                           'FixedIntervalLoopingCall')
+        looping_call_p.start()
+        self.addCleanup(looping_call_p.stop)
+        timeutils.set_time_override(timeutils.utcnow())
+        self.addCleanup(timeutils.clear_time_override)
+        self.heartbeats = agents_db.AgentDbMixin.heartbeats
+
+    def _get_dhcp_agent_db(self):
+        plugin = manager.NeutronManager.get_plugin()
+        return plugin._get_agent_by_type_and_host(
+            context.get_admin_context(), constants.AGENT_TYPE_DHCP,
+            DHCP_HOST1)
+
+    def test_heartbeat_absorbed(self):
+        self._override_time()
+        self._register_one_dhcp_agent()
+        written = timeutils.utcnow()
+        timeutils.advance_time_seconds(3)
+        self._register_one_dhcp_agent()
+        agent_db = self._get_dhcp_agent_db()
+        self.assertEqual(written, agent_db.heartbeat_timestamp)
+        self.assertEqual({agent_db.id: timeutils.utcnow()},
+                         self.heartbeats.pending)
+        agent = self._show('agents', agent_db.id)['agent']
+        self.assertEqual(timeutils.strtime(),
+                         timeutils.strtime(timeutils.parse_isotime(
+                             agent['heartbeat_timestamp']).replace(
+                                 tzinfo=None)))
+
+        self.heartbeats.flush()
+        self.assertFalse(self.heartbeats.pending)
+        self.assertEqual(timeutils.utcnow(),
+                         self._get_dhcp_agent_db().heartbeat_timestamp)
+
+    def test_heartbeat_written_on_configuration_change(self):
+        self._override_time()
+        agent_state = self._register_one_dhcp_agent()[0]
+        timeutils.advance_time_seconds(3)
+        agent_state['configurations']['networks'] = 1
+        callback = agents_db.AgentExtRpcCallback()
+        callback.report_state(self.adminContext,
+                              agent_state={'agent_state': agent_state},
+                              time=timeutils.strtime())
+        agent_db = self._get_dhcp_agent_db()
+        self.assertEqual(timeutils.utcnow(), agent_db.heartbeat_timestamp)
+        self.assertEqual(1, agent_db['configurations'].count('networks'))
+        self.assertFalse(self.heartbeats.pending)
+
+    def test_heartbeat_written_without_flush_interval(self):
+        self._override_time()
+        cfg.CONF.set_override('agent_heartbeat_flush_interval', 0)
+        self._register_one_dhcp_agent()
+        timeutils.advance_time_seconds(3)
+        self._register_one_dhcp_agent()
+        self.assertEqual(timeutils.utcnow(),
+                         self._get_dhcp_agent_db().heartbeat_timestamp)
+        self.assertFalse(self.heartbeats.pending)
+
+    def test_deleted_agent_created_again(self):
+        self._override_time()
+        self._register_one_dhcp_agent()
+        agent_id = self._get_dhcp_agent_db().id
+        # The agent is deleted by another process
+        plugin = manager.NeutronManager.get_plugin()
+        with self.adminContext.session.begin():
+            self.adminContext.session.delete(
+                plugin._get_agent(self.adminContext, agent_id))
+        self._register_one_dhcp_agent()
+        self.heartbeats.flush()
+        self.assertNotIn(agent_id, self.heartbeats.heartbeats)
+        self._register_one_dhcp_agent()
+        self.assertNotEqual(agent_id, self._get_dhcp_agent_db().id)
+
+    def test_is_agent_down(self):
+        self._override_time()
+        cfg.CONF.set_override('agent_down_time', 5)
+        cfg.CONF.set_override('agent_heartbeat_flush_interval', 2)
+        self._register_one_dhcp_agent()
+        agent_db = self._get_dhcp_agent_db()
+        written = agent_db.heartbeat_timestamp
+        timeutils.advance_time_seconds(4)
+        self._register_one_dhcp_agent()
+        timeutils.advance_time_seconds(4)
+        self.assertFalse(agents_db.AgentDbMixin.is_agent_down(
+            written, agent_db.id))
+        self.assertTrue(agents_db.AgentDbMixin.is_agent_down(written))
+
+    def test_is_agent_down_accounts_for_late_heartbeats(self):
+        cfg.CONF.set_override('agent_down_time', 5)
+        cfg.CONF.set_override('agent_heartbeat_flush_interval', 2)
+        timeutils.set_time_override(timeutils.utcnow())
+        self.addCleanup(timeutils.clear_time_override)
+        heartbeat = timeutils.utcnow()
+        timeutils.advance_time_seconds(6)
+        self.assertFalse(agents_db.AgentDbMixin.is_agent_down(heartbeat))
+        timeutils.advance_time_seconds(2)
+        self.assertTrue(agents_db.AgentDbMixin.is_agent_down(heartbeat))
+
+    def test_is_agent_down_heartbeats_written_by_another_process(self):
+        self._override_time()
+        cfg.CONF.set_override('agent_down_time', 5)
+        cfg.CONF.set_override('agent_heartbeat_flush_interval', 2)
+        self._register_one_dhcp_agent()
+        agent_id = self._get_dhcp_agent_db().id
+        # The next reports of the agent go to another process
+        other_heartbeats = agents_db.AgentHeartbeats()
+        other_heartbeats.written('agent', agent_id, 'state',
+                                 timeutils.utcnow())
+        timeutils.advance_time_seconds(4)
+        other_heartbeats.absorb('agent', 'state', timeutils.utcnow())
+        self.addCleanup(other_heartbeats._flusher.stop)
+        other_heartbeats.flush()
+        written = self._get_dhcp_agent_db().heartbeat_timestamp
+        self.assertEqual(timeutils.utcnow(), written)
+        # The heartbeats absorbed since are not written yet
+        timeutils.advance_time_seconds(6)
+        self.assertFalse(agents_db.AgentDbMixin.is_agent_down(
+            written, agent_id))
+        timeutils.advance_time_seconds(2)
+        self.assertTrue(agents_db.AgentDbMixin.is_agent_down(
+            written, agent_id))
+
+    def test_state_written_by_another_process_written_again(self):
+        self._override_time()
+        plugin = manager.NeutronManager.get_plugin()
+        agent_state = self._register_one_dhcp_agent()[0]
+        # Another process writes another state of the agent
+        other_state = copy.deepcopy(agent_state)
+        other_state['configurations']['networks'] = 1
+        with mock.patch.object(agents_db.AgentDbMixin, 'heartbeats',
+                               agents_db.AgentHeartbeats()):
+            plugin.create_or_update_agent(self.adminContext, other_state)
+        # The agent reports its first state again to this process
+        timeutils.advance_time_seconds(1)
+        plugin.create_or_update_agent(self.adminContext, agent_state)
+        self.assertIn('networks',
+                      self._get_dhcp_agent_db()['configurations'])
+        self.heartbeats.flush()
+        timeutils.advance_time_seconds(1)
+        plugin.create_or_update_agent(self.adminContext, agent_state)
+        agent_db = self._get_dhcp_agent_db()
+        self.assertNotIn('networks', agent_db['configurations'])
+        self.assertEqual(timeutils.utcnow(), agent_db.heartbeat_timestamp)
+        self.assertFalse(self.heartbeats.pending)
+
+    def test_heartbeats_kept_on_flush_failure(self):
+        self._override_time()
+        self._register_one_dhcp_agent()
+        self._register_one_dhcp_agent()
+        pending = dict(self.heartbeats.pending)
+        with mock.patch.object(agents_db.db_api, 'get_session',
+                               side_effect=RuntimeError()):
+            self.assertRaises(RuntimeError, self.heartbeats.flush)
+        self.assertEqual(pending, self.heartbeats.pending)
+
 
 class AgentDBTestCaseXML(AgentDBTestCase):
     fmt = 'xml'
@@ -17,7 +17,9 @@
 
 import fixtures
 import mock
+from oslo.config import cfg
 
+from neutron.agent.common import config
 from neutron.agent.linux import utils
 from neutron.tests import base
 
@@ -106,3 +108,71 @@ class AgentUtilsReplaceFile(base.BaseTestCase):
                     ntf.assert_has_calls(expected)
                     chmod.assert_called_once_with('/baz', 0o644)
                     rename.assert_called_once_with('/baz', '/foo')
+
+
+class TestFindChildPids(base.BaseTestCase):
+
+    def test_returns_empty_list_for_exit_code_1(self):
+        with mock.patch.object(utils, 'execute',
+                               side_effect=RuntimeError('Exit code: 1')):
+            self.assertEqual(utils.find_child_pids(-1), [])
+
+    def test_returns_list_of_child_process_ids_for_good_ouput(self):
+        with mock.patch.object(utils, 'execute', return_value=' 123 \n 185\n'):
+            self.assertEqual(utils.find_child_pids(-1), ['123', '185'])
+
+    def test_raises_unknown_exception(self):
+        with mock.patch.object(utils, 'execute',
+                               side_effect=RuntimeError('Exit code: 2')):
+            self.assertRaises(RuntimeError, utils.find_child_pids, -1)
+
+
+class AgentUtilsRootwrapDaemonTest(base.BaseTestCase):
+
+    def setUp(self):
+        super(AgentUtilsRootwrapDaemonTest, self).setUp()
+        self.client = mock.Mock()
+        self.client.execute.return_value = (0, 'out', '')
+        get_client_p = mock.patch.object(utils, 'get_rootwrap_client',
+                                         return_value=self.client)
+        get_client_p.start()
+        self.addCleanup(get_client_p.stop)
+
+    def test_execute_uses_daemon_with_root_helper(self):
+        self.assertEqual('out', utils.execute(['ip', 'link'], 'sudo',
+                                              process_input='in'))
+        self.client.execute.assert_called_once_with(['ip', 'link'], 'in')
+
+    def test_execute_raises_on_daemon_command_failure(self):
+        self.client.execute.return_value = (1, '', 'error')
+        self.assertRaises(RuntimeError, utils.execute, ['ip', 'link'],
+                          'sudo')
+
+    def test_execute_without_root_helper_does_not_use_daemon(self):
+        with mock.patch.object(utils, 'create_process') as create_process:
+            create_process.return_value[0].communicate.return_value = ('', '')
+            create_process.return_value[0].returncode = 0
+            create_process.return_value = (create_process.return_value[0],
+                                           ['ls'])
+            utils.execute(['ls'])
+        self.assertFalse(self.client.execute.called)
+
+
+class AgentUtilsGetRootwrapClientTest(base.BaseTestCase):
+
+    def setUp(self):
+        super(AgentUtilsGetRootwrapClientTest, self).setUp()
+        config.register_root_helper(cfg.CONF)
+        self.addCleanup(cfg.CONF.reset)
+        clients_p = mock.patch.dict(utils._rootwrap_clients, clear=True)
+        clients_p.start()
+        self.addCleanup(clients_p.stop)
+
+    def test_get_rootwrap_client_not_configured(self):
+        self.assertIsNone(utils.get_rootwrap_client())
+
+    def test_get_rootwrap_client(self):
+        cfg.CONF.set_override('root_helper_daemon', 'sudo daemon', 'AGENT')
+        client = utils.get_rootwrap_client()
+        self.assertEqual('sudo daemon', client.daemon_cmd)
+        self.assertIs(client, utils.get_rootwrap_client())
@@ -19,6 +19,7 @@ import mock
 
 from neutron.agent import rpc
 from neutron.openstack.common import context
+from neutron.openstack.common.rpc import common as rpc_common
 from neutron.tests import base
 
 
@@ -45,6 +46,47 @@ class AgentRPCPluginApi(base.BaseTestCase):
     def test_tunnel_sync(self):
         self._test_rpc_call('tunnel_sync')
 
+    def test_get_devices_details_list(self):
+        self._test_rpc_call('get_devices_details_list')
+
+    def test_update_devices_up(self):
+        self._test_rpc_call('update_devices_up')
+
+    def _test_batch_call_fallback(self, method, single_method, exc):
+        agent = rpc.PluginApi('fake_topic')
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        with mock.patch.object(agent, 'call',
+                               side_effect=[exc, 'foo', 'bar']) as call:
+            actual_val = getattr(agent, method)(ctxt, ['dev1', 'dev2'],
+                                                'fake_agent_id')
+        self.assertEqual('1.2', call.call_args_list[0][1]['version'])
+        self.assertEqual(method, call.call_args_list[0][0][1]['method'])
+        for i, device in enumerate(['dev1', 'dev2'], 1):
+            msg = call.call_args_list[i][0][1]
+            self.assertEqual(single_method, msg['method'])
+            self.assertEqual(device, msg['args']['device'])
+        return actual_val
+
+    def test_get_devices_details_list_falls_back_to_single_calls(self):
+        exc = rpc_common.RemoteError('UnsupportedRpcVersion')
+        self.assertEqual(['foo', 'bar'], self._test_batch_call_fallback(
+            'get_devices_details_list', 'get_device_details', exc))
+
+    def test_update_devices_up_falls_back_to_single_calls(self):
+        exc = rpc_common.UnsupportedRpcVersion(version='1.2')
+        self._test_batch_call_fallback('update_devices_up',
+                                       'update_device_up', exc)
+
+    def test_get_devices_details_list_raises_other_errors(self):
+        agent = rpc.PluginApi('fake_topic')
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        with mock.patch.object(agent, 'call',
+                               side_effect=rpc_common.Timeout()) as call:
+            self.assertRaises(rpc_common.Timeout,
+                              agent.get_devices_details_list,
+                              ctxt, ['dev1'], 'fake_agent_id')
+        self.assertEqual(1, call.call_count)
+
 
 class AgentPluginReportState(base.BaseTestCase):
     def test_plugin_report_state_use_call(self):
@@ -19,6 +19,8 @@
 #
 
 import mock
+from oslo.config import cfg
+import webob
 from webob import exc
 import webtest
 
@@ -26,6 +28,7 @@ from neutron.api.v2 import resource as wsgi_resource
 from neutron.common import exceptions as q_exc
 from neutron import context
 from neutron.openstack.common import gettextutils
+from neutron.openstack.common import jsonutils
 from neutron.tests import base
 from neutron import wsgi
 
@@ -298,6 +301,74 @@ class ResourceTestCase(base.BaseTestCase):
         res = resource.get('', extra_environ=environ, expect_errors=True)
         self.assertEqual(res.status_int, 200)
 
+    def test_index_streamed_with_json(self):
+        controller = mock.MagicMock()
+        controller.index = lambda request: {
+            'ports': ({'id': i} for i in range(3))}
+
+        resource = webtest.TestApp(wsgi_resource.Resource(controller))
+
+        environ = {'wsgiorg.routing_args': (None, {'action': 'index',
+                                                   'format': 'json'})}
+        res = resource.get('', extra_environ=environ)
+        self.assertEqual(res.status_int, 200)
+        self.assertEqual(wsgi.JSONDeserializer().deserialize(res.body),
+                         {'body': {'ports': [{'id': 0}, {'id': 1},
+                                             {'id': 2}]}})
+
+    def test_index_items_after_first_chunk_built_lazily(self):
+        cfg.CONF.set_override('response_chunk_size', 20)
+        self.addCleanup(cfg.CONF.clear_override, 'response_chunk_size')
+        built = []
+
+        def ports():
+            for i in range(3):
+                built.append(i)
+                yield {'id': i}
+
+        controller = mock.MagicMock()
+        controller.index = lambda request: {'ports': ports()}
+        resource = wsgi_resource.Resource(controller)
+
+        environ = {'wsgiorg.routing_args': (None, {'action': 'index',
+                                                   'format': 'json'})}
+        request = webob.Request.blank('/', environ=environ)
+        response = request.get_response(resource)
+        self.assertEqual(200, response.status_int)
+        self.assertEqual([0], built)
+        self.assertEqual({'ports': [{'id': 0}, {'id': 1}, {'id': 2}]},
+                         jsonutils.loads(''.join(response.app_iter)))
+        self.assertEqual([0, 1, 2], built)
+
+    def test_index_serialization_failure_returns_error(self):
+        def ports():
+            raise q_exc.NeutronException()
+            yield
+
+        controller = mock.MagicMock()
+        controller.index = lambda request: {'ports': ports()}
+
+        resource = webtest.TestApp(wsgi_resource.Resource(controller))
+
+        environ = {'wsgiorg.routing_args': (None, {'action': 'index',
+                                                   'format': 'json'})}
+        res = resource.get('', extra_environ=environ, expect_errors=True)
+        self.assertEqual(res.status_int, exc.HTTPInternalServerError.code)
+
+    def test_index_with_xml(self):
+        controller = mock.MagicMock()
+        controller.index = lambda request: {
+            'ports': ({'id': str(i)} for i in range(2))}
+
+        resource = webtest.TestApp(wsgi_resource.Resource(controller))
+
+        environ = {'wsgiorg.routing_args': (None, {'action': 'index',
+                                                   'format': 'xml'})}
+        res = resource.get('', extra_environ=environ)
+        self.assertEqual(res.status_int, 200)
+        self.assertIn('<id>0</id>', res.body)
+        self.assertIn('<id>1</id>', res.body)
+
     def test_status_204(self):
         controller = mock.MagicMock()
         controller.test = lambda request: {'foo': 'bar'}
@@ -0,0 +1,254 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from oslo.config import cfg
+
+from neutron.db import api as db
+from neutron.db import ipam
+from neutron.db import models_v2
+from neutron.tests import base
+
+
+class IpamDbTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IpamDbTestCase, self).setUp()
+        cfg.CONF.set_override('connection', 'sqlite://', 'database')
+        self.addCleanup(cfg.CONF.clear_override, 'connection', 'database')
+        db.configure_db()
+        self.addCleanup(db.clear_db)
+        self.context = mock.Mock()
+        self.context.session = self.session = db.get_session()
+
+    def _make_pool(self, ranges, first_ip='10.0.0.2', last_ip='10.0.0.254'):
+        with self.session.begin():
+            self.session.add(models_v2.Network(id='net', name='net',
+                                               status='ACTIVE',
+                                               admin_state_up=True))
+            self.session.add(models_v2.Subnet(id='sub', network_id='net',
+                                              ip_version=4,
+                                              cidr='10.0.0.0/24'))
+            pool = models_v2.IPAllocationPool(id='pool-id', subnet_id='sub',
+                                              first_ip=first_ip,
+                                              last_ip=last_ip)
+            self.session.add(pool)
+        with self.session.begin():
+            for first, last in ranges:
+                ranges = ipam.PoolRanges(self.session, pool)
+                ranges._insert(int(ipam.netaddr.IPAddress(first)),
+                               int(ipam.netaddr.IPAddress(last)))
+        self.session.expunge_all()
+        return pool
+
+    def _free(self):
+        query = self.session.query(models_v2.IPAvailabilityRange)
+        return sorted((r['first_ip'], r['last_ip']) for r in query)
+
+
+class TestPoolRanges(IpamDbTestCase):
+
+    def _ranges(self, ranges, first_ip='10.0.0.2', last_ip='10.0.0.254'):
+        pool = self._make_pool(ranges, first_ip, last_ip)
+        return ipam.PoolRanges(self.session, pool)
+
+    def _update(self, update):
+        with self.session.begin():
+            result = update()
+        self.session.expunge_all()
+        return result
+
+    def test_first_free(self):
+        ranges = self._ranges([('10.0.0.20', '10.0.0.30'),
+                               ('10.0.0.5', '10.0.0.6')])
+        self.assertEqual('10.0.0.5', ranges.format(ranges.first_free()))
+
+    def test_first_free_exhausted(self):
+        self.assertIsNone(self._ranges([]).first_free())
+
+    def test_take_first_of_range(self):
+        ranges = self._ranges([('10.0.0.2', '10.0.0.254')])
+        self.assertTrue(self._update(lambda: ranges.take(
+            ranges.first_free())))
+        self.assertEqual([('10.0.0.3', '10.0.0.254')], self._free())
+
+    def test_take_last_of_range(self):
+        ranges = self._ranges([('10.0.0.2', '10.0.0.254')])
+        self.assertTrue(self._update(lambda: ranges.take(0x0a0000fe)))
+        self.assertEqual([('10.0.0.2', '10.0.0.253')], self._free())
+
+    def test_take_splits_range(self):
+        ranges = self._ranges([('10.0.0.2', '10.0.0.254')])
+        self.assertTrue(self._update(lambda: ranges.take(0x0a000005)))
+        self.assertEqual([('10.0.0.2', '10.0.0.4'),
+                          ('10.0.0.6', '10.0.0.254')], self._free())
+
+    def test_take_single_address_range(self):
+        ranges = self._ranges([('10.0.0.5', '10.0.0.5'),
+                               ('10.0.0.7', '10.0.0.9')])
+        self.assertTrue(self._update(lambda: ranges.take(0x0a000005)))
+        self.assertEqual([('10.0.0.7', '10.0.0.9')], self._free())
+
+    def test_take_not_free(self):
+        ranges = self._ranges([('10.0.0.2', '10.0.0.4'),
+                               ('10.0.0.7', '10.0.0.9')])
+        self.assertFalse(self._update(lambda: ranges.take(0x0a000005)))
+        self.assertFalse(ranges.is_free(0x0a000005))
+        self.assertFalse(ranges.is_free(0x0a000001))
+
+    def test_take_orders_addresses_numerically(self):
+        # '10.0.0.100' sorts before '10.0.0.20' as a string
+        ranges = self._ranges([('10.0.0.20', '10.0.0.30'),
+                               ('10.0.0.100', '10.0.0.110')])
+        self.assertTrue(ranges.is_free(0x0a000019))
+        self.assertFalse(ranges.is_free(0x0a000032))
+        self.assertEqual('10.0.0.20', ranges.format(ranges.first_free()))
+
+    def test_take_first_spans_ranges(self):
+        ranges = self._ranges([('10.0.0.2', '10.0.0.3'),
+                               ('10.0.0.6', '10.0.0.9')])
+        ips = self._update(lambda: ranges.take_first(3))
+        self.assertEqual(['10.0.0.2', '10.0.0.3', '10.0.0.6'],
+                         [ranges.format(ip) for ip in ips])
+        self.assertEqual([('10.0.0.7', '10.0.0.9')], self._free())
+
+    def test_take_first_exhausts_pool(self):
+        ranges = self._ranges([('10.0.0.2', '10.0.0.3')])
+        self.assertEqual(2, len(self._update(lambda: ranges.take_first(5))))
+        self.assertIsNone(ranges.first_free())
+
+    def test_give_merges_both_neighbours(self):
+        ranges = self._ranges([('10.0.0.2', '10.0.0.4'),
+                               ('10.0.0.6', '10.0.0.9')])
+        self._update(lambda: ranges.give(0x0a000005))
+        self.assertEqual([('10.0.0.2', '10.0.0.9')], self._free())
+
+    def test_give_extends_previous(self):
+        ranges = self._ranges([('10.0.0.2', '10.0.0.4'),
+                               ('10.0.0.7', '10.0.0.9')])
+        self._update(lambda: ranges.give(0x0a000005))
+        self.assertEqual([('10.0.0.2', '10.0.0.5'),
+                          ('10.0.0.7', '10.0.0.9')], self._free())
+
+    def test_give_extends_next(self):
+        ranges = self._ranges([('10.0.0.2', '10.0.0.3'),
+                               ('10.0.0.6', '10.0.0.9')])
+        self._update(lambda: ranges.give(0x0a000005))
+        self.assertEqual([('10.0.0.2', '10.0.0.3'),
+                          ('10.0.0.5', '10.0.0.9')], self._free())
+        self.assertTrue(ranges.is_free(0x0a000005))
+
+    def test_give_isolated(self):
+        ranges = self._ranges([])
+        self._update(lambda: ranges.give(0x0a000005))
+        self.assertEqual([('10.0.0.5', '10.0.0.5')], self._free())
+
+    def test_give_already_free(self):
+        ranges = self._ranges([('10.0.0.2', '10.0.0.9')])
+        self._update(lambda: ranges.give(0x0a000005))
+        self.assertEqual([('10.0.0.2', '10.0.0.9')], self._free())
+
+    def test_ipv6(self):
+        ranges = self._ranges([('fe80::2', 'fe80::ffff')],
+                              first_ip='fe80::2', last_ip='fe80::ffff')
+        ip = ranges.first_free()
+        self.assertTrue(self._update(lambda: ranges.take(ip)))
+        self.assertEqual('fe80::2', ranges.format(ip))
+        self.assertEqual([('fe80::3', 'fe80::ffff')], self._free())
+
+
+class TestAvailabilityRangeIpamDriver(IpamDbTestCase):
+
+    def setUp(self):
+        super(TestAvailabilityRangeIpamDriver, self).setUp()
+        self.driver = ipam.AvailabilityRangeIpamDriver()
+        self._make_pool([('10.0.0.2', '10.0.0.254')])
+        self.addCleanup(mock.patch.stopall)
+
+    def _mock_bump(self, results):
+        return mock.patch.object(self.driver, '_bump_version',
+                                 side_effect=results).start()
+
+    def _call(self, method, *args):
+        with self.session.begin():
+            return method(self.context, *args)
+
+    def test_allocate(self):
+        self.assertEqual('10.0.0.2',
+                         self._call(self.driver.allocate, {'id': 'sub'}))
+        self.assertEqual([('10.0.0.3', '10.0.0.254')], self._free())
+        pool = self.session.query(models_v2.IPAllocationPool).one()
+        self.assertEqual(1, pool['version'])
+
+    def test_allocate_retries_with_lock_on_conflict(self):
+        get_pools = mock.patch.object(self.driver, '_get_pools',
+                                      wraps=self.driver._get_pools).start()
+        bump = self._mock_bump([False, True])
+        self.assertEqual('10.0.0.2',
+                         self._call(self.driver.allocate, {'id': 'sub'}))
+        get_pools.assert_has_calls([mock.call(self.context, 'sub', False),
+                                    mock.call(self.context, 'sub', True)])
+        self.assertEqual(2, bump.call_count)
+
+    def test_allocate_many(self):
+        bump = self._mock_bump([True])
+        self.assertEqual(['10.0.0.2', '10.0.0.3', '10.0.0.4'],
+                         self._call(self.driver.allocate_many,
+                                    {'id': 'sub'}, 3))
+        self.assertEqual(1, bump.call_count)
+
+    def test_allocate_many_retries_with_lock_on_conflict(self):
+        self._mock_bump([False, True])
+        self.assertEqual(['10.0.0.2', '10.0.0.3'],
+                         self._call(self.driver.allocate_many,
+                                    {'id': 'sub'}, 2))
+
+    def test_allocate_specific(self):
+        self.assertTrue(self._call(self.driver.allocate_specific, 'sub',
+                                   '10.0.0.5'))
+        self.assertEqual([('10.0.0.2', '10.0.0.4'),
+                          ('10.0.0.6', '10.0.0.254')], self._free())
+
+    def test_allocate_specific_not_free(self):
+        self._call(self.driver.allocate_specific, 'sub', '10.0.0.5')
+        self.assertFalse(self._call(self.driver.allocate_specific, 'sub',
+                                    '10.0.0.5'))
+
+    def test_allocate_specific_conflicts(self):
+        self._mock_bump([False, False])
+        self.assertFalse(self._call(self.driver.allocate_specific, 'sub',
+                                    '10.0.0.5'))
+
+    def test_allocate_specific_outside_pools(self):
+        self.assertTrue(self._call(self.driver.allocate_specific, 'sub',
+                                   '10.0.0.1'))
+        self.assertEqual([('10.0.0.2', '10.0.0.254')], self._free())
+
+    def test_release(self):
+        self._call(self.driver.allocate, {'id': 'sub'})
+        self.assertTrue(self._call(self.driver.release, 'sub', '10.0.0.2'))
+        self.assertEqual([('10.0.0.2', '10.0.0.254')], self._free())
+
+    def test_release_outside_pools(self):
+        bump = self._mock_bump([True])
+        self.assertFalse(self._call(self.driver.release, 'sub',
+                                    '10.0.0.255'))
+        self.assertFalse(bump.called)
+
+    def test_get_driver(self):
+        self.assertIsInstance(ipam.get_driver(),
+                              ipam.AvailabilityRangeIpamDriver)
@@ -0,0 +1,174 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from neutron.common import timing
+from neutron import context
+from neutron.db import metadata_cache
+from neutron.db import models_v2
+from neutron.manager import NeutronManager
+from neutron.tests import base
+from neutron.tests.unit import test_db_plugin
+
+
+class TestExpiringLRUCache(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestExpiringLRUCache, self).setUp()
+        self.size = 2
+        self.ttl = 10
+        self.cache = metadata_cache.ExpiringLRUCache(lambda: self.size,
+                                                     lambda: self.ttl)
+
+    def test_get_set(self):
+        self.cache.set('a', 1)
+        self.assertEqual(1, self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+
+    def test_evicts_least_recently_used(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.assertEqual(1, self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(2, len(self.cache))
+
+    def test_entries_expire(self):
+        with mock.patch('time.time', return_value=100):
+            self.cache.set('a', 1)
+        with mock.patch('time.time', return_value=111):
+            self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(0, len(self.cache))
+
+    def test_disabled(self):
+        self.ttl = 0
+        self.cache.set('a', 1)
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_invalidate(self):
+        self.cache.set('a', 1)
+        self.cache.invalidate('a')
+        self.assertIsNone(self.cache.get('a'))
+
+
+class TestMetadataCache(test_db_plugin.NeutronDbPluginV2TestCase):
+
+    def setUp(self):
+        super(TestMetadataCache, self).setUp()
+        metadata_cache.clear()
+        self.addCleanup(metadata_cache.clear)
+        self.plugin = NeutronManager.get_plugin()
+
+    def _count_statements(self, func, *args):
+        stats = timing.start_statement_stats()
+        try:
+            func(*args)
+        finally:
+            timing.stop_statement_stats()
+        return stats.count
+
+    def test_subnet_metadata_is_cached(self):
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            ctx = context.get_admin_context()
+            subnet_id = subnet['subnet']['id']
+            metadata = metadata_cache.get_subnet(ctx, subnet_id)
+            self.assertEqual('10.0.0.1', metadata['gateway_ip'])
+            self.assertEqual([('10.0.0.2', '10.0.0.254')],
+                             metadata['allocation_pools'])
+            self.assertEqual(0, self._count_statements(
+                metadata_cache.get_subnet, context.get_admin_context(),
+                subnet_id))
+
+    def test_subnet_update_invalidates_metadata(self):
+        pools = [{'start': '10.0.0.2', 'end': '10.0.0.100'}]
+        with self.subnet(allocation_pools=pools) as subnet:
+            subnet_id = subnet['subnet']['id']
+            metadata_cache.get_subnet(context.get_admin_context(), subnet_id)
+            req = self.new_update_request(
+                'subnets', {'subnet': {'gateway_ip': '10.0.0.200'}},
+                subnet_id)
+            req.get_response(self.api)
+            metadata = metadata_cache.get_subnet(context.get_admin_context(),
+                                                 subnet_id)
+            self.assertEqual('10.0.0.200', metadata['gateway_ip'])
+
+    def test_metadata_cached_during_transaction_invalidated_on_commit(self):
+        with self.subnet() as subnet:
+            subnet_id = subnet['subnet']['id']
+            stale = metadata_cache.get_subnet(context.get_admin_context(),
+                                              subnet_id)
+            ctx = context.get_admin_context()
+            with ctx.session.begin(subtransactions=True):
+                subnet_db = self.plugin._get_subnet(ctx, subnet_id)
+                subnet_db.gateway_ip = '10.0.0.200'
+                ctx.session.flush()
+                # Another request caches the subnet as committed so far
+                metadata_cache._subnets.set(subnet_id, stale)
+            metadata = metadata_cache.get_subnet(context.get_admin_context(),
+                                                 subnet_id)
+            self.assertEqual('10.0.0.200', metadata['gateway_ip'])
+
+    def test_metadata_invalidated_on_rollback(self):
+        with self.subnet() as subnet:
+            subnet_id = subnet['subnet']['id']
+            ctx = context.get_admin_context()
+            ctx.session.begin(subtransactions=True)
+            subnet_db = self.plugin._get_subnet(ctx, subnet_id)
+            subnet_db.gateway_ip = '10.0.0.200'
+            ctx.session.flush()
+            metadata_cache.get_subnet(ctx, subnet_id)
+            ctx.session.rollback()
+            metadata = metadata_cache.get_subnet(context.get_admin_context(),
+                                                 subnet_id)
+            self.assertEqual('10.0.0.1', metadata['gateway_ip'])
+
+    def test_subnet_delete_invalidates_metadata(self):
+        with self.network() as network:
+            with self.subnet(network=network, do_delete=False) as subnet:
+                subnet_id = subnet['subnet']['id']
+                metadata_cache.get_subnet(context.get_admin_context(),
+                                          subnet_id)
+                self._delete('subnets', subnet_id)
+                self.assertIsNone(metadata_cache.get_subnet(
+                    context.get_admin_context(), subnet_id))
+
+    def test_request_models_are_memoized(self):
+        with self.subnet() as subnet:
+            ctx = context.get_admin_context()
+            subnet_id = subnet['subnet']['id']
+            network_id = subnet['subnet']['network_id']
+            self._count_statements(self.plugin._get_subnet, ctx, subnet_id)
+            self._count_statements(self.plugin._get_network, ctx, network_id)
+            self.assertEqual(0, self._count_statements(
+                self.plugin._get_subnet, ctx, subnet_id))
+            self.assertEqual(0, self._count_statements(
+                self.plugin._get_network, ctx, network_id))
+            self.assertNotEqual(0, self._count_statements(
+                self.plugin._get_subnet, context.get_admin_context(),
+                subnet_id))
+
+    def test_request_model_deleted_is_not_returned(self):
+        with self.network() as network:
+            ctx = context.get_admin_context()
+            network_id = network['network']['id']
+            db_network = self.plugin._get_network(ctx, network_id)
+            ctx.session.delete(db_network)
+            self.assertIsNone(metadata_cache.get_request_model(
+                ctx, models_v2.Network, network_id))
+            ctx.session.expunge_all()
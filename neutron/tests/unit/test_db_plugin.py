@@ -35,9 +35,12 @@ from neutron.api.v2.router import APIRouter
 from neutron.common import config
 from neutron.common import exceptions as q_exc
 from neutron.common.test_lib import test_config
+from neutron.common import timing
 from neutron import context
+from neutron.db import agents_db
 from neutron.db import api as db
 from neutron.db import db_base_plugin_v2
+from neutron.db import ipam
 from neutron.db import models_v2
 from neutron.manager import NeutronManager
 from neutron.openstack.common import importutils
@@ -165,6 +168,7 @@ class NeutronDbPluginV2TestCase(testlib_api.WebTestCase):
         # NOTE(jkoelker) for a 'pluggable' framework, Neutron sure
         #                doesn't like when the plugin changes ;)
         db.clear_db()
+        agents_db.AgentDbMixin.heartbeats.clear()
         cfg.CONF.reset()
         # Restore the original attribute map
         attributes.RESOURCE_ATTRIBUTE_MAP = self._attribute_map_bk
@@ -858,6 +862,55 @@ class TestPortsV2(NeutronDbPluginV2TestCase):
             for p in self.deserialize(self.fmt, res)['ports']:
                 self._delete('ports', p['id'])
 
+    def test_create_ports_bulk_native_batched_allocation(self):
+        if self._skip_native_bulk:
+            self.skipTest("Plugin does not support native bulk port create")
+        plugin = NeutronManager.get_plugin()
+        with self.subnet() as subnet:
+            net_id = subnet['subnet']['network_id']
+            with contextlib.nested(
+                mock.patch.object(plugin, '_check_unique_mac'),
+                mock.patch.object(plugin, '_generate_macs',
+                                  wraps=plugin._generate_macs)
+            ) as (check_mac, generate_macs):
+                res = self._create_port_bulk(self.fmt, 2, net_id,
+                                             'test', True)
+                self.assertFalse(check_mac.called)
+                self.assertEqual(1, generate_macs.call_count)
+            self._validate_behavior_on_bulk_success(res, 'ports')
+            ports = self.deserialize(self.fmt, res)['ports']
+            self.assertEqual(2, len(set(p['mac_address'] for p in ports)))
+            self.assertEqual(['10.0.0.2', '10.0.0.3'],
+                             [p['fixed_ips'][0]['ip_address']
+                              for p in ports])
+            for p in ports:
+                self._delete('ports', p['id'])
+
+    def test_generate_macs_skips_excluded(self):
+        plugin = NeutronManager.get_plugin()
+        with self.network() as network:
+            with mock.patch.object(db_base_plugin_v2.NeutronDbPluginV2,
+                                   '_random_mac',
+                                   side_effect=['fa:16:3e:00:00:01',
+                                                'fa:16:3e:00:00:02']):
+                macs = plugin._generate_macs(
+                    context.get_admin_context(),
+                    network['network']['id'], 1,
+                    exclude=set(['fa:16:3e:00:00:01']))
+            self.assertEqual(['fa:16:3e:00:00:02'], macs)
+
+    def test_create_ports_bulk_native_exhausted_subnet(self):
+        if self._skip_native_bulk:
+            self.skipTest("Plugin does not support native bulk port create")
+        with self.subnet(cidr='10.0.0.0/30') as subnet:
+            net_id = subnet['subnet']['network_id']
+            res = self._create_port_bulk(self.fmt, 2, net_id, 'test', True)
+            self.assertEqual(webob.exc.HTTPConflict.code, res.status_int)
+            # Nothing was consumed from the pool
+            with self.port(subnet=subnet) as port:
+                ips = port['port']['fixed_ips']
+                self.assertEqual('10.0.0.2', ips[0]['ip_address'])
+
     def test_create_ports_bulk_emulated(self):
         real_has_attr = hasattr
 
@@ -1313,6 +1366,16 @@ fixed_ips=ip_address%%3D%s&fixed_ips=ip_address%%3D%s&fixed_ips=subnet_id%%3D%s
                 res = self._create_port(self.fmt, net_id=net_id, **kwargs)
                 self.assertEqual(res.status_int, webob.exc.HTTPConflict.code)
 
+    def test_requested_ip_not_free(self):
+        with self.subnet() as subnet:
+            kwargs = {"fixed_ips": [{'subnet_id': subnet['subnet']['id'],
+                                     'ip_address': '10.0.0.5'}]}
+            net_id = subnet['subnet']['network_id']
+            with mock.patch.object(ipam.AvailabilityRangeIpamDriver,
+                                   'allocate_specific', return_value=False):
+                res = self._create_port(self.fmt, net_id=net_id, **kwargs)
+            self.assertEqual(res.status_int, webob.exc.HTTPConflict.code)
+
     def test_requested_subnet_delete(self):
         with self.subnet() as subnet:
             with self.port(subnet=subnet) as port:
@@ -3556,6 +3619,63 @@ class TestSubnetsV2(NeutronDbPluginV2TestCase):
             q_exc.HostRoutesExhausted)
 
 
+class TestModelLoadProfiles(NeutronDbPluginV2TestCase):
+
+    def _count_statements(self, resources):
+        getter = getattr(NeutronManager.get_plugin(), 'get_%s' % resources)
+        stats = timing.start_statement_stats()
+        try:
+            getter(context.get_admin_context())
+        finally:
+            timing.stop_statement_stats()
+        return stats.count
+
+    def _count_all_statements(self):
+        return [self._count_statements(resources)
+                for resources in ('networks', 'subnets', 'ports')]
+
+    def test_list_statements_independent_of_size(self):
+        with self.subnet() as subnet:
+            with self.port(subnet=subnet):
+                counts = self._count_all_statements()
+                with contextlib.nested(self.subnet(cidr='10.0.1.0/24'),
+                                       self.port(subnet=subnet),
+                                       self.port(subnet=subnet)):
+                    self.assertEqual(counts, self._count_all_statements())
+
+    def test_list_ports_filtered_by_fixed_ips_not_duplicated(self):
+        with self.network() as network:
+            with contextlib.nested(
+                self.subnet(network=network),
+                self.subnet(network=network, cidr='10.0.1.0/24')
+            ) as (subnet1, subnet2):
+                fixed_ips = [{'subnet_id': subnet1['subnet']['id']},
+                             {'subnet_id': subnet2['subnet']['id']}]
+                with self.port(subnet=subnet1, fixed_ips=fixed_ips):
+                    ports = NeutronManager.get_plugin().get_ports(
+                        context.get_admin_context(),
+                        filters={'fixed_ips': {'subnet_id': [
+                            subnet1['subnet']['id'],
+                            subnet2['subnet']['id']]}})
+                    self.assertEqual(1, len(ports))
+                    self.assertEqual(2, len(ports[0]['fixed_ips']))
+
+    def test_get_by_id_joins_one_collection_at_most(self):
+        plugin = NeutronManager.get_plugin()
+        query = mock.Mock()
+        query.options.return_value = query
+        with contextlib.nested(
+            mock.patch.dict(plugin._model_load_profiles,
+                            {models_v2.Network: ['subnets', 'ports']}),
+            mock.patch.object(db_base_plugin_v2.orm, 'joinedload'),
+            mock.patch.object(db_base_plugin_v2.orm, 'subqueryload')
+        ) as (profiles, joinedload, subqueryload):
+            plugin._apply_load_profile(query, models_v2.Network,
+                                       collection=False)
+            joinedload.assert_called_once_with('subnets')
+            subqueryload.assert_called_once_with('ports')
+
+
 class DbModelTestCase(base.BaseTestCase):
     """DB model tests."""
     def test_repr(self):
@@ -403,6 +403,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
                               'neutron.agent.linux.interface.NullDriver')
         config.register_root_helper(cfg.CONF)
         cfg.CONF.register_opts(dhcp_agent.DhcpAgent.OPTS)
+        cfg.CONF.set_override('reload_allocations_delay', 0)
 
         self.plugin_p = mock.patch(DHCP_PLUGIN)
         plugin_cls = self.plugin_p.start()
@@ -775,6 +776,49 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
                                    removed_ips=removed_ips),
              mock.call.call_driver('reload_allocations', fake_network)])
 
+    def test_ports_changed(self):
+        payload = {'ports': [vars(fake_port1), vars(fake_port2)],
+                   'deleted_port_ids': [fake_port2.id]}
+        self.cache.get_network_by_id.return_value = fake_network
+        self.cache.get_port_by_id.return_value = fake_port2
+        self.dhcp.ports_changed(None, payload)
+        self.assertEqual(2, self.cache.put_port.call_count)
+        self.cache.remove_port.assert_called_once_with(fake_port2)
+        removed_ips = [fixed_ip.ip_address
+                       for fixed_ip in fake_port2.fixed_ips]
+        # The network is reloaded once
+        self.assertEqual(
+            [mock.call('release_lease',
+                       fake_network,
+                       mac_address=fake_port2.mac_address,
+                       removed_ips=removed_ips),
+             mock.call('reload_allocations', fake_network)],
+            self.call_driver.call_args_list)
+
+    def test_port_update_end_delays_reload(self):
+        cfg.CONF.set_override('reload_allocations_delay', 0.5)
+        payload = dict(port=vars(fake_port2))
+        self.cache.get_network_by_id.return_value = fake_network
+        self.cache.get_port_by_id.return_value = fake_port2
+        with mock.patch.object(eventlet, 'spawn_after') as spawn_after:
+            self.dhcp.port_update_end(None, payload)
+            self.dhcp.port_create_end(None, payload)
+        spawn_after.assert_called_once_with(
+            0.5, self.dhcp._reload_pending_allocations, fake_network.id)
+        self.assertFalse(self.call_driver.called)
+
+        self.dhcp._reload_pending_allocations(fake_network.id)
+        self.call_driver.assert_called_once_with('reload_allocations',
+                                                 fake_network)
+        self.assertFalse(self.dhcp.pending_reloads)
+
+    def test_reload_pending_allocations_unknown_network(self):
+        self.cache.get_network_by_id.return_value = None
+        self.dhcp.pending_reloads.add(fake_network.id)
+        self.dhcp._reload_pending_allocations(fake_network.id)
+        self.assertFalse(self.call_driver.called)
+        self.assertFalse(self.dhcp.pending_reloads)
+
     def test_port_delete_end_unknown_port(self):
         payload = dict(port_id='unknown')
         self.cache.get_port_by_id.return_value = None
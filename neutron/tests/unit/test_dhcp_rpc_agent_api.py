@@ -0,0 +1,178 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from oslo.config import cfg
+
+from neutron.api.rpc.agentnotifiers import dhcp_rpc_agent_api
+from neutron.common import utils
+from neutron.db import agentschedulers_db  # noqa
+from neutron import manager
+from neutron.tests import base
+
+
+class TestDhcpAgentNotifyAPI(base.BaseTestCase):
+    def setUp(self):
+        super(TestDhcpAgentNotifyAPI, self).setUp()
+        self.addCleanup(cfg.CONF.reset)
+        plugin_p = mock.patch.object(manager.NeutronManager, 'get_plugin')
+        self.plugin = plugin_p.start().return_value
+        self.addCleanup(plugin_p.stop)
+        ext_p = mock.patch.object(utils, 'is_extension_supported',
+                                  return_value=True)
+        ext_p.start()
+        self.addCleanup(ext_p.stop)
+        spawn_p = mock.patch('eventlet.spawn_after')
+        self.spawn_after = spawn_p.start()
+        self.addCleanup(spawn_p.stop)
+        self.addCleanup(
+            dhcp_rpc_agent_api.DhcpAgentNotifyAPI._agents_cache.clear)
+        self.notifier = dhcp_rpc_agent_api.DhcpAgentNotifyAPI()
+        cast_p = mock.patch.object(self.notifier, 'cast')
+        self.cast = cast_p.start()
+        self.addCleanup(cast_p.stop)
+        self.context = mock.Mock(is_admin=True)
+        self.hosta = mock.Mock(host='hosta', topic='dhcp_agent')
+        self.hostb = mock.Mock(host='hostb', topic='dhcp_agent')
+        self.plugin.get_dhcp_agents_hosting_networks.return_value = [
+            self.hosta, self.hostb]
+        # Only hosta handles the batches
+        self.plugin.get_configuration_dict.side_effect = (
+            lambda agent: {'batch_notifications': agent is self.hosta})
+
+    def _notify_port(self, port_id, methodname='port.create.end'):
+        port = {'id': port_id, 'network_id': 'net1'}
+        self.notifier.notify(self.context, {'port': port}, methodname)
+        return port
+
+    def test_port_events_buffered(self):
+        self._notify_port('p1')
+        port2 = self._notify_port('p2')
+        port1_updated = self._notify_port('p1', 'port.update.end')
+        self._notify_port('p3')
+        self._notify_port('p3', 'port.delete.end')
+        self.assertEqual(1, self.spawn_after.call_count)
+        self.assertFalse(self.cast.called)
+
+        self.notifier._flush_port_events()
+        self.assertFalse(self.notifier._pending_ports)
+        self.assertFalse(self.notifier._flush_scheduled)
+        # The network is hosted already
+        self.assertFalse(self.plugin.schedule_network.called)
+        make_msg = self.notifier.make_msg
+        casts = self.cast.call_args_list
+        self.assertEqual(
+            mock.call(mock.ANY,
+                      make_msg('ports_changed',
+                               payload={'ports': [port2, port1_updated],
+                                        'deleted_port_ids': ['p3']}),
+                      topic='dhcp_agent.hosta', version='1.1'),
+            casts[0])
+        self.assertEqual(
+            [mock.call(mock.ANY, make_msg(method, payload=payload),
+                       topic='dhcp_agent.hostb')
+             for method, payload in [
+                 ('port_create_end', {'port': port2}),
+                 ('port_create_end', {'port': port1_updated}),
+                 ('port_delete_end', {'port_id': 'p3'})]],
+            casts[1:])
+
+    def test_port_event_not_buffered_without_delay(self):
+        cfg.CONF.set_override('dhcp_agent_notification_delay', 0)
+        port = self._notify_port('p1')
+        self.assertFalse(self.spawn_after.called)
+        self.assertEqual(2, self.cast.call_count)
+        self.cast.assert_called_with(
+            mock.ANY,
+            self.notifier.make_msg('port_create_end',
+                                   payload={'port': port}),
+            topic='dhcp_agent.hostb')
+
+    def test_network_event_flushes_port_events(self):
+        self._notify_port('p1')
+        network = {'id': 'net1'}
+        self.notifier.notify(self.context, {'network': network},
+                             'network.update.end')
+        self.assertFalse(self.notifier._pending_ports)
+        self.assertEqual(
+            mock.call(mock.ANY,
+                      self.notifier.make_msg('network_update_end',
+                                             payload={'network': network}),
+                      topic='dhcp_agent.hostb'),
+            self.cast.call_args_list[-1])
+
+    def test_hosted_network_not_scheduled(self):
+        cfg.CONF.set_override('dhcp_agent_notification_delay', 0)
+        self._notify_port('p1')
+        self._notify_port('p2')
+        self.assertFalse(self.plugin.get_network.called)
+        self.assertFalse(self.plugin.schedule_network.called)
+        self.assertEqual(
+            1, self.plugin.get_dhcp_agents_hosting_networks.call_count)
+
+    def test_network_scheduled_invalidates_agents(self):
+        cfg.CONF.set_override('dhcp_agent_notification_delay', 0)
+        self.plugin.get_dhcp_agents_hosting_networks.side_effect = [
+            [], [self.hostb]]
+        self.plugin.schedule_network.return_value = [{'host': 'hostb'}]
+        port = self._notify_port('p1')
+        self.plugin.schedule_network.assert_called_once_with(
+            self.context, self.plugin.get_network.return_value)
+        make_msg = self.notifier.make_msg
+        self.assertEqual(
+            [mock.call(mock.ANY,
+                       make_msg('network_create_end',
+                                payload={'network': {'id': 'net1'}}),
+                       topic='dhcp_agent.hostb'),
+             mock.call(mock.ANY,
+                       make_msg('port_create_end', payload={'port': port}),
+                       topic='dhcp_agent.hostb')],
+            self.cast.call_args_list)
+
+    def test_network_added_to_agent_invalidates_agents(self):
+        cfg.CONF.set_override('dhcp_agent_notification_delay', 0)
+        self._notify_port('p1')
+        self.notifier.network_added_to_agent(self.context, 'net1', 'hostc')
+        self._notify_port('p2')
+        self.assertEqual(
+            2, self.plugin.get_dhcp_agents_hosting_networks.call_count)
+
+    def test_expired_agents_evicted(self):
+        with mock.patch('time.time', return_value=100):
+            self.notifier._get_dhcp_agents(self.context, 'net1')
+            self.notifier._get_dhcp_agents(self.context, 'net2')
+        with mock.patch('time.time',
+                        return_value=100 +
+                        dhcp_rpc_agent_api.AGENTS_CACHE_TTL):
+            self.notifier._get_dhcp_agents(self.context, 'net1')
+        self.assertEqual(['net1'], self.notifier._agents_cache.keys())
+
+    def test_bulk_ports_notified(self):
+        cfg.CONF.set_override('dhcp_agent_notification_delay', 0)
+        self.plugin.get_dhcp_agents_hosting_networks.return_value = [
+            self.hostb]
+        ports = [{'id': 'p1', 'network_id': 'net1'},
+                 {'id': 'p2', 'network_id': 'net1'}]
+        self.notifier.notify(self.context, {'ports': ports},
+                             'port.create.end')
+        self.assertEqual(
+            [mock.call(mock.ANY,
+                       self.notifier.make_msg('port_create_end',
+                                              payload={'port': port}),
+                       topic='dhcp_agent.hostb')
+             for port in ports],
+            self.cast.call_args_list)
@@ -0,0 +1,99 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from neutron.agent.linux import ipset_manager
+from neutron.tests import base
+
+
+class IpsetManagerTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IpsetManagerTestCase, self).setUp()
+        self.execute = mock.Mock()
+        self.ipset = ipset_manager.IpsetManager(execute=self.execute,
+                                                root_helper='sudo')
+
+    def test_get_name(self):
+        sg_id = 'c2b9b8c6-bc2d-4bca-9f0e-1e7b1d4e1c2a'
+        name = ipset_manager.get_name(sg_id, 'IPv4')
+        self.assertEqual(ipset_manager.MAX_NAME_LENGTH, len(name))
+        self.assertEqual(('IPv4' + sg_id)[:31], name)
+
+    def test_set_members_creates_set(self):
+        self.ipset.set_members('IPv4fake', 'IPv4',
+                               ['10.0.0.2/32', '10.0.0.1/32'])
+        self.execute.assert_called_once_with(
+            ['ipset', 'restore', '-exist'],
+            process_input=('create IPv4fake hash:net family inet\n'
+                           'flush IPv4fake\n'
+                           'add IPv4fake 10.0.0.1/32\n'
+                           'add IPv4fake 10.0.0.2/32\n'),
+            root_helper='sudo')
+        self.assertEqual(set(['10.0.0.1/32', '10.0.0.2/32']),
+                         self.ipset.ipsets['IPv4fake'])
+
+    def test_set_members_ipv6_family(self):
+        self.ipset.set_members('IPv6fake', 'IPv6', [])
+        self.execute.assert_called_once_with(
+            ['ipset', 'restore', '-exist'],
+            process_input=('create IPv6fake hash:net family inet6\n'
+                           'flush IPv6fake\n'),
+            root_helper='sudo')
+
+    def test_set_members_applies_deltas(self):
+        self.ipset.set_members('IPv4fake', 'IPv4',
+                               ['10.0.0.1/32', '10.0.0.2/32'])
+        self.execute.reset_mock()
+        self.ipset.set_members('IPv4fake', 'IPv4',
+                               ['10.0.0.2/32', '10.0.0.3/32'])
+        self.execute.assert_called_once_with(
+            ['ipset', 'restore', '-exist'],
+            process_input=('add IPv4fake 10.0.0.3/32\n'
+                           'del IPv4fake 10.0.0.1/32\n'),
+            root_helper='sudo')
+
+    def test_set_members_unchanged(self):
+        self.ipset.set_members('IPv4fake', 'IPv4', ['10.0.0.1/32'])
+        self.execute.reset_mock()
+        self.ipset.set_members('IPv4fake', 'IPv4', ['10.0.0.1/32'])
+        self.assertFalse(self.execute.called)
+
+    def test_set_members_failure_keeps_members(self):
+        self.ipset.set_members('IPv4fake', 'IPv4', ['10.0.0.1/32'])
+        self.execute.side_effect = RuntimeError()
+        self.assertRaises(RuntimeError, self.ipset.set_members,
+                          'IPv4fake', 'IPv4', ['10.0.0.2/32'])
+        self.assertEqual(set(['10.0.0.1/32']),
+                         self.ipset.ipsets['IPv4fake'])
+
+    def test_destroy(self):
+        self.ipset.set_members('IPv4fake', 'IPv4', [])
+        self.execute.reset_mock()
+        self.ipset.destroy('IPv4fake')
+        self.ipset.destroy('IPv4fake')
+        self.execute.assert_called_once_with(
+            ['ipset', 'destroy', 'IPv4fake'], root_helper='sudo')
+        self.assertNotIn('IPv4fake', self.ipset.ipsets)
+
+    def test_namespace(self):
+        self.ipset.namespace = 'qrouter-fake'
+        self.ipset.set_members('IPv4fake', 'IPv4', [])
+        self.assertEqual(['ip', 'netns', 'exec', 'qrouter-fake',
+                          'ipset', 'restore', '-exist'],
+                         self.execute.call_args[0][0])
@@ -23,6 +23,7 @@ from oslo.config import cfg
 
 from neutron.agent.common import config as a_cfg
 from neutron.agent.linux.iptables_firewall import IptablesFirewallDriver
+from neutron.agent import securitygroups_rpc as sg_cfg
 from neutron.tests import base
 from neutron.tests.unit import test_api_v2
 
@@ -38,6 +39,7 @@ class IptablesFirewallTestCase(base.BaseTestCase):
     def setUp(self):
         super(IptablesFirewallTestCase, self).setUp()
         cfg.CONF.register_opts(a_cfg.ROOT_HELPER_OPTS, 'AGENT')
+        cfg.CONF.register_opts(sg_cfg.security_group_opts, 'SECURITYGROUP')
         self.utils_exec_p = mock.patch(
             'neutron.agent.linux.utils.execute')
         self.utils_exec = self.utils_exec_p.start()
@@ -1126,3 +1128,123 @@ class IptablesFirewallTestCase(base.BaseTestCase):
                  call.add_rule('ofake_dev', '-j $sg-fallback'),
                  call.add_rule('sg-chain', '-j ACCEPT')]
         self.v4filter_inst.assert_has_calls(calls)
+
+
+class IptablesFirewallIpsetTestCase(IptablesFirewallTestCase):
+    def setUp(self):
+        super(IptablesFirewallIpsetTestCase, self).setUp()
+        cfg.CONF.set_override('enable_ipset', True, 'SECURITYGROUP')
+        self.firewall = IptablesFirewallDriver()
+        self.firewall.iptables = self.iptables_inst
+        self.ipset = mock.Mock()
+        self.ipset.ipsets = {}
+
+        def set_members(name, ethertype, members):
+            self.ipset.ipsets[name] = set(members)
+
+        def destroy(name):
+            del self.ipset.ipsets[name]
+
+        self.ipset.set_members.side_effect = set_members
+        self.ipset.destroy.side_effect = destroy
+        self.firewall.ipset = self.ipset
+        self.sg_id = _uuid()
+        self.ipset_name = ('IPv4' + self.sg_id)[:31]
+
+    def _remote_group_port(self, direction='ingress'):
+        port = self._fake_port()
+        port['security_group_rules'] = [
+            {'ethertype': 'IPv4',
+             'direction': direction,
+             'protocol': 'tcp',
+             'port_range_min': 22,
+             'port_range_max': 22,
+             'remote_group_id': self.sg_id}]
+        return port
+
+    def test_supports_remote_group_members(self):
+        self.assertTrue(self.firewall.supports_remote_group_members)
+
+    def test_filter_ipv4_ingress_remote_group(self):
+        self.firewall.update_security_group_members(
+            {self.sg_id: {'IPv4': ['10.0.0.2/32'], 'IPv6': []}})
+        self.assertFalse(self.ipset.set_members.called)
+
+        self.firewall.prepare_port_filter(self._remote_group_port())
+
+        self.ipset.set_members.assert_called_once_with(
+            self.ipset_name, 'IPv4', ['10.0.0.2/32'])
+        self.v4filter_inst.add_rule.assert_any_call(
+            'ifake_dev',
+            '-p tcp -m tcp --dport 22 -m set --match-set %s src '
+            '-j RETURN' % self.ipset_name)
+
+    def test_filter_ipv4_egress_remote_group(self):
+        self.firewall.prepare_port_filter(self._remote_group_port('egress'))
+
+        self.ipset.set_members.assert_called_once_with(
+            self.ipset_name, 'IPv4', [])
+        self.v4filter_inst.add_rule.assert_any_call(
+            'ofake_dev',
+            '-p tcp -m tcp --dport 22 -m set --match-set %s dst '
+            '-j RETURN' % self.ipset_name)
+
+    def test_filter_remote_group_converted_by_server(self):
+        port = self._remote_group_port()
+        port['security_group_rules'][0]['source_ip_prefix'] = '10.0.0.2/32'
+        self.firewall.prepare_port_filter(port)
+
+        self.assertFalse(self.ipset.set_members.called)
+        self.v4filter_inst.add_rule.assert_any_call(
+            'ifake_dev', '-s 10.0.0.2/32 -p tcp -m tcp --dport 22 -j RETURN')
+
+    def test_update_security_group_members_updates_ipset(self):
+        self.firewall.prepare_port_filter(self._remote_group_port())
+        self.ipset.set_members.reset_mock()
+        self.iptables_inst.reset_mock()
+
+        self.firewall.update_security_group_members(
+            {self.sg_id: {'IPv4': ['10.0.0.3/32'], 'IPv6': []}})
+
+        self.ipset.set_members.assert_called_once_with(
+            self.ipset_name, 'IPv4', ['10.0.0.3/32'])
+        self.assertFalse(self.iptables_inst.apply.called)
+
+    def test_update_security_group_member_ips_updates_ipset(self):
+        self.firewall.update_security_group_members(
+            {self.sg_id: {'IPv4': ['10.0.0.2/32', '10.0.0.3/32'],
+                          'IPv6': []}})
+        self.firewall.prepare_port_filter(self._remote_group_port())
+        self.ipset.set_members.reset_mock()
+        self.iptables_inst.reset_mock()
+
+        self.firewall.update_security_group_member_ips(
+            {self.sg_id: {'added': ['10.0.0.4/32'],
+                          'removed': ['10.0.0.2/32']},
+             'unused_sg_id': {'added': ['10.0.0.5/32'], 'removed': []}})
+
+        self.ipset.set_members.assert_called_once_with(
+            self.ipset_name, 'IPv4', set(['10.0.0.3/32', '10.0.0.4/32']))
+        self.assertFalse(self.iptables_inst.apply.called)
+        self.assertEqual({'IPv4': ['10.0.0.3/32', '10.0.0.4/32'],
+                          'IPv6': []},
+                         self.firewall.sg_members[self.sg_id])
+
+    def test_remove_port_filter_destroys_unused_ipset(self):
+        port = self._remote_group_port()
+        self.firewall.prepare_port_filter(port)
+        self.assertFalse(self.ipset.destroy.called)
+
+        self.firewall.remove_port_filter(port)
+
+        self.ipset.destroy.assert_called_once_with(self.ipset_name)
+
+    def test_deferred_remove_port_filter_destroys_unused_ipset(self):
+        port = self._remote_group_port()
+        self.firewall.prepare_port_filter(port)
+
+        with self.firewall.defer_apply():
+            self.firewall.remove_port_filter(port)
+            self.assertFalse(self.ipset.destroy.called)
+
+        self.ipset.destroy.assert_called_once_with(self.ipset_name)
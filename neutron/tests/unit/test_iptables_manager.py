@@ -101,23 +101,6 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
 
         iptables_args = {'bn': bn[:16]}
 
-        filter_dump = ('# Generated by iptables_manager\n'
-                       '*filter\n'
-                       ':neutron-filter-top - [0:0]\n'
-                       ':%(bn)s-FORWARD - [0:0]\n'
-                       ':%(bn)s-INPUT - [0:0]\n'
-                       ':%(bn)s-local - [0:0]\n'
-                       ':%(bn)s-filter - [0:0]\n'
-                       ':%(bn)s-OUTPUT - [0:0]\n'
-                       '[0:0] -A FORWARD -j neutron-filter-top\n'
-                       '[0:0] -A OUTPUT -j neutron-filter-top\n'
-                       '[0:0] -A neutron-filter-top -j %(bn)s-local\n'
-                       '[0:0] -A INPUT -j %(bn)s-INPUT\n'
-                       '[0:0] -A OUTPUT -j %(bn)s-OUTPUT\n'
-                       '[0:0] -A FORWARD -j %(bn)s-FORWARD\n'
-                       'COMMIT\n'
-                       '# Completed by iptables_manager\n' % iptables_args)
-
         filter_dump_mod = ('# Generated by iptables_manager\n'
                            '*filter\n'
                            ':neutron-filter-top - [0:0]\n'
@@ -158,18 +141,12 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
                               process_input=nat_dump + filter_dump_mod,
                               root_helper=self.root_helper).AndReturn(None)
 
-        self.iptables.execute(['iptables-save', '-c'],
-                              root_helper=self.root_helper).AndReturn('')
-
-        self.iptables.execute(['iptables-restore', '-c'],
-                              process_input=nat_dump + filter_dump,
-                              root_helper=self.root_helper).AndReturn(None)
-
         self.mox.ReplayAll()
 
         self.iptables.ipv4['filter'].add_chain('filter')
         self.iptables.apply()
 
+        # Emptying the empty chain changes nothing to apply
         self.iptables.ipv4['filter'].empty_chain('filter')
         self.iptables.apply()
 
@@ -188,22 +165,6 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
 
         iptables_args = {'bn': bn}
 
-        filter_dump = ('# Generated by iptables_manager\n'
-                       '*filter\n'
-                       ':neutron-filter-top - [0:0]\n'
-                       ':%(bn)s-FORWARD - [0:0]\n'
-                       ':%(bn)s-INPUT - [0:0]\n'
-                       ':%(bn)s-local - [0:0]\n'
-                       ':%(bn)s-OUTPUT - [0:0]\n'
-                       '[0:0] -A FORWARD -j neutron-filter-top\n'
-                       '[0:0] -A OUTPUT -j neutron-filter-top\n'
-                       '[0:0] -A neutron-filter-top -j %(bn)s-local\n'
-                       '[0:0] -A INPUT -j %(bn)s-INPUT\n'
-                       '[0:0] -A OUTPUT -j %(bn)s-OUTPUT\n'
-                       '[0:0] -A FORWARD -j %(bn)s-FORWARD\n'
-                       'COMMIT\n'
-                       '# Completed by iptables_manager\n' % iptables_args)
-
         filter_dump_mod = ('# Generated by iptables_manager\n'
                            '*filter\n'
                            ':neutron-filter-top - [0:0]\n'
@@ -245,11 +206,11 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
                               process_input=nat_dump + filter_dump_mod,
                               root_helper=self.root_helper).AndReturn(None)
 
-        self.iptables.execute(['iptables-save', '-c'],
-                              root_helper=self.root_helper).AndReturn('')
-
-        self.iptables.execute(['iptables-restore', '-c'],
-                              process_input=nat_dump + filter_dump,
+        self.iptables.execute(['iptables-restore', '--noflush'],
+                              process_input=('*filter\n'
+                                             '-F %(bn)s-filter\n'
+                                             '-X %(bn)s-filter\n'
+                                             'COMMIT\n' % iptables_args),
                               root_helper=self.root_helper).AndReturn(None)
 
         self.mox.ReplayAll()
@@ -290,11 +251,11 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
                               process_input=NAT_DUMP + filter_dump_mod,
                               root_helper=self.root_helper).AndReturn(None)
 
-        self.iptables.execute(['iptables-save', '-c'],
-                              root_helper=self.root_helper).AndReturn('')
-
-        self.iptables.execute(['iptables-restore', '-c'],
-                              process_input=NAT_DUMP + FILTER_DUMP,
+        self.iptables.execute(['iptables-restore', '--noflush'],
+                              process_input=('*filter\n'
+                                             '-F %(bn)s-filter\n'
+                                             '-X %(bn)s-filter\n'
+                                             'COMMIT\n' % IPTABLES_ARG),
                               root_helper=self.root_helper).AndReturn(None)
 
         self.mox.ReplayAll()
@@ -336,13 +297,15 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
                               process_input=NAT_DUMP + filter_dump_mod,
                               root_helper=self.root_helper).AndReturn(None)
 
-        self.iptables.execute(['iptables-save', '-c'],
-                              root_helper=self.root_helper).AndReturn('')
-
-        self.iptables.execute(['iptables-restore', '-c'],
-                              process_input=NAT_DUMP + FILTER_DUMP,
-                              root_helper=self.root_helper
-                              ).AndReturn(None)
+        self.iptables.execute(['iptables-restore', '--noflush'],
+                              process_input=('*filter\n'
+                                             '-D %(bn)s-INPUT '
+                                             '-s 0/0 -d 192.168.0.2 '
+                                             '-j %(bn)s-filter\n'
+                                             '-F %(bn)s-filter\n'
+                                             '-X %(bn)s-filter\n'
+                                             'COMMIT\n' % IPTABLES_ARG),
+                              root_helper=self.root_helper).AndReturn(None)
 
         self.mox.ReplayAll()
 
@@ -364,24 +327,6 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
         self.mox.VerifyAll()
 
     def test_add_nat_rule(self):
-        nat_dump = ('# Generated by iptables_manager\n'
-                    '*nat\n'
-                    ':neutron-postrouting-bottom - [0:0]\n'
-                    ':%(bn)s-float-snat - [0:0]\n'
-                    ':%(bn)s-POSTROUTING - [0:0]\n'
-                    ':%(bn)s-PREROUTING - [0:0]\n'
-                    ':%(bn)s-OUTPUT - [0:0]\n'
-                    ':%(bn)s-snat - [0:0]\n'
-                    '[0:0] -A PREROUTING -j %(bn)s-PREROUTING\n'
-                    '[0:0] -A OUTPUT -j %(bn)s-OUTPUT\n'
-                    '[0:0] -A POSTROUTING -j %(bn)s-POSTROUTING\n'
-                    '[0:0] -A POSTROUTING -j neutron-postrouting-bottom\n'
-                    '[0:0] -A neutron-postrouting-bottom -j %(bn)s-snat\n'
-                    '[0:0] -A %(bn)s-snat -j %(bn)s-float-snat\n'
-                    'COMMIT\n'
-                    '# Completed by iptables_manager\n'
-                    % IPTABLES_ARG)
-
         nat_dump_mod = ('# Generated by iptables_manager\n'
                         '*nat\n'
                         ':neutron-postrouting-bottom - [0:0]\n'
@@ -412,11 +357,13 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
                               process_input=nat_dump_mod + FILTER_DUMP,
                               root_helper=self.root_helper).AndReturn(None)
 
-        self.iptables.execute(['iptables-save', '-c'],
-                              root_helper=self.root_helper).AndReturn('')
-
-        self.iptables.execute(['iptables-restore', '-c'],
-                              process_input=nat_dump + FILTER_DUMP,
+        self.iptables.execute(['iptables-restore', '--noflush'],
+                              process_input=('*nat\n'
+                                             '-D %(bn)s-PREROUTING '
+                                             '-d 192.168.0.3 -j %(bn)s-nat\n'
+                                             '-F %(bn)s-nat\n'
+                                             '-X %(bn)s-nat\n'
+                                             'COMMIT\n' % IPTABLES_ARG),
                               root_helper=self.root_helper).AndReturn(None)
 
         self.mox.ReplayAll()
@@ -441,6 +388,152 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
         self.iptables.apply()
         self.mox.VerifyAll()
 
+    def _expect_full_apply(self, saved=''):
+        self.iptables.execute(['iptables-save', '-c'],
+                              root_helper=self.root_helper).AndReturn(saved)
+        self.iptables.execute(['iptables-restore', '-c'],
+                              process_input=mox.IgnoreArg(),
+                              root_helper=self.root_helper).AndReturn(None)
+
+    def _expect_incremental_apply(self, lines):
+        self.iptables.execute(['iptables-restore', '--noflush'],
+                              process_input=('\n'.join(lines) + '\n')
+                              % IPTABLES_ARG,
+                              root_helper=self.root_helper)
+
+    def test_apply_incremental_rules(self):
+        self._expect_full_apply()
+        self._expect_incremental_apply(
+            ['*filter',
+             ':%(bn)s-filter - [0:0]',
+             '-I %(bn)s-INPUT 1 -j %(bn)s-filter',
+             '-I %(bn)s-filter 1 -s 10.0.0.2 -j DROP',
+             '-I %(bn)s-filter 2 -j ACCEPT',
+             'COMMIT'])
+        self._expect_incremental_apply(
+            ['*filter',
+             '-D %(bn)s-filter -s 10.0.0.2 -j DROP',
+             '-I %(bn)s-filter 1 -s 10.0.0.3 -j DROP',
+             '-I %(bn)s-filter 2 -s 10.0.0.4 -j DROP',
+             'COMMIT'])
+        self.mox.ReplayAll()
+
+        self.iptables.apply()
+        table = self.iptables.ipv4['filter']
+        table.add_chain('filter')
+        table.add_rule('INPUT', '-j $filter')
+        table.add_rule('filter', '-j ACCEPT')
+        table.add_rule('filter', '-s 10.0.0.2 -j DROP', top=True)
+        self.iptables.apply()
+
+        table.remove_rule('filter', '-s 10.0.0.2 -j DROP', top=True)
+        table.add_rule('filter', '-s 10.0.0.3 -j DROP', top=True)
+        table.add_rule('filter', '-s 10.0.0.4 -j DROP', top=True)
+        self.iptables.apply()
+        # Nothing changed
+        self.iptables.apply()
+
+        self.mox.VerifyAll()
+
+    def test_apply_incremental_reordered_rules(self):
+        self._expect_full_apply()
+        self._expect_incremental_apply(
+            ['*filter',
+             '-F %(bn)s-local',
+             '-I %(bn)s-local 1 -j ACCEPT',
+             '-I %(bn)s-local 2 -j DROP',
+             'COMMIT'])
+        self.mox.ReplayAll()
+
+        table = self.iptables.ipv4['filter']
+        table.add_rule('local', '-j DROP')
+        table.add_rule('local', '-j ACCEPT')
+        self.iptables.apply()
+
+        table.empty_chain('local')
+        table.add_rule('local', '-j ACCEPT')
+        table.add_rule('local', '-j DROP')
+        self.iptables.apply()
+
+        self.mox.VerifyAll()
+
+    def test_apply_unwrapped_changes_saves_the_tables(self):
+        self._expect_full_apply()
+        self._expect_full_apply()
+        self.mox.ReplayAll()
+
+        self.iptables.apply()
+        self.iptables.ipv4['filter'].add_rule('neutron-filter-top',
+                                              '-j DROP', wrap=False)
+        self.iptables.apply()
+
+        self.mox.VerifyAll()
+
+    def test_apply_incremental_failure_saves_the_tables(self):
+        self._expect_full_apply()
+        self.iptables.execute(['iptables-restore', '--noflush'],
+                              process_input=mox.IgnoreArg(),
+                              root_helper=self.root_helper
+                              ).AndRaise(RuntimeError())
+        self._expect_full_apply()
+        self._expect_incremental_apply(
+            ['*filter', '-I %(bn)s-local 2 -j ACCEPT', 'COMMIT'])
+        self.mox.ReplayAll()
+
+        self.iptables.apply()
+        table = self.iptables.ipv4['filter']
+        table.add_rule('local', '-j DROP')
+        self.iptables.apply()
+        table.add_rule('local', '-j ACCEPT')
+        self.iptables.apply()
+
+        self.mox.VerifyAll()
+
+    def test_apply_saves_the_tables_periodically(self):
+        self.iptables.full_apply_interval = 2
+        self._expect_full_apply()
+        self._expect_incremental_apply(
+            ['*filter', '-I %(bn)s-local 1 -j DROP', 'COMMIT'])
+        self._expect_full_apply()
+        self.mox.ReplayAll()
+
+        self.iptables.apply()
+        self.iptables.ipv4['filter'].add_rule('local', '-j DROP')
+        self.iptables.apply()
+        # Nothing changed, the rules are not read yet
+        self.iptables.apply()
+        self.iptables.apply()
+
+        self.mox.VerifyAll()
+
+    def test_modify_rules_keeps_counters_and_other_rules(self):
+        saved = ('# Generated by iptables-save\n'
+                 '*filter\n'
+                 ':INPUT ACCEPT [0:0]\n'
+                 ':other-chain - [0:0]\n'
+                 ':%(bn)s-INPUT - [0:0]\n'
+                 ':%(bn)s-local - [1:1]\n'
+                 '[5:50] -A INPUT -j %(bn)s-INPUT\n'
+                 '[0:0] -A INPUT -j other-chain\n'
+                 '[0:0] -A other-chain -j DROP\n'
+                 '[7:70] -A %(bn)s-INPUT -j DROP\n'
+                 '[0:0] -A %(bn)s-INPUT -j DROP\n'
+                 'COMMIT\n'
+                 '# Completed\n' % IPTABLES_ARG)
+        table = self.iptables.ipv4['filter']
+        table.add_rule('INPUT', '-j DROP')
+
+        lines = self.iptables._modify_rules(saved.split('\n'), table,
+                                            'filter')
+
+        self.assertIn(':%(bn)s-local - [1:1]' % IPTABLES_ARG, lines)
+        self.assertIn('[5:50] -A INPUT -j %(bn)s-INPUT' % IPTABLES_ARG, lines)
+        self.assertIn('[0:0] -A INPUT -j other-chain', lines)
+        self.assertIn('[0:0] -A other-chain -j DROP', lines)
+        self.assertEqual(
+            ['[0:0] -A %(bn)s-INPUT -j DROP' % IPTABLES_ARG],
+            [line for line in lines if line.endswith('INPUT -j DROP')])
+
     def test_add_rule_to_a_nonexistent_chain(self):
         self.assertRaises(LookupError, self.iptables.ipv4['filter'].add_rule,
                           'nonexistent', '-j DROP')
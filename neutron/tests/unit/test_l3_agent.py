@@ -15,7 +15,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import copy
+import datetime
 
 import mock
 from oslo.config import cfg
@@ -25,6 +27,7 @@ from neutron.agent import l3_agent
 from neutron.agent.linux import interface
 from neutron.common import config as base_config
 from neutron.common import constants as l3_constants
+from neutron.openstack.common import timeutils
 from neutron.openstack.common import uuidutils
 from neutron.tests import base
 
@@ -34,6 +37,68 @@ HOSTNAME = 'myhost'
 FAKE_ID = _uuid()
 
 
+class TestRouterUpdateQueue(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestRouterUpdateQueue, self).setUp()
+        self.queue = l3_agent.RouterUpdateQueue()
+
+    def test_rpc_updates_before_sync_updates(self):
+        sync = l3_agent.RouterUpdate('r1', l3_agent.PRIORITY_SYNC_ROUTERS_TASK)
+        rpc = l3_agent.RouterUpdate('r2', l3_agent.PRIORITY_RPC)
+        self.queue.add(sync)
+        self.queue.add(rpc)
+        self.assertEqual(rpc, self.queue.get(block=False))
+        self.assertEqual(sync, self.queue.get(block=False))
+        self.assertIsNone(self.queue.get(block=False))
+
+    def test_updates_of_a_router_are_merged(self):
+        now = timeutils.utcnow()
+        sync = l3_agent.RouterUpdate('r1', l3_agent.PRIORITY_SYNC_ROUTERS_TASK,
+                                     router={'id': 'r1'}, timestamp=now)
+        other = l3_agent.RouterUpdate('r2', l3_agent.PRIORITY_RPC)
+        rpc = l3_agent.RouterUpdate(
+            'r1', l3_agent.PRIORITY_RPC, action=l3_agent.DELETE_ROUTER,
+            timestamp=now + datetime.timedelta(seconds=1))
+        self.queue.add(sync)
+        self.queue.add(other)
+        self.assertEqual(sync, self.queue.add(rpc))
+        self.assertEqual(2, len(self.queue))
+
+        self.assertEqual(other, self.queue.get(block=False))
+        update = self.queue.get(block=False)
+        self.assertEqual(sync, update)
+        self.assertEqual(l3_agent.PRIORITY_RPC, update.priority)
+        self.assertEqual(l3_agent.DELETE_ROUTER, update.action)
+        self.assertIsNone(update.router)
+        # The entry of the merged update with its former priority is skipped
+        self.assertIsNone(self.queue.get(block=False))
+
+    def test_older_update_does_not_replace_queued_one(self):
+        now = timeutils.utcnow()
+        rpc = l3_agent.RouterUpdate('r1', l3_agent.PRIORITY_RPC,
+                                    timestamp=now)
+        sync = l3_agent.RouterUpdate(
+            'r1', l3_agent.PRIORITY_SYNC_ROUTERS_TASK, router={'id': 'r1'},
+            timestamp=now - datetime.timedelta(seconds=1))
+        self.queue.add(rpc)
+        self.queue.add(sync)
+        update = self.queue.get(block=False)
+        self.assertIsNone(update.router)
+        self.assertEqual(now, update.timestamp)
+
+    def test_router_is_processed_once_at_a_time(self):
+        first = l3_agent.RouterUpdate('r1', l3_agent.PRIORITY_RPC)
+        second = l3_agent.RouterUpdate('r1', l3_agent.PRIORITY_RPC)
+        self.queue.add(first)
+        self.assertEqual(first, self.queue.get(block=False))
+        self.queue.add(second)
+        self.assertIsNone(self.queue.get(block=False))
+        self.queue.task_done(first)
+        self.assertTrue(first.done.ready())
+        self.assertEqual(second, self.queue.get(block=False))
+
+
 class TestBasicRouterOperations(base.BaseTestCase):
 
     def setUp(self):
@@ -524,29 +589,31 @@ class TestBasicRouterOperations(base.BaseTestCase):
         agent._process_routers(routers)
         self.assertNotIn(routers[0]['id'], agent.router_info)
 
+    def _assert_router_queued(self, agent, router_id, action=None):
+        update = agent._queue.get(block=False)
+        self.assertEqual(router_id, update.router_id)
+        self.assertEqual(l3_agent.PRIORITY_RPC, update.priority)
+        self.assertEqual(action, update.action)
+
     def test_router_deleted(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         agent.router_deleted(None, FAKE_ID)
-        # verify that will set fullsync
-        self.assertIn(FAKE_ID, agent.removed_routers)
+        self._assert_router_queued(agent, FAKE_ID, l3_agent.DELETE_ROUTER)
 
     def test_routers_updated(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         agent.routers_updated(None, [FAKE_ID])
-        # verify that will set fullsync
-        self.assertIn(FAKE_ID, agent.updated_routers)
+        self._assert_router_queued(agent, FAKE_ID)
 
     def test_removed_from_agent(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         agent.router_removed_from_agent(None, {'router_id': FAKE_ID})
-        # verify that will set fullsync
-        self.assertIn(FAKE_ID, agent.removed_routers)
+        self._assert_router_queued(agent, FAKE_ID, l3_agent.DELETE_ROUTER)
 
     def test_added_to_agent(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         agent.router_added_to_agent(None, [FAKE_ID])
-        # verify that will set fullsync
-        self.assertIn(FAKE_ID, agent.updated_routers)
+        self._assert_router_queued(agent, FAKE_ID)
 
     def test_process_router_delete(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
@@ -563,8 +630,150 @@ class TestBasicRouterOperations(base.BaseTestCase):
             'gw_port': ex_gw_port}
         agent._router_added(router['id'], router)
         agent.router_deleted(None, router['id'])
-        agent._process_router_delete()
-        self.assertFalse(list(agent.removed_routers))
+        self.assertTrue(agent._process_router_update(block=False))
+        self.assertNotIn(router['id'], agent.router_info)
+        self.assertEqual(0, len(agent._queue))
+
+    def test_process_router_update_fetches_router(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        self.conf.set_override('external_network_bridge', '')
+        router = {'id': FAKE_ID,
+                  'admin_state_up': True,
+                  'routes': [],
+                  'external_gateway_info': {}}
+        self.plugin_api.get_routers.return_value = [router]
+        agent.routers_updated(None, [FAKE_ID])
+        with mock.patch.object(agent, 'process_router') as process_router:
+            self.assertTrue(agent._process_router_update(block=False))
+        self.plugin_api.get_routers.assert_called_once_with(
+            agent.context, [FAKE_ID])
+        process_router.assert_called_once_with(agent.router_info[FAKE_ID])
+        self.assertFalse(agent._process_router_update(block=False))
+
+    def test_process_router_update_skips_outdated_router(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent._router_timestamps[FAKE_ID] = timeutils.utcnow()
+        update = l3_agent.RouterUpdate(
+            FAKE_ID, l3_agent.PRIORITY_SYNC_ROUTERS_TASK,
+            action=l3_agent.DELETE_ROUTER,
+            timestamp=timeutils.utcnow() - datetime.timedelta(seconds=1))
+        agent._queue.add(update)
+        with mock.patch.object(agent, '_router_removed') as router_removed:
+            agent.router_info[FAKE_ID] = mock.Mock()
+            self.assertTrue(agent._process_router_update(block=False))
+        self.assertFalse(router_removed.called)
+
+    def test_process_router_update_failure_sets_fullsync(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent.fullsync = False
+        self.plugin_api.get_routers.side_effect = Exception()
+        agent.routers_updated(None, [FAKE_ID])
+        self.assertTrue(agent._process_router_update(block=False))
+        self.assertTrue(agent.fullsync)
+
+    def test_sync_routers_task_processes_routers(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        self.plugin_api.get_external_network_id.return_value = None
+        stale_router_id = _uuid()
+        agent.router_info[stale_router_id] = mock.Mock()
+        router = {'id': FAKE_ID,
+                  'admin_state_up': True,
+                  'routes': [],
+                  'external_gateway_info': {}}
+        self.plugin_api.get_routers.return_value = [router]
+        with contextlib.nested(
+            mock.patch.object(agent, 'process_router'),
+            mock.patch.object(agent, '_router_removed')
+        ) as (process_router, router_removed):
+            agent._sync_routers_task(agent.context)
+        process_router.assert_called_once_with(agent.router_info[FAKE_ID])
+        router_removed.assert_called_once_with(stale_router_id)
+        self.assertFalse(agent.fullsync)
+        self.assertEqual(0, len(agent._queue))
+
+    def test_sync_routers_task_timestamp_taken_before_fetching(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        self.plugin_api.get_external_network_id.return_value = None
+        fetched_at = timeutils.utcnow()
+        timeutils.set_time_override(fetched_at)
+        self.addCleanup(timeutils.clear_time_override)
+        router = {'id': FAKE_ID,
+                  'admin_state_up': True,
+                  'routes': [],
+                  'external_gateway_info': {}}
+
+        def get_routers(*args, **kwargs):
+            timeutils.advance_time_seconds(10)
+            return [router]
+
+        self.plugin_api.get_routers.side_effect = get_routers
+        with mock.patch.object(agent, 'process_router'):
+            agent._sync_routers_task(agent.context)
+        self.assertEqual(fetched_at, agent._router_timestamps[FAKE_ID])
+        self.assertIsNone(agent._sync_timestamp)
+
+    def test_sync_routers_task_forgets_removed_routers(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        self.plugin_api.get_external_network_id.return_value = None
+        stale_router_id = _uuid()
+        agent.router_info[stale_router_id] = mock.Mock()
+        agent._router_timestamps[stale_router_id] = timeutils.utcnow()
+        self.plugin_api.get_routers.return_value = []
+
+        def router_removed(router_id):
+            del agent.router_info[router_id]
+
+        with mock.patch.object(agent, '_router_removed',
+                               side_effect=router_removed):
+            agent._sync_routers_task(agent.context)
+        self.assertEqual({}, agent._router_timestamps)
+
+    def test_process_router_update_forgets_removed_router(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent._router_timestamps[FAKE_ID] = timeutils.utcnow()
+        agent.router_info[FAKE_ID] = mock.Mock()
+        agent.router_deleted(None, FAKE_ID)
+        with mock.patch.object(agent, '_router_removed') as router_removed:
+            self.assertTrue(agent._process_router_update(block=False))
+        router_removed.assert_called_once_with(FAKE_ID)
+        self.assertNotIn(FAKE_ID, agent._router_timestamps)
+
+    def test_sync_routers_task_skips_unchanged_routers(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        self.plugin_api.get_external_network_id.return_value = None
+        agent.router_info[FAKE_ID] = mock.Mock()
+        agent._router_revisions[FAKE_ID] = 'rev1'
+        self.plugin_api.get_routers.return_value = [{'id': FAKE_ID,
+                                                     'revision': 'rev1'}]
+        with contextlib.nested(
+            mock.patch.object(agent, 'process_router'),
+            mock.patch.object(agent, '_router_removed')
+        ) as (process_router, router_removed):
+            agent._sync_routers_task(agent.context)
+        self.plugin_api.get_routers.assert_called_once_with(
+            agent.context, None, router_revisions={FAKE_ID: 'rev1'})
+        self.assertFalse(process_router.called)
+        self.assertFalse(router_removed.called)
+        self.assertIn(FAKE_ID, agent.router_info)
+
+    def test_process_router_update_records_revision(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = {'id': FAKE_ID,
+                  'admin_state_up': True,
+                  'routes': [],
+                  'external_gateway_info': {},
+                  'revision': 'rev1'}
+        agent._queue.add(l3_agent.RouterUpdate(
+            FAKE_ID, l3_agent.PRIORITY_SYNC_ROUTERS_TASK, router=router))
+        with mock.patch.object(agent, 'process_router') as process_router:
+            agent._process_router_update(block=False)
+            self.assertEqual('rev1', agent._router_revisions[FAKE_ID])
+
+            process_router.side_effect = Exception()
+            agent._queue.add(l3_agent.RouterUpdate(
+                FAKE_ID, l3_agent.PRIORITY_SYNC_ROUTERS_TASK, router=router))
+            agent._process_router_update(block=False)
+        self.assertNotIn(FAKE_ID, agent._router_revisions)
 
     def testDestroyNamespace(self):
 
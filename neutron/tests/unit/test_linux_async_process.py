@@ -0,0 +1,198 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import contextlib
+
+import eventlet.event
+import eventlet.queue
+import eventlet.timeout
+import mock
+
+from neutron.agent.linux import async_process
+from neutron.tests import base
+
+
+class TestAsyncProcess(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestAsyncProcess, self).setUp()
+        self.proc = async_process.AsyncProcess(['fake'])
+
+    def test_constructor_raises_for_negative_respawn_interval(self):
+        self.assertRaises(ValueError, async_process.AsyncProcess,
+                          ['fake'], respawn_interval=-1)
+
+    def test__spawn(self):
+        proc = self.proc
+        with mock.patch.object(async_process.utils, 'create_process',
+                               return_value=('process', None)):
+            with mock.patch('eventlet.spawn') as mock_spawn:
+                proc._spawn()
+
+        self.assertIsInstance(proc._kill_event, eventlet.event.Event)
+        self.assertEqual('process', proc._process)
+        mock_spawn.assert_has_calls([
+            mock.call(proc._watch_process, proc._read_stdout,
+                      proc._kill_event),
+            mock.call(proc._watch_process, proc._read_stderr,
+                      proc._kill_event),
+        ])
+        self.assertEqual(2, len(proc._watchers))
+        self.assertTrue(proc.is_active)
+
+    def _mock_kill_and_spawn(self):
+        return contextlib.nested(mock.patch.object(self.proc, '_kill'),
+                                 mock.patch.object(self.proc, '_spawn'))
+
+    def _test__handle_process_error(self, respawning):
+        self.proc.respawn_interval = 0 if respawning else None
+        self.proc._kill_event = eventlet.event.Event()
+        with self._mock_kill_and_spawn() as (kill, spawn):
+            self.proc._handle_process_error()
+
+        kill.assert_called_once_with(respawning=respawning)
+        self.assertEqual(respawning, spawn.called)
+
+    def test__handle_process_error_kills_with_respawn(self):
+        self._test__handle_process_error(True)
+
+    def test__handle_process_error_kills_without_respawn(self):
+        self._test__handle_process_error(False)
+
+    def test__handle_process_error_not_respawned_once_stopped(self):
+        self.proc.respawn_interval = 0
+        self.proc._kill_event = None
+        with self._mock_kill_and_spawn() as (kill, spawn):
+            self.proc._handle_process_error()
+        self.assertFalse(spawn.called)
+
+    def _test__watch_process(self, callback, kill_event):
+        self.proc._kill_event = kill_event
+        # Ensure the test times out eventually if the watcher loops endlessly
+        with eventlet.timeout.Timeout(5):
+            with mock.patch.object(self.proc,
+                                   '_handle_process_error') as func:
+                self.proc._watch_process(callback, kill_event)
+
+        if not kill_event.ready():
+            func.assert_called_once_with()
+
+    def test__watch_process_exits_on_callback_failure(self):
+        self._test__watch_process(lambda: False, eventlet.event.Event())
+
+    def test__watch_process_exits_on_exception(self):
+        def foo():
+            raise Exception('Error!')
+        self._test__watch_process(foo, eventlet.event.Event())
+
+    def test__watch_process_exits_on_sent_kill_event(self):
+        kill_event = eventlet.event.Event()
+        kill_event.send()
+        self._test__watch_process(None, kill_event)
+
+    def test__read_queues_stripped_line(self):
+        stream = mock.Mock()
+        stream.readline.return_value = 'hello\n'
+        queue = eventlet.queue.LightQueue()
+        self.assertEqual('hello', self.proc._read(stream, queue))
+        self.assertEqual('hello', queue.get_nowait())
+
+    def test_iter_stdout(self):
+        self.proc._stdout_lines.put('foo')
+        self.proc._stdout_lines.put('bar')
+        self.assertEqual(['foo', 'bar'], list(self.proc.iter_stdout()))
+        self.assertEqual([], list(self.proc.iter_stdout()))
+
+    def test_iter_stdout_waits_for_the_first_line(self):
+        eventlet.spawn_after(0.01, self.proc._stdout_lines.put, 'foo')
+        self.assertEqual(['foo'], list(self.proc.iter_stdout(timeout=5)))
+
+    def test_iter_stdout_times_out(self):
+        self.assertEqual([], list(self.proc.iter_stdout(timeout=0.01)))
+
+    def test_start_raises_exception_if_process_already_started(self):
+        self.proc._kill_event = True
+        self.assertRaises(async_process.AsyncProcessException,
+                          self.proc.start)
+
+    def test_start_invokes__spawn(self):
+        with mock.patch.object(self.proc, '_spawn') as mock_start:
+            self.proc.start()
+
+        mock_start.assert_called_once_with()
+
+    def test_stop_calls_kill(self):
+        self.proc._kill_event = eventlet.event.Event()
+        with mock.patch.object(self.proc, '_kill') as mock_kill:
+            self.proc.stop()
+        mock_kill.assert_called_once_with()
+
+    def test_stop_raises_exception_if_not_started(self):
+        self.assertRaises(async_process.AsyncProcessException,
+                          self.proc.stop)
+
+    def _test__kill(self, respawning, pid=None):
+        self.proc._kill_event = eventlet.event.Event()
+        with mock.patch.object(self.proc, '_get_pid_to_kill',
+                               return_value=pid):
+            with mock.patch.object(self.proc,
+                                   '_kill_process') as mock_kill_process:
+                self.proc._kill(respawning)
+
+        if respawning:
+            self.assertIsNotNone(self.proc._kill_event)
+        else:
+            self.assertIsNone(self.proc._kill_event)
+        if pid:
+            mock_kill_process.assert_called_once_with(pid)
+        else:
+            self.assertFalse(mock_kill_process.called)
+
+    def test__kill_when_respawning_does_not_clear_kill_event(self):
+        self._test__kill(True)
+
+    def test__kill_when_not_respawning_clears_kill_event(self):
+        self._test__kill(False)
+
+    def test__kill_targets_process_for_pid(self):
+        self._test__kill(False, pid='1')
+
+    def test__get_pid_to_kill_follows_children_with_root_helper(self):
+        self.proc.root_helper = 'sudo'
+        self.proc._process = mock.Mock(pid=1)
+        with mock.patch.object(async_process.utils, 'find_child_pids',
+                               side_effect=[['2'], ['3'], []]):
+            self.assertEqual('3', self.proc._get_pid_to_kill())
+
+    def test__get_pid_to_kill_without_root_helper(self):
+        self.proc._process = mock.Mock(pid=1)
+        with mock.patch.object(async_process.utils,
+                               'find_child_pids') as find_child_pids:
+            self.assertEqual(1, self.proc._get_pid_to_kill())
+        self.assertFalse(find_child_pids.called)
+
+    def test__kill_process_uses_root_helper(self):
+        self.proc.root_helper = 'sudo'
+        with mock.patch.object(async_process.utils, 'execute') as execute:
+            self.assertTrue(self.proc._kill_process('1'))
+        execute.assert_called_once_with(['kill', '-9', '1'],
+                                        root_helper='sudo')
+
+    def test__kill_process_returns_false_on_error(self):
+        with mock.patch.object(async_process.utils, 'execute',
+                               side_effect=RuntimeError()):
+            self.assertFalse(self.proc._kill_process('1'))
@@ -15,6 +15,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import os
 
 import mock
@@ -868,6 +869,40 @@ tag:tag1,249,%s,%s""".lstrip() % (fake_v6,
                                     mock.call(exp_opt_name, exp_opt_data)])
         self.execute.assert_called_once_with(exp_args, 'sudo')
 
+    def test_reload_allocations_unchanged(self):
+        files = {}
+
+        def replace_file(name, data):
+            files[name] = data
+
+        def open_file(name):
+            if name not in files:
+                raise IOError()
+            config_file = mock.MagicMock()
+            config_file.__enter__.return_value.read.return_value = files[name]
+            return config_file
+
+        self.safe.side_effect = replace_file
+        with contextlib.nested(
+            mock.patch.object(dhcp.Dnsmasq, 'active'),
+            mock.patch.object(dhcp.Dnsmasq, 'pid'),
+            mock.patch.object(dhcp.Dnsmasq, '_make_subnet_interface_ip_map'),
+            mock.patch('__builtin__.open', side_effect=open_file)
+        ) as (active, pid, ip_map, mock_open):
+            active.__get__ = mock.Mock(return_value=True)
+            pid.__get__ = mock.Mock(return_value=5)
+            ip_map.return_value = {}
+            dm = dhcp.Dnsmasq(self.conf, FakeDualNetwork(),
+                              version=float(2.59))
+            dm.reload_allocations()
+            self.assertEqual(2, self.safe.call_count)
+            self.assertEqual(1, self.execute.call_count)
+
+            dm.reload_allocations()
+        self.assertEqual(2, self.safe.call_count)
+        self.assertEqual(1, self.execute.call_count)
+        self.assertEqual(1, dm.device_manager.update.call_count)
+
     def test_reload_allocations_stale_pid(self):
         exp_host_name = '/dhcp/cccccccc-cccc-cccc-cccc-cccccccccccc/host'
         exp_host_data = ('00:00:80:aa:bb:cc,host-192-168-0-2.openstacklocal,'
@@ -915,7 +950,7 @@ tag:tag1,249,%s,%s""".lstrip() % (fake_v6,
             self.safe.assert_has_calls([mock.call(exp_host_name,
                                                   exp_host_data),
                                         mock.call(exp_opt_name, exp_opt_data)])
-            mock_open.assert_called_once_with('/proc/5/cmdline', 'r')
+            mock_open.assert_any_call('/proc/5/cmdline', 'r')
 
     def test_make_subnet_interface_ip_map(self):
         with mock.patch('neutron.agent.linux.ip_lib.IPDevice') as ip_dev:
@@ -15,9 +15,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import socket
+
 import mock
+from oslo.config import cfg
 
 from neutron.agent.linux import ip_lib
+from neutron.agent.linux import netlink
 from neutron.common import exceptions
 from neutron.tests import base
 
@@ -150,6 +154,36 @@ class TestSubProcessBase(base.BaseTestCase):
                           [], 'link', ('list',))
 
 
+class TestSubProcessBaseNetlink(base.BaseTestCase):
+    def setUp(self):
+        super(TestSubProcessBaseNetlink, self).setUp()
+        cfg.CONF.register_opts(ip_lib.OPTS)
+        cfg.CONF.set_override('ip_lib_use_netlink', True)
+        self.root_p = mock.patch.object(netlink, 'can_enter_namespaces')
+        self.can_enter_namespaces = self.root_p.start()
+        self.addCleanup(self.root_p.stop)
+
+    def test_use_netlink_no_namespace(self):
+        self.can_enter_namespaces.return_value = False
+        self.assertTrue(ip_lib.SubProcessBase('sudo')._use_netlink())
+
+    def test_use_netlink_namespace_as_root(self):
+        self.can_enter_namespaces.return_value = True
+        self.assertTrue(ip_lib.SubProcessBase('sudo', 'ns')._use_netlink())
+
+    def test_use_netlink_namespace_not_root(self):
+        self.can_enter_namespaces.return_value = False
+        self.assertFalse(ip_lib.SubProcessBase('sudo', 'ns')._use_netlink())
+
+    def test_use_netlink_force_root(self):
+        cfg.CONF.set_override('ip_lib_force_root', True)
+        self.assertFalse(ip_lib.SubProcessBase('sudo')._use_netlink())
+
+    def test_use_netlink_disabled(self):
+        cfg.CONF.set_override('ip_lib_use_netlink', False)
+        self.assertFalse(ip_lib.SubProcessBase('sudo')._use_netlink())
+
+
 class TestIpWrapper(base.BaseTestCase):
     def setUp(self):
         super(TestIpWrapper, self).setUp()
@@ -394,6 +428,7 @@ class TestIPCmdBase(base.BaseTestCase):
         self.parent = mock.Mock()
         self.parent.name = 'eth0'
         self.parent.root_helper = 'sudo'
+        self.parent._use_netlink.return_value = False
 
     def _assert_call(self, options, args):
         self.parent.assert_has_calls([
@@ -675,6 +710,100 @@ class TestIpNetnsCommand(TestIPCmdBase):
                 root_helper='sudo', check_exit_code=True)
 
 
+class TestIpLibNetlink(base.BaseTestCase):
+    def setUp(self):
+        super(TestIpLibNetlink, self).setUp()
+        self.use_netlink_p = mock.patch.object(ip_lib.SubProcessBase,
+                                               '_use_netlink',
+                                               return_value=True)
+        self.use_netlink_p.start()
+        self.execute_p = mock.patch('neutron.agent.linux.utils.execute')
+        self.execute = self.execute_p.start()
+        self.links_p = mock.patch.object(netlink, 'get_links')
+        self.get_links = self.links_p.start()
+        self.get_links.return_value = [
+            {'index': 1, 'name': 'lo', 'type': 772,
+             'address': '00:00:00:00:00:00', 'mtu': 16436, 'state': 'UNKNOWN'},
+            {'index': 2, 'name': 'eth0', 'type': netlink.ARPHRD_ETHER,
+             'address': 'cc:dd:ee:ff:ab:cd', 'mtu': 1500, 'qdisc': 'mq',
+             'state': 'UP', 'qlen': 1000, 'alias': 'openvswitch'}]
+        self.addCleanup(mock.patch.stopall)
+
+    def test_get_devices(self):
+        devices = ip_lib.IPWrapper('sudo', 'ns').get_devices(
+            exclude_loopback=True)
+        self.assertEqual([ip_lib.IPDevice('eth0', 'sudo', 'ns')], devices)
+        self.get_links.assert_called_once_with('ns')
+        self.assertFalse(self.execute.called)
+
+    def test_link_attributes(self):
+        link = ip_lib.IPDevice('eth0').link
+        self.assertEqual('cc:dd:ee:ff:ab:cd', link.address)
+        self.assertEqual(1500, link.mtu)
+        self.assertEqual('UP', link.state)
+        self.assertEqual('mq', link.qdisc)
+        self.assertEqual(1000, link.qlen)
+        self.assertEqual('openvswitch', link.alias)
+        self.assertFalse(self.execute.called)
+
+    def test_device_exists(self):
+        self.assertTrue(ip_lib.device_exists('eth0'))
+        # The loopback has no ethernet address
+        self.assertFalse(ip_lib.device_exists('lo'))
+        self.assertFalse(ip_lib.device_exists('eth1'))
+        self.assertFalse(self.execute.called)
+
+    def test_addr_list(self):
+        addresses = [
+            {'family': socket.AF_INET, 'prefixlen': 24, 'flags': 0x80,
+             'scope': 'global', 'index': 2, 'address': '172.16.77.240'},
+            {'family': socket.AF_INET6, 'prefixlen': 64, 'flags': 0,
+             'scope': 'global', 'index': 2,
+             'address': '2001:470:9:1224:dfcc:aaff:feb9:76ce'},
+            {'family': socket.AF_INET6, 'prefixlen': 64, 'flags': 0x80,
+             'scope': 'link', 'index': 2,
+             'address': 'fe80::dfcc:aaff:feb9:76ce'}]
+        with mock.patch.object(netlink, 'get_addresses',
+                               return_value=addresses) as get_addresses:
+            addr = ip_lib.IPDevice('eth0', 'sudo', 'ns').addr
+            self.assertEqual(
+                [dict(cidr='172.16.77.240/24', broadcast='172.16.77.255',
+                      scope='global', ip_version=4, dynamic=False),
+                 dict(cidr='2001:470:9:1224:dfcc:aaff:feb9:76ce/64',
+                      broadcast='::', scope='global', ip_version=6,
+                      dynamic=True),
+                 dict(cidr='fe80::dfcc:aaff:feb9:76ce/64', broadcast='::',
+                      scope='link', ip_version=6, dynamic=False)],
+                addr.list())
+            self.assertEqual(['fe80::dfcc:aaff:feb9:76ce/64'],
+                             [a['cidr'] for a in addr.list(scope='link')])
+            self.assertEqual(['172.16.77.240/24'],
+                             [a['cidr'] for a in addr.list(
+                                 to='172.16.77.0/24')])
+        get_addresses.assert_called_with(2, 'ns')
+        self.assertFalse(self.execute.called)
+
+    def test_addr_list_with_filters_runs_ip(self):
+        self.execute.return_value = ADDR_SAMPLE
+        ip_lib.IPDevice('eth0').addr.list(filters=['permanent'])
+        self.assertTrue(self.execute.called)
+
+    def test_get_gateway(self):
+        routes = [
+            {'dst_len': 0, 'table': 254, 'scope': 'global', 'type': 1,
+             'oif': 3, 'gateway': '10.0.0.1'},
+            {'dst_len': 22, 'table': 254, 'scope': 'link', 'type': 1,
+             'oif': 2, 'dst': '10.35.16.0'},
+            {'dst_len': 0, 'table': 254, 'scope': 'global', 'type': 1,
+             'oif': 2, 'gateway': '10.35.19.254', 'priority': 100}]
+        with mock.patch.object(netlink, 'get_routes', return_value=routes):
+            route = ip_lib.IPDevice('eth0').route
+            self.assertEqual(dict(gateway='10.35.19.254', metric=100),
+                             route.get_gateway())
+            self.assertIsNone(route.get_gateway(scope='link'))
+        self.assertFalse(self.execute.called)
+
+
 class TestDeviceExists(base.BaseTestCase):
     def test_device_exists(self):
         with mock.patch.object(ip_lib.IPDevice, '_execute') as _execute:
@@ -0,0 +1,114 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import itertools
+import socket
+import struct
+
+import mock
+
+from neutron.agent.linux import netlink
+from neutron.tests import base
+
+
+def _attr(attr_type, value):
+    data = struct.pack('=HH', 4 + len(value), attr_type) + value
+    return data + '\0' * (netlink._align(len(data)) - len(data))
+
+
+def _message(msg_type, body, sequence):
+    return struct.pack('=IHHII', 16 + len(body), msg_type, 2, sequence,
+                       0) + body
+
+
+class TestNetlink(base.BaseTestCase):
+    def setUp(self):
+        super(TestNetlink, self).setUp()
+        self.socket_p = mock.patch.object(netlink, '_open_socket')
+        self.sock = self.socket_p.start().return_value
+        self.addCleanup(self.socket_p.stop)
+        self.sequence_p = mock.patch.object(netlink, '_sequence',
+                                            itertools.count(1))
+        self.sequence_p.start()
+        self.addCleanup(self.sequence_p.stop)
+
+    def _reply(self, *bodies):
+        """Reply the bodies to the first request, in two datagrams."""
+        # A reply to another request is ignored
+        messages = [_message(16, bodies[0], 2)]
+        messages += [_message(16, body, 1) for body in bodies]
+        self.sock.recv.side_effect = [
+            ''.join(messages),
+            _message(netlink.NLMSG_DONE, '\0' * 4, 1)]
+
+    def test_get_links(self):
+        self._reply(
+            struct.pack('=BxHiII', 0, 1, 2, 0, 0) +
+            _attr(netlink.IFLA_IFNAME, 'eth0\0') +
+            _attr(netlink.IFLA_ADDRESS, '\xcc\xdd\xee\xff\xab\xcd') +
+            _attr(netlink.IFLA_MTU, struct.pack('=I', 1500)) +
+            _attr(netlink.IFLA_QDISC, 'mq\0') +
+            _attr(netlink.IFLA_TXQLEN, struct.pack('=I', 1000)) +
+            _attr(netlink.IFLA_OPERSTATE, '\x06'))
+        self.assertEqual(
+            [{'index': 2, 'type': 1, 'name': 'eth0',
+              'address': 'cc:dd:ee:ff:ab:cd', 'mtu': 1500, 'qdisc': 'mq',
+              'qlen': 1000, 'state': 'UP'}],
+            netlink.get_links('ns'))
+        netlink._open_socket.assert_called_once_with('ns')
+        self.assertTrue(self.sock.close.called)
+
+    def test_get_addresses(self):
+        self._reply(
+            struct.pack('=BBBBI', socket.AF_INET, 24, 0x80, 0, 2) +
+            _attr(netlink.IFA_ADDRESS, socket.inet_aton('172.16.77.240')) +
+            _attr(netlink.IFA_LOCAL, socket.inet_aton('172.16.77.240')) +
+            _attr(netlink.IFA_BROADCAST, socket.inet_aton('172.16.77.255')),
+            struct.pack('=BBBBI', socket.AF_INET6, 64, 0, 253, 2) +
+            _attr(netlink.IFA_ADDRESS,
+                  socket.inet_pton(socket.AF_INET6, 'fe80::1')),
+            struct.pack('=BBBBI', socket.AF_INET, 8, 0x80, 254, 1) +
+            _attr(netlink.IFA_LOCAL, socket.inet_aton('127.0.0.1')))
+        self.assertEqual(
+            [{'family': socket.AF_INET, 'prefixlen': 24, 'flags': 0x80,
+              'scope': 'global', 'index': 2, 'address': '172.16.77.240',
+              'broadcast': '172.16.77.255'},
+             {'family': socket.AF_INET6, 'prefixlen': 64, 'flags': 0,
+              'scope': 'link', 'index': 2, 'address': 'fe80::1'}],
+            netlink.get_addresses(2))
+
+    def test_get_routes(self):
+        self._reply(
+            struct.pack('=BBBBBBBBI', socket.AF_INET, 0, 0, 0, 254, 3, 0, 1,
+                        0) +
+            _attr(netlink.RTA_OIF, struct.pack('=I', 2)) +
+            _attr(netlink.RTA_GATEWAY, socket.inet_aton('10.0.0.1')) +
+            _attr(netlink.RTA_PRIORITY, struct.pack('=I', 100)))
+        self.assertEqual(
+            [{'dst_len': 0, 'table': 254, 'scope': 'global', 'type': 1,
+              'oif': 2, 'gateway': '10.0.0.1', 'priority': 100}],
+            netlink.get_routes())
+
+    def test_dump_error(self):
+        self.sock.recv.return_value = _message(
+            netlink.NLMSG_ERROR, struct.pack('=i', -1) + '\0' * 16, 1)
+        self.assertRaises(RuntimeError, netlink.get_links)
+        self.assertTrue(self.sock.close.called)
+
+    def test_open_socket_error(self):
+        netlink._open_socket.side_effect = IOError()
+        self.assertRaises(RuntimeError, netlink.get_links, 'ns')
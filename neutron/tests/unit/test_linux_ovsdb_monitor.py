@@ -0,0 +1,103 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet.event
+import mock
+
+from neutron.agent.linux import ovsdb_monitor
+from neutron.tests import base
+
+
+class TestOvsdbMonitor(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestOvsdbMonitor, self).setUp()
+        self.root_helper = 'sudo'
+        self.monitor = ovsdb_monitor.OvsdbMonitor('Interface',
+                                                  root_helper=self.root_helper)
+
+    def test_command(self):
+        monitor = ovsdb_monitor.OvsdbMonitor('Interface',
+                                             columns=['name', 'ofport'],
+                                             format='json')
+        self.assertEqual(['ovsdb-client', 'monitor', 'Interface',
+                          'name,ofport', '--format=json'], monitor.cmd)
+
+    def read_output_queues_and_returns_result(self, output_type, output):
+        with mock.patch.object(self.monitor, '_process') as mock_process:
+            with mock.patch.object(mock_process, output_type) as mock_file:
+                with mock.patch.object(mock_file, 'readline') as mock_readline:
+                    mock_readline.return_value = output
+                    func = getattr(self.monitor,
+                                   '_read_%s' % output_type,
+                                   None)
+                    return func()
+
+    def test__read_stdout_returns_none_for_empty_read(self):
+        result = self.read_output_queues_and_returns_result('stdout', '')
+        self.assertIsNone(result)
+
+    def test__read_stdout_queues_normal_output_to_stdout_queue(self):
+        output = 'foo'
+        result = self.read_output_queues_and_returns_result('stdout', output)
+        self.assertEqual(result, output)
+        self.assertEqual(self.monitor._stdout_lines.get_nowait(), output)
+
+    def test__read_stdout_logs_root_helper_errors(self):
+        output = '%s: error' % self.root_helper
+        with mock.patch.object(ovsdb_monitor.LOG, 'error') as log_error:
+            self.read_output_queues_and_returns_result('stdout', output)
+        self.assertTrue(log_error.called)
+        self.assertTrue(self.monitor._stdout_lines.empty())
+
+    def test__read_stderr_returns_none(self):
+        with mock.patch.object(ovsdb_monitor.LOG, 'error'):
+            result = self.read_output_queues_and_returns_result('stderr',
+                                                                'error')
+        self.assertIsNone(result)
+
+
+class TestSimpleInterfaceMonitor(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestSimpleInterfaceMonitor, self).setUp()
+        self.monitor = ovsdb_monitor.SimpleInterfaceMonitor()
+        self.monitor._kill_event = eventlet.event.Event()
+
+    def test_has_updates_is_true_by_default_when_not_active(self):
+        self.monitor._kill_event = None
+        self.assertTrue(self.monitor.has_updates)
+
+    def test_has_updates_is_false_without_output(self):
+        self.assertFalse(self.monitor.has_updates)
+
+    def test_has_updates_consumes_output(self):
+        self.monitor._stdout_lines.put('update')
+        self.assertTrue(self.monitor.has_updates)
+        self.assertFalse(self.monitor.has_updates)
+
+    def test_wait_for_updates_leaves_updates_pending(self):
+        eventlet.spawn_after(0.01, self.monitor._stdout_lines.put, 'update')
+        self.monitor.wait_for_updates(5)
+        self.assertTrue(self.monitor.has_updates)
+        self.assertFalse(self.monitor.has_updates)
+
+    def test_wait_for_updates_sleeps_when_not_active(self):
+        self.monitor._kill_event = None
+        with mock.patch('eventlet.sleep') as sleep:
+            self.monitor.wait_for_updates(5)
+        sleep.assert_called_once_with(5)
@@ -0,0 +1,140 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import socket
+import sys
+
+import fixtures
+import mock
+
+from neutron.agent.linux import rootwrap_daemon
+from neutron.openstack.common.rootwrap import cmd as rootwrap_cmd
+from neutron.openstack.common.rootwrap import filters
+from neutron.tests import base
+
+
+class TestFrames(base.BaseTestCase):
+
+    def test_send_recv_frames(self):
+        first, second = socket.socketpair()
+        self.addCleanup(first.close)
+        self.addCleanup(second.close)
+        frames = ['', 'foo', 'x' * 100000]
+        rootwrap_daemon.send_frames(first, frames)
+        self.assertEqual(frames, rootwrap_daemon.recv_frames(second))
+
+    def test_recv_frames_limits_frames(self):
+        first, second = socket.socketpair()
+        self.addCleanup(first.close)
+        self.addCleanup(second.close)
+        rootwrap_daemon.send_frames(first, ['a', 'b'])
+        self.assertRaises(ValueError, rootwrap_daemon.recv_frames, second,
+                          max_frames=1)
+
+    def test_recv_frames_raises_on_closed_socket(self):
+        first, second = socket.socketpair()
+        self.addCleanup(second.close)
+        first.close()
+        self.assertRaises(EOFError, rootwrap_daemon.recv_frames, second)
+
+
+class TestRootwrapServer(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestRootwrapServer, self).setUp()
+        config = mock.Mock(exec_dirs=['/bin', '/usr/bin'], use_syslog=False)
+        echo = filters.CommandFilter('echo', 'root')
+        cat = filters.CommandFilter('cat', 'root')
+        missing = filters.CommandFilter('/nonexistent/foo', 'root')
+        self.server = rootwrap_daemon.RootwrapServer(config,
+                                                     [echo, cat, missing])
+
+    def test_run(self):
+        self.assertEqual((0, 'hello\n', ''),
+                         self.server.run(['echo', 'hello']))
+
+    def test_run_with_input(self):
+        self.assertEqual((0, 'hello', ''), self.server.run(['cat'], 'hello'))
+
+    def test_run_unauthorized_command(self):
+        returncode, stdout, stderr = self.server.run(['rm', '-rf', '/'])
+        self.assertEqual(rootwrap_cmd.RC_UNAUTHORIZED, returncode)
+        self.assertIn('Unauthorized command', stderr)
+
+    def test_run_missing_executable(self):
+        returncode, stdout, stderr = self.server.run(['foo'])
+        self.assertEqual(rootwrap_cmd.RC_NOEXECFOUND, returncode)
+
+
+class TestRootwrapDaemon(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestRootwrapDaemon, self).setUp()
+        tempdir = self.useFixture(fixtures.TempDir()).path
+        filters_dir = os.path.join(tempdir, 'rootwrap.d')
+        os.mkdir(filters_dir)
+        with open(os.path.join(filters_dir, 'test.filters'), 'w') as f:
+            f.write('[Filters]\n'
+                    'echo: CommandFilter, echo, root\n'
+                    'cat: CommandFilter, cat, root\n')
+        conf_file = os.path.join(tempdir, 'rootwrap.conf')
+        with open(conf_file, 'w') as f:
+            f.write('[DEFAULT]\n'
+                    'filters_path=%s\n'
+                    'exec_dirs=/bin,/usr/bin\n' % filters_dir)
+        # The daemon runs as the current user
+        daemon_cmd = ('%s -c "from neutron.agent.linux import '
+                      'rootwrap_daemon; rootwrap_daemon.main()" %s' %
+                      (sys.executable, conf_file))
+        self.client = rootwrap_daemon.RootwrapDaemonClient(daemon_cmd)
+        self.addCleanup(self.client.stop)
+
+    def test_execute(self):
+        self.assertEqual((0, 'hello\n', ''),
+                         self.client.execute(['echo', 'hello']))
+        self.assertEqual((0, 'foo\nbar', ''),
+                         self.client.execute(['cat'], 'foo\nbar'))
+        self.assertEqual(rootwrap_cmd.RC_UNAUTHORIZED,
+                         self.client.execute(['ls'])[0])
+
+    def test_execute_reuses_connection(self):
+        self.client.execute(['echo', 'hello'])
+        sock = self.client._connections[0]
+        self.client.execute(['echo', 'hello'])
+        self.assertEqual([sock], self.client._connections)
+
+    def test_execute_restarts_exited_daemon(self):
+        self.client.execute(['echo', 'hello'])
+        self.client._process.stdin.close()
+        self.client._process.wait()
+        self.assertEqual((0, 'hello\n', ''),
+                         self.client.execute(['echo', 'hello']))
+
+    def test_connection_requires_authkey(self):
+        self.client.execute(['echo', 'hello'])
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(sock.close)
+        sock.connect(self.client._address)
+        rootwrap_daemon.send_frames(sock, ['0' * len(self.client._authkey)])
+        self.assertRaises(EOFError, rootwrap_daemon.recv_frames, sock)
+
+    def test_stop_removes_socket(self):
+        self.client.execute(['echo', 'hello'])
+        address = self.client._address
+        self.client.stop()
+        self.assertFalse(os.path.exists(os.path.dirname(address)))
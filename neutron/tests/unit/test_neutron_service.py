@@ -0,0 +1,95 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+
+import mock
+from oslo.config import cfg
+
+from neutron import service
+from neutron.tests import base
+
+
+class TestServeRpc(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestServeRpc, self).setUp()
+        self.plugin = mock.Mock()
+        self.plugin.rpc_workers_supported.return_value = True
+        get_plugin = mock.patch('neutron.manager.NeutronManager.get_plugin',
+                                return_value=self.plugin)
+        get_plugin.start()
+        self.addCleanup(get_plugin.stop)
+        dispose = mock.patch.object(service.db_api, 'dispose_engine')
+        dispose.start()
+        self.addCleanup(dispose.stop)
+        self.addCleanup(cfg.CONF.reset)
+
+    def test_not_supported_raises(self):
+        self.plugin.rpc_workers_supported.return_value = False
+        self.assertRaises(NotImplementedError, service.serve_rpc)
+        self.assertFalse(self.plugin.start_rpc_listener.called)
+
+    def test_in_process(self):
+        conn = mock.Mock()
+        self.plugin.start_rpc_listener.return_value = [conn]
+        rpc = service.serve_rpc()
+        self.assertIsInstance(rpc, service.RpcWorker)
+        self.plugin.start_rpc_listener.assert_called_once_with()
+        rpc.stop()
+        conn.close.assert_called_once_with()
+        # stop releases the waiters
+        rpc.wait()
+
+    def test_worker_processes(self):
+        cfg.CONF.set_override('rpc_workers', 3)
+        with mock.patch.object(service, 'ProcessLauncher') as launcher:
+            rpc = service.serve_rpc()
+            self.assertEqual(launcher.return_value, rpc)
+            launcher.return_value.launch_service.assert_called_once_with(
+                mock.ANY, workers=3)
+            self.assertFalse(self.plugin.start_rpc_listener.called)
+
+
+class TestProcessLauncher(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestProcessLauncher, self).setUp()
+        signal_p = mock.patch('signal.signal')
+        signal_p.start()
+        self.addCleanup(signal_p.stop)
+        self.launcher = service.ProcessLauncher()
+        self.wrap = mock.Mock(children=set([1, 2]))
+        self.launcher.children = {1: self.wrap, 2: self.wrap}
+
+    def test_wait_child_reaps_own_children(self):
+        with mock.patch('os.waitpid',
+                        side_effect=[(0, 0), (2, 0)]) as waitpid:
+            self.assertEqual(self.wrap, self.launcher._wait_child())
+        waitpid.assert_has_calls([mock.call(1, os.WNOHANG),
+                                  mock.call(2, os.WNOHANG)])
+        self.assertEqual({1: self.wrap}, self.launcher.children)
+        self.assertEqual(set([1]), self.wrap.children)
+
+    def test_wait_child_no_child_exited(self):
+        with mock.patch('os.waitpid', return_value=(0, 0)):
+            self.assertIsNone(self.launcher._wait_child())
+        self.assertEqual(2, len(self.launcher.children))
+
+    def test_stop(self):
+        self.launcher.stop()
+        self.assertFalse(self.launcher.running)
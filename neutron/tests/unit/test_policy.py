@@ -15,6 +15,7 @@
 
 """Test of Policy Engine For Neutron"""
 
+import contextlib
 import json
 import StringIO
 import urllib2
@@ -531,3 +532,39 @@ class NeutronPolicyTestCase(base.BaseTestCase):
             {'extension:provider_network:set': 'rule:admin_only'},
             dict((policy, 'rule:admin_only') for policy in
                  expected_policies))
+
+    def _compile(self, rule, roles):
+        credentials = {'tenant_id': 'fake', 'roles': roles}
+        return policy._compile_rule(common_policy.parse_rule(rule),
+                                    credentials)
+
+    def test_compile_rule_target_independent(self):
+        self.assertTrue(self._compile("rule:admin_or_owner", ['admin']))
+        self.assertFalse(self._compile("rule:admin_only", ['user']))
+        self.assertFalse(self._compile("not rule:regular_user", ['user']))
+
+    def test_compile_rule_target_dependent(self):
+        checker = self._compile("rule:admin_or_owner", ['user'])
+        self.assertTrue(checker({'tenant_id': 'fake'}))
+        self.assertFalse(checker({'tenant_id': 'somebody_else'}))
+
+    def test_check_compiles_rule_once_per_context(self):
+        target = {'shared': True, 'tenant_id': 'somebody_else'}
+        policy.init()
+        with contextlib.nested(
+            mock.patch.object(policy, 'init'),
+            mock.patch.object(policy, '_build_match_rule',
+                              wraps=policy._build_match_rule)
+        ) as (init, build):
+            for i in range(3):
+                self.assertTrue(policy.check(self.context, 'get_network',
+                                             target))
+            self.assertEqual(1, build.call_count)
+            policy.check(context.get_admin_context(), 'get_network', target)
+            self.assertEqual(2, build.call_count)
+
+    def test_check_recompiles_rule_on_roles_change(self):
+        target = {'tenant_id': 'somebody_else'}
+        self.assertFalse(policy.check(self.context, 'create_network', target))
+        self.context.roles.append('admin')
+        self.assertTrue(policy.check(self.context, 'create_network', target))
@@ -15,6 +15,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+
 import mock
 from oslo.config import cfg
 import testtools
@@ -26,6 +28,7 @@ from neutron.common import config
 from neutron.common import exceptions
 from neutron import context
 from neutron.db import api as db
+from neutron.db import models_v2
 from neutron.db import quota_db
 from neutron import manager
 from neutron.plugins.linuxbridge.db import l2network_db_v2
@@ -401,3 +404,143 @@ class TestDbQuotaDriver(base.BaseTestCase):
             get_tenant_quotas.assert_called_once_with(ctx,
                                                       default_quotas,
                                                       target_tenant)
+
+
+class TestDbQuotaDriverReservations(base.BaseTestCase):
+    """Test the reservations of neutron.db.quota_db.DbQuotaDriver."""
+
+    def setUp(self):
+        super(TestDbQuotaDriverReservations, self).setUp()
+        db.configure_db()
+        self.addCleanup(db.clear_db)
+        self.addCleanup(cfg.CONF.reset)
+        cfg.CONF.set_override('quota_network', 2, group='QUOTAS')
+        cfg.CONF.set_override('quota_subnet', 2, group='QUOTAS')
+        self.driver = quota_db.DbQuotaDriver()
+        self.ctx = context.get_admin_context()
+        self.count = mock.Mock(return_value=0)
+        self.resources = {
+            'network': quota.CountableResource('network', self.count,
+                                               'quota_network'),
+            'extra1': quota.CountableResource('extra1', self.count,
+                                              'quota_subnet')}
+
+    def _reserve(self, resource='network', delta=1):
+        return self.driver.make_reservation(self.ctx, 'tenant',
+                                            self.resources, resource,
+                                            delta, self.count)
+
+    def _add_network(self, tenant_id='tenant'):
+        with self.ctx.session.begin():
+            network = models_v2.Network(tenant_id=tenant_id, name='net',
+                                        status='ACTIVE',
+                                        admin_state_up=True, shared=False)
+            self.ctx.session.add(network)
+        return network
+
+    def _usage(self, resource='network'):
+        return self.ctx.session.query(quota_db.QuotaUsage).filter_by(
+            tenant_id='tenant', resource=resource).one()
+
+    def test_reservations_count_against_quota(self):
+        self._reserve(delta=2)
+        with testtools.ExpectedException(exceptions.OverQuota):
+            self._reserve()
+
+    def test_cancel_reservation(self):
+        reservation = self._reserve(delta=2)
+        self.driver.cancel_reservation(self.ctx, reservation)
+        self.assertIsNotNone(self._reserve(delta=2))
+
+    def test_usage_tracked_on_create_and_delete(self):
+        self._add_network()
+        reservation = self._reserve()
+        self.assertEqual(1, self._usage()['in_use'])
+        network = self._add_network()
+        self.driver.commit_reservation(self.ctx, reservation)
+        self.assertEqual(2, self._usage()['in_use'])
+        with testtools.ExpectedException(exceptions.OverQuota):
+            self._reserve()
+        with self.ctx.session.begin():
+            self.ctx.session.delete(network)
+        self.assertEqual(1, self._usage()['in_use'])
+        self._reserve()
+        self.assertFalse(self.count.called)
+
+    def test_reservation_consumed_by_creation(self):
+        reservation = self._reserve()
+        self._add_network()
+        # The network is in use, its reservation no longer counts
+        self.driver.make_reservation(context.get_admin_context(), 'tenant',
+                                     self.resources, 'network', 1,
+                                     self.count)
+        with testtools.ExpectedException(exceptions.OverQuota):
+            self._reserve()
+        self.driver.commit_reservation(self.ctx, reservation)
+
+    def test_usage_of_other_tenant_untouched(self):
+        self._reserve()
+        self._add_network(tenant_id='other')
+        self.assertEqual(0, self._usage()['in_use'])
+
+    def test_expired_reservations_ignored(self):
+        cfg.CONF.set_override('reservation_expiration', -1, group='QUOTAS')
+        self._reserve(delta=2)
+        self._reserve(delta=2)
+
+    def test_unlimited_resource_not_reserved(self):
+        cfg.CONF.set_override('quota_network', -1, group='QUOTAS')
+        self.assertIsNone(self._reserve(delta=100))
+
+    def test_untracked_resource_counted(self):
+        self.count.return_value = 1
+        self._reserve('extra1')
+        with testtools.ExpectedException(exceptions.OverQuota):
+            self._reserve('extra1')
+        self.assertEqual(2, self.count.call_count)
+
+    def test_sync_usages(self):
+        self._reserve('extra1')
+        cfg.CONF.set_override('reservation_expiration', -1, group='QUOTAS')
+        self._reserve()
+        self._add_network()
+        with self.ctx.session.begin():
+            self._usage()['in_use'] = 5
+        self.assertEqual(1, self.driver.sync_usages(self.ctx))
+        self.assertEqual(1, self._usage()['in_use'])
+        self.assertTrue(self._usage('extra1')['dirty'])
+        self.assertEqual(1, self.ctx.session.query(
+            quota_db.Reservation).count())
+
+
+class TestUsageTracking(base.BaseTestCase):
+
+    def test_usages_only_tracked_once_enabled(self):
+        with contextlib.nested(
+            mock.patch.object(quota_db, '_tracking_enabled', False),
+            mock.patch.object(quota_db, '_TRACKED_RESOURCES', {}),
+            mock.patch.object(quota_db.event, 'listen')
+        ) as (enabled, tracked, listen):
+            quota_db.track_resource_usage('fake', mock.sentinel.model)
+            self.assertFalse(listen.called)
+            quota_db.DbQuotaDriver()
+            listen.assert_has_calls(
+                [mock.call(mock.sentinel.model, 'after_insert', mock.ANY),
+                 mock.call(mock.sentinel.model, 'after_delete', mock.ANY)])
+
+
+class TestQuotaEngineReservations(base.BaseTestCase):
+
+    def test_make_reservation_without_driver_support(self):
+        engine = quota.QuotaEngine(quota.ConfDriver())
+        engine.register_resource(quota.CountableResource(
+            'network', mock.Mock(return_value=10), 'quota_network'))
+        with testtools.ExpectedException(exceptions.OverQuota):
+            engine.make_reservation(context.Context('', 'tenant'),
+                                    'tenant', 'network', 1)
+
+    def test_make_reservation_unknown_resource(self):
+        engine = quota.QuotaEngine(quota.ConfDriver())
+        with testtools.ExpectedException(exceptions.QuotaResourceUnknown):
+            engine.make_reservation(context.Context('', 'tenant'),
+                                    'tenant', 'network', 1)
@@ -0,0 +1,142 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from oslo.config import cfg
+import sqlalchemy
+import webob
+
+from neutron.api import request_stats
+from neutron.common import timing
+from neutron import context
+from neutron.db import api as db
+from neutron.db import models_v2
+from neutron.openstack.common import jsonutils
+from neutron.tests import base
+
+
+class TimingTestCase(base.BaseTestCase):
+
+    def test_measure_not_started(self):
+        with timing.measure(timing.POLICY):
+            pass
+
+    def test_measure(self):
+        timings = timing.start()
+        self.addCleanup(timing.stop)
+        with timing.measure(timing.POLICY):
+            pass
+        self.assertIn(timing.POLICY, timings)
+        self.assertNotIn(timing.SERIALIZATION, timings)
+
+    def test_timed(self):
+        @timing.timed(timing.SERIALIZATION)
+        def serialize(value):
+            return value
+
+        self.assertEqual(1, serialize(1))
+        timings = timing.start()
+        self.addCleanup(timing.stop)
+        self.assertEqual(2, serialize(2))
+        self.assertIn(timing.SERIALIZATION, timings)
+
+    def test_statement_stats(self):
+        engine = sqlalchemy.create_engine('sqlite://')
+        timing.instrument_engine(engine)
+        timing.instrument_engine(engine)
+        engine.execute('SELECT 1')
+        stats = timing.start_statement_stats()
+        try:
+            engine.execute('SELECT 2')
+        finally:
+            self.assertIs(stats, timing.stop_statement_stats())
+        engine.execute('SELECT 3')
+        self.assertEqual(1, stats.count)
+        self.assertEqual('SELECT 2', stats.slowest_statement)
+
+
+class RequestStatsMiddlewareTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(RequestStatsMiddlewareTestCase, self).setUp()
+        db.configure_db()
+        self.addCleanup(db.clear_db)
+
+        @webob.dec.wsgify
+        def fake_app(req):
+            session = db.get_session()
+            session.query(models_v2.Network).all()
+            session.query(models_v2.Port).all()
+            with timing.measure(timing.POLICY):
+                pass
+            return webob.Response()
+
+        self.middleware = request_stats.RequestStatsMiddleware(fake_app)
+
+    def _request(self, path, method='GET', is_admin=True):
+        request = webob.Request.blank(path, method=method)
+        request.environ['neutron.context'] = context.Context(
+            'user', 'tenant', is_admin=is_admin)
+        return request.get_response(self.middleware)
+
+    def test_headers(self):
+        response = self._request('/networks')
+        self.assertEqual('2', response.headers['X-DB-Statements'])
+        self.assertGreater(float(response.headers['X-Policy-Time']), 0)
+        self.assertEqual(0, float(response.headers['X-Serialization-Time']))
+
+    def test_stats_aggregated_per_request_kind(self):
+        self._request('/networks/2f0a1d39-07a6-4bb4-8b0c-b2cd2e6e8f42.json')
+        self._request('/networks/6b0ef7a5-9e1e-4a8b-b4d5-0b0a2c44a5ea')
+        self._request('/networks', method='POST')
+        response = self._request('/request-stats')
+        stats = jsonutils.loads(response.body)['request_stats']
+        self.assertEqual(['GET /networks/{id}', 'POST /networks'],
+                         [s['request'] for s in stats])
+        self.assertEqual(2, stats[0]['count'])
+        self.assertEqual(4, stats[0]['statements'])
+        self.assertEqual(2, stats[0]['max_statements'])
+
+    def test_stats_undashed_ids_collapsed(self):
+        self._request('/v2.0/8a7d9e3c1b2f4e5d9c0b1a2f3e4d5c6b/quotas')
+        self._request('/v2.0/1f2e3d4c5b6a79880716253443526170/quotas')
+        response = self._request('/request-stats')
+        stats = jsonutils.loads(response.body)['request_stats']
+        self.assertEqual(['GET /v2.0/{id}/quotas'],
+                         [s['request'] for s in stats])
+
+    def test_stats_keys_capped(self):
+        cfg.CONF.set_override('request_stats_max_keys', 2)
+        self.addCleanup(cfg.CONF.clear_override, 'request_stats_max_keys')
+        for name in ('net1', 'net2', 'net3', 'net4'):
+            self._request('/networks/%s' % name)
+        response = self._request('/request-stats')
+        stats = jsonutils.loads(response.body)['request_stats']
+        self.assertEqual(['GET /networks/net1', 'GET /networks/net2',
+                          request_stats.OTHER_REQUESTS],
+                         [s['request'] for s in stats])
+        self.assertEqual(2, stats[2]['count'])
+
+    def test_stats_reset(self):
+        self._request('/networks')
+        self.assertEqual(204, self._request('/request-stats',
+                                            method='DELETE').status_int)
+        response = self._request('/request-stats')
+        self.assertEqual([], jsonutils.loads(response.body)['request_stats'])
+
+    def test_stats_admin_only(self):
+        self.assertEqual(403, self._request('/request-stats',
+                                            is_admin=False).status_int)
@@ -31,6 +31,7 @@ from neutron.db import securitygroups_rpc_base as sg_db_rpc
 from neutron.extensions import allowedaddresspairs as addr_pair
 from neutron.extensions import securitygroup as ext_sg
 from neutron.manager import NeutronManager
+from neutron.openstack.common.rpc import common as rpc_common
 from neutron.openstack.common.rpc import proxy
 from neutron.tests import base
 from neutron.tests.unit import test_extension_security_group as test_sg
@@ -273,11 +274,99 @@ class SGServerRpcCallBackMixinTestCase(test_sg.SecurityGroupDBTestCase):
                              'remote_group_id': sg2_id,
                              'security_group_id': sg1_id},
                             ]
-                self.assertEqual(port_rpc['security_group_rules'],
-                                 expected)
+                # The security groups of the port come in any order
+                self.assertEqual(sorted(port_rpc['security_group_rules']),
+                                 sorted(expected))
+                self._delete('ports', port_id1)
+                self._delete('ports', port_id2)
+
+    def test_security_group_info_for_devices_ipv4_source_group(self):
+        with self.network() as n:
+            with nested(self.subnet(n),
+                        self.security_group(),
+                        self.security_group()) as (subnet_v4,
+                                                   sg1,
+                                                   sg2):
+                sg1_id = sg1['security_group']['id']
+                sg2_id = sg2['security_group']['id']
+                rule1 = self._build_security_group_rule(
+                    sg1_id,
+                    'ingress', 'tcp', '24',
+                    '25', remote_group_id=sg2_id)
+                rules = {
+                    'security_group_rules': [rule1['security_group_rule']]}
+                res = self._create_security_group_rule(self.fmt, rules)
+                self.deserialize(self.fmt, res)
+                self.assertEqual(res.status_int, 201)
+
+                res1 = self._create_port(
+                    self.fmt, n['network']['id'],
+                    security_groups=[sg1_id])
+                ports_rest1 = self.deserialize(self.fmt, res1)
+                port_id1 = ports_rest1['port']['id']
+                self.rpc.devices = {port_id1: ports_rest1['port']}
+                devices = [port_id1, 'no_exist_device']
+
+                res2 = self._create_port(
+                    self.fmt, n['network']['id'],
+                    security_groups=[sg2_id])
+                ports_rest2 = self.deserialize(self.fmt, res2)
+                port_id2 = ports_rest2['port']['id']
+                ctx = context.get_admin_context()
+                info = self.rpc.security_group_info_for_devices(
+                    ctx, devices=devices)
+                port_rpc = info['devices'][port_id1]
+                expected = [{'direction': 'egress', 'ethertype': 'IPv4',
+                             'security_group_id': sg1_id},
+                            {'direction': 'egress', 'ethertype': 'IPv6',
+                             'security_group_id': sg1_id},
+                            {'direction': u'ingress',
+                             'protocol': u'tcp', 'ethertype': u'IPv4',
+                             'port_range_max': 25, 'port_range_min': 24,
+                             'remote_group_id': sg2_id,
+                             'security_group_id': sg1_id},
+                            ]
+                self.assertEqual({sg1_id: expected}, info['security_groups'])
+                self.assertEqual([], port_rpc['security_group_rules'])
+                self.assertEqual([sg2_id],
+                                 port_rpc['security_group_source_groups'])
+                ip2 = ports_rest2['port']['fixed_ips'][0]['ip_address']
+                self.assertEqual({sg2_id: {'IPv4': ['%s/32' % ip2],
+                                           'IPv6': []}},
+                                 info['sg_member_ips'])
                 self._delete('ports', port_id1)
                 self._delete('ports', port_id2)
 
+    def test_security_group_rules_cached(self):
+        with self.network() as n:
+            with nested(self.subnet(n),
+                        self.security_group()) as (subnet_v4, sg1):
+                sg1_id = sg1['security_group']['id']
+                res1 = self._create_port(
+                    self.fmt, n['network']['id'],
+                    security_groups=[sg1_id])
+                ports_rest1 = self.deserialize(self.fmt, res1)
+                port_id1 = ports_rest1['port']['id']
+                ctx = context.get_admin_context()
+
+                def get_rules():
+                    self.rpc.devices = {port_id1: dict(ports_rest1['port'])}
+                    info = self.rpc.security_group_info_for_devices(
+                        ctx, devices=[port_id1])
+                    return info['security_groups'][sg1_id]
+
+                self.assertEqual(2, len(get_rules()))
+                with mock.patch.object(self.rpc, '_make_rule_dict') as make:
+                    self.assertEqual(2, len(get_rules()))
+                    self.assertFalse(make.called)
+
+                rule1 = self._build_security_group_rule(
+                    sg1_id, 'ingress', 'tcp', '22', '22')
+                res = self._create_security_group_rule(self.fmt, rule1)
+                self.assertEqual(res.status_int, 201)
+                self.assertEqual(3, len(get_rules()))
+                self._delete('ports', port_id1)
+
     def test_security_group_rules_for_devices_ipv6_ingress(self):
         fake_prefix = test_fw.FAKE_PREFIX['IPv6']
         with self.network() as n:
@@ -453,8 +542,9 @@ class SGServerRpcCallBackMixinTestCase(test_sg.SecurityGroupDBTestCase):
                              'remote_group_id': sg2_id,
                              'security_group_id': sg1_id},
                             ]
-                self.assertEqual(port_rpc['security_group_rules'],
-                                 expected)
+                # The security groups of the port come in any order
+                self.assertEqual(sorted(port_rpc['security_group_rules']),
+                                 sorted(expected))
                 self._delete('ports', port_id1)
                 self._delete('ports', port_id2)
 
@@ -481,21 +571,31 @@ class SGAgentRpcCallBackMixinTestCase(base.BaseTestCase):
         self.rpc.sg_agent.assert_has_calls(
             [call.security_groups_member_updated(['fake_sgid'])])
 
+    def test_security_groups_member_ips_updated(self):
+        member_ips = {'fake_sgid': {'added': ['10.0.0.2/32'],
+                                    'removed': []}}
+        self.rpc.security_groups_member_updated(None,
+                                                security_groups=['fake_sgid'],
+                                                member_ips=member_ips)
+        self.rpc.sg_agent.assert_has_calls(
+            [call.security_group_member_ips_updated(['fake_sgid'],
+                                                    member_ips)])
+
     def test_security_groups_provider_updated(self):
         self.rpc.security_groups_provider_updated(None)
         self.rpc.sg_agent.assert_has_calls(
             [call.security_groups_provider_updated()])
 
 
-class SecurityGroupAgentRpcTestCase(base.BaseTestCase):
-    def setUp(self):
-        super(SecurityGroupAgentRpcTestCase, self).setUp()
+class BaseSecurityGroupAgentRpcTestCase(base.BaseTestCase):
+    def setUp(self, defer_refresh_firewall=False):
+        super(BaseSecurityGroupAgentRpcTestCase, self).setUp()
         self.agent = sg_rpc.SecurityGroupAgentRpcMixin()
         self.agent.context = None
         self.addCleanup(mock.patch.stopall)
         mock.patch('neutron.agent.linux.iptables_manager').start()
         self.agent.root_helper = 'sudo'
-        self.agent.init_firewall()
+        self.agent.init_firewall(defer_refresh_firewall=defer_refresh_firewall)
         self.firewall = mock.Mock()
         firewall_object = firewall_base.FirewallDriver()
         self.firewall.defer_apply.side_effect = firewall_object.defer_apply
@@ -513,6 +613,8 @@ class SecurityGroupAgentRpcTestCase(base.BaseTestCase):
         self.firewall.ports = fake_devices
         rpc.security_group_rules_for_devices.return_value = fake_devices
 
+
+class SecurityGroupAgentRpcTestCase(BaseSecurityGroupAgentRpcTestCase):
     def test_prepare_and_remove_devices_filter(self):
         self.agent.prepare_devices_filter(['fake_device'])
         self.agent.remove_devices_filter(['fake_device'])
@@ -579,6 +681,182 @@ class SecurityGroupAgentRpcTestCase(base.BaseTestCase):
         self.agent.refresh_firewall([])
         self.firewall.assert_has_calls([])
 
+    def test_prepare_devices_filter_with_remote_group_members(self):
+        self.agent.use_remote_group_members = True
+        sg_member_ips = {'fake_sgid2': {'IPv4': ['10.0.0.2/32'],
+                                        'IPv6': []}}
+        provider_rule = {'direction': 'ingress', 'ethertype': 'IPv4',
+                         'source_ip_prefix': '10.0.0.1/32'}
+        rpc_device = dict(self.fake_device,
+                          security_group_rules=[provider_rule])
+        self.fake_device['security_group_rules'].append(provider_rule)
+        self.agent.plugin_rpc.security_group_info_for_devices.return_value = {
+            'devices': {'fake_device': rpc_device},
+            'security_groups': {
+                'fake_sgid1': [{'security_group_id': 'fake_sgid1',
+                                'remote_group_id': 'fake_sgid2'}],
+                'fake_sgid2': []},
+            'sg_member_ips': sg_member_ips}
+        self.agent.prepare_devices_filter(['fake_device'])
+        self.firewall.assert_has_calls(
+            [call.update_security_group_members(sg_member_ips),
+             call.defer_apply(),
+             call.prepare_port_filter(self.fake_device)])
+        self.assertFalse(
+            self.agent.plugin_rpc.security_group_rules_for_devices.called)
+
+    def test_prepare_devices_filter_remote_group_members_unsupported(self):
+        self.agent.use_remote_group_members = True
+        rpc = self.agent.plugin_rpc
+        rpc.security_group_info_for_devices.return_value = None
+        self.agent.prepare_devices_filter(['fake_device'])
+        self.agent.refresh_firewall()
+        rpc.security_group_info_for_devices.assert_called_once_with(
+            None, ['fake_device'])
+        self.assertEqual(2, rpc.security_group_rules_for_devices.call_count)
+        self.assertFalse(self.agent.use_remote_group_members)
+        self.assertFalse(self.firewall.update_security_group_members.called)
+
+    def test_security_group_member_ips_updated(self):
+        self.agent.use_remote_group_members = True
+        self.agent.refresh_firewall = mock.Mock()
+        member_ips = {'fake_sgid2': {'added': ['10.0.0.3/32'],
+                                     'removed': ['10.0.0.2/32']}}
+        self.agent.security_group_member_ips_updated(['fake_sgid2'],
+                                                     member_ips)
+        self.firewall.update_security_group_member_ips.assert_called_once_with(
+            {'fake_sgid2': {'added': set(['10.0.0.3/32']),
+                            'removed': set(['10.0.0.2/32'])}})
+        self.assertFalse(self.agent.refresh_firewall.called)
+
+    def test_security_group_member_ips_updated_without_remote_groups(self):
+        self.agent.use_remote_group_members = False
+        self.agent.refresh_firewall = mock.Mock()
+        self.agent.security_group_member_ips_updated(
+            ['fake_sgid2'], {'fake_sgid2': {'added': ['10.0.0.3/32'],
+                                            'removed': []}})
+        self.agent.refresh_firewall.assert_called_once_with(
+            [self.fake_device])
+        self.assertFalse(self.firewall.update_security_group_member_ips.called)
+
+
+class SecurityGroupAgentRpcDeferredTestCase(
+        BaseSecurityGroupAgentRpcTestCase):
+    def setUp(self):
+        super(SecurityGroupAgentRpcDeferredTestCase, self).setUp(
+            defer_refresh_firewall=True)
+        self.agent.refresh_firewall = mock.Mock()
+
+    def test_security_groups_rule_updated(self):
+        self.agent.security_groups_rule_updated(['fake_sgid1'])
+        self.agent.security_groups_member_updated(['fake_sgid2'])
+        self.assertFalse(self.agent.refresh_firewall.called)
+        self.assertTrue(self.agent.firewall_refresh_needed())
+
+        self.agent.refresh_pending_firewall()
+
+        self.agent.refresh_firewall.assert_called_once_with(
+            [self.fake_device])
+        self.assertFalse(self.agent.firewall_refresh_needed())
+
+    def test_security_groups_rule_not_updated(self):
+        self.agent.security_groups_rule_updated(['fake_sgid3'])
+        self.assertFalse(self.agent.firewall_refresh_needed())
+
+    def test_security_groups_member_updated(self):
+        self.agent.security_groups_member_updated(['fake_sgid2'])
+        self.assertFalse(self.agent.refresh_firewall.called)
+        self.agent.refresh_pending_firewall()
+        self.agent.refresh_firewall.assert_called_once_with(
+            [self.fake_device])
+
+    def test_security_groups_member_not_updated(self):
+        self.agent.security_groups_member_updated(['fake_sgid3'])
+        self.assertFalse(self.agent.firewall_refresh_needed())
+
+    def test_security_groups_provider_updated(self):
+        self.agent.security_groups_rule_updated(['fake_sgid1'])
+        self.agent.security_groups_provider_updated()
+        self.assertFalse(self.agent.refresh_firewall.called)
+
+        self.agent.refresh_pending_firewall()
+
+        self.agent.refresh_firewall.assert_called_once_with()
+        self.assertFalse(self.agent.firewall_refresh_needed())
+
+    def test_refresh_pending_firewall_removed_device(self):
+        self.agent.security_groups_rule_updated(['fake_sgid1'])
+        self.firewall.ports = {}
+        self.agent.refresh_pending_firewall()
+        self.assertFalse(self.agent.refresh_firewall.called)
+
+    def test_security_group_member_ips_updated(self):
+        self.agent.use_remote_group_members = True
+        self.agent.security_group_member_ips_updated(
+            ['fake_sgid2'], {'fake_sgid2': {'added': ['10.0.0.3/32'],
+                                            'removed': ['10.0.0.2/32']}})
+        self.agent.security_group_member_ips_updated(
+            ['fake_sgid2'], {'fake_sgid2': {'added': ['10.0.0.2/32'],
+                                            'removed': ['10.0.0.4/32']}})
+        self.assertFalse(self.firewall.update_security_group_member_ips.called)
+
+        self.agent.refresh_pending_firewall()
+
+        self.firewall.update_security_group_member_ips.assert_called_once_with(
+            {'fake_sgid2': {'added': set(['10.0.0.2/32', '10.0.0.3/32']),
+                            'removed': set(['10.0.0.4/32'])}})
+        self.assertFalse(self.agent.refresh_firewall.called)
+        self.assertFalse(self.agent.firewall_refresh_needed())
+
+    def test_security_group_member_ips_updated_without_remote_groups(self):
+        self.agent.use_remote_group_members = False
+        self.agent.security_group_member_ips_updated(
+            ['fake_sgid2'], {'fake_sgid2': {'added': ['10.0.0.3/32'],
+                                            'removed': []}})
+        self.agent.refresh_pending_firewall()
+        self.agent.refresh_firewall.assert_called_once_with(
+            [self.fake_device])
+        self.assertFalse(self.firewall.update_security_group_member_ips.called)
+
+    def test_remote_members_resynced_periodically(self):
+        self.agent.use_remote_group_members = True
+        rpc = self.agent.plugin_rpc
+        rpc.security_group_info_for_devices.return_value = {
+            'sg_member_ips': {'fake_sgid2': {'IPv4': ['10.0.0.2/32']}}}
+        resynced_at = self.agent._sg_members_resynced_at
+        with mock.patch('time.time', return_value=resynced_at + 59):
+            self.assertFalse(self.agent.firewall_refresh_needed())
+        with mock.patch('time.time', return_value=resynced_at + 60):
+            self.assertTrue(self.agent.firewall_refresh_needed())
+            self.agent.refresh_pending_firewall()
+            self.assertFalse(self.agent.firewall_refresh_needed())
+        rpc.security_group_info_for_devices.assert_called_once_with(
+            None, ['fake_device'])
+        self.firewall.update_security_group_members.assert_called_once_with(
+            {'fake_sgid2': {'IPv4': ['10.0.0.2/32']}})
+        self.assertFalse(self.agent.refresh_firewall.called)
+
+    def test_remote_members_not_resynced_when_disabled(self):
+        cfg.CONF.set_override('remote_members_resync_interval', 0,
+                              'SECURITYGROUP')
+        self.addCleanup(cfg.CONF.reset)
+        self.agent.use_remote_group_members = True
+        with mock.patch('time.time',
+                        return_value=self.agent._sg_members_resynced_at +
+                        3600):
+            self.assertFalse(self.agent.firewall_refresh_needed())
+
+    def test_global_refresh_resyncs_remote_members(self):
+        self.agent.use_remote_group_members = True
+        self.agent.security_groups_provider_updated()
+        resynced_at = self.agent._sg_members_resynced_at
+        with mock.patch('time.time', return_value=resynced_at + 60):
+            self.agent.refresh_pending_firewall()
+            self.assertFalse(self.agent.firewall_refresh_needed())
+        self.agent.refresh_firewall.assert_called_once_with()
+        self.assertFalse(
+            self.agent.plugin_rpc.security_group_info_for_devices.called)
+
 
 class FakeSGRpcApi(agent_rpc.PluginApi,
                    sg_rpc.SecurityGroupServerRpcApiMixin):
@@ -602,6 +880,22 @@ class SecurityGroupServerRpcApiTestCase(base.BaseTestCase):
              version=sg_rpc.SG_RPC_VERSION,
              topic='fake_topic')])
 
+    def test_security_group_info_for_devices(self):
+        self.rpc.security_group_info_for_devices(None, ['fake_device'])
+        self.rpc.call.assert_called_once_with(
+            None,
+            {'args': {'devices': ['fake_device']},
+             'method': 'security_group_info_for_devices',
+             'namespace': None},
+            version='1.3',
+            topic='fake_topic')
+
+    def test_security_group_info_for_devices_unsupported(self):
+        self.rpc.call.side_effect = rpc_common.UnsupportedRpcVersion(
+            version='1.3')
+        self.assertIsNone(
+            self.rpc.security_group_info_for_devices(None, ['fake_device']))
+
 
 class FakeSGNotifierAPI(proxy.RpcProxy,
                         sg_rpc.SecurityGroupAgentRpcApiMixin):
@@ -639,6 +933,21 @@ class SecurityGroupAgentRpcApiTestCase(base.BaseTestCase):
                   version=sg_rpc.SG_RPC_VERSION,
                   topic='fake-security_group-update')])
 
+    def test_security_groups_member_ips_updated(self):
+        member_ips = {'fake_sgid': {'added': ['10.0.0.2/32'],
+                                    'removed': []}}
+        self.notifier.security_groups_member_updated(
+            None, security_groups=['fake_sgid'], member_ips=member_ips)
+        self.notifier.fanout_cast.assert_has_calls(
+            [call(None,
+                  {'args':
+                      {'security_groups': ['fake_sgid'],
+                       'member_ips': member_ips},
+                      'method': 'security_groups_member_updated',
+                      'namespace': None},
+                  version=sg_rpc.SG_RPC_VERSION,
+                  topic='fake-security_group-update')])
+
     def test_security_groups_rule_not_updated(self):
         self.notifier.security_groups_rule_updated(
             None, security_groups=[])
@@ -1216,6 +1525,9 @@ class TestSecurityGroupAgentWithIptables(base.BaseTestCase):
 
         self.iptables = self.agent.firewall.iptables
         self.mox.StubOutWithMock(self.iptables, "execute")
+        # Check the whole state of the tables after each apply
+        mock.patch.object(self.iptables, '_apply_incremental',
+                          return_value=False).start()
 
         self.rpc = mock.Mock()
         self.agent.plugin_rpc = self.rpc
@@ -1382,6 +1694,13 @@ class SGNotificationTestMixin():
                     security_group_id = sg['security_group']['id']
                     res = self._create_port(self.fmt, n['network']['id'])
                     port = self.deserialize(self.fmt, res)
+                    default_sg_id = port['port'][ext_sg.SECURITYGROUPS][0]
+                    ip = '%s/32' % port['port']['fixed_ips'][0]['ip_address']
+                    notify = self.notifier.security_groups_member_updated
+                    notify.assert_called_once_with(
+                        mock.ANY, [default_sg_id],
+                        member_ips={default_sg_id: {'added': [ip],
+                                                    'removed': []}})
 
                     data = {'port': {'fixed_ips': port['port']['fixed_ips'],
                                      'name': port['port']['name'],
@@ -1394,12 +1713,18 @@ class SGNotificationTestMixin():
                                            req.get_response(self.api))
                     self.assertEqual(res['port'][ext_sg.SECURITYGROUPS][0],
                                      security_group_id)
+                    # The port left its original group
+                    notify.assert_called_with(
+                        mock.ANY, [default_sg_id, security_group_id],
+                        member_ips={default_sg_id: {'added': [],
+                                                    'removed': [ip]},
+                                    security_group_id: {'added': [ip],
+                                                        'removed': []}})
                     self._delete('ports', port['port']['id'])
-                    self.notifier.assert_has_calls(
-                        [call.security_groups_member_updated(
-                            mock.ANY, [mock.ANY]),
-                         call.security_groups_member_updated(
-                             mock.ANY, [security_group_id])])
+                    notify.assert_called_with(
+                        mock.ANY, [security_group_id],
+                        member_ips={security_group_id: {'added': [],
+                                                        'removed': [ip]}})
 
 
 class TestSecurityGroupAgentWithOVSIptables(
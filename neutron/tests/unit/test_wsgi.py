@@ -15,6 +15,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import os
 import socket
 import urllib2
@@ -28,6 +29,7 @@ import webob.exc
 from neutron.api.v2 import attributes
 from neutron.common import constants
 from neutron.common import exceptions as exception
+from neutron.openstack.common import jsonutils
 from neutron.tests import base
 from neutron import wsgi
 
@@ -92,6 +94,37 @@ class TestWSGIServer(base.BaseTestCase):
                             mock_listen.return_value)
                     ])
 
+    def test_start_multiple_workers(self):
+        with mock.patch.object(wsgi, 'common_service') as mock_service:
+            server = wsgi.Server("test_multiple_processes")
+            server.start(None, 0, host="127.0.0.1", workers=2)
+            launcher = mock_service.ProcessLauncher.return_value
+            launcher.launch_service.assert_called_once_with(mock.ANY,
+                                                            workers=2)
+            worker = launcher.launch_service.call_args[0][0]
+            self.assertIsInstance(worker, wsgi.WorkerService)
+            server.stop()
+            self.assertFalse(launcher.running)
+            server.wait()
+            launcher.wait.assert_called_once_with()
+            server._socket.close()
+
+    def test_worker_service_start_stop(self):
+        server = wsgi.Server("test_worker")
+        server._socket = mock.sentinel.socket
+        worker = wsgi.WorkerService(server, mock.sentinel.app)
+        with contextlib.nested(
+            mock.patch.object(wsgi.api, 'dispose_engine'),
+            mock.patch.object(server, 'pool')
+        ) as (dispose, pool):
+            worker.start()
+            dispose.assert_called_once_with()
+            pool.spawn.assert_called_once_with(server._run,
+                                               mock.sentinel.app,
+                                               mock.sentinel.socket)
+            worker.stop()
+            pool.spawn.return_value.kill.assert_called_once_with()
+
     def test_app(self):
         greetings = 'Hello, World!!!'
 
@@ -588,6 +621,40 @@ class JSONDictSerializerTest(base.BaseTestCase):
 
         self.assertEqual(result, expected_json)
 
+    def test_serialize_iter(self):
+        input_dict = {'ports': [{'id': 1}, {'id': 2}],
+                      'ports_links': [{'rel': 'next', 'href': 'url'}]}
+        serializer = wsgi.JSONDictSerializer()
+        result = ''.join(serializer.serialize_iter(input_dict))
+
+        self.assertEqual(jsonutils.loads(result), input_dict)
+
+    def test_serialize_iter_consumes_generators(self):
+        input_dict = {'ports': ({'id': i} for i in range(3))}
+        serializer = wsgi.JSONDictSerializer()
+        result = ''.join(serializer.serialize_iter(input_dict))
+
+        self.assertEqual(jsonutils.loads(result),
+                         {'ports': [{'id': 0}, {'id': 1}, {'id': 2}]})
+
+    def test_serialize_iter_empty_collection(self):
+        serializer = wsgi.JSONDictSerializer()
+        result = ''.join(serializer.serialize_iter(
+            {'ports': (port for port in [])}))
+
+        self.assertEqual(jsonutils.loads(result), {'ports': []})
+
+    def test_serialize_iter_chunks(self):
+        cfg.CONF.set_override('response_chunk_size', 100)
+        self.addCleanup(cfg.CONF.clear_override, 'response_chunk_size')
+        input_dict = {'ports': [{'name': 'x' * 30} for i in range(20)]}
+        serializer = wsgi.JSONDictSerializer()
+        chunks = list(serializer.serialize_iter(input_dict))
+
+        self.assertTrue(len(chunks) > 1)
+        self.assertTrue(all(len(chunk) < 200 for chunk in chunks))
+        self.assertEqual(jsonutils.loads(''.join(chunks)), input_dict)
+
 
 class TextDeserializerTest(base.BaseTestCase):
 
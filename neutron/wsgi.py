@@ -24,6 +24,7 @@ import socket
 import ssl
 import sys
 import time
+import types
 from xml.etree import ElementTree as etree
 from xml.parsers import expat
 
@@ -37,9 +38,11 @@ import webob.exc
 from neutron.common import constants
 from neutron.common import exceptions as exception
 from neutron import context
+from neutron.db import api
 from neutron.openstack.common import gettextutils
 from neutron.openstack.common import jsonutils
 from neutron.openstack.common import log as logging
+from neutron.openstack.common import service as common_service
 
 socket_opts = [
     cfg.IntOpt('backlog',
@@ -53,6 +56,10 @@ socket_opts = [
     cfg.IntOpt('retry_until_window',
                default=30,
                help=_("Number of seconds to keep retrying to listen")),
+    cfg.IntOpt('response_chunk_size',
+               default=65536,
+               help=_("Size in bytes of the chunks in which collection "
+                      "responses are streamed")),
     cfg.BoolOpt('use_ssl',
                 default=False,
                 help=_('Enable SSL on the API server')),
@@ -82,12 +89,40 @@ def run_server(application, port):
     eventlet.wsgi.server(sock, application)
 
 
+class WorkerService(object):
+    """Wraps a worker to be handled by ProcessLauncher."""
+
+    def __init__(self, service, application):
+        self._service = service
+        self._application = application
+        self._server = None
+
+    def start(self):
+        # We may have just forked from the parent process. Dispose of the
+        # inherited sql connections so that they are not shared between
+        # workers and discovered to be broken later on.
+        api.dispose_engine()
+        self._server = self._service.pool.spawn(self._service._run,
+                                                self._application,
+                                                self._service._socket)
+
+    def wait(self):
+        self._service.pool.waitall()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.kill()
+            self._server = None
+
+
 class Server(object):
     """Server class to manage multiple WSGI sockets and applications."""
 
     def __init__(self, name, threads=1000):
         self.pool = eventlet.GreenPool(threads)
         self.name = name
+        self._launcher = None
+        self._server = None
 
     def _get_socket(self, host, port, backlog):
         bind_addr = (host, port)
@@ -166,8 +201,14 @@ class Server(object):
 
         return sock
 
-    def start(self, application, port, host='0.0.0.0'):
-        """Run a WSGI server with the given application."""
+    def start(self, application, port, host='0.0.0.0', workers=0,
+              launcher=None):
+        """Run a WSGI server with the given application.
+
+        With workers > 0 the listening socket is shared by that many forked
+        worker processes instead of being served from this process. They are
+        started by launcher, a new ProcessLauncher by default.
+        """
         self._host = host
         self._port = port
         backlog = CONF.backlog
@@ -175,7 +216,14 @@ class Server(object):
         self._socket = self._get_socket(self._host,
                                         self._port,
                                         backlog=backlog)
-        self._server = self.pool.spawn(self._run, application, self._socket)
+        if workers < 1:
+            # For the case where only one process is required.
+            self._server = self.pool.spawn(self._run, application,
+                                           self._socket)
+        else:
+            self._launcher = launcher or common_service.ProcessLauncher()
+            self._server = WorkerService(self, application)
+            self._launcher.launch_service(self._server, workers=workers)
 
     @property
     def host(self):
@@ -186,12 +234,19 @@ class Server(object):
         return self._socket.getsockname()[1] if self._socket else self._port
 
     def stop(self):
-        self._server.kill()
+        if self._launcher:
+            # The launcher terminates its children when its wait loop ends
+            self._launcher.running = False
+        else:
+            self._server.kill()
 
     def wait(self):
         """Wait until all servers have completed running."""
         try:
-            self.pool.waitall()
+            if self._launcher:
+                self._launcher.wait()
+            else:
+                self.pool.waitall()
         except KeyboardInterrupt:
             pass
 
@@ -337,17 +392,79 @@ class DictSerializer(ActionDispatcher):
     def serialize(self, data, action='default'):
         return self.dispatch(data, action=action)
 
+    def serialize_iter(self, data, action='default'):
+        """Serialize data into an iterator of chunks of the body.
+
+        The values of data may be iterators, they are consumed here. This
+        serializes the whole body at once, serializers able to stream it
+        override this.
+        """
+        if isinstance(data, dict):
+            data = dict((key, list(value)
+                         if isinstance(value, types.GeneratorType)
+                         else value)
+                        for key, value in data.iteritems())
+        return iter([self.serialize(data, action)])
+
     def default(self, data):
         return ""
 
 
+def _json_sanitizer(obj):
+    return unicode(obj)
+
+
 class JSONDictSerializer(DictSerializer):
     """Default JSON request body serialization."""
 
     def default(self, data):
-        def sanitizer(obj):
-            return unicode(obj)
-        return jsonutils.dumps(data, default=sanitizer)
+        return jsonutils.dumps(data, default=_json_sanitizer)
+
+    def serialize_iter(self, data, action='default'):
+        """Serialize data into an iterator of chunks of the body.
+
+        The items of the lists and iterators held by data are serialized
+        one at a time, and buffered into chunks of response_chunk_size
+        bytes, so that the body of a large collection never lives in
+        memory as a whole.
+        """
+        if not isinstance(data, dict):
+            return super(JSONDictSerializer, self).serialize_iter(data,
+                                                                  action)
+        return self._iter_chunks(self._iter_dict(data),
+                                 cfg.CONF.response_chunk_size)
+
+    def _iter_dict(self, data):
+        yield '{'
+        for index, (key, value) in enumerate(data.iteritems()):
+            if index:
+                yield ', '
+            yield self.default(key)
+            yield ': '
+            if isinstance(value, (list, types.GeneratorType)):
+                yield '['
+                for item_index, item in enumerate(value):
+                    if item_index:
+                        yield ', '
+                    yield self.default(item)
+                yield ']'
+            else:
+                yield self.default(value)
+        yield '}'
+
+    @staticmethod
+    def _iter_chunks(parts, chunk_size):
+        buf = []
+        size = 0
+        for part in parts:
+            buf.append(part)
+            size += len(part)
+            if size >= chunk_size:
+                yield ''.join(buf)
+                buf = []
+                size = 0
+        if buf:
+            yield ''.join(buf)
 
 
 class XMLDictSerializer(DictSerializer):